@@ -0,0 +1,194 @@
+'''
+Logging setup of the workers (setup_logger of FtxApiClient, the workers and PushoverNotifier).
+
+Synchronous mode (default): the FileHandler and the StreamHandler write from the calling thread, as before.
+
+Asynchronous mode (configure(async_mode=True), "logging" section of the config):
+    - the loggers only get a QueueHandler - a logging call costs a record creation and a queue put
+    - one QueueListener thread per process writes the records into the real handlers (file + console)
+    - formatting is lazy: the message is formatted by the listener thread, so the hot paths log with the %-style
+      arguments (logger.info("sending request: %s", request)) - the arguments must not be mutated after the call
+    - the listener is restarted in forked processes (the workers) and flushed by shutdown() / at exit
+
+Options (both modes):
+    max_bytes / backup_count    rotating files (the previous run's log is rotated out instead of truncated)
+    compress                    rotated files are gzipped (by the writing thread)
+    json_lines                  files get one JSON object per record ({"time", "level", "logger", "message", ...}
+                                and "data" given as logger.info(..., extra={"data": {...}})), cheap to grep / parse
+
+eg. usage:
+
+    async_logging.configure(async_mode=True, max_bytes=10 * 1024 * 1024, json_lines=True)
+    async_logging.setup_logger(logging.getLogger("ftx_lib"), "./logs/ftx_lib.log")
+'''
+
+import os
+import gzip
+import json
+import atexit
+import shutil
+import logging
+import threading
+from queue import SimpleQueue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+CONFIG = {
+    "async_mode": False,
+    "json_lines": False,
+    "max_bytes": 0,  # 0 - no rotation
+    "backup_count": 5,
+    "compress": True,
+    "console": True
+}
+
+CONSOLE_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+FILE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def configure(**config):
+    '''
+    To be called before the loggers are set up (e.g. with the "logging" section of the config)
+    '''
+    unknown_options = set(config) - set(CONFIG)
+    if unknown_options:
+        raise Exception("Unknown logging options: {}".format(sorted(unknown_options)))
+    CONFIG.update(config)
+
+
+class JsonLinesFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {"time": record.created, "level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        data = getattr(record, "data", None)
+        if data is not None:
+            entry["data"] = data
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)  # Runs on the writing thread (default=str for e.g. Decimal)
+
+
+class LazyQueueHandler(QueueHandler):
+
+    def prepare(self, record):
+        # Formatted by the listener thread (QueueHandler formats the record in the calling thread)
+        return record
+
+
+class RoutingHandler(logging.Handler):
+    '''
+    Handler of the listener thread - passes the record to the handlers of its logger
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.handlers_by_logger = {}
+
+    def add(self, logger_name: str, handler: logging.Handler):
+        self.handlers_by_logger.setdefault(logger_name, []).append(handler)
+
+    def handle(self, record):
+        for handler in self.handlers_by_logger.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def flush(self):
+        for handlers in self.handlers_by_logger.values():
+            for handler in handlers:
+                handler.flush()
+
+
+class LogWriter(object):
+    '''
+    The queue and the listener thread of the process
+    '''
+
+    def __init__(self):
+        self.queue = SimpleQueue()
+        self.router = RoutingHandler()
+        self.queue_handlers = []
+        self.listener = None
+        self.lock = threading.Lock()
+
+    def add_logger(self, logger: logging.Logger, handlers: list):
+        for handler in handlers:
+            self.router.add(logger.name, handler)
+        queue_handler = LazyQueueHandler(self.queue)
+        self.queue_handlers.append(queue_handler)
+        logger.addHandler(queue_handler)
+        self.start()
+
+    def start(self):
+        with self.lock:
+            if not self.listener:
+                self.listener = QueueListener(self.queue, self.router)
+                self.listener.start()
+
+    def stop(self):
+        with self.lock:
+            if self.listener:
+                self.listener.stop()  # Writes all the queued records first
+                self.listener = None
+            self.router.flush()
+
+    def after_fork(self):
+        # The listener thread of the parent process doesn't exist in the child
+        self.lock = threading.Lock()
+        self.queue = SimpleQueue()
+        for queue_handler in self.queue_handlers:
+            queue_handler.queue = self.queue
+        self.listener = None
+        if self.queue_handlers:
+            self.start()
+
+
+log_writer = LogWriter()
+os.register_at_fork(after_in_child=log_writer.after_fork)
+atexit.register(log_writer.stop)
+
+
+def shutdown():
+    '''
+    Writes all the queued records (to be called before the process exits)
+    '''
+    log_writer.stop()
+
+
+def gzip_namer(name):
+    return name + ".gz"
+
+
+def gzip_rotator(source, dest):
+    with open(source, "rb") as source_file, gzip.open(dest, "wb") as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+def create_file_handler(log_file, mode="w"):
+    if not CONFIG["max_bytes"]:
+        return logging.FileHandler(log_file, mode=mode)
+    fh = RotatingFileHandler(log_file, maxBytes=CONFIG["max_bytes"], backupCount=CONFIG["backup_count"])
+    if CONFIG["compress"]:
+        fh.namer = gzip_namer
+        fh.rotator = gzip_rotator
+    if mode == "w" and os.path.exists(log_file) and os.path.getsize(log_file):
+        fh.doRollover()  # Keep the previous run's log (rotated) instead of truncating it
+    return fh
+
+
+def setup_logger(logger, log_file, mode="w"):
+    logger.setLevel(logging.DEBUG)
+    fh = create_file_handler(log_file, mode)
+    fh.setLevel(logging.DEBUG)
+    fh.setFormatter(JsonLinesFormatter() if CONFIG["json_lines"] else logging.Formatter(FILE_FORMAT))
+    handlers = [fh]
+    if CONFIG["console"]:
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.DEBUG)
+        ch.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(ch)
+    if CONFIG["async_mode"]:
+        log_writer.add_logger(logger, handlers)
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
@@ -0,0 +1,361 @@
+'''
+Offline evaluation of buy/sell signals with the trading rules of FtxUserApiWorker: every buy spends the whole quote
+balance at the ask, every sell sells the whole base balance at the bid, with the taker fee and the rounding of
+order_sizing.OrderSizer (price ROUND_UP to the tick, balances ROUND_DOWN, fees ROUND_UP - the buy fee is paid in the base
+currency, the sell fee in the quote currency).
+
+Market data (MarketData):
+    - bars (ohlcv.FIELDS rows) - e.g. OhlcvBars.view() or downloaded FTX candles (download_bars), the bid / ask being
+      the close -/+ half of the given relative spread
+    - a market data capture (market_data_recorder) - the ticker's bid / ask at every receive time, and the recorded order
+      book to fill against its depth (fill="book": the average price walking the book for the order's size)
+
+Signals: (row index, side) pairs, side 1 - buy, -1 - sell (e.g. Strategy.warm_up() of signal_engine, or the times of
+recorded alerts through MarketData.indices()). A signal is filled at the quote of its row + delay. As in the worker,
+a buy while holding the base currency (or a sell without it) trades nothing, so only the alternating signals count.
+
+The per bar work is vectorized (positions, fills, the equity curve). The trades (round trips) are computed either
+    - exactly (exact=True): one OrderSizer.buy / sell per trade, in fixed point integers, as the worker does
+    - vectorized (exact=False): the same formulas in floats without the rounding (cumulative product of the round
+      trips' returns) - for the parameter sweeps, where the per trade rounding is noise
+
+sweep() runs a strategy (signal_engine.STRATEGIES) over a parameter grid in a process pool (the market data is sent to
+every worker process once).
+
+eg. usage:
+
+    market_data = MarketData.from_bars("BTC/USDT", bars, spread=0.0002)
+    strategy = create_strategy({"type": "ema_cross", "market": "BTC/USDT", "timeframe": "1m", "fast": 9, "slow": 21})
+    result = Backtester(market_data, quote_balance="1000").run_strategy(strategy)
+    result.summary        # {"trades": ..., "total_return": ..., "max_drawdown": ..., ...}
+    result.equity         # equity curve (quote currency) at every row
+    result.trades         # per trade: entry / exit rows and prices, quantity, fees, pnl
+
+    results = sweep(market_data, "ema_cross", {"fast": [5, 9, 13], "slow": [21, 34, 55]}, processes=4)
+'''
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from decimal import ROUND_DOWN
+import json_codec
+from market_data_recorder import MarketDataCaptureReader
+from order_book import OrderBook
+from order_sizing import OrderSizer, divide
+from ohlcv import FIELDS
+from signal_engine import create_strategy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+CLOSE = FIELDS.index("close")
+
+
+class MarketData(object):
+
+    def __init__(self, market: str, times, bids, asks, bars=None, capture_directory: str = None):
+        if not np:
+            raise Exception("The backtester requires numpy!")
+        self.market = market
+        self.times = np.asarray(times, dtype=float)
+        self.bids = np.asarray(bids, dtype=float)
+        self.asks = np.asarray(asks, dtype=float)
+        self.bars = bars  # The rows the strategies are computed on (None for the captures)
+        self.capture_directory = capture_directory  # The order book depth (see book_snapshots)
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def from_bars(cls, market: str, bars, spread: float = 0.0):
+        bars = np.asarray(bars, dtype=float)
+        close = bars[:, CLOSE]
+        return cls(market, bars[:, 0], close * (1 - spread / 2), close * (1 + spread / 2), bars=bars)
+
+    @classmethod
+    def from_capture(cls, directory: str, market: str, start: float = None, end: float = None):
+        '''
+        Ticker bid / ask of the market at every receive time of the capture
+        '''
+        decoder = json_codec.FrameDecoder(["ticker"])
+        times, bids, asks = [], [], []
+        for receive_time, frame in MarketDataCaptureReader(directory).replay(start, end):
+            if '"ticker"' not in frame or market not in frame:
+                continue
+            message = decoder.decode(frame)
+            if message.get("channel") == "ticker" and message.get("market") == market and message.get("type") == "update":
+                data = message["data"]
+                if data.bid and data.ask:
+                    times.append(receive_time)
+                    bids.append(data.bid)
+                    asks.append(data.ask)
+        return cls(market, times, bids, asks, capture_directory=directory)
+
+    def indices(self, signal_times):
+        '''
+        Row of the first quote at / after every signal time
+        '''
+        return np.searchsorted(self.times, signal_times, side="left")
+
+    def book_snapshots(self, rows, depth: int = 100):
+        '''
+        {row: OrderBook} - the recorded order book (depth best levels) as it was at the time of each row
+        '''
+        if not self.capture_directory:
+            raise Exception("No order book depth without a market data capture!")
+        rows = sorted(set(int(row) for row in rows))
+        snapshots = {}
+        if not rows:
+            return snapshots
+        decoder = json_codec.FrameDecoder(["orderbook"])
+        book = OrderBook(self.market)
+        position = 0
+        for receive_time, frame in MarketDataCaptureReader(self.capture_directory).replay(None, self.times[rows[-1]] + 1e-9):
+            while position < len(rows) and receive_time > self.times[rows[position]]:
+                snapshots[rows[position]] = self.snapshot(book, depth)
+                position += 1
+            if position == len(rows):
+                break
+            if '"orderbook"' not in frame:
+                continue
+            message = decoder.decode(frame)
+            if message.get("channel") == "orderbook" and message.get("market") == self.market:
+                if message["type"] == "partial":
+                    book.apply_partial(message["data"])
+                elif message["type"] == "update":
+                    book.apply_update(message["data"])
+        for row in rows[position:]:
+            snapshots[row] = self.snapshot(book, depth)
+        return snapshots
+
+    @staticmethod
+    def snapshot(book: OrderBook, depth: int):
+        snapshot = OrderBook(book.market)
+        for price, size in book.bids.levels(depth):
+            snapshot.bids.apply(price, size)
+        for price, size in book.asks.levels(depth):
+            snapshot.asks.apply(price, size)
+        snapshot.time = book.time
+        return snapshot
+
+
+async def download_bars(rest_client, market: str, resolution: int, start: float, end: float, limit: int = 1500):
+    '''
+    FTX historical candles (GET /markets/{market}/candles) as bars rows - downloaded in chunks of limit candles
+    '''
+    rows = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(end, chunk_start + resolution * limit)
+        candles = await rest_client.get_candles(market, resolution, chunk_start, chunk_end)
+        for candle in candles:
+            candle_time = candle["time"] / 1000
+            if (not rows or candle_time > rows[-1][0]) and candle_time < end:
+                rows.append([candle_time, candle["open"], candle["high"], candle["low"], candle["close"], candle["volume"], 0])
+        chunk_start = chunk_end
+    return np.array(rows, dtype=float).reshape(-1, len(FIELDS))
+
+
+class BacktestResult(object):
+
+    def __init__(self, equity, trades: dict, summary: dict):
+        self.equity = equity  # Quote currency at every row (the base currency valued at the bid)
+        self.trades = trades  # Column arrays: entry_row, exit_row (-1 - open), entry_price, exit_price, quantity, buy_fee, sell_fee, pnl
+        self.summary = summary
+
+    def __repr__(self):
+        return "BacktestResult({})".format(self.summary)
+
+
+class Backtester(object):
+
+    def __init__(self, market_data: MarketData, quote_balance="1000", taker_fee=0.000665, price_decimals: int = 2, fill: str = "quote", book_depth: int = 100, delay: int = 0):
+        if fill not in ("quote", "book"):
+            raise Exception("Unknown fill: {}. Supported: quote, book".format(fill))
+        self.market_data = market_data
+        self.sizer = OrderSizer(market_data.market, price_decimals)
+        self.quote_balance = self.sizer.quote_quantizer.to_fixed(quote_balance, ROUND_DOWN)
+        self.taker_fee = taker_fee
+        self.fill = fill
+        self.book_depth = book_depth
+        self.delay = delay  # Rows between the signal and its fill
+        # notional [quote] / price -> quantity [base] and back (fixed point)
+        self.base_scale = 10 ** (self.sizer.base_quantizer.decimals + self.sizer.price_quantizer.decimals - self.sizer.quote_quantizer.decimals)
+
+    def trade_rows(self, rows, sides):
+        '''
+        The alternating signals (buy, sell, buy...) -> (buy rows, sell rows) filled
+        '''
+        rows = np.asarray(rows, dtype=np.int64) + self.delay
+        sides = np.asarray(sides, dtype=np.int64)
+        keep = rows < len(self.market_data)
+        rows, sides = rows[keep], sides[keep]
+        order = np.argsort(rows, kind="stable")
+        rows, sides = rows[order], sides[order]
+        effective = sides != np.r_[-1, sides[:-1]]  # Starting without the base currency
+        rows, sides = rows[effective], sides[effective]
+        return rows[sides > 0], rows[sides < 0]
+
+    def round_trips_exact(self, buy_rows, sell_rows, books):
+        sizer = self.sizer
+        base_decimals = sizer.base_quantizer.decimals
+        quote_format = sizer.quote_quantizer.format
+        base_format = sizer.base_quantizer.format
+        bids, asks = self.market_data.bids, self.market_data.asks
+        count = len(buy_rows)
+        trades = {name: np.zeros(count) for name in ("entry_price", "exit_price", "quantity", "buy_fee", "sell_fee", "pnl", "cash_before", "cash_left", "cash_after")}
+        cash = self.quote_balance
+        for k in range(count):
+            buy_row = buy_rows[k]
+            price = float(asks[buy_row])
+            if books is not None:
+                price = self.book_price(books[buy_row], "buy", notional=cash / sizer.quote_quantizer.scale) or price
+            order = sizer.buy(price, quote_format(cash), self.taker_fee)
+            quantity = divide(order.amount * self.base_scale, order.price, ROUND_DOWN) - order.fee
+            trades["cash_before"][k] = cash / sizer.quote_quantizer.scale
+            trades["entry_price"][k] = order.price / sizer.price_quantizer.scale
+            trades["quantity"][k] = quantity / 10 ** base_decimals
+            trades["buy_fee"][k] = order.fee / 10 ** base_decimals
+            spent = order.amount
+            cash -= spent
+            trades["cash_left"][k] = cash / sizer.quote_quantizer.scale
+            if k < len(sell_rows):
+                sell_row = sell_rows[k]
+                price = float(bids[sell_row])
+                if books is not None:
+                    price = self.book_price(books[sell_row], "sell", quantity=quantity / 10 ** base_decimals) or price
+                order = sizer.sell(price, base_format(quantity), self.taker_fee)
+                proceeds = divide(order.amount * order.price, self.base_scale, ROUND_DOWN) - order.fee
+                cash += proceeds
+                trades["exit_price"][k] = order.price / sizer.price_quantizer.scale
+                trades["sell_fee"][k] = order.fee / sizer.quote_quantizer.scale
+                trades["pnl"][k] = (proceeds - spent) / sizer.quote_quantizer.scale
+            else:
+                trades["exit_price"][k] = np.nan
+                trades["pnl"][k] = np.nan
+            trades["cash_after"][k] = cash / sizer.quote_quantizer.scale
+        return trades
+
+    def round_trips_vectorized(self, buy_rows, sell_rows):
+        count, closed = len(buy_rows), len(sell_rows)
+        fee = self.sizer.get_taker_fee(self.taker_fee) / self.sizer.fee_rate_quantizer.scale  # As rounded by the sizer
+        entry_price = self.market_data.asks[buy_rows]
+        exit_price = np.full(count, np.nan)
+        exit_price[:closed] = self.market_data.bids[sell_rows]
+        returns = exit_price[:closed] / entry_price[:closed] * (1 - fee) ** 2
+        cash_before = self.quote_balance / self.sizer.quote_quantizer.scale * np.r_[1.0, np.cumprod(returns)][:count]
+        quantity = cash_before / entry_price * (1 - fee)
+        proceeds = np.full(count, np.nan)
+        proceeds[:closed] = quantity[:closed] * exit_price[:closed] * (1 - fee)
+        return {
+            "entry_price": entry_price, "exit_price": exit_price, "quantity": quantity,
+            "buy_fee": cash_before / entry_price * fee, "sell_fee": quantity * exit_price * fee,
+            "pnl": proceeds - cash_before, "cash_before": cash_before, "cash_left": np.zeros(count), "cash_after": proceeds
+        }
+
+    @staticmethod
+    def book_price(book: OrderBook, side: str, quantity: float = None, notional: float = None):
+        '''
+        Average price walking the recorded book (None if it's empty)
+        '''
+        if side == "buy":
+            filled, spent = book.asks.quantity_for_notional(notional)
+        else:
+            filled, spent = book.bids.cost(quantity)
+        return spent / filled if filled else None
+
+    def equity_curve(self, buy_rows, sell_rows, trades):
+        '''
+        Cash while flat, the quantity valued at the bid (plus the cash left after the buy) while holding it
+        '''
+        rows = len(self.market_data)
+        initial = self.quote_balance / self.sizer.quote_quantizer.scale
+        if not len(buy_rows):
+            return np.full(rows, initial)
+        bought = np.zeros(rows, dtype=np.int64)
+        np.add.at(bought, buy_rows, 1)
+        trade = np.cumsum(bought) - 1  # The last trade bought at / before every row
+        sold = np.zeros(rows, dtype=np.int64)
+        np.add.at(sold, sell_rows, 1)
+        closed = np.cumsum(sold) - sold  # Trades sold before every row (the sell row is still valued at the bid)
+        holding = trade >= closed
+        last = np.maximum(trade, 0)
+        value = trades["quantity"][last] * self.market_data.bids + trades["cash_left"][last]
+        cash = np.where(trade >= 0, trades["cash_after"][last], initial)
+        return np.where(holding, value, cash)
+
+    def run(self, rows, sides, exact: bool = True):
+        buy_rows, sell_rows = self.trade_rows(rows, sides)
+        books = None
+        if self.fill == "book":
+            books = self.market_data.book_snapshots(np.r_[buy_rows, sell_rows], self.book_depth)
+        if exact or books is not None:
+            trades = self.round_trips_exact(buy_rows, sell_rows, books)
+        else:
+            trades = self.round_trips_vectorized(buy_rows, sell_rows)
+        equity = self.equity_curve(buy_rows, sell_rows, trades)
+        trades["entry_row"] = buy_rows
+        trades["exit_row"] = np.r_[sell_rows, -np.ones(len(buy_rows) - len(sell_rows), dtype=np.int64)]
+        return BacktestResult(equity, trades, self.summarize(equity, trades))
+
+    def run_strategy(self, strategy, exact: bool = True):
+        '''
+        signal_engine.Strategy on the market data's bars (vectorized warm_up)
+        '''
+        if self.market_data.bars is None:
+            raise Exception("Strategies need the bars of the market data!")
+        signals = strategy.warm_up(self.market_data.bars)
+        rows = np.array([row for row, _ in signals], dtype=np.int64)
+        sides = np.array([1 if side == "buy" else -1 for _, side in signals], dtype=np.int64)
+        return self.run(rows, sides, exact=exact)
+
+    def summarize(self, equity, trades):
+        initial = self.quote_balance / self.sizer.quote_quantizer.scale
+        pnl = trades["pnl"][~np.isnan(trades["pnl"])]
+        peak = np.maximum.accumulate(equity) if len(equity) else equity
+        drawdown = float(np.max(1 - equity / peak)) if len(equity) else 0.0
+        final = float(equity[-1]) if len(equity) else initial
+        return {
+            "trades": int(len(pnl)),
+            "open_position": bool(len(trades["pnl"]) > len(pnl)),
+            "win_rate": float(np.mean(pnl > 0)) * 100 if len(pnl) else 0.0,
+            "total_pnl": float(np.sum(pnl)),
+            "fees": float(np.sum(trades["buy_fee"] * trades["entry_price"]) + np.nansum(trades["sell_fee"])),
+            "final_equity": final,
+            "total_return": (final / initial - 1) * 100,
+            "max_drawdown": drawdown * 100
+        }
+
+
+sweep_market_data = None
+sweep_backtester_kwargs = None
+
+
+def init_sweep_worker(market_data: MarketData, backtester_kwargs: dict):
+    global sweep_market_data, sweep_backtester_kwargs
+    sweep_market_data = market_data
+    sweep_backtester_kwargs = backtester_kwargs
+
+
+def run_sweep_point(point):
+    strategy_type, parameters, exact = point
+    strategy = create_strategy(dict(parameters, type=strategy_type, market=sweep_market_data.market, timeframe=""))
+    return parameters, Backtester(sweep_market_data, **sweep_backtester_kwargs).run_strategy(strategy, exact=exact).summary
+
+
+def sweep(market_data: MarketData, strategy_type: str, grid: dict, processes: int = None, exact: bool = False, **backtester_kwargs):
+    '''
+    Every combination of the grid's parameters ({"fast": [5, 9], "slow": [21, 34]}) -> [(parameters, summary)] sorted
+    by the total return (best first). processes=0 runs in this process.
+    '''
+    names = list(grid.keys())
+    points = [(strategy_type, dict(zip(names, values)), exact) for values in itertools.product(*(grid[name] for name in names))]
+    if processes == 0:
+        init_sweep_worker(market_data, backtester_kwargs)
+        results = [run_sweep_point(point) for point in points]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_sweep_worker, initargs=(market_data, backtester_kwargs)) as executor:
+            results = list(executor.map(run_sweep_point, points))
+    return sorted(results, key=lambda result: result[1]["total_return"], reverse=True)
@@ -0,0 +1,163 @@
+'''
+Accounts multiplexing: a process per account (FtxUserApiWorker.run_forever, the former mode) vs FtxUserApiWorkerGroup
+(many accounts on one loop, sharded across --processes processes). Real FtxUserApiWorker instances connect to the local
+FTX stand-in server (in its own process), the signals go through their SignalChannels as from the webhook. Reports for
+every number of accounts:
+    - memory: PSS (proportional set size - the pages shared after fork counted once) and RSS of all the worker
+      processes, total and per account
+    - signal fan-out: one signal put into every account's channel (as WebhookBot does) -> handled by all the accounts,
+      p50 / max over the signals, and the per account webhook -> handled p50
+
+Usage:
+    python benchmarks/bench_account_multiplexing.py [--accounts 1 10 50] [--processes 1] [--signals 20]
+'''
+
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from multiprocessing import Process, Queue
+
+from bench_common import percentile
+from ftx_stand_in_server import FtxStandInServer
+from ftx_client import FtxClient
+from ftx_user_api_worker import FtxUserApiWorker
+from ftx_user_api_worker_group import FtxUserApiWorkerGroup, shard_accounts
+from shared_market_data import SharedMarketData
+from signal_transport import SignalChannel
+from latency import stamp
+import async_logging
+
+
+class BenchFtxUserApiWorker(FtxUserApiWorker):
+    '''
+    Reports every handled signal to the benchmark process
+    '''
+
+    results_queue = None
+
+    def handle_buy_sell_requests(self, request: dict):
+        super().handle_buy_sell_requests(request)
+        self.results_queue.put((self.ftx_client.ftx_user, request["timestamps"]))
+
+
+def run_server(port_queue):
+    async def main():
+        server = await FtxStandInServer().start()
+        port_queue.put(server.port)
+        await asyncio.Event().wait()
+    asyncio.new_event_loop().run_until_complete(main())
+
+
+def run_worker(worker):
+    asyncio.new_event_loop().run_until_complete(worker.run())
+
+
+def run_group(group):
+    asyncio.new_event_loop().run_until_complete(group.run())
+
+
+def memory_kb(pid):
+    '''
+    (PSS, RSS) of the process in kB
+    '''
+    values = {}
+    with open("/proc/{}/smaps_rollup".format(pid)) as smaps:
+        for line in smaps:
+            name, _, value = line.partition(":")
+            if name in ("Pss", "Rss"):
+                values[name] = int(value.split()[0])
+    return values["Pss"], values["Rss"]
+
+
+def create_workers(name, accounts, uri, shared_market_data, log_dir):
+    workers = []
+    for i in range(accounts):
+        shared_user_api_data = {
+            "tickers": {"BTC_USDT": {"price_decimals": "0", "quantity_decimals": "4"}},
+            "balance_USDT": "1234.56", "balance_BTC": "0.0123", "balance_FTT": "0",
+            "last_transaction_BTC_buy_price_in_fiat": "0", "last_transaction_BTC_buy_price_in_USDT": "0",
+            "last_transaction_BTC_sell_price_in_fiat": "0", "last_transaction_BTC_sell_price_in_USDT": "0"
+        }
+        workers.append(BenchFtxUserApiWorker(
+            ftx_client=FtxClient("stand-in-key", "", "{}_account_{}".format(name, i)),
+            shared_user_api_data=shared_user_api_data,
+            shared_market_data=shared_market_data,
+            buy_sell_requests_channel=SignalChannel(),
+            log_file=os.path.join(log_dir, "account_{}.log".format(i)),
+            transactions_log_file=os.path.join(log_dir, "transactions_{}.log".format(i)),
+            websocket_uri=uri,
+            rest_api_url=None  # The account state is fixed
+        ))
+    return workers
+
+
+def fan_out(workers, results_queue, request):
+    '''
+    Puts the signal into every account's channel and waits for all of them -> (start, {account: timestamps})
+    '''
+    start = time.monotonic_ns()
+    for worker in workers:
+        signal = dict(request, timestamps={"webhook_received": start})
+        stamp(signal["timestamps"], "enqueued")
+        worker.buy_sell_requests_channel.put(signal)
+    results = {}
+    while len(results) < len(workers):
+        account, timestamps = results_queue.get(timeout=60)
+        results[account] = timestamps
+    return start, results
+
+
+def bench(name, accounts, processes, uri, shared_market_data, signals):
+    with tempfile.TemporaryDirectory() as log_dir:
+        workers = create_workers("{}_{}".format("multiplexed" if processes else "process_per_account", accounts), accounts, uri, shared_market_data, log_dir)
+        results_queue = Queue()
+        BenchFtxUserApiWorker.results_queue = results_queue
+        if processes:
+            worker_processes = [Process(target=run_group, args=(FtxUserApiWorkerGroup(shard, name="bench_{}".format(i), log_file=os.path.join(log_dir, "group_{}.log".format(i))),)) for i, shard in enumerate(shard_accounts(workers, processes))]
+        else:
+            worker_processes = [Process(target=run_worker, args=(worker,)) for worker in workers]
+        for process in worker_processes:
+            process.start()
+        try:
+            fan_out(workers, results_queue, {"type": "buy", "price": "43000", "fiat": "USD"})  # All connected and initialized
+            time.sleep(0.5)
+            memory = [memory_kb(process.pid) for process in worker_processes]
+            pss, rss = sum(value[0] for value in memory) / 1024, sum(value[1] for value in memory) / 1024
+            fan_out_times, handled_latencies = [], []
+            for i in range(signals):
+                start, results = fan_out(workers, results_queue, {"type": "sell" if i % 2 else "buy", "price": "43000", "fiat": "USD"})
+                fan_out_times.append((max(timestamps["handled"] for timestamps in results.values()) - start) / 1e6)
+                handled_latencies.extend((timestamps["handled"] - start) / 1e6 for timestamps in results.values())
+            fan_out_times.sort()
+            handled_latencies.sort()
+            print("{:28} {:3} accounts {:3} processes   PSS: {:7.1f} MB ({:5.1f} MB/account)   RSS: {:7.1f} MB   fan-out p50: {:7.2f} ms   max: {:7.2f} ms   per account p50: {:6.2f} ms".format(
+                name, accounts, len(worker_processes), pss, pss / accounts, rss, percentile(fan_out_times, 50), fan_out_times[-1], percentile(handled_latencies, 50)))
+        finally:
+            for process in worker_processes:
+                process.terminate()
+                process.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--signals", type=int, default=20)
+    args = parser.parse_args()
+
+    async_logging.configure(async_mode=True, console=False)
+    port_queue = Queue()
+    server_process = Process(target=run_server, args=(port_queue,), daemon=True)
+    server_process.start()
+    uri = "ws://127.0.0.1:{}/ws/".format(port_queue.get())
+    shared_market_data = SharedMarketData(markets=["BTC/USDT", "EUR/USD"], taker_fee=0.000665)
+    shared_market_data.update("BTC/USDT", bid=43000.0, ask=43001.0, last=43000.0, timestamp=time.time())
+    try:
+        for accounts in args.accounts:
+            bench("process per account (former)", accounts, 0, uri, shared_market_data, args.signals)
+            bench("multiplexed", accounts, args.processes, uri, shared_market_data, args.signals)
+    finally:
+        shared_market_data.unlink()
+        server_process.terminate()
@@ -0,0 +1,151 @@
+'''
+Backtester (backtester.py) on synthetic random walk 1 minute bars (a year by default). Reports:
+    - check: the exact backtest vs a bar by bar reference (Strategy.update() per bar, OrderSizer per signal - as the
+      signal engine and the worker would do it live): the same trades and the same final balance; and the vectorized
+      (float) backtest's difference from the exact one (the rounding to the cent) for growing balances
+    - speed: the exact and the vectorized backtest of a strategy over the whole year
+    - sweep: a parameter grid in this process vs in a process pool
+    - book fills: a synthetic market data capture (ticker + order book) filled at the quotes vs against the book depth
+
+Usage:
+    python benchmarks/bench_backtester.py [--bars 525600] [--processes 4] [--quote-balance 1000]
+'''
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from decimal import ROUND_DOWN
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+from backtester import Backtester, MarketData, sweep
+from bench_indicators import random_bars
+from market_data_recorder import MarketDataRecorder
+import json_codec
+from order_sizing import divide
+from signal_engine import create_strategy
+
+SPREAD = 0.0002
+TAKER_FEE = 0.000665
+GRID = {"fast": [30, 60, 120, 240], "slow": [360, 720, 1440, 2880]}
+
+
+def reference_backtest(bars, config, quote_balance):
+    '''
+    Bar by bar: the strategy's update() and the worker's all-in / all-out sizing on every signal
+    '''
+    market_data = MarketData.from_bars("BTC/USDT", bars, spread=SPREAD)
+    backtester = Backtester(market_data, quote_balance=quote_balance, taker_fee=TAKER_FEE)
+    sizer = backtester.sizer
+    strategy = create_strategy(dict(config, market="BTC/USDT", timeframe="1m"))
+    cash, quantity, holding, trades = backtester.quote_balance, 0, False, 0
+    for row, bar in enumerate(bars.tolist()):
+        side = strategy.update(bar)
+        if side == "buy" and not holding:
+            order = sizer.buy(float(market_data.asks[row]), sizer.quote_quantizer.format(cash), TAKER_FEE)
+            quantity = divide(order.amount * backtester.base_scale, order.price, ROUND_DOWN) - order.fee
+            cash -= order.amount
+            holding = True
+        elif side == "sell" and holding:
+            order = sizer.sell(float(market_data.bids[row]), sizer.base_quantizer.format(quantity), TAKER_FEE)
+            cash += divide(order.amount * order.price, backtester.base_scale, ROUND_DOWN) - order.fee
+            quantity, holding = 0, False
+            trades += 1
+    equity = cash / sizer.quote_quantizer.scale + quantity / sizer.base_quantizer.scale * market_data.bids[-1]
+    return trades, equity
+
+
+def bench_check_and_speed(bars, quote_balance):
+    config = {"type": "ema_cross", "fast": 60, "slow": 240}
+    market_data = MarketData.from_bars("BTC/USDT", bars, spread=SPREAD)
+    backtester = Backtester(market_data, quote_balance=quote_balance, taker_fee=TAKER_FEE)
+    print("{} bars of 1m ({:.0f} days)".format(len(bars), len(bars) / 1440))
+
+    start = time.perf_counter()
+    reference_trades, reference_equity = reference_backtest(bars, config, quote_balance)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = backtester.run_strategy(create_strategy(dict(config, market="BTC/USDT", timeframe="1m")), exact=True)
+    exact_time = time.perf_counter() - start
+    start = time.perf_counter()
+    vectorized = backtester.run_strategy(create_strategy(dict(config, market="BTC/USDT", timeframe="1m")), exact=False)
+    vectorized_time = time.perf_counter() - start
+
+    print("    bar by bar reference: {:8.1f} ms   trades: {}   final equity: {:.2f}".format(reference_time * 1e3, reference_trades, reference_equity))
+    print("    exact:                {:8.1f} ms   trades: {}   final equity: {:.2f}   == reference: {}".format(
+        exact_time * 1e3, exact.summary["trades"], exact.summary["final_equity"], exact.summary["trades"] == reference_trades and abs(exact.summary["final_equity"] - reference_equity) < 1e-6))
+    print("    vectorized:           {:8.1f} ms   trades: {}   final equity: {:.2f}".format(vectorized_time * 1e3, vectorized.summary["trades"], vectorized.summary["final_equity"]))
+    # The vectorized backtest leaves out the per trade rounding to the cent - it matters less with larger balances
+    for balance in (quote_balance, "1000000", "1000000000"):
+        exact_return = Backtester(market_data, quote_balance=balance, taker_fee=TAKER_FEE).run_strategy(create_strategy(dict(config, market="BTC/USDT", timeframe="1m"))).summary["total_return"]
+        print("    total return with balance {:>10}: exact {:9.5f} %   vectorized {:9.5f} %".format(balance, exact_return, vectorized.summary["total_return"]))
+    print("    summary: {}".format({key: round(value, 4) if isinstance(value, float) else value for key, value in exact.summary.items()}))
+    pnl = exact.trades["pnl"][~np.isnan(exact.trades["pnl"])]
+    print("    per trade pnl: min {:.2f}  mean {:.4f}  max {:.2f}   equity curve points: {}".format(pnl.min(), pnl.mean(), pnl.max(), len(exact.equity)))
+    return market_data
+
+
+def bench_sweep(market_data, processes, quote_balance):
+    points = int(np.prod([len(values) for values in GRID.values()]))
+    print("sweep: ema_cross over {} parameter sets (CPUs: {})".format(points, os.cpu_count()))
+    timings = {}
+    for label, pool_size in (("in process", 0), ("{} processes".format(processes), processes)):
+        start = time.perf_counter()
+        results = sweep(market_data, "ema_cross", GRID, processes=pool_size, quote_balance=quote_balance, taker_fee=TAKER_FEE)
+        timings[label] = time.perf_counter() - start
+        print("    {:14} {:8.2f} s   ({:.1f} ms per parameter set)   best: {} return: {:.2f} %".format(
+            label, timings[label], timings[label] / points * 1e3, results[0][0], results[0][1]["total_return"]))
+
+
+def write_capture(directory, count, seed=3):
+    '''
+    Ticker and order book (10 levels a side, 0.5 BTC each) frames of BTC/USDT, one of each per second
+    '''
+    rng = np.random.default_rng(seed)
+    mid = (30000.0 * np.exp(np.cumsum(rng.normal(0, 0.0005, count)))).tolist()
+    recorder = MarketDataRecorder(directory)
+    start = 1650000000.0
+    for i in range(count):
+        bid, ask = round(mid[i] - 0.5, 1), round(mid[i] + 0.5, 1)
+        book = {"time": start + i, "checksum": 0, "action": "partial",
+                "bids": [[round(bid - level, 1), 0.5] for level in range(10)], "asks": [[round(ask + level, 1), 0.5] for level in range(10)]}
+        recorder.record(json_codec.dumps({"channel": "orderbook", "market": "BTC/USDT", "type": "partial", "data": book}), start + i)
+        ticker = {"bid": bid, "ask": ask, "bidSize": 0.5, "askSize": 0.5, "last": bid, "time": start + i}
+        recorder.record(json_codec.dumps({"channel": "ticker", "market": "BTC/USDT", "type": "update", "data": ticker}), start + i + 0.001)
+    recorder.close()
+
+
+def bench_book_fills(quote_balance):
+    with tempfile.TemporaryDirectory() as directory:
+        write_capture(directory, 3600)
+        start = time.perf_counter()
+        market_data = MarketData.from_capture(directory, "BTC/USDT")
+        load_time = time.perf_counter() - start
+        rng = np.random.default_rng(4)
+        rows = np.sort(rng.choice(len(market_data), 40, replace=False))
+        sides = np.tile([1, -1], 20)
+        print("book fills: {} ticker updates loaded in {:.1f} ms, {} signals".format(len(market_data), load_time * 1e3, len(rows)))
+        for balance in (quote_balance, "100000"):
+            quote = Backtester(market_data, quote_balance=balance, taker_fee=TAKER_FEE).run(rows, sides)
+            start = time.perf_counter()
+            book = Backtester(market_data, quote_balance=balance, taker_fee=TAKER_FEE, fill="book").run(rows, sides)
+            book_time = time.perf_counter() - start
+            slippage = np.mean(book.trades["entry_price"] / quote.trades["entry_price"] - 1) * 1e4
+            print("    balance {:>7}: at the quotes return {:7.3f} %   against the book {:7.3f} %   buy slippage {:5.2f} bp   ({:.1f} ms)".format(
+                balance, quote.summary["total_return"], book.summary["total_return"], slippage, book_time * 1e3))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=365 * 1440)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--quote-balance", default="1000")
+    args = parser.parse_args()
+
+    market_data = bench_check_and_speed(random_bars(args.bars), args.quote_balance)
+    bench_sweep(market_data, args.processes, args.quote_balance)
+    bench_book_fills(args.quote_balance)
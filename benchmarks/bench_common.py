@@ -0,0 +1,54 @@
+'''
+Helpers shared by the benchmarks
+'''
+
+import os
+import sys
+import asyncio
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ftx_lib import FtxApiClient
+
+
+class FakeWebsocket(object):
+    '''
+    In-memory stand-in for websockets.WebSocketClientProtocol
+    '''
+
+    def __init__(self):
+        self.open = True
+        self.frames = asyncio.Queue()
+        self.sent = []
+
+    async def recv(self):
+        return await self.frames.get()
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def close(self):
+        self.open = False
+
+
+class BenchFtxApiClient(FtxApiClient):
+    '''
+    FtxApiClient connected to a FakeWebsocket (no network at all)
+    '''
+
+    async def websocket_connect(self):
+        self.websocket = FakeWebsocket()
+        self.websocket_connected_event.set()
+
+
+def create_logger(name):
+    logger = logging.getLogger(name)
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+    return logger
+
+
+def percentile(sorted_values, percent):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
@@ -0,0 +1,91 @@
+'''
+Redundant market data feeds: FtxMarketDataWorker with one connection vs --feeds connections (first arrival wins, see
+feed_arbiter) against the local FTX stand-in server streaming the same ticker messages on every connection
+(shared_stream) with a delay per connection (base + exponential jitter). Reports for every scenario:
+    - send -> handler latency (the stand-in stamps every message with its generation time) p50 / p99 / p999 / max
+    - per feed win rate and lag behind the winner p50 / p99, duplicates dropped
+
+Usage:
+    python benchmarks/bench_dual_feed.py [--seconds 5] [--rate 1000] [--feeds 2]
+'''
+
+import os
+import time
+import asyncio
+import tempfile
+import argparse
+
+from bench_common import create_logger
+from ftx_market_data_worker import FtxMarketDataWorker
+from ftx_stand_in_server import FtxStandInServer
+from shared_market_data import SharedMarketData
+from latency import LatencyHistogram
+import async_logging
+
+
+SCENARIOS = [
+    ("jittery paths", [(0.001, 0.004)]),
+    ("one slow path", [(0.010, 0.002), (0.001, 0.001)]),
+]
+
+
+class BenchFtxMarketDataWorker(FtxMarketDataWorker):
+    '''
+    Records the send -> handler latency of every handled ticker message
+    '''
+
+    latencies = None
+
+    def handle_channel_event_ticker(self, event: dict):
+        self.latencies.record(int((time.time() - event["data"].time) * 1e9))
+        super().handle_channel_event_ticker(event)
+
+
+async def bench(name, delays, feeds, shared_market_data, seconds, rate, log_dir):
+    server = await FtxStandInServer(rate=rate, shared_stream=True, connection_delays=delays).start()
+    worker = BenchFtxMarketDataWorker(shared_market_data, ticker_markets=["BTC/USDT"], websocket_uri=server.uri, market_data_feeds=feeds, log_file=os.path.join(log_dir, "ftx_market_data_worker.log"))
+    worker.logger = create_logger("bench_dual_feed")
+    worker.latencies = LatencyHistogram()
+    task = asyncio.ensure_future(worker.run())
+    await asyncio.sleep(1.0)  # Connected and subscribed
+    worker.latencies.reset()
+    if worker.feed_arbiter:
+        worker.feed_arbiter.reset_stats()
+    await asyncio.sleep(seconds)
+    latency = worker.latencies.summary(unit=1000000)
+    print("{:14} feeds: {}   delays: {:36}   latency p50: {:6.2f} ms   p99: {:6.2f} ms   p999: {:6.2f} ms   max: {:6.2f} ms   events: {}".format(
+        name, feeds, ", ".join("{:.0f}+exp({:.0f}) ms".format(base * 1e3, jitter * 1e3) for base, jitter in (delays[feed % len(delays)] for feed in range(feeds))), latency["p50"], latency["p99"], latency["p999"], latency["max"], latency["count"]))
+    if worker.feed_arbiter:
+        report = worker.feed_arbiter.report()
+        for feed, stats in enumerate(report["feeds"]):
+            print("    feed {}: win rate: {:5.1f} %   lag behind the winner p50: {:6.2f} ms   p99: {:6.2f} ms".format(feed, stats["win_rate"], stats["lag"]["p50"], stats["lag"]["p99"]))
+        print("    duplicates dropped: {}".format(report["duplicates"]))
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await worker.cleanup()
+    await server.stop()
+
+
+async def main(seconds, rate, feeds):
+    shared_market_data = SharedMarketData(markets=["BTC/USDT"], taker_fee=0.000665)
+    print("ticker stream: {:.0f} messages/s".format(rate))
+    try:
+        with tempfile.TemporaryDirectory() as log_dir:
+            for name, delays in SCENARIOS:
+                await bench(name, delays, 1, shared_market_data, seconds, rate, log_dir)
+                await bench(name, delays, feeds, shared_market_data, seconds, rate, log_dir)
+    finally:
+        shared_market_data.unlink()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rate", type=float, default=1000.0)
+    parser.add_argument("--feeds", type=int, default=2)
+    args = parser.parse_args()
+
+    async_logging.configure(async_mode=False, console=False)
+    asyncio.new_event_loop().run_until_complete(main(args.seconds, args.rate, args.feeds))
@@ -0,0 +1,118 @@
+'''
+FtxApiClient failover: the local FTX stand-in server (benchmarks/ftx_stand_in_server.py) streams the ticker and the
+orderbook channels and the primary connection is killed --kills times. Without standby connections the client reconnects
+(exponential backoff, the first attempt immediately) and subscribes again, with --standbys connections a logged in and
+subscribed standby websocket is promoted (and the orderbook channel resubscribed for a fresh partial). Reports:
+    - failover gap (the headline): the last event handled from the killed connection -> the first event handled from
+      the next one (the promoted standby or the new connection), p50 / max
+    - blind time: the client's metric (disconnection found -> the first message of the next connection) p50 / max
+    - longest gap between two handled events in the 0.5 s after a kill. It is not the failover: the stand-in server and
+      the client share the loop (and the CPU), so it catches e.g. the replacement standby being opened (connect, subscribe,
+      a new producer on the server) - the standby run pays it after the failover, the reconnect run during its blind time
+    - connects, failovers, messages discarded by the standbys
+    - check: the order book is valid again after every kill (a fresh partial), partials and checksum mismatches (about
+      one per failover: the standby's updates received before the promotion are of its own book, until the fresh partial)
+    - the backoff delays of consecutive failing reconnections (server down)
+
+Usage:
+    python benchmarks/bench_failover.py [--kills 20] [--standbys 1] [--rate 1000]
+'''
+
+import asyncio
+import argparse
+
+from bench_common import create_logger, percentile
+from ftx_lib import FtxApiClient
+from order_book import OrderBooks
+from ftx_stand_in_server import FtxStandInServer
+
+
+def primary_connection(server, client):
+    port = client.websocket.local_address[1]
+    for connection in server.connections:
+        if connection.websocket.remote_address[1] == port:
+            return connection
+
+
+async def bench(name, kills, standbys, rate):
+    server = await FtxStandInServer(rate=rate).start()
+    loop = asyncio.get_running_loop()
+    events = []  # (loop.time(), websocket) of the handled events
+    client = None
+    books = OrderBooks(logger=create_logger("bench_failover_books_" + name))
+    partials = [0]
+    mismatches = [0]
+
+    def resubscribe(market):
+        mismatches[0] += 1
+        client.resubscribe_channel("orderbook." + market)
+
+    books.resubscribe = resubscribe
+
+    def handle_ticker(event):
+        events.append((loop.time(), client.websocket))
+
+    def handle_orderbook(event):
+        events.append((loop.time(), client.websocket))
+        if event["data"].action == "partial":
+            partials[0] += 1
+        books.handle_event(event)
+
+    client = FtxApiClient(client_type=FtxApiClient.MARKET, logger=create_logger("bench_failover_" + name), websocket_uri=server.uri, typed_channels=["orderbook"],
+                          channels=["ticker.BTC/USDT", "orderbook.BTC/USDT"], channels_handling_map={"ticker.BTC/USDT": handle_ticker, "orderbook.BTC/USDT": handle_orderbook},
+                          responses_handling_map={}, standby_connections=standbys)
+    await client.websocket_connected_event.wait()
+    await asyncio.sleep(0.5)
+    discarded = 0
+    failover_gaps = []
+    longest_gaps = []
+    invalid_books = 0
+    for _ in range(kills):
+        while len(client.standbys) < standbys:
+            await asyncio.sleep(0.05)
+        discarded += sum(standby.discarded for standby in client.standbys)
+        del events[:-1]  # The last event before the kill
+        primary = client.websocket
+        await primary_connection(server, client).websocket.close()
+        await asyncio.sleep(0.5)
+        # The frames of the killed connection already received are still handled - the gap is between the connections
+        last_primary_event = max(event_time for event_time, websocket in events if websocket is primary)
+        failover_gaps.append(min(event_time for event_time, websocket in events if websocket is not primary) - last_primary_event)
+        longest_gaps.append(max(events[i][0] - events[i - 1][0] for i in range(1, len(events))))
+        book = books.get("BTC/USDT")
+        if not book or not book.valid:
+            invalid_books += 1
+    report = client.connection_report()
+    blind_time = report["blind_time"]
+    failover_gaps.sort()
+    print("{:14} kills: {:3}   failover gap p50: {:6.2f} ms   max: {:6.2f} ms   blind time p50: {:6.2f} ms   max: {:6.2f} ms   longest event gap: {:6.2f} ms".format(
+        name, kills, percentile(failover_gaps, 50) * 1e3, failover_gaps[-1] * 1e3, blind_time["p50"], blind_time["max"], max(longest_gaps) * 1e3))
+    print("{:14} connects: {:3}   failovers: {:3}   standby messages discarded: {}   check: order book invalid after a kill: {} of {}   partials: {}   checksum mismatches: {}".format(
+        "", report["connects"], report["failovers"], discarded, invalid_books, kills, partials[0], mismatches[0]))
+
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await server.stop()
+    return client
+
+
+async def main(kills, standbys, rate):
+    print("ticker + orderbook streams: {:.0f} messages/s".format(rate))
+    await bench("reconnect", kills, 0, rate)
+    client = await bench("standby ({})".format(standbys), kills, standbys, rate)
+
+    # Server down: the failing reconnections back off
+    print("backoff delays (min: {} s, max: {} s): {}".format(client.reconnect_min_delay, client.reconnect_max_delay,
+                                                            " ".join("{:.2f}".format(client.backoff_delay(attempts)) for attempts in range(12))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kills", type=int, default=20)
+    parser.add_argument("--standbys", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    asyncio.new_event_loop().run_until_complete(main(args.kills, args.standbys, args.rate))
@@ -0,0 +1,139 @@
+'''
+Compares the old busy-spinning FtxApiClient loops (asyncio.sleep(0) + queue.Queue.get_nowait()) with the current
+event driven ones (asyncio.Queue / asyncio.Event).
+
+Reported:
+    - idle CPU usage (process CPU time / wall time) with no traffic at all
+    - receive-to-handler latency (from the frame being available on the websocket to the handler being called)
+
+Usage:
+    python benchmarks/bench_ftx_api_client_loops.py [--idle-seconds 3] [--messages 5000]
+'''
+
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from queue import Empty, Queue
+
+from bench_common import FakeWebsocket, BenchFtxApiClient, create_logger, percentile
+from ftx_lib import FtxApiClient
+
+
+class LegacyPollingClient(object):
+    '''
+    The receive / dispatch part of FtxApiClient as it used to be (busy-spinning on asyncio.sleep(0)).
+    '''
+
+    def __init__(self, responses_handling_map: dict):
+        self.responses_handling_map = responses_handling_map
+        self.events_and_responses_queue = Queue()
+        self.requests_queue = Queue()
+        self.websocket = FakeWebsocket()
+        asyncio.create_task(self.handle_requests())
+        asyncio.create_task(self.handle_events_and_responses())
+        asyncio.create_task(self.send_initial_requests())
+        asyncio.create_task(self.dispatch())
+
+    async def get_event_or_response(self):
+        while True:
+            await asyncio.sleep(0)
+            try:
+                return self.events_and_responses_queue.get_nowait()
+            except Empty:
+                continue
+
+    async def dispatch(self):
+        while True:
+            await asyncio.sleep(0)
+            event_or_response = await self.get_event_or_response()
+            self.responses_handling_map[event_or_response["type"]](event_or_response)
+
+    async def handle_requests(self):
+        while True:
+            await asyncio.sleep(0)
+            try:
+                request = self.requests_queue.get_nowait()
+            except Empty:
+                pass
+            else:
+                await self.websocket.send(json.dumps(request))
+
+    async def send_initial_requests(self):
+        while True:
+            await asyncio.sleep(0)
+
+    async def handle_events_and_responses(self):
+        while True:
+            await asyncio.sleep(0)
+            message = await self.websocket.recv()
+            self.events_and_responses_queue.put(json.loads(message))
+
+
+async def measure(create_client, idle_seconds: float, messages: int):
+    latencies = []
+    done = asyncio.Event()
+
+    def handle_update(event: dict):
+        latencies.append(time.perf_counter_ns() - event["sent_ns"])
+        if len(latencies) == messages:
+            done.set()
+
+    client = create_client(handle_update)
+    await asyncio.sleep(0.1)  # Let the client connect
+
+    # Idle CPU
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.sleep(idle_seconds)
+    idle_cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+
+    # Receive-to-handler latency (one frame at a time, so there is no queueing)
+    for _ in range(messages):
+        client.websocket.frames.put_nowait(json.dumps({"type": "update", "channel": "ticker", "market": "BTC/USDT", "sent_ns": time.perf_counter_ns()}))
+        await asyncio.sleep(0.0002)
+    await asyncio.wait_for(done.wait(), 30)
+    latencies.sort()
+    return {
+        "idle_cpu_percent": idle_cpu * 100,
+        "latency_p50_us": statistics.median(latencies) / 1000,
+        "latency_p99_us": percentile(latencies, 99) / 1000,
+    }
+
+
+def run_case(name, create_client, idle_seconds, messages):
+    async def main():
+        # The clients start never-ending tasks - results are taken as soon as the measurements are done
+        return await measure(create_client, idle_seconds, messages)
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(main())
+    finally:
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+    print("{:<14} idle CPU: {:6.1f} %   receive-to-handler p50: {:8.1f} us   p99: {:8.1f} us".format(name, results["idle_cpu_percent"], results["latency_p50_us"], results["latency_p99_us"]))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--idle-seconds", type=float, default=3)
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+
+    logger = create_logger("bench_ftx_api_client_loops")
+    run_case("before (spin)", lambda handler: LegacyPollingClient({"update": handler}), args.idle_seconds, args.messages)
+    clients = []
+
+    def create_event_driven_client(handler):
+        client = BenchFtxApiClient(client_type=FtxApiClient.MARKET, logger=logger, channels=["ticker.BTC/USDT"], channels_handling_map={"ticker.BTC/USDT": handler})
+        clients.append(client)
+        return client
+    try:
+        run_case("after (events)", create_event_driven_client, args.idle_seconds, args.messages)
+    finally:
+        for client in clients:
+            client.__exit__()
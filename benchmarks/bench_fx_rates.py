@@ -0,0 +1,108 @@
+'''
+FxRateService against the local HTTP stand-in (benchmarks/http_stand_in_server.py). Reports:
+    - refresh time: cold (200), revalidated (304 with ETag), TTL cached (no request at all) and the former approach
+      (a new blocking requests.get - a new TCP connection - per refresh)
+    - connections opened by the server's point of view (the pool keeps one alive)
+    - providers fallback (first provider failing) and the staleness metadata when all the providers fail
+
+Usage:
+    python benchmarks/bench_fx_rates.py [--refreshes 200] [--latency 0.0]
+'''
+
+import time
+import asyncio
+import argparse
+
+from bench_common import create_logger, percentile
+from fx_rates import FxRateService
+from http_stand_in_server import HttpStandInServer
+from shared_market_data import SharedMarketData
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+PAIRS = ["EUR/USD", "EUR/PLN", "USD/PLN"]
+
+
+async def timed_refreshes(fx_rates, refreshes):
+    durations = []
+    for _ in range(refreshes):
+        start = time.perf_counter()
+        await fx_rates.refresh()
+        durations.append(time.perf_counter() - start)
+    return sorted(durations)
+
+
+def print_durations(name, durations, server, requests_before, connections_before):
+    print("{:32} p50: {:8.1f} us   p99: {:8.1f} us   server requests: {:5}   new connections: {:4}".format(
+        name, percentile(durations, 50) * 1e6, percentile(durations, 99) * 1e6, server.requests - requests_before, len(server.connections) - connections_before))
+
+
+async def main(refreshes, latency):
+    server = await HttpStandInServer().start()
+    server.latency = latency
+    provider = server.url + "/fx/latest?base={base}&symbols={symbols}"
+    shared_market_data = SharedMarketData(markets=PAIRS)
+    logger = create_logger("bench_fx_rates")
+
+    # Cold + revalidation (TTL 0 - every refresh asks the provider, which answers 304 Not Modified)
+    fx_rates = FxRateService([provider], PAIRS, shared_market_data, ttl=0, logger=logger)
+    requests_before, connections_before = server.requests, len(server.connections)
+    print_durations("cold (200)", await timed_refreshes(fx_rates, 1), server, requests_before, connections_before)
+    requests_before, connections_before = server.requests, len(server.connections)
+    print_durations("revalidated (304)", await timed_refreshes(fx_rates, refreshes), server, requests_before, connections_before)
+    server.set_fx_rate("EUR", "USD", 1.2300)
+    await fx_rates.refresh()
+    print("    after the rate change: {} (shared memory: {}, age: {:.3f} s)".format(fx_rates.get("EUR/USD").rate, shared_market_data.read("EUR/USD").last, shared_market_data.age("EUR/USD")))
+
+    # TTL cache
+    fx_rates.ttl = 60
+    await fx_rates.refresh()
+    requests_before, connections_before = server.requests, len(server.connections)
+    print_durations("TTL cached", await timed_refreshes(fx_rates, refreshes), server, requests_before, connections_before)
+    await fx_rates.close()
+
+    # Former approach: a new blocking requests.get per refresh and pair
+    if requests:
+        requests_before, connections_before = server.requests, len(server.connections)
+        loop = asyncio.get_running_loop()
+        durations = []
+        for _ in range(refreshes):
+            start = time.perf_counter()
+            for pair in PAIRS:
+                base, quote = pair.split("/")
+                await loop.run_in_executor(None, lambda: requests.get(provider.format(base=base, symbols=quote), timeout=4).json())
+            durations.append(time.perf_counter() - start)
+        print_durations("requests.get per pair (former)", sorted(durations), server, requests_before, connections_before)
+
+    # Providers fallback
+    failing_server = await HttpStandInServer().start()
+    failing_server.fail = True
+    fx_rates = FxRateService([failing_server.url + "/fx/latest?base={base}&symbols={symbols}", provider], PAIRS, shared_market_data, ttl=0, max_age=0.2, logger=logger)
+    start = time.perf_counter()
+    await fx_rates.refresh()
+    print("fallback: {} from provider: {} in {:.1f} us".format(fx_rates.get("EUR/USD").rate, fx_rates.get("EUR/USD").provider, (time.perf_counter() - start) * 1e6))
+
+    # All providers failing - the last rate is kept with its age
+    server.fail = True
+    await asyncio.sleep(0.3)
+    await fx_rates.refresh()
+    rate = fx_rates.get("EUR/USD")
+    print("all providers failing: rate: {} age: {:.2f} s stale: {} (shared memory age: {:.2f} s)".format(rate.rate, rate.age, rate.stale, shared_market_data.age("EUR/USD")))
+    await fx_rates.close()
+
+    await failing_server.stop()
+    await server.stop()
+    shared_market_data.unlink()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--refreshes", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="added server latency (seconds)")
+    args = parser.parse_args()
+
+    asyncio.new_event_loop().run_until_complete(main(args.refreshes, args.latency))
@@ -0,0 +1,128 @@
+'''
+Streaming indicators (indicators.py) and the signal engine (signal_engine.py) on synthetic random walk bars. Reports:
+    - check: bar by bar update() vs vectorized warm_up() of every indicator (max relative difference) and of every
+      strategy's signals (the same bars, the same signals)
+    - warm-up: vectorized warm_up() vs update() per bar over --history bars
+    - streaming: indicator updates/s across --markets markets with all the indicators, and closed bars/s through
+      SignalEngine (3 strategies per market, the signals put into a SignalChannel)
+
+Usage:
+    python benchmarks/bench_indicators.py [--markets 100] [--history 100000] [--bars 2000]
+'''
+
+import time
+import argparse
+
+import bench_common  # noqa: F401 (sys.path)
+import numpy as np
+from indicators import EMA, SMA, RSI, ATR, Bollinger, VWAP
+from ohlcv import OhlcvAggregator
+from signal_engine import SignalEngine, create_strategy
+from signal_transport import SignalChannel
+
+
+def create_indicators():
+    return [EMA(21), SMA(50), RSI(14), ATR(14), Bollinger(20, 2.0), VWAP()]
+
+
+STRATEGY_CONFIGS = [
+    {"type": "ema_cross", "fast": 9, "slow": 21},
+    {"type": "rsi", "period": 14, "oversold": 30, "overbought": 70},
+    {"type": "bollinger", "period": 20, "deviations": 2.0},
+]
+
+
+def random_bars(count, seed=1, seconds=60):
+    '''
+    Rows [time, open, high, low, close, volume, trades]
+    '''
+    rng = np.random.default_rng(seed)
+    close = 30000.0 * np.exp(np.cumsum(rng.normal(0, 0.002, count)))
+    opens = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.001, count)) * close
+    bars = np.empty((count, 7))
+    bars[:, 0] = 1650000000 + np.arange(count) * seconds
+    bars[:, 1] = opens
+    bars[:, 2] = np.maximum(opens, close) + spread
+    bars[:, 3] = np.minimum(opens, close) - spread
+    bars[:, 4] = close
+    bars[:, 5] = rng.uniform(0.1, 10, count)
+    bars[:, 6] = rng.integers(1, 100, count)
+    return bars
+
+
+def max_relative_difference(a, b):
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    if not np.array_equal(np.isnan(a), np.isnan(b)):
+        return float("inf")
+    ready = ~np.isnan(a)
+    return float(np.max(np.abs(a[ready] - b[ready]) / np.maximum(np.abs(b[ready]), 1e-12))) if ready.any() else 0.0
+
+
+def bench_checks_and_warm_up(history):
+    bars = random_bars(history)
+    rows = bars.tolist()
+    print("{} bars history".format(history))
+    for streaming, vectorized in zip(create_indicators(), create_indicators()):
+        start = time.perf_counter()
+        streamed = [streaming.update(row) for row in rows]
+        streaming_time = time.perf_counter() - start
+        start = time.perf_counter()
+        values = vectorized.warm_up(bars)
+        warm_up_time = time.perf_counter() - start
+        difference = max_relative_difference(streamed, values)
+        # The state after warm_up carries on as the streamed one
+        next_row = random_bars(1, seed=2)[0].tolist()
+        next_row[0] = rows[-1][0] + 60
+        continued = max_relative_difference(streaming.update(next_row), vectorized.update(next_row))
+        print("    {:10} update(): {:8.1f} ms   warm_up(): {:6.2f} ms   ({:5.0f}x)   max relative difference: {:.1e}   after warm-up: {:.1e}".format(
+            vectorized.name, streaming_time * 1e3, warm_up_time * 1e3, streaming_time / warm_up_time, difference, continued))
+    for config in STRATEGY_CONFIGS:
+        streaming, vectorized = create_strategy(dict(config, market="BTC/USDT", timeframe="1m")), create_strategy(dict(config, market="BTC/USDT", timeframe="1m"))
+        streamed = [(index, side) for index, side in ((index, streaming.update(row)) for index, row in enumerate(rows)) if side]
+        signals = vectorized.warm_up(bars)
+        print("    strategy {:10} signals: {:5}   bar by bar == vectorized: {}".format(config["type"], len(signals), streamed == signals))
+
+
+def bench_streaming(markets, bars_per_market):
+    markets_bars = [random_bars(bars_per_market, seed=i).tolist() for i in range(markets)]
+    markets_indicators = [create_indicators() for _ in range(markets)]
+    start = time.perf_counter()
+    for i in range(bars_per_market):
+        for rows, indicators in zip(markets_bars, markets_indicators):
+            row = rows[i]
+            for indicator in indicators:
+                indicator.update(row)
+    elapsed = time.perf_counter() - start
+    updates = markets * bars_per_market * len(markets_indicators[0])
+    print("streaming: {} markets x {} indicators: {:,.0f} indicator updates/s ({:.2f} us/update)".format(markets, len(markets_indicators[0]), updates / elapsed, elapsed / updates * 1e6))
+
+    names = ["MARKET{}/USDT".format(i) for i in range(markets)]
+    aggregator = OhlcvAggregator(names, timeframes=["1m"], capacity=bars_per_market)
+    channel = SignalChannel()
+    engine = SignalEngine(aggregator, [create_strategy(dict(config, market=name, timeframe="1m")) for name in names for config in STRATEGY_CONFIGS], signal_channels={"bench": channel}, logger=bench_common.create_logger("bench_indicators"))
+    received = 0
+    start = time.perf_counter()
+    for i in range(bars_per_market):
+        for name, rows in zip(names, markets_bars):
+            bars = aggregator.bars(name, "1m")
+            for listener in bars.bar_closed_listeners:  # As OhlcvBars.update on the first trade of the next bar
+                listener(bars, rows[i])
+        while channel.receiver.poll():
+            channel.receiver.recv_bytes()
+            received += 1
+    elapsed = time.perf_counter() - start
+    closed_bars = markets * bars_per_market
+    print("signal engine: {} markets x {} strategies: {:,.0f} closed bars/s ({:.2f} us/bar)   signals: {} (received: {})".format(
+        markets, len(STRATEGY_CONFIGS), closed_bars / elapsed, elapsed / closed_bars * 1e6, engine.signals, received))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--markets", type=int, default=100)
+    parser.add_argument("--history", type=int, default=100000)
+    parser.add_argument("--bars", type=int, default=2000)
+    args = parser.parse_args()
+
+    bench_checks_and_warm_up(args.history)
+    bench_streaming(args.markets, args.bars)
@@ -0,0 +1,62 @@
+'''
+Micro-benchmark of the json_codec backends over FTX websocket frames: plain decode, typed decode (FrameDecoder) and
+request encode, for every installed backend (msgspec / orjson / stdlib json).
+
+Usage:
+    python benchmarks/bench_json_codec.py [--frames frames.txt] [--repeat 20000]
+
+--frames takes a file with one recorded raw frame per line. Without it a set of representative FTX frames is used.
+'''
+
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import json_codec
+from json_codec import FrameDecoder, BACKENDS
+
+
+SAMPLE_FRAMES = [
+    '{"channel": "ticker", "market": "BTC/USDT", "type": "update", "data": {"bid": 29100.5, "ask": 29101.0, "bidSize": 0.0412, "askSize": 1.2, "last": 29100.5, "time": 1603922220.4351048}}',
+    '{"channel": "orderbook", "market": "BTC/USDT", "type": "update", "data": {"time": 1603922220.4351048, "checksum": 1851349441, "bids": [[29100.5, 0.3], [29099.0, 0.0]], "asks": [[29101.0, 1.2]], "action": "update"}}',
+    '{"channel": "trades", "market": "BTC/USDT", "type": "update", "data": [{"id": 1987712, "price": 29101.0, "size": 0.0123, "side": "buy", "liquidation": false, "time": "2020-10-28T21:57:00.435104+00:00"}, {"id": 1987713, "price": 29101.5, "size": 0.5, "side": "buy", "liquidation": false, "time": "2020-10-28T21:57:00.435104+00:00"}]}',
+    '{"channel": "orderbook", "market": "BTC/USDT", "type": "partial", "data": {"time": 1603922220.4351048, "checksum": 1851349441, "bids": ' + json.dumps([[29100.5 - i * 0.5, 0.1 + i / 100] for i in range(100)]) + ', "asks": ' + json.dumps([[29101.0 + i * 0.5, 0.1 + i / 100] for i in range(100)]) + ', "action": "partial"}}',
+    '{"type": "pong"}',
+]
+
+SAMPLE_REQUEST = {"op": "subscribe", "channel": "orderbook", "market": "BTC/USDT"}
+
+
+def bench(name, func, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    elapsed = time.perf_counter() - start
+    count = repeat * len(items)
+    print("    {:<18} {:8.2f} us / frame   {:10.0f} frames/s".format(name, elapsed / count * 1e6, count / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    if args.frames:
+        with open(args.frames) as frames_file:
+            frames = [line.rstrip("\n") for line in frames_file if line.strip()]
+        repeat = max(1, args.repeat * len(SAMPLE_FRAMES) // len(frames))
+    else:
+        frames = SAMPLE_FRAMES
+        repeat = args.repeat
+
+    for backend in BACKENDS:
+        print("{}:".format(backend))
+        bench("decode", json_codec.get_loads(backend), frames, repeat)
+        bench("typed decode", FrameDecoder(["ticker", "orderbook", "trades"], backend=backend).decode, frames, repeat)
+        bench("encode request", json_codec.get_dumps(backend), [SAMPLE_REQUEST], repeat * len(frames))
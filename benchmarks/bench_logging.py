@@ -0,0 +1,118 @@
+'''
+Logging cost on the hot paths: synchronous handlers (FileHandler + StreamHandler written by the calling thread, as the
+workers used to log) vs async_logging (QueueHandler -> QueueListener thread, lazy formatting), text and JSON lines.
+Reports:
+    - logging calls of a buy signal (the "[BUY REQUEST] received!" line + the Decimal debug lines): eager str.format
+      (former) and lazy %-style arguments, time per signal p50 / p99
+    - FtxApiClient.handle_requests (logs every outbound request): order_queued -> websocket_sent p50 / p99
+      (BenchFtxApiClient, no network)
+
+The console handler writes into /dev/null, the files go into a temporary directory.
+
+Usage:
+    python benchmarks/bench_logging.py [--signals 20000] [--requests 20000]
+'''
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from decimal import Decimal
+
+from bench_common import BenchFtxApiClient, percentile
+from ftx_lib import FtxApiClient
+import async_logging
+
+
+PRICE = Decimal("43123.456789")
+BALANCE = Decimal("1234.56")
+TAKER_FEE = Decimal("0.0007")
+
+
+def create_logger(name, log_dir, **config):
+    async_logging.configure(**dict({"async_mode": False, "json_lines": False}, **config))
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, "w")  # The console handler
+    try:
+        async_logging.setup_logger(logger, os.path.join(log_dir, name + ".log"))
+    finally:
+        sys.stderr = stderr
+    return logger
+
+
+def log_signal_eager(logger, price, balance, taker_fee):
+    logger.info("[BUY REQUEST] received! Price in request: {} [{}]. Price on ftx: {} [USDT]".format(price.quantize(Decimal('1e-2')), "USD", price.quantize(Decimal('1e-2'))))
+    logger.debug("price_BTC_buy_for_USDT (Decimal): {}".format(price))
+    logger.debug("balance_USDT (Decimal): {}".format(balance))
+    logger.debug("taker_fee (Decimal): {}".format(taker_fee))
+    logger.debug("fee_BTC_buy_in_BTC (Decimal): {}".format(balance / price * taker_fee))
+
+
+def log_signal_lazy(logger, price, balance, taker_fee):
+    logger.info("[BUY REQUEST] received! Price in request: %s [%s]. Price on ftx: %s [USDT]", price.quantize(Decimal('1e-2')), "USD", price.quantize(Decimal('1e-2')))
+    logger.debug("price_BTC_buy_for_USDT (Decimal): %s", price)
+    logger.debug("balance_USDT (Decimal): %s", balance)
+    logger.debug("taker_fee (Decimal): %s", taker_fee)
+    logger.debug("fee_BTC_buy_in_BTC (Decimal): %s", balance / price * taker_fee)
+
+
+def bench_signals(name, logger, log_signal, signals):
+    durations = []
+    for _ in range(signals):
+        start = time.perf_counter()
+        log_signal(logger, PRICE, BALANCE, TAKER_FEE)
+        durations.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    async_logging.shutdown()  # Wait for the writing thread
+    drain = time.perf_counter() - start
+    durations.sort()
+    print("{:34} per signal p50: {:7.2f} us   p99: {:7.2f} us   (background drain after the run: {:.1f} ms)".format(name, percentile(durations, 50) * 1e6, percentile(durations, 99) * 1e6, drain * 1e3))
+
+
+def bench_requests(name, logger, requests):
+    durations = []
+
+    async def main():
+        sent = asyncio.Event()
+
+        def observe(timestamps):
+            durations.append(timestamps["websocket_sent"] - timestamps["order_queued"])
+            sent.set()
+
+        client = BenchFtxApiClient(client_type=FtxApiClient.USER, logger=logger, channels=[], channels_handling_map={}, responses_handling_map={}, latency_observer=observe)
+        await client.websocket_connected_event.wait()
+        client.authenticated = True  # No login with the fake websocket
+        for i in range(requests):
+            sent.clear()
+            client.send({"op": "place_order", "id": i, "args": {"market": "BTC/USDT", "side": "buy", "type": "market", "size": 0.0123, "clientId": "default_user_BUY_BTC/USDT_{}".format(i)}}, {})
+            await sent.wait()
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    asyncio.new_event_loop().run_until_complete(main())
+    async_logging.shutdown()
+    durations.sort()
+    print("{:34} order_queued -> websocket_sent p50: {:7.2f} us   p99: {:7.2f} us".format(name, percentile(durations, 50) / 1e3, percentile(durations, 99) / 1e3))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--signals", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        bench_signals("sync, eager format (former)", create_logger("signals_sync_eager", log_dir), log_signal_eager, args.signals)
+        bench_signals("sync, lazy", create_logger("signals_sync_lazy", log_dir), log_signal_lazy, args.signals)
+        bench_signals("async, lazy", create_logger("signals_async", log_dir, async_mode=True), log_signal_lazy, args.signals)
+        bench_signals("async, lazy, JSON lines", create_logger("signals_async_json", log_dir, async_mode=True, json_lines=True), log_signal_lazy, args.signals)
+
+        bench_requests("FtxApiClient sync", create_logger("requests_sync", log_dir), args.requests)
+        bench_requests("FtxApiClient async", create_logger("requests_async", log_dir, async_mode=True), args.requests)
+        bench_requests("FtxApiClient async, JSON lines", create_logger("requests_async_json", log_dir, async_mode=True, json_lines=True), args.requests)
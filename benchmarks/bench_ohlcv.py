@@ -0,0 +1,129 @@
+'''
+OhlcvAggregator (ohlcv.py) on synthetic trades channel events (TradeData as decoded by json_codec, ISO trade times) of
+--markets markets, bursts of 1-20 trades per message. Reports:
+    - trades/s and per message time through all the timeframes, vs a straightforward per trade aggregation (every trade
+      applied to every timeframe, datetime.fromisoformat per trade, bars in lists of dicts)
+    - check: the bars of both are the same (the last --capacity bars of every market and timeframe)
+    - memory: ring buffers' bytes per market and timeframe (fixed), readers' views sharing the buffers (zero-copy)
+
+Usage:
+    python benchmarks/bench_ohlcv.py [--markets 50] [--trades 300000] [--capacity 1000]
+'''
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+from json_codec import TradeData
+from ohlcv import OhlcvAggregator, TIMEFRAMES, FIELDS
+
+
+TIMEFRAMES_BENCHED = ["1s", "1m", "5m", "1h"]
+
+
+def generate_events(markets, trades):
+    '''
+    [(market, [TradeData, ...])] - the markets interleaved, 1-20 trades per message (within ~10 ms), ~2 h of trading
+    '''
+    random.seed(1)
+    events = []
+    times = {market: 1650000000.0 for market in markets}
+    prices = {market: 100.0 * (i + 1) for i, market in enumerate(markets)}
+    trade_id = 0
+    while trade_id < trades:
+        market = random.choice(markets)
+        burst = []
+        times[market] += random.expovariate(1.0 / (len(markets) * 0.12))  # Between the messages of the market
+        for _ in range(random.randint(1, 20)):
+            trade_id += 1
+            times[market] += random.uniform(0, 0.001)  # Within a burst (one taker order matched)
+            prices[market] = round(prices[market] * (1 + random.gauss(0, 0.0005)), 2)
+            trade_time = datetime.fromtimestamp(round(times[market], 6), timezone.utc).isoformat()
+            burst.append(TradeData(trade_id, prices[market], round(random.uniform(0.001, 2), 4), random.choice(["buy", "sell"]), False, trade_time))
+        events.append((market, burst))
+    return events
+
+
+class ReferenceAggregator(object):
+    '''
+    Straightforward aggregation: every trade into every timeframe
+    '''
+
+    def __init__(self, markets, timeframes):
+        self.timeframes = timeframes
+        self.bars = {(market, timeframe): [] for market in markets for timeframe in timeframes}
+
+    def handle_trades(self, market, trades):
+        for trade in trades:
+            trade_time = datetime.fromisoformat(trade.time).timestamp()
+            for timeframe in self.timeframes:
+                seconds = TIMEFRAMES[timeframe]
+                start = trade_time - trade_time % seconds
+                bars = self.bars[(market, timeframe)]
+                if bars and bars[-1]["time"] == start:
+                    bar = bars[-1]
+                    bar["high"] = max(bar["high"], trade.price)
+                    bar["low"] = min(bar["low"], trade.price)
+                    bar["close"] = trade.price
+                    bar["volume"] += trade.size
+                    bar["trades"] += 1
+                else:
+                    bars.append({"time": start, "open": trade.price, "high": trade.price, "low": trade.price, "close": trade.price, "volume": trade.size, "trades": 1})
+
+
+def run(aggregator, events):
+    start = time.perf_counter()
+    for market, trades in events:
+        aggregator.handle_trades(market, trades)
+    return time.perf_counter() - start
+
+
+def main(markets, trades, capacity):
+    markets = ["MARKET{}/USDT".format(i) for i in range(markets)]
+    events = generate_events(markets, trades)
+    trades = sum(len(burst) for _, burst in events)
+    print("{} markets, {} trades in {} messages, timeframes: {}".format(len(markets), trades, len(events), TIMEFRAMES_BENCHED))
+
+    reference = ReferenceAggregator(markets, TIMEFRAMES_BENCHED)
+    reference_elapsed = run(reference, events)
+    aggregator = OhlcvAggregator(markets, TIMEFRAMES_BENCHED, capacity=capacity)
+    elapsed = run(aggregator, events)
+    for name, duration in (("per trade (reference)", reference_elapsed), ("OhlcvAggregator", elapsed)):
+        print("{:24} {:10.0f} trades/s   {:6.2f} us/message".format(name, trades / duration, duration / len(events) * 1e6))
+    print("    {:.1f}x".format(reference_elapsed / elapsed))
+
+    mismatches = 0
+    for market in markets:
+        for timeframe in TIMEFRAMES_BENCHED:
+            expected = np.array([[bar[field] for field in FIELDS] for bar in reference.bars[(market, timeframe)][-capacity:]])
+            view = aggregator.bars(market, timeframe).view()
+            if view.shape != expected.shape or not np.allclose(view, expected, rtol=1e-12, atol=1e-9):
+                mismatches += 1
+    print("check: bars mismatching the reference: {} of {}   late trades: {}".format(mismatches, len(markets) * len(TIMEFRAMES_BENCHED),
+                                                                                 sum(bars.late_trades for market_bars in aggregator.market_bars.values() for bars in market_bars)))
+
+    bars = aggregator.bars(markets[0], "1s")
+    view = bars.view(100)
+    start = time.perf_counter()
+    for _ in range(100000):
+        bars.column("close", 100)
+    column_time = (time.perf_counter() - start) / 100000
+    print("memory: {:.1f} kB per market and timeframe ({} bars), {:.1f} MB in total   views share the buffer: {}   writeable: {}   column(\"close\", 100): {:.2f} us".format(
+        bars.data.nbytes / 1024, capacity, aggregator.nbytes() / 1024 ** 2, np.shares_memory(view, bars.data), view.flags.writeable, column_time * 1e6))
+    print("    1s bars of {} (last 3):\n{}".format(markets[0], bars.view(3)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--markets", type=int, default=50)
+    parser.add_argument("--trades", type=int, default=300000)
+    parser.add_argument("--capacity", type=int, default=1000)
+    args = parser.parse_args()
+
+    main(args.markets, args.trades, args.capacity)
@@ -0,0 +1,183 @@
+'''
+order_sizing (integer fixed point) vs the former Decimal quantize chains of handle_buy_request / handle_sell_request.
+
+1. Equivalence (property check with random and edge case inputs, seeded): every quantization (float / str inputs,
+   0 - 8 decimals, ROUND_UP / ROUND_DOWN / ROUND_HALF_EVEN), the buy / sell sizing (price, amount, fee, taker fee) and
+   the message values (products of CENTS values) are compared with the Decimal results - value and exponent.
+2. Speed: time per signal of the sizing alone and of the sizing + the message values.
+
+Usage:
+    python benchmarks/bench_order_sizing.py [--cases 200000] [--signals 100000] [--seed 1]
+'''
+
+import os
+import sys
+import time
+import random
+import argparse
+from fractions import Fraction
+from decimal import Decimal, ROUND_UP, ROUND_DOWN, ROUND_HALF_EVEN
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from order_sizing import OrderSizer, Quantizer, rescale
+
+
+ROUNDINGS = [ROUND_UP, ROUND_DOWN, ROUND_HALF_EVEN]
+EDGE_CASES = ["0", "0.0", "-0.5", "0.005", "0.015", "0.025", "1.005", "2.675", "0.000000005", "0.000000015", "99999.995", "1e-7", "1E+3",
+              "25420", "25420.", ".5", "43123.456789123456", "123456789.12345678", 0.1, 0.125, 1e-9, 2.675, 1.005, 0.000665, 1e22, 123456789012.5]
+
+
+def legacy_quantize(value, decimals, rounding):
+    return Decimal(str(value)).quantize(Decimal('1e-' + str(decimals)), rounding=rounding)
+
+
+def legacy_buy(price_on_ftx, balance_USDT, taker_fee, price_decimals):
+    price_BTC_buy_for_USDT = Decimal(str(price_on_ftx)).quantize(Decimal('1e-' + str(price_decimals)), rounding=ROUND_UP)
+    balance_USDT = Decimal(balance_USDT).quantize(Decimal('1e-' + str(2)), rounding=ROUND_DOWN)
+    taker_fee = Decimal(str(taker_fee)).quantize(Decimal('1e-' + str(4)), rounding=ROUND_UP)
+    fee_BTC_buy_in_BTC = ((balance_USDT / price_BTC_buy_for_USDT) * taker_fee).quantize(Decimal('1e-' + str(8)), rounding=ROUND_UP)
+    return price_BTC_buy_for_USDT, balance_USDT, fee_BTC_buy_in_BTC, taker_fee
+
+
+def legacy_sell(price_on_ftx, balance_BTC, taker_fee, price_decimals):
+    price_BTC_sell_to_USDT = Decimal(str(price_on_ftx)).quantize(Decimal('1e-' + str(price_decimals)), rounding=ROUND_UP)
+    balance_BTC = Decimal(balance_BTC).quantize(Decimal('1e-' + str(8)), rounding=ROUND_DOWN)
+    taker_fee = Decimal(str(taker_fee)).quantize(Decimal('1e-' + str(4)), rounding=ROUND_UP)
+    fee_BTC_sell_in_USDT = ((balance_BTC * price_BTC_sell_to_USDT) * taker_fee).quantize(Decimal('1e-' + str(2)), rounding=ROUND_UP)
+    return price_BTC_sell_to_USDT, balance_BTC, fee_BTC_sell_in_USDT, taker_fee
+
+
+def legacy_messages(price_in_request, price_on_ftx, eur_usd_exchange_rate):
+    price_in_request_in_usd = Decimal(price_in_request).quantize(Decimal('1e-' + str(2))) * Decimal(eur_usd_exchange_rate).quantize(Decimal('1e-' + str(2)))
+    return Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), price_in_request_in_usd, price_in_request_in_usd.quantize(Decimal('1e-' + str(2))), Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2)))
+
+
+CENTS = Quantizer(2)
+CENTS_PRODUCT = Quantizer(4)
+
+
+def fixed_messages(price_in_request, price_on_ftx, eur_usd_exchange_rate):
+    price_in_request_cents = CENTS.to_fixed(price_in_request, ROUND_HALF_EVEN)
+    price_in_request_in_usd = price_in_request_cents * CENTS.to_fixed(eur_usd_exchange_rate, ROUND_HALF_EVEN)
+    return (CENTS.to_decimal(price_in_request_cents), CENTS_PRODUCT.to_decimal(price_in_request_in_usd), CENTS.to_decimal(rescale(price_in_request_in_usd, 4, 2, ROUND_HALF_EVEN)),
+            CENTS.to_decimal(CENTS.to_fixed(price_on_ftx, ROUND_HALF_EVEN)))
+
+
+def same(a: Decimal, b: Decimal):
+    return a == b and a.as_tuple().exponent == b.as_tuple().exponent
+
+
+def outcome(function, *args):
+    # The result or the "error" (e.g. both raise for a value beyond the 28 digits of the Decimal context)
+    try:
+        return function(*args)
+    except Exception:
+        return "error"
+
+
+def exact_buy_fee(order_size):
+    # ceil(notional / price * taker fee) at 10^-8 with no intermediate rounding
+    fee = Fraction(order_size.decimal("amount")) / Fraction(order_size.decimal("price")) * Fraction(order_size.decimal("taker_fee")) * 10 ** 8
+    return -(-fee.numerator // fee.denominator)
+
+
+def random_number(rng):
+    kind = rng.random()
+    magnitude = 10 ** rng.uniform(-9, 6)
+    if kind < 0.3:
+        return round(rng.uniform(0, 1) * magnitude, rng.randint(0, 8))  # Tick aligned float
+    if kind < 0.5:
+        return rng.uniform(0, 1) * magnitude  # Any float
+    if kind < 0.8:
+        return "{}.{}".format(rng.randint(0, 10 ** rng.randint(0, 7)), "".join(rng.choice("0123456789") for _ in range(rng.randint(0, 14))))
+    if kind < 0.9:
+        return "{}.{}5".format(rng.randint(0, 100000), "".join(rng.choice("0123456789") for _ in range(rng.randint(0, 7))))  # Ties
+    return repr(rng.uniform(0, 1) * magnitude)
+
+
+def check_equivalence(cases, seed):
+    rng = random.Random(seed)
+    quantizers = [Quantizer(decimals) for decimals in range(9)]
+    mismatches = {"quantize": 0, "buy": 0, "sell": 0, "messages": 0}
+    legacy_context_rounding = 0  # Buy fees where the former chain rounded the quotient to 28 digits first (fixed point == exact)
+    examples = []
+    values = EDGE_CASES + [random_number(rng) for _ in range(cases)]
+    for value in values:
+        for quantizer in quantizers:
+            for rounding in ROUNDINGS:
+                fixed = outcome(lambda: quantizer.to_decimal(quantizer.to_fixed(value, rounding)))
+                legacy = outcome(legacy_quantize, value, quantizer.decimals, rounding)
+                if fixed != legacy if "error" in (fixed, legacy) else not same(fixed, legacy):
+                    mismatches["quantize"] += 1
+                    examples.append(("quantize", value, quantizer.decimals, rounding))
+    sizers = [OrderSizer("BTC_USDT", price_decimals) for price_decimals in range(7)]
+    for _ in range(cases):
+        sizer = rng.choice(sizers)
+        price = random_number(rng)
+        if not legacy_quantize(price, sizer.price_quantizer.decimals, ROUND_UP):
+            continue
+        balance = str(random_number(rng))
+        taker_fee = rng.choice([0.000665, 0.0007, 0.00019, 0.0, rng.uniform(0, 0.01)])
+        order_size = sizer.buy(price, balance, taker_fee)
+        legacy = legacy_buy(price, balance, taker_fee, sizer.price_quantizer.decimals)
+        matching = [same(order_size.decimal(name), value) for name, value in zip(("price", "amount", "fee", "taker_fee"), legacy)]
+        if matching == [True, True, False, True] and order_size.fee == exact_buy_fee(order_size) and legacy[2] == order_size.decimal("fee") + Decimal("1e-8"):
+            legacy_context_rounding += 1
+        elif not all(matching):
+            mismatches["buy"] += 1
+            examples.append(("buy", price, balance, taker_fee, sizer.price_quantizer.decimals))
+        order_size = sizer.sell(price, balance, taker_fee)
+        if not all(same(order_size.decimal(name), legacy) for name, legacy in zip(("price", "amount", "fee", "taker_fee"), legacy_sell(price, balance, taker_fee, sizer.price_quantizer.decimals))):
+            mismatches["sell"] += 1
+            examples.append(("sell", price, balance, taker_fee, sizer.price_quantizer.decimals))
+        price_in_request, rate = str(random_number(rng)), str(rng.uniform(0.5, 2))
+        if not all(same(fixed, legacy) for fixed, legacy in zip(fixed_messages(price_in_request, price, rate), legacy_messages(price_in_request, str(price), rate))):
+            mismatches["messages"] += 1
+            examples.append(("messages", price_in_request, price, rate))
+    print("equivalence: {} values x 9 quantizers x 3 roundings, {} buy / sell / message cases   mismatches: {}".format(len(values), cases, mismatches))
+    print("    buy fees 1e-8 above the exact value in the former chain (quotient rounded to 28 digits, e.g. 0.08 / 7 * 0.0007): {}".format(legacy_context_rounding))
+    for example in examples[:10]:
+        print("    mismatch: {}".format(example))
+
+
+def bench(signals, seed):
+    rng = random.Random(seed)
+    inputs = [(round(rng.uniform(20000, 60000), rng.randint(0, 2)), "{:.8f}".format(rng.uniform(0, 5000)), str(round(rng.uniform(20000, 60000), 2)), "1.1{}".format(rng.randint(0, 99))) for _ in range(1000)]
+    sizer = OrderSizer("BTC_USDT", 2)
+
+    def run(name, sizing, messages=None):
+        start = time.perf_counter()
+        for i in range(signals):
+            price, balance, price_in_request, rate = inputs[i % 1000]
+            sizing(price, balance)
+            if messages:
+                messages(price_in_request, price, rate)
+        elapsed = time.perf_counter() - start
+        print("{:38} {:7.2f} us per signal".format(name, elapsed / signals * 1e6))
+        return elapsed
+
+    legacy = run("Decimal chains (former): sizing", lambda price, balance: legacy_buy(price, balance, 0.000665, "2"))
+    fixed = run("fixed point: sizing", lambda price, balance: sizer.buy(price, balance, 0.000665))
+    print("    speedup: {:.1f}x".format(legacy / fixed))
+    legacy = run("Decimal chains (former): + messages", lambda price, balance: legacy_buy(price, balance, 0.000665, "2"), lambda price_in_request, price, rate: [str(value) for value in legacy_messages(price_in_request, str(price), rate)])
+    fixed = run("fixed point: + messages", lambda price, balance: sizer.buy(price, balance, 0.000665), fixed_messages_formatted)
+    print("    speedup: {:.1f}x".format(legacy / fixed))
+
+
+def fixed_messages_formatted(price_in_request, price_on_ftx, eur_usd_exchange_rate):
+    # As the handlers do: fixed point -> strings (no Decimal at all)
+    price_in_request_cents = CENTS.to_fixed(price_in_request, ROUND_HALF_EVEN)
+    price_in_request_in_usd = price_in_request_cents * CENTS.to_fixed(eur_usd_exchange_rate, ROUND_HALF_EVEN)
+    return CENTS.format(price_in_request_cents), CENTS_PRODUCT.format(price_in_request_in_usd), CENTS.format(rescale(price_in_request_in_usd, 4, 2, ROUND_HALF_EVEN)), CENTS.format(CENTS.to_fixed(price_on_ftx, ROUND_HALF_EVEN))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=200000)
+    parser.add_argument("--signals", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    check_equivalence(args.cases, args.seed)
+    bench(args.signals, args.seed)
@@ -0,0 +1,143 @@
+'''
+Paper trading exchange (paper_exchange.py) with a synthetic BTC/USDT market (--rate order book updates/s) and the real
+clients: FtxApiClient (logged in, orders / fills channels into an OrderStore as the user worker does), FtxRestClient
+(order placing, balances) and a second FtxApiClient keeping the order book from the orderbook channel. Reports:
+    - sequential market orders: REST acknowledgement and placing -> closed (the orders channel) latency p50 / p99
+    - a burst of concurrent orders: orders/s
+    - check: the balances over REST vs the ones computed from the received fills (fees included), the fills vs the
+      closed orders' filled sizes, and the checksum mismatches of the order book kept from the relayed frames
+
+Usage:
+    python benchmarks/bench_paper_exchange.py [--orders 500] [--burst 200] [--rate 100]
+'''
+
+import time
+import asyncio
+import argparse
+from decimal import Decimal
+
+from bench_common import create_logger, percentile
+import json_codec
+from ftx_lib import FtxApiClient
+from ftx_rest_client import FtxRestClient
+from order_book import OrderBooks
+from order_store import OrderStore
+from paper_exchange import PaperExchange, PaperExchangeServer, SyntheticMarketData
+
+SIZE = 0.01
+BALANCES = {"USDT": 1000000.0, "BTC": 10.0}
+
+
+class Account(object):
+    '''
+    The balances computed from the fills channel
+    '''
+
+    def __init__(self, balances):
+        self.balances = {coin: Decimal(repr(amount)) for coin, amount in balances.items()}
+        self.fills = 0
+
+    def add_fill(self, fill):
+        size, notional, fee = Decimal(repr(fill["size"])), Decimal(repr(fill["price"])) * Decimal(repr(fill["size"])), Decimal(repr(fill["fee"]))
+        if fill["side"] == "buy":
+            self.balances["USDT"] -= notional
+            self.balances["BTC"] += size - fee
+        else:
+            self.balances["BTC"] -= size
+            self.balances["USDT"] += notional - fee
+        self.fills += 1
+
+
+async def place(rest_client, store, client_id, side, ack_latencies, closed_latencies):
+    store.add_pending(client_id, "BTC/USDT", side, size=SIZE)
+    start = time.perf_counter()
+    response = await rest_client.place_order("BTC/USDT", side, SIZE, client_id=client_id)
+    ack_latencies.append(time.perf_counter() - start)
+    store.set_order_id(client_id, response["id"])
+    await store.wait_closed(client_id, timeout=10)
+    closed_latencies.append(time.perf_counter() - start)
+
+
+async def main(orders, burst, rate):
+    logger = create_logger("bench_paper_exchange")
+    exchange = PaperExchange(["BTC/USDT"], initial_balances=BALANCES, logger=logger)
+    server = await PaperExchangeServer(exchange, SyntheticMarketData(["BTC/USDT"], rate=rate, seed=1), port=0, rest_port=0, logger=logger).start()
+
+    store = OrderStore(history_size=orders + burst)
+    account = Account(BALANCES)
+
+    def handle_order(event):
+        data = event["data"]
+        store.update(data["id"], client_id=data.get("clientId"), status=data["status"], filled_size=data.get("filledSize"), avg_fill_price=data.get("avgFillPrice"))
+
+    def handle_fill(event):
+        account.add_fill(event["data"])
+        store.add_fill(event["data"]["orderId"], event["data"]["size"], event["data"]["price"], event["data"]["fee"])
+
+    user_client = FtxApiClient(client_type=FtxApiClient.USER, logger=logger, websocket_uri=server.uri, api_key="bench", api_secret="bench",
+                               channels=["orders", "fills"], channels_handling_map={"orders": handle_order, "fills": handle_fill}, responses_handling_map={})
+    books = OrderBooks(logger=logger)
+    book_updates = [0]
+    mismatches = [0]
+
+    def resubscribe(market):
+        mismatches[0] += 1
+
+    books.resubscribe = resubscribe
+
+    def handle_book(event):
+        books.handle_event(event)
+        book_updates[0] += 1
+
+    market_client = FtxApiClient(client_type=FtxApiClient.MARKET, logger=logger, websocket_uri=server.uri, typed_channels=["orderbook"],
+                                 channels=["orderbook.BTC/USDT"], channels_handling_map={"orderbook.BTC/USDT": handle_book}, responses_handling_map={})
+    rest_client = FtxRestClient("bench", "bench", base_url=server.rest_url, logger=logger)
+    await user_client.initialized_event.wait()
+    while not books.get("BTC/USDT"):
+        await asyncio.sleep(0.01)
+
+    # Sequential orders
+    ack_latencies, closed_latencies = [], []
+    for i in range(orders):
+        await place(rest_client, store, "sequential_{}".format(i), "buy" if i % 2 == 0 else "sell", ack_latencies, closed_latencies)
+    ack_latencies.sort()
+    closed_latencies.sort()
+    print("{} sequential market orders of {} BTC (market data: {:.0f} updates/s)".format(orders, SIZE, rate))
+    print("    REST acknowledgement  p50: {:7.3f} ms   p99: {:7.3f} ms".format(percentile(ack_latencies, 50) * 1e3, percentile(ack_latencies, 99) * 1e3))
+    print("    placing -> closed     p50: {:7.3f} ms   p99: {:7.3f} ms".format(percentile(closed_latencies, 50) * 1e3, percentile(closed_latencies, 99) * 1e3))
+
+    # Burst
+    start = time.perf_counter()
+    await asyncio.gather(*(place(rest_client, store, "burst_{}".format(i), "buy" if i % 2 == 0 else "sell", [], []) for i in range(burst)))
+    elapsed = time.perf_counter() - start
+    print("burst of {} concurrent orders: {:.2f} s   ({:,.0f} orders/s)".format(burst, elapsed, burst / elapsed))
+
+    # Check
+    await asyncio.sleep(0.2)  # The last fills
+    rest_balances = {balance["coin"]: Decimal(repr(balance["total"])) for balance in await rest_client.get_balances()}
+    difference = max(abs(rest_balances[coin] - account.balances[coin]) for coin in account.balances)
+    closed = [store.get(client_id) for client_id in ["sequential_{}".format(i) for i in range(orders)] + ["burst_{}".format(i) for i in range(burst)]]
+    fills_match = all(order.closed and abs(order.fills_size - order.filled_size) < 1e-12 for order in closed)
+    print("check: fills: {}   REST balances: {}   from the fills: {}   max difference: {}".format(
+        account.fills, {coin: float(value) for coin, value in rest_balances.items()}, {coin: float(value) for coin, value in account.balances.items()}, difference))
+    print("       all orders closed with their fills: {}   order book updates: {}   checksum mismatches: {}   server: {}".format(
+        fills_match, book_updates[0], mismatches[0], json_codec.dumps(server.report())))
+
+    await rest_client.close()
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for client in (user_client, market_client):
+        await client.websocket_disconnect()
+    await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=100.0)
+    args = parser.parse_args()
+
+    asyncio.new_event_loop().run_until_complete(main(args.orders, args.burst, args.rate))
@@ -0,0 +1,101 @@
+'''
+PushoverNotifier against the local HTTP stand-in (benchmarks/http_stand_in_server.py, run on its own thread) vs the
+former approach (a blocking HTTP request per user key in the notify() call). Reports:
+    - notify() call time p50 / p99 (what a handler calling it waits for)
+    - requests received by the provider and the delivered messages / digests for a burst of notifications
+    - deduplication of the already sent messages and the provider being down (notify() stays non-blocking, the messages
+      are delivered after the provider recovers)
+
+Usage:
+    python benchmarks/bench_pushover_notifier.py [--notifications 1000] [--distinct 20] [--latency 0.02]
+'''
+
+import time
+import asyncio
+import argparse
+import threading
+from http.client import HTTPConnection
+from urllib.parse import urlencode
+
+from bench_common import create_logger, percentile
+from http_stand_in_server import HttpStandInServer
+from pushover_notifier import PushoverNotifier
+
+
+USER_KEYS = ["user_key_1", "user_key_2"]
+
+
+def start_server(latency):
+    loop = asyncio.new_event_loop()
+    server = HttpStandInServer()
+    server.latency = latency
+    loop.run_until_complete(server.start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return server
+
+
+def blocking_notify(server, message, priority=2):
+    # Former approach: a new connection and a blocking request per user key
+    for user_key in USER_KEYS:
+        connection = HTTPConnection(server.host, server.port, timeout=10)
+        connection.request("POST", "/1/messages.json", body=urlencode({"token": "token", "user": user_key, "message": message, "priority": priority, "retry": 1800, "expire": 3600}),
+                           headers={"Content-Type": "application/x-www-form-urlencoded"})
+        connection.getresponse().read()
+        connection.close()
+
+
+def timed_calls(notify, messages):
+    durations = []
+    for message in messages:
+        start = time.perf_counter()
+        notify(message)
+        durations.append(time.perf_counter() - start)
+    return sorted(durations)
+
+
+def print_durations(name, durations, server, requests_before, messages_before):
+    print("{:36} notify() p50: {:9.1f} us   p99: {:9.1f} us   provider requests: {:5}   pushover messages: {:5}".format(
+        name, percentile(durations, 50) * 1e6, percentile(durations, 99) * 1e6, server.requests - requests_before, len(server.pushover_messages) - messages_before))
+
+
+def main(notifications, distinct, latency):
+    server = start_server(latency)
+    api_url = server.url + "/1/messages.json"
+    messages = ["ftx_user_api_worker: Exception during handling buy/sell request: {}".format(i % distinct) for i in range(notifications)]
+
+    requests_before, messages_before = server.requests, len(server.pushover_messages)
+    print_durations("blocking request per key (former)", timed_calls(blocking_notify.__get__(server), messages[:50]), server, requests_before, messages_before)
+
+    notifier = PushoverNotifier("ftx-trader", "token", USER_KEYS, logger=create_logger("bench_pushover_notifier"), api_url=api_url, min_interval=1.0, batch_delay=0.2, send_notifications=True)
+    requests_before, messages_before = server.requests, len(server.pushover_messages)
+    durations = timed_calls(notifier.notify, messages)
+    start = time.perf_counter()
+    notifier.flush(10)
+    print_durations("PushoverNotifier burst", durations, server, requests_before, messages_before)
+    print("    flushed in: {:.1f} ms   digest titles: {}   stats: {}".format(
+        (time.perf_counter() - start) * 1e3, [message["title"] for message in server.pushover_messages[messages_before:]], notifier.stats))
+
+    requests_before, messages_before = server.requests, len(server.pushover_messages)
+    durations = timed_calls(notifier.notify, messages)
+    notifier.flush(10)
+    print_durations("PushoverNotifier same burst again", durations, server, requests_before, messages_before)
+    print("    deduplicated: {}".format(notifier.stats["deduplicated"]))
+
+    server.fail = True
+    requests_before, messages_before = server.requests, len(server.pushover_messages)
+    durations = timed_calls(notifier.notify, ["Websocket connection exception: {}".format(i) for i in range(100)])
+    time.sleep(1.5)
+    print_durations("PushoverNotifier provider down", durations, server, requests_before, messages_before)
+    server.fail = False
+    notifier.flush(15)
+    print("    after the provider recovery: pushover messages: {}   stats: {}".format(len(server.pushover_messages) - messages_before, notifier.stats))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notifications", type=int, default=1000)
+    parser.add_argument("--distinct", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="added provider latency (seconds)")
+    args = parser.parse_args()
+
+    main(args.notifications, args.distinct, args.latency)
@@ -0,0 +1,96 @@
+'''
+FtxApiClient.request (awaitable requests correlated by "id") against the local FTX stand-in server with a response
+latency (benchmarks/ftx_stand_in_server.py). Reports:
+    - sequential: every request awaited before sending the next one (as the shared dicts polling allows at best)
+    - pipelined: up to --in-flight requests in flight at once, every result awaited separately
+      requests/s and p50 / p99 request -> response time
+    - a request without response timing out and an error response raised
+    - fail fast on disconnection: the server closes the connection with requests in flight - the time until all of
+      them fail (instead of waiting for their timeouts)
+
+Usage:
+    python benchmarks/bench_request_correlation.py [--requests 2000] [--in-flight 100] [--latency 0.002]
+'''
+
+import time
+import asyncio
+import argparse
+
+from bench_common import create_logger, percentile
+from ftx_lib import FtxApiClient
+from ftx_stand_in_server import FtxStandInServer
+
+
+async def timed_request(client, durations):
+    start = time.perf_counter()
+    await client.request({"op": "ping"})
+    durations.append(time.perf_counter() - start)
+
+
+def print_durations(name, durations, elapsed):
+    durations.sort()
+    print("{:34} {:8.0f} requests/s   p50: {:6.2f} ms   p99: {:6.2f} ms".format(name, len(durations) / elapsed, percentile(durations, 50) * 1e3, percentile(durations, 99) * 1e3))
+
+
+async def main(requests, in_flight, latency):
+    server = await FtxStandInServer().start()
+    server.latency = latency
+    client = FtxApiClient(client_type=FtxApiClient.MARKET, logger=create_logger("bench_request_correlation"), websocket_uri=server.uri, channels=[], channels_handling_map={}, responses_handling_map={})
+    await client.websocket_connected_event.wait()
+    print("server response latency: {:.1f} ms".format(latency * 1e3))
+
+    durations = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        await timed_request(client, durations)
+    print_durations("sequential", durations, time.perf_counter() - start)
+
+    durations = []
+    window = asyncio.Semaphore(in_flight)
+
+    async def windowed_request():
+        async with window:
+            await timed_request(client, durations)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[windowed_request() for _ in range(requests)])
+    print_durations("pipelined ({} in flight)".format(in_flight), durations, time.perf_counter() - start)
+    print("    pending requests left: {}".format(len(client.pending_requests)))
+
+    # Timeout (login is never answered) and error response
+    start = time.perf_counter()
+    try:
+        await client.request({"op": "login", "args": {}}, timeout=0.2)
+    except asyncio.TimeoutError as e:
+        print("timeout after {:.3f} s: {}".format(time.perf_counter() - start, e))
+    client.authenticated = True  # Private ops are held until the login otherwise
+    try:
+        await client.request({"op": "unknown"})
+    except Exception as e:
+        print("error response: {}".format(e))
+
+    # Fail fast on disconnection
+    server.latency = 5.0
+    tasks = [asyncio.ensure_future(client.request({"op": "ping"}, timeout=30)) for _ in range(in_flight)]
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    for connection in list(server.connections):
+        await connection.websocket.close()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failed = sum(1 for result in results if isinstance(result, ConnectionError))
+    print("disconnection: {} of {} in flight requests failed after {:.1f} ms (timeout: 30 s)   pending requests left: {}".format(failed, len(tasks), (time.perf_counter() - start) * 1e3, len(client.pending_requests)))
+
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel()
+    await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--in-flight", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    asyncio.new_event_loop().run_until_complete(main(args.requests, args.in_flight, args.latency))
@@ -0,0 +1,71 @@
+'''
+Compares reading the best ask from the old Manager().dict proxy with reading it from the SharedMarketData snapshot
+(read, read_bid_ask and the bound bid_ask_reader), with an idle writer and with a writer process updating it in a loop.
+With the busy writer the bid_ask_reader pairs are checked for consistency (the writer keeps ask - bid == 0.5).
+
+Usage:
+    python benchmarks/bench_shared_market_data.py [--reads 100000]
+'''
+
+import os
+import sys
+import time
+import argparse
+from multiprocessing import Manager, Process, Event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from shared_market_data import SharedMarketData
+
+
+def writer(shared_market_data: SharedMarketData, stop: Event):
+    '''
+    Keeps updating the snapshot from another process, so the readers also exercise the seqlock retries
+    '''
+    price = 29000.0
+    while not stop.is_set():
+        price += 0.5
+        shared_market_data.update("BTC/USDT", bid=price - 0.5, ask=price)
+
+
+def bench(name, read, reads):
+    start = time.perf_counter()
+    for _ in range(reads):
+        read()
+    elapsed = time.perf_counter() - start
+    print("{:<36} {:10.3f} us / read   {:12.0f} reads/s".format(name, elapsed / reads * 1e6, reads / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=100000)
+    args = parser.parse_args()
+
+    manager = Manager()
+    manager_dict = manager.dict({"price_BTC_buy_for_USDT": "29000.5"})
+    bench("Manager().dict", lambda: manager_dict["price_BTC_buy_for_USDT"], args.reads // 10)
+
+    bench("empty call (the loop overhead)", lambda: None, args.reads)
+
+    shared_market_data = SharedMarketData(["BTC/USDT"])
+    shared_market_data.update("BTC/USDT", bid=29000.0, ask=29000.5)
+    slot = shared_market_data.market_slot("BTC/USDT")
+    read_bid_ask = shared_market_data.bid_ask_reader("BTC/USDT")
+    assert read_bid_ask() == shared_market_data.read_bid_ask(slot) == (29000.0, 29000.5)
+    bench("bid_ask_reader(market)(), idle writer", read_bid_ask, args.reads)
+    bench("read_bid_ask(slot), idle writer", lambda: shared_market_data.read_bid_ask(slot), args.reads)
+    bench("read(market), idle writer", lambda: shared_market_data.read("BTC/USDT"), args.reads)
+
+    stop = Event()
+    writer_process = Process(target=writer, args=(shared_market_data, stop))
+    writer_process.start()
+    try:
+        bench("bid_ask_reader(market)(), busy writer", read_bid_ask, args.reads)
+        torn = sum(1 for bid, ask in (read_bid_ask() for _ in range(args.reads)) if ask - bid != 0.5)
+        print("{:<36} {} of {}".format("torn bid/ask pairs, busy writer", torn, args.reads))
+        bench("read_bid_ask(slot), busy writer", lambda: shared_market_data.read_bid_ask(slot), args.reads)
+        bench("read(market), busy writer", lambda: shared_market_data.read("BTC/USDT"), args.reads)
+    finally:
+        stop.set()
+        writer_process.join()
+        shared_market_data.unlink()
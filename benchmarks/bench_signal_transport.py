@@ -0,0 +1,110 @@
+'''
+Webhook -> user workers signal delivery latency: one producer (as the webhook bot) fans every signal out to N worker
+processes, each running an asyncio loop (as FtxUserApiWorker). Compares:
+    - manager: Manager().Queue() per worker, read with a blocking get in the loop's executor (the former transport)
+    - pipe:    SignalChannel per worker, read by loop.add_reader (signal_transport)
+Reports per worker p50 / p99 / max latency from the put (the "enqueued" stamp) to the signal being handled on the
+worker's loop, and the latency until the slowest worker has got the signal.
+
+Usage:
+    python benchmarks/bench_signal_transport.py [--workers 4] [--signals 2000] [--interval 0.002]
+'''
+
+import time
+import asyncio
+import argparse
+from queue import Empty
+from multiprocessing import Process, Manager, Queue
+
+from bench_common import percentile
+from latency import stamp
+from signal_transport import SignalChannel
+
+
+def run_manager_worker(worker_id, queue, signals, results_queue):
+    received = {}
+
+    def get():
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            return None
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        while len(received) < signals:
+            signal = await loop.run_in_executor(None, get)
+            if signal:
+                received[signal["id"]] = time.monotonic_ns()
+
+    asyncio.new_event_loop().run_until_complete(main())
+    results_queue.put((worker_id, received))
+
+
+def run_pipe_worker(worker_id, channel, signals, results_queue):
+    received = {}
+
+    async def main():
+        done = asyncio.Event()
+
+        def handle_signal(signal):
+            received[signal["id"]] = time.monotonic_ns()
+            if len(received) == signals:
+                done.set()
+
+        channel.attach(asyncio.get_running_loop(), handle_signal)
+        await done.wait()
+        channel.detach()
+
+    asyncio.new_event_loop().run_until_complete(main())
+    results_queue.put((worker_id, received))
+
+
+def run(transport, workers, signals, interval):
+    if transport == "manager":
+        manager = Manager()
+        queues = [manager.Queue() for _ in range(workers)]
+        target = run_manager_worker
+    else:
+        queues = [SignalChannel() for _ in range(workers)]
+        target = run_pipe_worker
+    results_queue = Queue()
+    processes = [Process(target=target, args=(i, queue, signals, results_queue)) for i, queue in enumerate(queues)]
+    for process in processes:
+        process.start()
+    time.sleep(1)  # Let the workers start
+
+    enqueued = {i: [] for i in range(workers)}
+    for signal_id in range(signals):
+        for i, queue in enumerate(queues):
+            timestamps = {}
+            stamp(timestamps, "enqueued")
+            enqueued[i].append(timestamps["enqueued"])
+            queue.put({"id": signal_id, "type": "buy", "price": "25420", "fiat": "EUR", "timestamps": timestamps})
+        time.sleep(interval)
+
+    results = dict(results_queue.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join()
+
+    print("transport: {}".format(transport))
+    last_delivery = [0] * signals
+    for i in range(workers):
+        latencies = sorted((results[i][signal_id] - enqueued[i][signal_id]) / 1000 for signal_id in range(signals))
+        for signal_id in range(signals):
+            last_delivery[signal_id] = max(last_delivery[signal_id], results[i][signal_id] - enqueued[0][signal_id])
+        print("    worker {}: p50: {:8.1f} us   p99: {:8.1f} us   max: {:8.1f} us".format(i, percentile(latencies, 50), percentile(latencies, 99), latencies[-1]))
+    last_delivery = sorted(latency / 1000 for latency in last_delivery)
+    print("    all workers: p50: {:8.1f} us   p99: {:8.1f} us   max: {:8.1f} us".format(percentile(last_delivery, 50), percentile(last_delivery, 99), last_delivery[-1]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--signals", type=int, default=2000)
+    parser.add_argument("--interval", type=float, default=0.002, help="seconds between the signals")
+    parser.add_argument("--transports", type=str, nargs="+", default=["manager", "pipe"])
+    args = parser.parse_args()
+
+    for transport in args.transports:
+        run(transport, args.workers, args.signals, args.interval)
@@ -0,0 +1,74 @@
+'''
+Ticker channel throughput of FtxMarketDataWorker: frame decoding (typed ticker data, as the worker's FtxApiClient decodes
+it) + FtxApiClient.dispatch (channel/market lookup table)
++ the ticker handler writing into the shared market data, for 1, 50 and 200 markets.
+
+Usage:
+    python benchmarks/bench_ticker_throughput.py [--messages 200000] [--markets 1 50 200]
+'''
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from bench_common import BenchFtxApiClient, create_logger
+from ftx_lib import FtxApiClient
+from ftx_market_data_worker import FtxMarketDataWorker
+from shared_market_data import SharedMarketData
+
+
+def ticker_frames(markets, count):
+    frames = []
+    for i in range(count):
+        price = 100 + random.random()
+        frames.append(json.dumps({
+            "channel": "ticker",
+            "market": markets[i % len(markets)],
+            "type": "update",
+            "data": {"bid": price, "ask": price + 0.5, "bidSize": 1.5, "askSize": 2.0, "last": price, "time": time.time()}
+        }))
+    return frames
+
+
+async def measure(markets_count, messages, log_dir):
+    markets = ["COIN{}/USDT".format(i) for i in range(markets_count)]
+    shared_market_data = SharedMarketData(max_markets=markets_count)
+    try:
+        worker = FtxMarketDataWorker(shared_market_data, debug=False, log_file=log_dir + "/bench_ticker_throughput.log", ticker_markets=markets)
+        channels_handling_map = worker.create_channels_handling_map()
+        worker.ftx_api_client = BenchFtxApiClient(client_type=FtxApiClient.MARKET, logger=create_logger("bench_ticker_throughput"), channels=list(channels_handling_map.keys()), channels_handling_map=channels_handling_map, typed_channels=["ticker"])
+        frames = ticker_frames(markets, messages)
+        decode = worker.ftx_api_client.frame_decoder.decode
+        dispatch = worker.ftx_api_client.dispatch
+        start = time.perf_counter()
+        for frame in frames:
+            dispatch(decode(frame))
+        elapsed = time.perf_counter() - start
+        worker.ftx_api_client.__exit__()
+        assert shared_market_data.read(markets[-1]).time > 0
+        return messages / elapsed
+    finally:
+        shared_market_data.unlink()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--markets", type=int, nargs="+", default=[1, 50, 200])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        for markets_count in args.markets:
+            loop = asyncio.new_event_loop()
+            try:
+                messages_per_second = loop.run_until_complete(measure(markets_count, args.messages, log_dir))
+            finally:
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                loop.close()
+            print("{:>4} markets: {:10.0f} messages/s".format(markets_count, messages_per_second))
@@ -0,0 +1,102 @@
+'''
+Periodic calls: PeriodicNormal (a threading.Timer thread per tick) vs TimerScheduler (one timer heap in the loop).
+Runs N timers for the given time and reports:
+    - threads created and the peak number of live threads
+    - tick lateness p50 / p99 (real call time - nominal tick time) and the drift of the last tick
+    - CPU usage of the process and the scheduler's own overhead per tick (TimerScheduler only)
+
+Usage:
+    python benchmarks/bench_timer_scheduler.py [--timers 1 10 100] [--interval 0.05] [--seconds 5]
+'''
+
+import time
+import asyncio
+import argparse
+import threading
+
+from bench_common import percentile
+from periodic import PeriodicNormal, TimerScheduler
+
+
+threads_started = [0]
+thread_start = threading.Thread.start
+
+
+def counting_thread_start(thread):
+    threads_started[0] += 1
+    thread_start(thread)
+
+
+threading.Thread.start = counting_thread_start
+
+
+class TickRecorder(object):
+
+    def __init__(self, start: float, interval: float):
+        self.start = start
+        self.interval = interval
+        self.ticks = 0
+        self.lateness = []
+
+    def tick(self):
+        self.ticks += 1
+        self.lateness.append(time.monotonic() - (self.start + self.ticks * self.interval))
+
+
+def report(name, recorders, threads_created, peak_threads, cpu, overhead=None):
+    lateness = sorted(lateness for recorder in recorders for lateness in recorder.lateness)
+    drift = max(recorder.lateness[-1] for recorder in recorders if recorder.lateness)
+    print("{:15} timers: {:4}   threads created: {:6}   peak threads: {:4}   lateness p50: {:8.1f} us   p99: {:8.1f} us   last tick drift: {:8.1f} us   CPU: {:5.1f} %{}".format(
+        name, len(recorders), threads_created, peak_threads, percentile(lateness, 50) * 1e6, percentile(lateness, 99) * 1e6, drift * 1e6, cpu * 100,
+        "   scheduler overhead p50: {:.2f} us per tick".format(overhead["p50"]) if overhead else ""))
+
+
+def bench_periodic_normal(timers, interval, seconds):
+    threads_started[0] = 0
+    start = time.monotonic()
+    recorders = [TickRecorder(start, interval) for _ in range(timers)]
+    cpu_start = time.process_time()
+    periodics = [PeriodicNormal(interval, recorder.tick) for recorder in recorders]
+    peak_threads = 0
+    while time.monotonic() - start < seconds:
+        peak_threads = max(peak_threads, threading.active_count())
+        time.sleep(0.001)
+    for periodic in periodics:
+        periodic.stop()
+    cpu = (time.process_time() - cpu_start) / (time.monotonic() - start)
+    report("PeriodicNormal", recorders, threads_started[0], peak_threads, cpu)
+    while threading.active_count() > 1:
+        time.sleep(0.01)  # Let the last timer threads finish
+
+
+def bench_timer_scheduler(timers, interval, seconds):
+    threads_started[0] = 0
+
+    async def main():
+        scheduler = TimerScheduler(asyncio.get_running_loop())
+        start = scheduler.loop.time()
+        recorders = [TickRecorder(start, interval) for _ in range(timers)]
+        cpu_start = time.process_time()
+        periodics = [scheduler.call_periodic(interval, recorder.tick) for recorder in recorders]
+        peak_threads = 0
+        while scheduler.loop.time() - start < seconds:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+        for periodic in periodics:
+            periodic.cancel()
+        cpu = (time.process_time() - cpu_start) / (scheduler.loop.time() - start)
+        report("TimerScheduler", recorders, threads_started[0], peak_threads, cpu, scheduler.overhead.summary())
+
+    asyncio.new_event_loop().run_until_complete(main())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--timers", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for timers in args.timers:
+        bench_periodic_normal(timers, args.interval, args.seconds)
+        bench_timer_scheduler(timers, args.interval, args.seconds)
@@ -0,0 +1,127 @@
+'''
+Webhook load test: runs WebhookBot (aiohttp or Flask server) in its own process with a SignalChannel per user (as
+ftx_trader does) and fires concurrent TradingView-style bursts of alerts at it. Reports:
+    - requests/s (all the responses received / wall time)
+    - p50 / p99 alert-to-enqueue latency (client send -> put into the user's queue) per user
+    - p50 / p99 server side latency (webhook received -> put into the user's queue)
+
+Usage:
+    python benchmarks/bench_webhook_load.py [--server aiohttp] [--users 2] [--bursts 50] [--burst-size 100]
+                                            [--concurrency 100] [--pause 0.05]
+'''
+
+import os
+import sys
+import time
+import hashlib
+import asyncio
+import argparse
+import logging
+from multiprocessing import Process, Queue
+
+import aiohttp
+
+from bench_common import percentile
+from webhook_bot import WebhookBot
+from signal_transport import SignalChannel
+
+
+PIN = "1234"
+
+
+def run_webhook_bot(server, queues, port):
+    sys.stdout = open(os.devnull, "w")  # No per alert prints
+    bot = WebhookBot(PIN, queues, server=server)
+    if server == WebhookBot.AIOHTTP:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(bot.serve(host="127.0.0.1", port=port))
+        loop.run_forever()
+    else:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        from webhook_bot import WebhookView
+        WebhookView.register(bot.app)
+        bot.app.run(host="127.0.0.1", port=port, threaded=True)
+
+
+def run_consumer(user, queue, expected, results_queue):
+    alert_to_enqueue, server_side = [], []
+    for _ in range(expected):
+        request = queue.get()
+        timestamps = request["timestamps"]
+        alert_to_enqueue.append((timestamps["enqueued"] - request["sent"]) / 1000)
+        server_side.append((timestamps["enqueued"] - timestamps["webhook_received"]) / 1000)
+    results_queue.put((user, sorted(alert_to_enqueue), sorted(server_side)))
+
+
+async def fire(url, token, bursts, burst_size, concurrency, pause):
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    statuses = {}
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def alert(i):
+            body = '{{"type": "{}", "price": "25420.5", "fiat": "EUR", "token": "{}", "sent": {}}}'.format(
+                "buy" if i % 2 else "sell", token, time.monotonic_ns())
+            async with session.post(url, data=body) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        start = time.perf_counter()
+        for burst in range(bursts):
+            await asyncio.gather(*(alert(burst * burst_size + i) for i in range(burst_size)))
+            if pause:
+                await asyncio.sleep(pause)
+        elapsed = time.perf_counter() - start
+    return elapsed, statuses
+
+
+def wait_until_online(url, timeout=10):
+    async def check():
+        deadline = time.monotonic() + timeout
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    async with session.get(url) as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    if time.monotonic() > deadline:
+                        raise
+                await asyncio.sleep(0.1)
+    asyncio.new_event_loop().run_until_complete(check())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", type=str, default=WebhookBot.AIOHTTP, choices=[WebhookBot.AIOHTTP, WebhookBot.FLASK])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--bursts", type=int, default=50)
+    parser.add_argument("--burst-size", type=int, default=100, help="alerts fired at once (as TradingView does for many alerts)")
+    parser.add_argument("--concurrency", type=int, default=100, help="max client connections")
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds between the bursts")
+    args = parser.parse_args()
+
+    queues = {"user_{}".format(i): SignalChannel() for i in range(args.users)}
+    expected = args.bursts * args.burst_size
+    results_queue = Queue()
+    consumers = [Process(target=run_consumer, args=(user, queue, expected, results_queue)) for user, queue in queues.items()]
+    for consumer in consumers:
+        consumer.start()
+    server_process = Process(target=run_webhook_bot, args=(args.server, queues, args.port), daemon=True)
+    server_process.start()
+
+    base_url = "http://127.0.0.1:{}/".format(args.port)
+    wait_until_online(base_url)
+    token = hashlib.sha224(PIN.encode()).hexdigest()
+    elapsed, statuses = asyncio.new_event_loop().run_until_complete(
+        fire(base_url + "webhook", token, args.bursts, args.burst_size, args.concurrency, args.pause))
+    results = sorted(results_queue.get(timeout=60) for _ in consumers)
+    for consumer in consumers:
+        consumer.join()
+    server_process.terminate()
+
+    print("server: {}, users: {}, alerts: {} ({} bursts x {}), responses: {}".format(args.server, args.users, expected, args.bursts, args.burst_size, statuses))
+    print("requests/s: {:.0f} (including {:.2f} s of pauses between the bursts)".format(expected / elapsed, args.pause * args.bursts))
+    for user, alert_to_enqueue, server_side in results:
+        print("{}: alert-to-enqueue p50: {:8.1f} us   p99: {:8.1f} us   |   webhook received-to-enqueue p50: {:8.1f} us   p99: {:8.1f} us".format(
+            user, percentile(alert_to_enqueue, 50), percentile(alert_to_enqueue, 99), percentile(server_side, 50), percentile(server_side, 99)))
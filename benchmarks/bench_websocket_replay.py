@@ -0,0 +1,107 @@
+'''
+Websocket replay benchmark: starts the local FTX stand-in server (in its own process) streaming synthetic or recorded
+messages at the configured rate into real FtxApiClient instances (one per worker process) and reports per worker:
+    - messages/s handled
+    - p50 / p99 / p999 frame-to-handler latency (server send time -> handler call)
+    - CPU usage and memory (RSS)
+
+Usage:
+    python benchmarks/bench_websocket_replay.py [--workers 1] [--rate 2000] [--seconds 10] [--markets 5]
+                                                [--channels ticker orderbook] [--frames frames.txt]
+'''
+
+import time
+import asyncio
+import argparse
+import resource
+from multiprocessing import Process, Queue
+
+from bench_common import create_logger, percentile
+from ftx_lib import FtxApiClient
+from ftx_stand_in_server import FtxStandInServer, load_frames
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_server(rate, frames_file, port_queue):
+    async def main():
+        server = await FtxStandInServer(rate=rate, frames=load_frames(frames_file) if frames_file else None).start()
+        port_queue.put(server.port)
+        await asyncio.Event().wait()
+    asyncio.new_event_loop().run_until_complete(main())
+
+
+def run_worker(worker_id, uri, channels, warmup, seconds, results_queue):
+    latencies = []
+    measuring = [False]
+
+    def handle_channel_event(event: dict):
+        if measuring[0]:
+            latencies.append(time.time() - event["data"].time)
+
+    async def main():
+        client = FtxApiClient(
+            client_type=FtxApiClient.MARKET,
+            logger=create_logger("bench_websocket_replay_{}".format(worker_id)),
+            websocket_uri=uri,
+            channels=channels,
+            channels_handling_map={channel: handle_channel_event for channel in channels},
+            typed_channels=["ticker", "orderbook"]
+        )
+        await asyncio.sleep(warmup)
+        measuring[0] = True
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        await asyncio.sleep(seconds)
+        measuring[0] = False
+        cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+        client.__exit__()
+        return cpu
+
+    cpu = asyncio.new_event_loop().run_until_complete(main())
+    latencies.sort()
+    results_queue.put({
+        "worker": worker_id,
+        "messages_per_second": len(latencies) / seconds,
+        "p50_us": percentile(latencies, 50) * 1e6 if latencies else None,
+        "p99_us": percentile(latencies, 99) * 1e6 if latencies else None,
+        "p999_us": percentile(latencies, 99.9) * 1e6 if latencies else None,
+        "cpu_percent": cpu * 100,
+        "rss_mb": current_rss_mb(),
+    })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=2000, help="messages/s per connection (0 - as fast as possible)")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--markets", type=int, default=5)
+    parser.add_argument("--channels", type=str, nargs="+", default=["ticker", "orderbook"])
+    parser.add_argument("--frames", type=str, default=None, help="recorded raw frames (one per line) to replay")
+    args = parser.parse_args()
+
+    port_queue, results_queue = Queue(), Queue()
+    server_process = Process(target=run_server, args=(args.rate, args.frames, port_queue), daemon=True)
+    server_process.start()
+    uri = "ws://127.0.0.1:{}/ws/".format(port_queue.get(timeout=10))
+    markets = ["COIN{}/USDT".format(i) for i in range(args.markets)]
+    channels = ["{}.{}".format(channel, market) for channel in args.channels for market in markets]
+
+    workers = [Process(target=run_worker, args=(i, uri, channels, args.warmup, args.seconds, results_queue)) for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    results = sorted((results_queue.get() for _ in workers), key=lambda result: result["worker"])
+    for worker in workers:
+        worker.join()
+    server_process.terminate()
+
+    print("rate: {} messages/s per connection, channels: {}".format(args.rate or "unlimited", len(channels)))
+    for result in results:
+        print("worker {worker}: {messages_per_second:10.0f} messages/s   latency p50: {p50_us:8.1f} us   p99: {p99_us:8.1f} us   p999: {p999_us:8.1f} us   CPU: {cpu_percent:5.1f} %   RSS: {rss_mb:6.1f} MB".format(**result))
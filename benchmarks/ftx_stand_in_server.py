@@ -0,0 +1,351 @@
+'''
+Local stand-in for the FTX websocket API (wss://ftx.com/ws/) - for benchmarks and load tests of FtxApiClient.
+
+Speaks the FTX protocol:
+    {"op": "ping"}                                               -> {"type": "pong"}
+    {"op": "login", "args": {"key", "sign", "time"}}              -> nothing (as FTX), error if the signature is wrong
+    {"op": "subscribe", "channel": "ticker", "market": "BTC/USDT"} -> {"type": "subscribed", ...} + the channel stream
+    {"op": "unsubscribe", ...}                                   -> {"type": "unsubscribed", ...}
+The "id" of a request (if any) is echoed in its response (see FtxApiClient.request). The responses can be delayed
+(latency, seconds) without delaying the following requests (pipelining).
+
+Every connection gets its own stream of synthetic channel messages (ticker / orderbook partial+update with valid
+checksums / trades) for its subscriptions, at the configured rate (messages/s per connection, 0 - as fast as possible).
+Alternatively recorded raw frames (a file or a market data capture directory) can be replayed (only the ones matching
+the connection's subscriptions).
+With shared_stream the ticker / trades messages are generated once (at the configured rate per stream) and sent to every
+connection subscribed - the same messages on every connection, as redundant feeds of the exchange. Every connection can
+get its own delay (connection_delays: (base, jitter) seconds per connection in the connection order, the jitter is
+exponentially distributed and the order of the frames is kept, as on a TCP path).
+The "time" of every sent message is set to the sending time, so clients can measure frame-to-handler latency.
+
+Run standalone:
+    python benchmarks/ftx_stand_in_server.py [--port 8765] [--rate 1000] [--frames frames.txt]
+'''
+
+import os
+import sys
+import hmac
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import websockets
+from collections import deque
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import json_codec
+from market_data_recorder import MarketDataCaptureReader
+from order_book import OrderBook
+
+
+class StandInConnection(object):
+
+    def __init__(self, server, websocket):
+        self.server = server
+        self.websocket = websocket
+        self.subscriptions = []  # [(channel, market)]
+        self.order_books = {}
+        self.producer = None
+        self.sent = 0
+        self.trade_id = 0
+        self.delay = server.next_connection_delay() if server else (0.0, 0.0)
+        self.delayed_frames = deque()  # (due loop time, frame)
+        self.delayed_sender = None
+        self.last_due = 0.0
+
+    async def send(self, message: dict):
+        await self.websocket.send(json_codec.dumps(message))
+
+    async def respond(self, request: dict, message: dict):
+        if "id" in request:
+            message["id"] = request["id"]
+        if self.server.latency:
+            asyncio.ensure_future(self.send_later(message, self.server.latency))
+        else:
+            await self.send(message)
+
+    async def send_frame(self, frame: str):
+        '''
+        Channel message frame (delayed by the connection's delay if any)
+        '''
+        base, jitter = self.delay
+        if not base and not jitter:
+            await self.websocket.send(frame)
+            self.sent += 1
+            return
+        loop = asyncio.get_running_loop()
+        self.last_due = max(self.last_due, loop.time() + base + (random.expovariate(1.0 / jitter) if jitter else 0.0))
+        self.delayed_frames.append((self.last_due, frame))
+        if not self.delayed_sender:
+            self.delayed_sender = asyncio.ensure_future(self.send_delayed_frames())
+
+    async def send_delayed_frames(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.delayed_frames:
+                self.delayed_sender = None
+                return
+            due, frame = self.delayed_frames[0]
+            if due > loop.time():
+                await asyncio.sleep(due - loop.time())
+            self.delayed_frames.popleft()
+            try:
+                await self.websocket.send(frame)
+            except websockets.ConnectionClosed:
+                self.delayed_frames.clear()
+                self.delayed_sender = None
+                return
+            self.sent += 1
+
+    async def send_later(self, message: dict, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.send(message)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def handle(self, request: dict):
+        op = request.get("op")
+        if op == "ping":
+            await self.respond(request, {"type": "pong"})
+        elif op == "login":
+            if not self.server.check_login(request.get("args", {})):
+                await self.respond(request, {"type": "error", "code": 400, "msg": "Invalid login credentials"})
+        elif op == "subscribe":
+            subscription = (request["channel"], request.get("market"))
+            if subscription in self.subscriptions:
+                await self.respond(request, {"type": "error", "code": 400, "msg": "Already subscribed"})
+                return
+            self.subscriptions.append(subscription)
+            await self.respond(request, {"type": "subscribed", "channel": subscription[0], "market": subscription[1]})
+            if subscription[0] == "orderbook":
+                await self.send(self.orderbook_partial(subscription[1]))
+            if not self.producer and not self.server.shared_stream:
+                self.producer = asyncio.ensure_future(self.produce())
+        elif op == "unsubscribe":
+            subscription = (request["channel"], request.get("market"))
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+                if subscription[0] == "orderbook":
+                    del self.order_books[subscription[1]]
+            await self.respond(request, {"type": "unsubscribed", "channel": subscription[0], "market": subscription[1]})
+        else:
+            await self.respond(request, {"type": "error", "code": 400, "msg": "Invalid op: {}".format(op)})
+
+    def orderbook_partial(self, market: str):
+        book = self.order_books[market] = OrderBook(market)
+        for i in range(100):
+            book.bids.apply(round(100.0 - i * 0.5, 1), round(random.uniform(0.01, 5), 4))
+            book.asks.apply(round(100.5 + i * 0.5, 1), round(random.uniform(0.01, 5), 4))
+        return {"channel": "orderbook", "market": market, "type": "partial", "data": {
+            "time": time.time(), "checksum": book.checksum(), "bids": book.bids.levels(100), "asks": book.asks.levels(100), "action": "partial"}}
+
+    def orderbook_update(self, market: str):
+        book = self.order_books[market]
+        bids, asks = [], []
+        for _ in range(random.randint(1, 3)):
+            side, changes = (book.bids, bids) if random.random() < 0.5 else (book.asks, asks)
+            level = random.randint(0, 60)
+            price = round(100.0 - level * 0.5, 1) if side is book.bids else round(100.5 + level * 0.5, 1)
+            size = 0.0 if random.random() < 0.2 else round(random.uniform(0.01, 5), 4)
+            side.apply(price, size)
+            changes.append([price, size])
+        return {"channel": "orderbook", "market": market, "type": "update", "data": {
+            "time": time.time(), "checksum": book.checksum(), "bids": bids, "asks": asks, "action": "update"}}
+
+    def ticker(self, market: str):
+        bid = round(100.0 + random.uniform(-1, 1), 1)
+        return {"channel": "ticker", "market": market, "type": "update", "data": {
+            "bid": bid, "ask": bid + 0.5, "bidSize": 1.5, "askSize": 2.0, "last": bid, "time": time.time()}}
+
+    def trades(self, market: str):
+        self.trade_id += 1
+        return {"channel": "trades", "market": market, "type": "update", "data": [{
+            "id": self.trade_id, "price": round(100.0 + random.uniform(-1, 1), 1), "size": round(random.uniform(0.01, 1), 4),
+            "side": random.choice(["buy", "sell"]), "liquidation": False, "time": datetime.now(timezone.utc).isoformat()}]}
+
+    def synthetic_frames(self):
+        generators = {"ticker": self.ticker, "orderbook": self.orderbook_update, "trades": self.trades}
+        while True:
+            streams = [(generators[channel], market) for channel, market in self.subscriptions if channel in generators and market]
+            if not streams:
+                yield None
+                continue
+            for generator, market in streams:
+                if generator != self.orderbook_update or market in self.order_books:
+                    yield json_codec.dumps(generator(market))
+
+    def recorded_frames(self):
+        while True:
+            for frame in self.server.frames:
+                message = json_codec.loads(frame)
+                if (message.get("channel"), message.get("market")) in self.subscriptions:
+                    if isinstance(message.get("data"), dict) and "time" in message["data"]:
+                        message["data"]["time"] = time.time()
+                    yield json_codec.dumps(message)
+            yield None  # Nothing matching the subscriptions - don't spin
+
+    async def produce(self):
+        frames = self.recorded_frames() if self.server.frames else self.synthetic_frames()
+        loop = asyncio.get_running_loop()
+        rate = self.server.rate
+        interval = 0.001
+        credit = 0.0
+        next_tick = loop.time()
+        while True:
+            if rate:
+                credit += rate * interval
+                count = int(credit)
+                credit -= count
+            else:
+                count = 100
+            for _ in range(count):
+                frame = next(frames)
+                if frame is None:
+                    break
+                await self.send_frame(frame)
+            if rate:
+                next_tick += interval
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            else:
+                await asyncio.sleep(0)
+
+    def close(self):
+        if self.producer:
+            self.producer.cancel()
+        if self.delayed_sender:
+            self.delayed_sender.cancel()
+
+
+class FtxStandInServer(object):
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, rate: float = 1000.0, frames: list = None, api_secret: str = None, logger: logging.Logger = None, shared_stream: bool = False, connection_delays: list = None):
+        self.host = host
+        self.port = port
+        self.rate = rate  # messages/s per connection, 0 - as fast as possible
+        self.frames = frames  # Recorded raw frames to replay instead of the synthetic streams
+        self.api_secret = api_secret.encode() if api_secret else None
+        self.latency = 0.0  # Seconds before every response to a request
+        self.logger = logger if logger else logging.getLogger("ftx_stand_in_server")
+        self.shared_stream = shared_stream  # The same ticker / trades messages on every connection
+        self.connection_delays = connection_delays if connection_delays else []  # [(base, jitter)] cycled over the connections
+        self.connections_opened = 0
+        self.stream_source = StandInConnection(None, None)  # Generates the shared stream
+        self.producer = None
+        self.connections = set()
+        self.server = None
+
+    @property
+    def uri(self):
+        return "ws://{}:{}/ws/".format(self.host, self.port)
+
+    def check_login(self, args: dict):
+        if not self.api_secret:
+            return True
+        expected_sign = hmac.new(self.api_secret, "{}websocket_login".format(args.get("time")).encode(), "sha256").hexdigest()
+        return hmac.compare_digest(expected_sign, str(args.get("sign")))
+
+    def next_connection_delay(self):
+        delay = self.connection_delays[self.connections_opened % len(self.connection_delays)] if self.connection_delays else (0.0, 0.0)
+        self.connections_opened += 1
+        return delay
+
+    async def produce_shared_stream(self):
+        generators = {"ticker": self.stream_source.ticker, "trades": self.stream_source.trades}
+        loop = asyncio.get_running_loop()
+        interval = 0.001
+        credit = 0.0
+        next_tick = loop.time()
+        while True:
+            streams = list(dict.fromkeys(subscription for connection in self.connections for subscription in connection.subscriptions if subscription[0] in generators and subscription[1]))
+            if self.rate:  # messages/s per stream
+                credit += self.rate * interval
+                count = int(credit)
+                credit -= count
+            else:
+                count = 1
+            for _ in range(count):
+                for channel, market in streams:
+                    frame = json_codec.dumps(generators[channel](market))
+                    for connection in list(self.connections):
+                        if (channel, market) in connection.subscriptions:
+                            try:
+                                await connection.send_frame(frame)
+                            except websockets.ConnectionClosed:
+                                pass
+            if self.rate:
+                next_tick += interval
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            else:
+                await asyncio.sleep(0)
+
+    async def handle_connection(self, websocket, path=None):
+        connection = StandInConnection(self, websocket)
+        self.connections.add(connection)
+        try:
+            async for message in websocket:
+                try:
+                    request = json.loads(message)
+                except ValueError:
+                    await connection.send({"type": "error", "code": 400, "msg": "Invalid JSON"})
+                    continue
+                await connection.handle(request)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            connection.close()
+            self.connections.discard(connection)
+
+    async def start(self):
+        self.server = await websockets.serve(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.shared_stream:
+            self.producer = asyncio.ensure_future(self.produce_shared_stream())
+        self.logger.info("FTX stand-in server listening at: {}".format(self.uri))
+        return self
+
+    async def stop(self):
+        if self.producer:
+            self.producer.cancel()
+        for connection in list(self.connections):
+            connection.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def sent(self):
+        return sum(connection.sent for connection in self.connections)
+
+
+def load_frames(frames_path: str):
+    '''
+    A file with one raw frame per line or a market data capture directory (see market_data_recorder)
+    '''
+    if os.path.isdir(frames_path):
+        return [frame for _, frame in MarketDataCaptureReader(frames_path).replay()]
+    with open(frames_path) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=1000.0)
+    parser.add_argument("--frames", type=str, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        await FtxStandInServer(args.host, args.port, args.rate, load_frames(args.frames) if args.frames else None).start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.get_event_loop().run_until_complete(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,199 @@
+'''
+Local HTTP stand-in (aiohttp) for the external HTTP services used by ftx-trader - for benchmarks and load tests:
+
+    GET  /fx/latest?base=EUR&symbols=USD,PLN    FX rates provider (as exchangeratesapi.io), with ETag / Last-Modified
+                                                revalidation (304 Not Modified while the rates haven't changed)
+    POST /1/messages.json                       Pushover messages API (the received messages are kept in
+                                                pushover_messages)
+    GET  /api/account, /api/wallet/balances,    FTX REST API (a minimal account state). The FTX-KEY / FTX-TS / FTX-SIGN
+         /api/positions, /api/orders,           headers are verified against ftx_api_keys (key -> secret, 401 if
+         /api/markets, /api/markets/{market}    invalid), the FTX-SUBACCOUNT header is recorded in ftx_subaccounts
+    POST /api/orders, DELETE /api/orders/{id}
+
+Every endpoint can be made slow (latency, seconds) or failing (fail=True -> HTTP 503) at runtime, e.g. to test the
+providers fallback.
+
+Run standalone:
+    python benchmarks/http_stand_in_server.py [--port 8767]
+'''
+
+import os
+import sys
+import hmac
+import time
+import uuid
+import hashlib
+import asyncio
+import argparse
+import logging
+from email.utils import formatdate
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import json_codec
+
+
+class HttpStandInServer(object):
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, logger: logging.Logger = None):
+        self.host = host
+        self.port = port
+        self.logger = logger if logger else logging.getLogger("http_stand_in_server")
+        self.latency = 0.0
+        self.fail = False
+        self.requests = 0
+        self.not_modified = 0
+        self.connections = set()
+        self.fx_rates = {"EUR": {"USD": 1.2271, "PLN": 4.5597, "GBP": 0.8990}, "USD": {"EUR": 0.8149, "PLN": 3.7158}}
+        self.fx_rates_version = 1
+        self.fx_rates_modified = time.time()
+        self.pushover_messages = []
+        self.ftx_api_keys = {"stand-in-key": "stand-in-secret"}
+        self.ftx_subaccounts = []
+        self.ftx_balances = [{"coin": "USDT", "free": 1234.56, "total": 1234.56, "usdValue": 1234.56}, {"coin": "BTC", "free": 0.0123, "total": 0.0123, "usdValue": 530.4}, {"coin": "FTT", "free": 0.0, "total": 0.0, "usdValue": 0.0}]
+        self.ftx_markets = {"BTC/USDT": {"name": "BTC/USDT", "type": "spot", "baseCurrency": "BTC", "quoteCurrency": "USDT", "priceIncrement": 1.0, "sizeIncrement": 0.0001, "minProvideSize": 0.0001, "bid": 43123.0, "ask": 43124.0, "last": 43123.0}}
+        self.ftx_orders = {}
+        self.ftx_next_order_id = 1
+        self.runner = None
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(self.host, self.port)
+
+    def set_fx_rate(self, base: str, quote: str, rate: float):
+        self.fx_rates.setdefault(base, {})[quote] = rate
+        self.fx_rates_version += 1
+        self.fx_rates_modified = time.time()
+
+    async def handle_common(self, request):
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info("peername"))  # (host, port) - one per TCP connection
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            raise web.HTTPServiceUnavailable()
+
+    async def handle_fx_latest(self, request):
+        await self.handle_common(request)
+        base = request.query.get("base") or request.query.get("from", "EUR")
+        symbols = (request.query.get("symbols") or request.query.get("to", "")).split(",")
+        if base not in self.fx_rates:
+            raise web.HTTPBadRequest(text='{"error": "Base not supported"}', content_type="application/json")
+        etag = '"{}-{}-{}"'.format(base, ",".join(symbols), self.fx_rates_version)
+        last_modified = formatdate(self.fx_rates_modified, usegmt=True)
+        headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "max-age=60"}
+        if request.headers.get("If-None-Match") == etag or (not request.headers.get("If-None-Match") and request.headers.get("If-Modified-Since") == last_modified):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        rates = {quote: rate for quote, rate in self.fx_rates[base].items() if quote in symbols or symbols == [""]}
+        return web.json_response({"rates": rates, "base": base, "date": time.strftime("%Y-%m-%d")}, headers=headers)
+
+    async def handle_pushover_message(self, request):
+        await self.handle_common(request)
+        fields = await request.post()
+        if not fields.get("token") or not fields.get("user") or not fields.get("message"):
+            return web.json_response({"status": 0, "errors": ["token, user and message are required"], "request": str(uuid.uuid4())}, status=400)
+        self.pushover_messages.append(dict(fields))
+        return web.json_response({"status": 1, "request": str(uuid.uuid4())})
+
+    async def handle_ftx_common(self, request):
+        await self.handle_common(request)
+        body = await request.text()
+        secret = self.ftx_api_keys.get(request.headers.get("FTX-KEY"))
+        timestamp = request.headers.get("FTX-TS", "")
+        signature = hmac.new(secret.encode(), (timestamp + request.method + request.path_qs + body).encode(), hashlib.sha256).hexdigest() if secret else None
+        if not signature or not hmac.compare_digest(signature, request.headers.get("FTX-SIGN", "")):
+            raise web.HTTPUnauthorized(text='{"success": false, "error": "Not logged in"}', content_type="application/json")
+        if request.headers.get("FTX-SUBACCOUNT"):
+            self.ftx_subaccounts.append(request.headers["FTX-SUBACCOUNT"])
+        return json_codec.loads(body) if body else None
+
+    @staticmethod
+    def ftx_response(result):
+        return web.json_response({"success": True, "result": result})
+
+    async def handle_ftx_account(self, request):
+        await self.handle_ftx_common(request)
+        return self.ftx_response({"username": "stand-in", "collateral": 1234.56, "freeCollateral": 1234.56, "leverage": 1.0, "makerFee": 0.0002, "takerFee": 0.0007, "positions": []})
+
+    async def handle_ftx_balances(self, request):
+        await self.handle_ftx_common(request)
+        return self.ftx_response(self.ftx_balances)
+
+    async def handle_ftx_positions(self, request):
+        await self.handle_ftx_common(request)
+        return self.ftx_response([])
+
+    async def handle_ftx_open_orders(self, request):
+        await self.handle_ftx_common(request)
+        market = request.query.get("market")
+        return self.ftx_response([order for order in self.ftx_orders.values() if order["status"] != "closed" and (not market or order["market"] == market)])
+
+    async def handle_ftx_markets(self, request):
+        await self.handle_ftx_common(request)
+        return self.ftx_response(list(self.ftx_markets.values()))
+
+    async def handle_ftx_market(self, request):
+        await self.handle_ftx_common(request)
+        market = request.match_info["market"].upper()
+        if market not in self.ftx_markets:
+            return web.json_response({"success": False, "error": "No such market: {}".format(market)}, status=404)
+        return self.ftx_response(self.ftx_markets[market])
+
+    async def handle_ftx_place_order(self, request):
+        body = await self.handle_ftx_common(request)
+        order = {"id": self.ftx_next_order_id, "market": body["market"], "side": body["side"], "type": body["type"], "price": body.get("price"), "size": body["size"], "filledSize": 0.0,
+                 "remainingSize": body["size"], "status": "new", "clientId": body.get("clientId"), "reduceOnly": body.get("reduceOnly", False), "ioc": body.get("ioc", False), "postOnly": body.get("postOnly", False)}
+        self.ftx_next_order_id += 1
+        self.ftx_orders[order["id"]] = order
+        return self.ftx_response(order)
+
+    async def handle_ftx_cancel_order(self, request):
+        await self.handle_ftx_common(request)
+        order = self.ftx_orders.get(int(request.match_info["order_id"]))
+        if not order:
+            return web.json_response({"success": False, "error": "Order not found"}, status=404)
+        order["status"] = "closed"
+        return self.ftx_response("Order queued for cancellation")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/fx/latest", self.handle_fx_latest)
+        app.router.add_post("/1/messages.json", self.handle_pushover_message)
+        app.router.add_get("/api/account", self.handle_ftx_account)
+        app.router.add_get("/api/wallet/balances", self.handle_ftx_balances)
+        app.router.add_get("/api/positions", self.handle_ftx_positions)
+        app.router.add_get("/api/orders", self.handle_ftx_open_orders)
+        app.router.add_post("/api/orders", self.handle_ftx_place_order)
+        app.router.add_delete("/api/orders/{order_id}", self.handle_ftx_cancel_order)
+        app.router.add_get("/api/markets", self.handle_ftx_markets)
+        app.router.add_get("/api/markets/{market:.+}", self.handle_ftx_market)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.logger.info("HTTP stand-in server listening at: {}".format(self.url))
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        await HttpStandInServer(args.host, args.port).start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.get_event_loop().run_until_complete(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,85 @@
+'''
+First-arrival arbitration of redundant market data feeds (the same channels subscribed on several independent
+websocket connections - see FtxMarketDataWorker "market_data_feeds").
+
+Every channel event is identified by (channel, market, exchange time) - or the trade ids for the trades channel. The
+first feed delivering an event wins and the event is handled, the copies arriving later from the other feeds are
+dropped. The seen events are kept in a bounded window (the oldest evicted first), so the window must cover the
+arrival skew of the feeds (e.g. 4096 events - 4 s at 1000 events/s).
+
+Per feed stats: wins (events delivered first) and the lag behind the winner (0 for the won events) in a
+LatencyHistogram - see report().
+
+eg. usage:
+
+    arbiter = FeedArbiter(feeds=2)
+    channels_handling_map_of_feed_1 = {"ticker.BTC/USDT": arbiter.handler(1, handle_channel_event_ticker)}
+'''
+
+import time
+from collections import deque
+from typing import Callable
+from latency import LatencyHistogram
+
+
+def event_key(event: dict):
+    data = event["data"]
+    if isinstance(data, list):  # Trades
+        return event["channel"], event.get("market"), tuple(trade["id"] if isinstance(trade, dict) else trade.id for trade in data)
+    return event["channel"], event.get("market"), data["time"] if isinstance(data, dict) else data.time
+
+
+class FeedArbiter(object):
+
+    def __init__(self, feeds: int, window: int = 4096):
+        self.feeds = feeds
+        self.window = window
+        self.seen = {}  # event key -> arrival time (monotonic ns) of the first copy
+        self.seen_order = deque()
+        self.wins = [0] * feeds
+        self.duplicates = 0
+        self.lags = [LatencyHistogram() for _ in range(feeds)]  # ns behind the first arrival
+
+    def accept(self, feed: int, key):
+        '''
+        True if it's the first arrival of the event
+        '''
+        now = time.monotonic_ns()
+        first_arrival = self.seen.get(key)
+        if first_arrival is not None:
+            self.duplicates += 1
+            self.lags[feed].record(now - first_arrival)
+            return False
+        self.seen[key] = now
+        self.seen_order.append(key)
+        if len(self.seen_order) > self.window:
+            del self.seen[self.seen_order.popleft()]
+        self.wins[feed] += 1
+        self.lags[feed].record(0)
+        return True
+
+    def handler(self, feed: int, handler: Callable):
+        '''
+        Channel event handler of the feed - calls the handler only for the first arrivals
+        '''
+        def handle_first_arrival(event: dict):
+            if self.accept(feed, event_key(event)):
+                handler(event)
+        return handle_first_arrival
+
+    def report(self):
+        '''
+        Per feed win rate (%) and lag behind the winner (ms)
+        '''
+        events = sum(self.wins)
+        return {
+            "events": events,
+            "duplicates": self.duplicates,
+            "feeds": [{"win_rate": 100.0 * wins / events if events else 0.0, "lag": lags.summary(unit=1000000)} for wins, lags in zip(self.wins, self.lags)]
+        }
+
+    def reset_stats(self):
+        self.wins = [0] * self.feeds
+        self.duplicates = 0
+        for lags in self.lags:
+            lags.reset()
@@ -1,6 +1,7 @@
 class FtxClient(object):
 
-    def __init__(self, ftx_api_key, ftx_api_secret, ftx_user):
+    def __init__(self, ftx_api_key, ftx_api_secret, ftx_user, ftx_subaccount=None):
         self.ftx_api_key = ftx_api_key
         self.ftx_api_secret = ftx_api_secret
         self.ftx_user = ftx_user
+        self.ftx_subaccount = ftx_subaccount
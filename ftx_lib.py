@@ -4,14 +4,33 @@ import websockets
 import hmac
 import hashlib
 import time
+import random
 import logging
+import async_logging
 import socket
+import threading
+from collections import deque
 from typing import List, Callable
-from queue import Empty, Queue
-from periodic import PeriodicNormal
+from json_codec import FrameDecoder
+from latency import stamp, LatencyHistogram
+import json_codec
+from periodic import TimerScheduler
 from pushover_notifier import PushoverNotifier
 
 
+class StandbyWebsocket(object):
+    '''
+    Hot standby connection of FtxApiClient: logged in and subscribed, its frames are read and discarded until promoted
+    '''
+
+    __slots__ = ("websocket", "reader", "discarded")
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.reader = None
+        self.discarded = 0
+
+
 class FtxApiClient(object):
 
     MARKET = 0
@@ -22,7 +41,10 @@ class FtxApiClient(object):
     USER_URI = "wss://ftx.com/ws/"
     SANDBOX_USER_URI = "wss://ftx.com/ws/"
 
-    def __init__(self, client_type: int, debug: bool = True, logger: logging.Logger = None, channels: List[str] = None, channels_handling_map: dict = None, responses_handling_map: dict = None, initial_requests_handling_map: dict = None, periodic_requests_handling_map: dict = None, api_secret: str = None, api_key: str = None, observer_for_authenticated: Callable = None, pushover_notifier: PushoverNotifier = None):
+    # Error replies to subscribe / unsubscribe requests (they carry neither the channel nor the market)
+    SUBSCRIPTION_ERRORS = ("Already subscribed", "Not subscribed", "Not logged in", "Invalid channel", "Invalid market")
+
+    def __init__(self, client_type: int, debug: bool = True, logger: logging.Logger = None, channels: List[str] = None, channels_handling_map: dict = None, responses_handling_map: dict = None, initial_requests_handling_map: dict = None, periodic_requests_handling_map: dict = None, api_secret: str = None, api_key: str = None, observer_for_authenticated: Callable = None, pushover_notifier: PushoverNotifier = None, typed_channels: List[str] = None, websocket_uri: str = None, raw_frames_observer: Callable = None, latency_observer: Callable = None, request_timeout: float = 10.0, standby_connections: int = 0, reconnect_min_delay: float = 0.1, reconnect_max_delay: float = 30.0, connect_timeout: float = 10.0):
         self.api_secret = api_secret.encode() if api_key else None
         self.api_key = api_key
         self._next_id = 1
@@ -33,13 +55,35 @@ class FtxApiClient(object):
         self.periodic_requests_handling_map = periodic_requests_handling_map
         self.periodic_calls = []
         self.initial_requests_list = []
-        self.initializing = False
-        self.initialized = False
+        self.initializing_event = asyncio.Event()  # Set when initial requests should be (re)sent
+        self.initialized_event = asyncio.Event()  # Set when all the initial requests have been handled
+        self.websocket_connected_event = asyncio.Event()  # Set when the websocket is open
         self.prevent_pushover_notifications_regarding_disconnected_websocket = False
         self.last_websocket_connection_exception_pushover_message = None
-        self.requests_queue = Queue()
-        self.events_and_responses_queue = Queue()
+        self.requests_queue = asyncio.Queue()
+        self.frame_decoder = FrameDecoder(typed_channels)  # e.g. typed_channels=["ticker"] -> event["data"].bid
+        self.raw_frames_observer = raw_frames_observer  # Called with every received frame and its receive time (must not block!)
+        self.latency_observer = latency_observer  # Called with the timestamps of every sent request that carried them (see latency.py)
+        self.requests_waiting_for_authentication = deque()
+        self.pending_requests = {}  # id -> (future, timeout handle) of the awaited requests (see request)
+        self.request_timeout = request_timeout  # Default seconds to wait for a response of an awaited request
+        self.loop = None
+        self.loop_thread_id = None
+        self.scheduler = None  # TimerScheduler of the loop (the periodic requests)
         self.websocket = None
+        self.websocket_uri = websocket_uri  # Overrides MARKET_URI / USER_URI (e.g. a local stand-in server)
+        # Hot standby websockets (logged in and subscribed) - on disconnection one of them is promoted instantly. Note! The
+        # events delivered between the disconnection and the promotion are lost (fills / orders: reconcile over REST)
+        self.standby_connections = standby_connections
+        self.standbys = deque()  # StandbyWebsocket
+        self.standbys_changed = asyncio.Event()
+        self.reconnect_min_delay = reconnect_min_delay  # Exponential backoff (with jitter) of the failing reconnections
+        self.reconnect_max_delay = reconnect_max_delay
+        self.reconnect_attempts = 0  # Connections in a row without any message received
+        self.connect_timeout = connect_timeout
+        self.disconnected_time = None  # loop.time() the websocket has been found disconnected (blind since then)
+        self.blind_time = LatencyHistogram()  # ns from a disconnection to the first message of the next connection
+        self.connection_stats = {"connects": 0, "connect_failures": 0, "failovers": 0}
         self.client_type = client_type
         self.debug = debug
         self._authenticated = False
@@ -65,21 +109,11 @@ class FtxApiClient(object):
     def __exit__(self):
         self.logger.info("Cleanup...")
         for periodic_call in self.periodic_calls:
-            periodic_call.stop()
+            periodic_call.cancel()
 
     @staticmethod
     def setup_logger(logger, log_file):
-        logger.setLevel(logging.DEBUG)
-        fh = logging.FileHandler(log_file, mode="w")
-        fh.setLevel(logging.DEBUG)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        ch.setFormatter(console_formatter)
-        fh.setFormatter(file_formatter)
-        logger.addHandler(ch)
-        logger.addHandler(fh)
+        async_logging.setup_logger(logger, log_file)
 
     @property
     def authenticated(self):
@@ -90,6 +124,9 @@ class FtxApiClient(object):
         self._authenticated = value
         if self._authenticated:
             self.initializing = True
+            # Give back the requests which have been held until authentication
+            while self.requests_waiting_for_authentication:
+                self.requests_queue.put_nowait(self.requests_waiting_for_authentication.popleft())
         else:
             self.initialized = False
             if self.initial_requests_list:
@@ -101,7 +138,42 @@ class FtxApiClient(object):
             # Supporting only normal (not async (coroutines)) callbacks
             callback(self._authenticated)
 
-    def pushover_notify(self, message, priority=2):
+    @property
+    def initializing(self):
+        return self.initializing_event.is_set()
+
+    @initializing.setter
+    def initializing(self, value):
+        if value:
+            self.initializing_event.set()
+        else:
+            self.initializing_event.clear()
+
+    @property
+    def initialized(self):
+        return self.initialized_event.is_set()
+
+    @initialized.setter
+    def initialized(self, value):
+        if value:
+            self.initialized_event.set()
+        else:
+            self.initialized_event.clear()
+
+    def update_initialized(self):
+        '''
+        Check if all initial methods are already initialized (the responses already handled)
+        '''
+        if not self.initialized and not self.initializing and (self.authenticated or not self.requires_login()):
+            self.initialized = all(method_dict["initialized"] for method_dict in self.initial_requests_list)
+
+    def requires_login(self):
+        '''
+        Only a USER client with an API key logs in - otherwise it's initialized once connected (as without any initial requests)
+        '''
+        return self.client_type == self.USER and bool(self.api_key)
+
+    def pushover_notify(self, message, priority=0):
         if self.pushover_notifier:
             try:
                 message = self.logger.name + ": " + message
@@ -112,10 +184,9 @@ class FtxApiClient(object):
     def register_observer_for_authenticated(self, callback):
         self._authenticated_observers.append(callback)
 
-    def authenticate(self):
-        self.logger.info("Authenticating using the API key: {}...".format(self.api_key))
+    def login_request(self):
         ts = int(time.time() * 1000)
-        self.send(request={
+        return {
             "op": "login",
             "args": {
                 "key": self.api_key,
@@ -123,7 +194,11 @@ class FtxApiClient(object):
                     self.api_secret, f'{ts}websocket_login'.encode(), 'sha256').hexdigest(),
                 "time": ts
             }
-        })
+        }
+
+    def authenticate(self):
+        self.logger.info("Authenticating using the API key: {}...".format(self.api_key))
+        self.send(request=self.login_request())
         # Note! There is no confirmation response!
         self.logger.info("Assuming authentication success (Note! There is never any confirmation)!")
         self.authenticated = True
@@ -169,18 +244,14 @@ class FtxApiClient(object):
         if self.periodic_requests_handling_map:
             for method in self.periodic_requests_handling_map.values():
                 try:
-                    periodic_call = PeriodicNormal(5, method)
-                    self.periodic_calls.append(periodic_call)
-                    periodic_call.start()
+                    self.periodic_calls.append(self.scheduler.call_periodic(5, method))
                 except Exception as e:
                     e.args = ("Exception during periodic function execution: {}. ".format(method) + str(e),)
                     raise
 
     def start_periodic_ping_requests(self):
         try:
-            periodic_call = PeriodicNormal(15, self.ping)
-            self.periodic_calls.append(periodic_call)
-            periodic_call.start()
+            self.periodic_calls.append(self.scheduler.call_periodic(15, self.ping, jitter=1.0))  # Jitter - spread the pings of many clients
         except Exception as e:
             e.args = ("Exception during periodic ping execution. " + str(e),)
             raise
@@ -193,8 +264,73 @@ class FtxApiClient(object):
     def current_id(self):
         return self._next_id
 
-    def send(self, request: dict):
-        self.requests_queue.put(request)
+    def send(self, request: dict, timestamps: dict = None, future: asyncio.Future = None):
+        '''
+        Thread safe. Requests sent from foreign threads are handed over to the loop.
+        timestamps - latency trace of the signal the request originates from (see latency.py), stamped on queuing and sending.
+        future - of an awaited request (see request), the request is dropped instead of sent once it's done
+        '''
+        if timestamps is not None:
+            stamp(timestamps, "order_queued")
+        if threading.get_ident() == self.loop_thread_id:
+            self.requests_queue.put_nowait((request, timestamps, future))
+        else:
+            self.loop.call_soon_threadsafe(self.requests_queue.put_nowait, (request, timestamps, future))
+
+    async def request(self, request: dict, timeout: float = None, timestamps: dict = None):
+        '''
+        Sends the request and waits for its response, correlated by "id" (assigned if missing), so any number of
+        requests (also of the same kind) can be in flight at once. To be called on the client's loop.
+        Raises asyncio.TimeoutError after timeout (default: request_timeout), ConnectionError when the websocket
+        disconnects before the response and Exception for an error response.
+        '''
+        request_id = request.setdefault("id", self.next_id())
+        if request_id in self.pending_requests:
+            raise Exception("Request with id: {} is already pending!".format(request_id))
+        future = self.loop.create_future()
+        self.pending_requests[request_id] = (future, self.loop.call_later(timeout if timeout else self.request_timeout, self.expire_request, request_id))
+        self.send(request, timestamps, future)
+        try:
+            return await future
+        finally:
+            pending = self.pending_requests.pop(request_id, None)  # Still there if the caller has been cancelled
+            if pending:
+                pending[1].cancel()
+
+    def resolve_request(self, response: dict):
+        '''
+        Returns True if the response has been awaited (see request)
+        '''
+        pending = self.pending_requests.pop(response.get("id"), None)
+        if not pending:
+            return False
+        future, timeout_handle = pending
+        timeout_handle.cancel()
+        if not future.done():
+            if response["type"] == "error":
+                future.set_exception(Exception("Error received: {}".format(response)))
+            else:
+                future.set_result(response)
+        return True
+
+    def expire_request(self, request_id):
+        pending = self.pending_requests.pop(request_id, None)
+        if pending and not pending[0].done():
+            pending[0].set_exception(asyncio.TimeoutError("No response for request with id: {}".format(request_id)))
+
+    def fail_pending_requests(self, reason: str):
+        '''
+        Fails all the awaited requests at once (e.g. on disconnection - their responses will never come)
+        '''
+        if not self.pending_requests:
+            return
+        self.logger.error("Failing {} pending request(s): {}".format(len(self.pending_requests), reason))
+        pending_requests = self.pending_requests
+        self.pending_requests = {}
+        for request_id, (future, timeout_handle) in pending_requests.items():
+            timeout_handle.cancel()
+            if not future.done():
+                future.set_exception(ConnectionError("{} (request with id: {})".format(reason, request_id)))
 
     # def build_message(self, method: str, params: dict = None, **kwargs):
     #     message = {
@@ -216,138 +352,141 @@ class FtxApiClient(object):
     #
     #     return message
 
-    async def dispatch(self):
-        while True:
-            await asyncio.sleep(0)  # This line is VERY important: In the case of trying to concurrently run two looping Tasks (here handle_requests() and handle_events_and_responses()), unless the Task has an internal await expression, it will get stuck in the while loop, effectively blocking other tasks from running (much like a normal while loop). However, as soon the Tasks have to (a)wait, they run concurrently without an issue. Check this: https://stackoverflow.com/questions/29269370/how-to-properly-create-and-run-concurrent-tasks-using-pythons-asyncio-module
-            event_or_response = await self.get_event_or_response()
-            try:
-                if event_or_response["type"] == "subscribed":
-                    self.channels_handling_map[event_or_response["type"]](event_or_response)
-                else:
-                    self.responses_handling_map[event_or_response["type"]](event_or_response)
-            except Exception as e:
-                if event_or_response["type"] == "subscribed":
-                    message = "Exception during event handling: {}".format(repr(e))
-                    self.logger.exception(message)
-                    self.logger.error("Event that failed: {}".format(event_or_response))
-                else:
-                    # Check if that's been a response for one of the initial requests
-                    for method_dict in self.initial_requests_list:
-                        if method_dict["api_method"] == event_or_response["type"]:
-                            self.initializing = True
-                            break
-                    message = "Exception during response handling: {}".format(repr(e))
-                    self.logger.exception(message)
-                    self.logger.error("Response that failed: {}".format(event_or_response))
-                self.pushover_notify(message)
+    def dispatch(self, event_or_response: dict):
+        '''
+        Called directly from the receiving loop, so every received message reaches its handler within a single wakeup.
+        '''
+        try:
+            if "channel" in event_or_response:
+                channel = event_or_response["channel"] + "." + event_or_response["market"] if "market" in event_or_response else event_or_response["channel"]
+                self.channels_handling_map[channel](event_or_response)
+            else:
+                self.responses_handling_map[event_or_response["type"]](event_or_response)
+        except Exception as e:
+            if "channel" in event_or_response:
+                message = "Exception during event handling: {}".format(repr(e))
+                self.logger.exception(message)
+                self.logger.error("Event that failed: {}".format(event_or_response))
             else:
-                if "type" in event_or_response:
-                    # Mark the method as initialized in self.initial_requests_list
-                    for method_dict in self.initial_requests_list:
-                        if method_dict["api_method"] == event_or_response["type"]:
-                            method_dict["initialized"] = True
+                # Check if that's been a response for one of the initial requests
+                for method_dict in self.initial_requests_list:
+                    if method_dict["api_method"] == event_or_response["type"]:
+                        self.initializing = True
+                        break
+                message = "Exception during response handling: {}".format(repr(e))
+                self.logger.exception(message)
+                self.logger.error("Response that failed: {}".format(event_or_response))
+            self.pushover_notify(message)
+        else:
+            if "type" in event_or_response and "channel" not in event_or_response:
+                # Mark the method as initialized in self.initial_requests_list
+                for method_dict in self.initial_requests_list:
+                    if method_dict["api_method"] == event_or_response["type"]:
+                        method_dict["initialized"] = True
+                self.update_initialized()
 
     async def send_initial_requests(self):
         '''
         Initial requests are sent on every websocket disconnection event.
         '''
         while True:
-            await asyncio.sleep(0)  # This line is VERY important: In the case of trying to concurrently run two looping Tasks (here handle_requests() and handle_events_and_responses()), unless the Task has an internal await expression, it will get stuck in the while loop, effectively blocking other tasks from running (much like a normal while loop). However, as soon the Tasks have to (a)wait, they run concurrently without an issue. Check this: https://stackoverflow.com/questions/29269370/how-to-properly-create-and-run-concurrent-tasks-using-pythons-asyncio-module
+            await self.initializing_event.wait()
             # Send initial requests
-            if self.initializing:
-                try:
-                    for method_dict in self.initial_requests_list:
-                        if not method_dict["initialized"]:
-                            method_dict["method"]()
-                except Exception as e:
-                    message = "Exception during initial requests sending: {}".format(repr(e))
-                    self.logger.exception(message)
-                    self.pushover_notify(message)
-                    await asyncio.sleep(1)
-                else:
-                    self.initializing = False
-            elif not self.initialized:
-                # Check if all initial methods are already initialized (the responses already handled)
-                _initialized = True
+            try:
                 for method_dict in self.initial_requests_list:
-                    _initialized = _initialized and method_dict["initialized"]
-                self.initialized = _initialized
+                    if not method_dict["initialized"]:
+                        method_dict["method"]()
+            except Exception as e:
+                message = "Exception during initial requests sending: {}".format(repr(e))
+                self.logger.exception(message)
+                self.pushover_notify(message)
+                await asyncio.sleep(1)
+            else:
+                self.initializing = False
+                # Nothing to wait for if there are no initial requests (or all of them are already handled)
+                self.update_initialized()
 
     async def handle_requests(self):
         '''
         Main loop handling all queued requests
         '''
         while True:
-            await asyncio.sleep(0)  # This line is VERY important: In the case of trying to concurrently run two looping Tasks (here handle_requests() and handle_events_and_responses()), unless the Task has an internal await expression, it will get stuck in the while loop, effectively blocking other tasks from running (much like a normal while loop). However, as soon the Tasks have to (a)wait, they run concurrently without an issue. Check this: https://stackoverflow.com/questions/29269370/how-to-properly-create-and-run-concurrent-tasks-using-pythons-asyncio-module
-            if self.websocket and self.websocket.open:
-                try:
-                    request = self.requests_queue.get_nowait()
-                except (Empty, BrokenPipeError):
-                    pass
-                else:
-                    # Check if request requires authentication
-                    if not self.authenticated and request["op"] not in ["ping", "login", "subscribe"]:
-                        # Put it back to the queue
-                        self.requests_queue.put(request)
-                        continue
-
-                    self.logger.info("sending request: {}".format(request))
-                    try:
-                        await self.websocket.send(json.dumps(request))
-                    except (websockets.ConnectionClosed, websockets.ConnectionClosedOK, websockets.ConnectionClosedError, socket.gaierror, OSError) as e:
-                        self.logger.error("Websocket NOT connected. Request with id: {} not sent! Putting it back to queue.".format(request["id"]))
-                        self.requests_queue.put(request)
-                        await asyncio.sleep(1)
-                    except Exception as e:
-                        message = "Exception during sending request with id: {}. Putting it back to queue. Exception: {}".format(request["id"], repr(e))
-                        self.logger.exception(message)
-                        self.requests_queue.put(request)
-                        self.pushover_notify(message)
-                        await asyncio.sleep(1)
-
-    async def get_event_or_response(self):
-        while True:
-            await asyncio.sleep(0)  # This line is VERY important: In the case of trying to concurrently run two looping Tasks (here handle_requests() and handle_events_and_responses()), unless the Task has an internal await expression, it will get stuck in the while loop, effectively blocking other tasks from running (much like a normal while loop). However, as soon the Tasks have to (a)wait, they run concurrently without an issue. Check this: https://stackoverflow.com/questions/29269370/how-to-properly-create-and-run-concurrent-tasks-using-pythons-asyncio-module
-            try:
-                event_or_response = self.events_and_responses_queue.get_nowait()
-            except (Empty, BrokenPipeError):
+            await self.websocket_connected_event.wait()
+            queued_request = await self.requests_queue.get()
+            request, timestamps, future = queued_request
+            if future is not None and future.done():
+                continue  # Timed out, cancelled or failed on disconnection meanwhile - never send it late
+            # Check if request requires authentication
+            if not self.authenticated and request["op"] not in ["ping", "login", "subscribe", "unsubscribe"]:
+                # Hold it until authenticated (see authenticated setter)
+                self.requests_waiting_for_authentication.append(queued_request)
                 continue
-            else:
-                return event_or_response
 
-    def get_event_or_response_no_wait(self):
-        try:
-            event_or_response = self.events_and_responses_queue.get_nowait()
-        except (Empty, BrokenPipeError):
-            return None
-        else:
-            return event_or_response
+            self.logger.info("sending request: %s", request)
+            try:
+                await self.websocket.send(json_codec.dumps(request))
+            except (websockets.ConnectionClosed, websockets.ConnectionClosedOK, websockets.ConnectionClosedError, socket.gaierror, OSError) as e:
+                if future is not None:
+                    self.logger.error("Websocket NOT connected. Awaited request with id: {} not sent!".format(request.get("id")))
+                    self.fail_pending_requests("Websocket disconnected: {}".format(repr(e)))
+                else:
+                    self.logger.error("Websocket NOT connected. Request with id: {} not sent! Putting it back to queue.".format(request.get("id")))
+                    self.requests_queue.put_nowait(queued_request)
+                await asyncio.sleep(1)
+            except Exception as e:
+                if future is not None:
+                    self.logger.exception("Exception during sending awaited request with id: {}. Exception: {}".format(request.get("id"), repr(e)))
+                    self.resolve_request({"id": request.get("id"), "type": "error", "msg": repr(e)})
+                    continue
+                message = "Exception during sending request with id: {}. Putting it back to queue. Exception: {}".format(request.get("id"), repr(e))
+                self.logger.exception(message)
+                self.requests_queue.put_nowait(queued_request)
+                self.pushover_notify(message)
+                await asyncio.sleep(1)
+            else:
+                if timestamps is not None:
+                    stamp(timestamps, "websocket_sent")
+                    if self.latency_observer:
+                        self.latency_observer(timestamps)
 
     async def handle_events_and_responses(self):
         '''
         Main loop handling all queued events or responses
         '''
         while True:
-            await asyncio.sleep(0)
             message = None
             try:
                 if not self.websocket or not self.websocket.open:
+                    self.websocket_connected_event.clear()
                     self.authenticated = False
                     if self.websocket and not self.websocket.open:
+                        if self.disconnected_time is None:
+                            self.disconnected_time = self.loop.time()
+                        self.fail_pending_requests("Websocket disconnected")
                         msg = "Websocket NOT connected. Trying to reconnect..."
                         self.logger.error(msg)
                         if not self.prevent_pushover_notifications_regarding_disconnected_websocket:
                             self.pushover_notify(msg)
                             self.prevent_pushover_notifications_regarding_disconnected_websocket = True
-                    await self.websocket_connect()
+                    if not await self.promote_standby():
+                        await asyncio.sleep(self.backoff_delay(self.reconnect_attempts))
+                        self.reconnect_attempts += 1
+                        await self.websocket_connect()
+                    continue  # Connected or not
                 message = await self.websocket.recv()
-                event_or_response = await self.parse_message(json.loads(message))
+                if self.reconnect_attempts or self.disconnected_time is not None:
+                    self.connection_recovered()
+                if self.raw_frames_observer:
+                    self.raw_frames_observer(message, time.time())
+                event_or_response = await self.parse_message(self.frame_decoder.decode(message))
                 if event_or_response:
-                    self.events_and_responses_queue.put(event_or_response)
+                    self.dispatch(event_or_response)
             except (websockets.ConnectionClosed, websockets.ConnectionClosedOK, websockets.ConnectionClosedError,
                     socket.gaierror, OSError) as e:
                 self.logger.error(repr(e))
-                await asyncio.sleep(1)
+                if self.disconnected_time is None:
+                    self.disconnected_time = self.loop.time()
+                self.fail_pending_requests("Websocket disconnected: {}".format(repr(e)))  # Without waiting for the reconnection
             except Exception as e:
                 msg = "Exception during received message parsing: {}".format(repr(e))
                 self.logger.exception(msg)
@@ -356,12 +495,152 @@ class FtxApiClient(object):
                 self.pushover_notify(msg)
                 await asyncio.sleep(1)
 
+    def backoff_delay(self, attempts: int):
+        '''
+        Exponential backoff with jitter (half of the delay is random): 0 for the first attempt, then ~min_delay doubling
+        up to max_delay - the clients don't hammer a failing server and don't reconnect in lockstep
+        '''
+        if not attempts:
+            return 0.0
+        delay = min(self.reconnect_max_delay, self.reconnect_min_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def connection_recovered(self):
+        '''
+        The first message of a new connection
+        '''
+        self.reconnect_attempts = 0
+        if self.disconnected_time is not None:
+            blind_time = self.loop.time() - self.disconnected_time
+            self.disconnected_time = None
+            self.blind_time.record(int(blind_time * 1e9))
+            self.logger.info("Receiving again after {:.3f} s blind time".format(blind_time))
+
+    def connection_report(self):
+        '''
+        Connection stats and the blind time summary (ms)
+        '''
+        return dict(self.connection_stats, standbys=len(self.standbys), blind_time=self.blind_time.summary(unit=1000000))
+
+    async def promote_standby(self):
+        '''
+        Failover: the first open standby becomes the websocket (already logged in and subscribed)
+        '''
+        while self.standbys:
+            standby = self.standbys.popleft()
+            self.standbys_changed.set()  # Replace it
+            standby.reader.cancel()
+            await asyncio.gather(standby.reader, return_exceptions=True)  # Only one recv at a time
+            if standby.websocket.open:
+                break
+        else:
+            return False
+        self.websocket = standby.websocket
+        self.connection_stats["failovers"] += 1
+        self.logger.warning("Failover to a standby websocket ({} discarded messages, {} standby left)".format(standby.discarded, len(self.standbys)))
+        self.prevent_pushover_notifications_regarding_disconnected_websocket = False
+        self.websocket_connected_event.set()
+        if self.requires_login():
+            self.authenticated = True  # Logged in already
+        else:
+            self.update_initialized()
+        for channel in self.channels:
+            if channel.startswith("orderbook"):
+                self.resubscribe_channel(channel)  # A fresh partial (the standby's updates have been discarded)
+        return True
+
+    async def open_standby(self):
+        websocket = await asyncio.wait_for(websockets.connect(self.get_websocket_uri()), self.connect_timeout)
+        try:
+            if self.requires_login():
+                await websocket.send(json_codec.dumps(self.login_request()))
+            for channel in self.channels:
+                await websocket.send(json_codec.dumps(self.channel_request("subscribe", channel)))
+        except Exception:
+            await websocket.close()
+            raise
+        standby = StandbyWebsocket(websocket)
+        standby.reader = asyncio.ensure_future(self.read_standby(standby))
+        return standby
+
+    async def read_standby(self, standby: StandbyWebsocket):
+        try:
+            while True:
+                await standby.websocket.recv()
+                standby.discarded += 1
+        except (websockets.ConnectionClosed, OSError) as e:
+            self.logger.warning("Standby websocket disconnected: {}".format(repr(e)))
+            if standby in self.standbys:
+                self.standbys.remove(standby)
+                self.standbys_changed.set()
+
+    async def maintain_standbys(self):
+        '''
+        Keeps standby_connections standby websockets open (opened after the first connection)
+        '''
+        await self.websocket_connected_event.wait()
+        attempts = 0
+        while True:
+            if len(self.standbys) >= self.standby_connections:
+                self.standbys_changed.clear()
+                await self.standbys_changed.wait()
+                continue
+            try:
+                standby = await self.open_standby()
+            except Exception as e:
+                attempts += 1
+                delay = self.backoff_delay(attempts)
+                self.logger.error("Cannot open a standby websocket: {}. Next attempt in {:.1f} s".format(repr(e), delay))
+                await asyncio.sleep(delay)
+            else:
+                attempts = 0
+                self.standbys.append(standby)
+                self.logger.info("Standby websocket ready ({} of {})".format(len(self.standbys), self.standby_connections))
+
+    def ping_standbys(self):
+        for standby in self.standbys:
+            asyncio.ensure_future(self.send_to_standby(standby, {"op": "ping"}))
+
+    async def send_to_standby(self, standby: StandbyWebsocket, request: dict):
+        try:
+            await standby.websocket.send(json_codec.dumps(request))
+        except (websockets.ConnectionClosed, OSError):
+            pass  # See read_standby
+
+    @staticmethod
+    def channel_request(op: str, channel: str):
+        '''
+        Channels are named "<channel>.<market>" (e.g. "orderbook.BTC/USDT") or just "<channel>" for the ones without
+        market (e.g. "fills"). FTX expects a separate (un)subscribe request per channel and market.
+        '''
+        channel_name, _, market = channel.partition(".")
+        request = {
+            "op": op,
+            "channel": channel_name
+        }
+        if market:
+            request["market"] = market
+        return request
+
     def subscribe(self):
         self.logger.info("Subscribing channels: {}...".format(self.channels))
-        self.send(request={
-            "op": "subscribe",
-            "channels": self.channels
-        })
+        for channel in self.channels:
+            self.send(request=self.channel_request("subscribe", channel))
+
+    def subscribe_channel(self, channel: str):
+        self.logger.info("Subscribing channel: {}...".format(channel))
+        self.send(request=self.channel_request("subscribe", channel))
+
+    def unsubscribe_channel(self, channel: str):
+        self.logger.info("Unsubscribing channel: {}...".format(channel))
+        self.send(request=self.channel_request("unsubscribe", channel))
+
+    def resubscribe_channel(self, channel: str):
+        '''
+        E.g. to get a fresh partial of the orderbook channel
+        '''
+        self.unsubscribe_channel(channel)
+        self.subscribe_channel(channel)
 
     def ping(self):
         '''
@@ -372,23 +651,30 @@ class FtxApiClient(object):
                 "op": "ping"
             }
         )
+        if self.standbys:
+            self.ping_standbys()
 
     async def parse_message(self, data: dict):
+        if self.pending_requests and "id" in data and self.resolve_request(data):
+            return None  # Handed over to the awaiting request
         if data["type"] == "pong":
             self.logger.info("Heartbeat pong")
             return None
-        elif data["type"] == "subscribed":
-            res = data.get("result")
-            if res:
-                return res
-            else:
-                if data["code"] == 0:
-                    self.logger.info("Subscription success!")
-                    return None
-                else:
-                    await self.websocket_disconnect()  # For simpler flow
-                    self.authenticated = False
-                    raise Exception(f"Error when subscribing: {json.dumps(data)}")
+        elif data["type"] in ("subscribed", "unsubscribed"):
+            self.logger.info("Channel: {} {} for market: {}".format(data.get("channel"), data["type"], data.get("market")))
+            return None
+        elif data["type"] == "error":
+            if data.get("msg", "").startswith(self.SUBSCRIPTION_ERRORS):
+                # E.g. "Already subscribed" after a resubscription - nothing to retry, keep receiving
+                self.logger.warning("Subscription error received: {}".format(data))
+                return None
+            raise Exception(f"Error received: {json.dumps(data)}")
+        elif data["type"] == "info":
+            self.logger.info("Info received: {}".format(data))
+            if data.get("code") == 20001:
+                # Server restart - reconnect (and resubscribe)
+                await self.websocket_disconnect()
+            return None
         # elif data["type"] == "public/auth":
         #     if data["code"] == 0:
         #         self.logger.info("Authentication success!")
@@ -402,14 +688,19 @@ class FtxApiClient(object):
 
         return data
 
-    async def websocket_connect(self):
-        websocket_uri = self.MARKET_URI if self.client_type == self.MARKET else self.USER_URI
+    def get_websocket_uri(self):
         # if self.debug:
-        #     websocket_uri = self.SANDBOX_MARKET_URI if self.client_type == self.MARKET else self.SANDBOX_USER_URI
+        #     return self.SANDBOX_MARKET_URI if self.client_type == self.MARKET else self.SANDBOX_USER_URI
+        return self.websocket_uri or (self.MARKET_URI if self.client_type == self.MARKET else self.USER_URI)
+
+    async def websocket_connect(self):
+        websocket_uri = self.get_websocket_uri()
         self.logger.info("Connecting to websocket: {}...".format(websocket_uri))
+        self.connection_stats["connects"] += 1
         try:
-            self.websocket = await asyncio.wait_for(websockets.connect(websocket_uri), 10)
+            self.websocket = await asyncio.wait_for(websockets.connect(websocket_uri), self.connect_timeout)
         except Exception as e:
+            self.connection_stats["connect_failures"] += 1
             self.logger.exception("Websocket connection exception: {}".format(repr(e)))
             if not self.last_websocket_connection_exception_pushover_message or (self.last_websocket_connection_exception_pushover_message and self.last_websocket_connection_exception_pushover_message != repr(e)):
                 self.pushover_notify("Websocket connection exception: {}".format(repr(e)))
@@ -420,9 +711,11 @@ class FtxApiClient(object):
         self.pushover_notify("Connected to websocket!", 1)
         self.prevent_pushover_notifications_regarding_disconnected_websocket = False
         self.last_websocket_connection_exception_pushover_message = None
-        await asyncio.sleep(1)  # As requested by crypto.com API
-        if self.client_type == self.USER and self.api_key:
+        self.websocket_connected_event.set()
+        if self.requires_login():
             self.authenticate()
+        else:
+            self.update_initialized()
         if self.channels:
             self.subscribe()
 
@@ -437,10 +730,14 @@ class FtxApiClient(object):
             self.logger.exception("No running asyncio loop detected! Terminating CryptoComApiClient!")
             raise Exception("No running asyncio loop detected! Terminating CryptoComApiClient!")
         else:
+            self.loop = asyncio.get_running_loop()
+            self.loop_thread_id = threading.get_ident()
+            self.scheduler = TimerScheduler.get(self.loop)
             asyncio.create_task(self.handle_requests())
             asyncio.create_task(self.handle_events_and_responses())
             asyncio.create_task(self.send_initial_requests())
-            asyncio.create_task(self.dispatch())
+            if self.standby_connections:
+                asyncio.create_task(self.maintain_standbys())
 
     # async def __aenter__(self):
     #     await self.websocket_connect()
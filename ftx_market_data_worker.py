@@ -1,15 +1,26 @@
 import os
+import math
 import sys
 import asyncio
 import logging
+import async_logging
+from typing import List
 from ftx_lib import FtxApiClient
+from feed_arbiter import FeedArbiter
+from fx_rates import FxRateService
+from order_book import OrderBooks
+from market_data_recorder import MarketDataRecorder
+from ohlcv import OhlcvAggregator
+from signal_engine import SignalEngine, create_strategy
 from pid import PidFile
+from periodic import TimerScheduler
 from pushover_notifier import PushoverNotifier
+from shared_market_data import SharedMarketData
 
 
 class FtxMarketDataWorker(object):
 
-    def __init__(self, shared_market_data: dict, debug: bool = True, log_file: str = None, pushover_notifier: PushoverNotifier = None):
+    def __init__(self, shared_market_data: SharedMarketData, debug: bool = True, log_file: str = None, pushover_notifier: PushoverNotifier = None, ticker_markets: List[str] = None, orderbook_markets: List[str] = None, websocket_uri: str = None, capture_directory: str = None, fx_rate_providers: List[str] = None, fx_pairs: List[str] = None, standby_connections: int = 0, market_data_feeds: int = 1, bar_markets: List[str] = None, bar_timeframes: List[str] = None, bar_capacity: int = 1000, strategies: List[dict] = None, signal_channels: dict = None):
         print("Initializing ftx market data worker...")
         self.debug = debug
         self.log_file = log_file if log_file else "./logs/ftx_market_data_worker.log"
@@ -18,68 +29,174 @@ class FtxMarketDataWorker(object):
         self.shared_market_data = shared_market_data
         self.ftx_api_client = None
         self.pushover_notifier = pushover_notifier
+        self.websocket_uri = websocket_uri
+        self.ticker_markets = ticker_markets if ticker_markets else []
+        self.ticker_market_slots = {}  # market -> slot in shared_market_data
+        self.orderbook_markets = orderbook_markets if orderbook_markets else []
+        self.order_books = OrderBooks(resubscribe=self.resubscribe_orderbook, logger=self.logger)
+        self.capture_directory = capture_directory  # Optional capture of all the received frames (see market_data_recorder)
+        self.recorder = None
+        self.fx_rate_providers = fx_rate_providers if fx_rate_providers else []  # See fx_rates.FxRateService
+        self.fx_pairs = fx_pairs if fx_pairs else ["EUR/USD"]
+        self.fx_rates = None
+        self.standby_connections = standby_connections  # Hot standby websockets (see FtxApiClient)
+        # Redundant feeds: the ticker channels subscribed on this many independent connections, every update taken from
+        # the first connection delivering it (see feed_arbiter). The orderbook channels stay on the first connection only
+        # (every connection gets its own partial, the updates are a sequence on top of it)
+        self.market_data_feeds = max(1, market_data_feeds)
+        self.feed_arbiter = FeedArbiter(self.market_data_feeds) if self.market_data_feeds > 1 else None
+        self.feed_clients = []  # Redundant feeds' FtxApiClients (the first feed is ftx_api_client)
+        # OHLCV bars built from the trades channel of these markets (see ohlcv.OhlcvAggregator)
+        self.bar_markets = bar_markets if bar_markets else []
+        self.ohlcv = OhlcvAggregator(self.bar_markets, timeframes=bar_timeframes, capacity=bar_capacity) if self.bar_markets else None
+        # Local signals of the indicator strategies on the bars, sent to the user api workers as the webhook alerts
+        self.signal_engine = None
+        if strategies:
+            if not self.ohlcv:
+                raise Exception("Local strategies need the bars of their markets (bar_markets)!")
+            self.signal_engine = SignalEngine(self.ohlcv, [create_strategy(strategy) for strategy in strategies], signal_channels=signal_channels, logger=self.logger)
+        self.periodic_calls = []
 
     @staticmethod
     def setup_logger(logger, log_file):
-        logger.setLevel(logging.DEBUG)
-        fh = logging.FileHandler(log_file, mode="w")
-        fh.setLevel(logging.DEBUG)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        ch.setFormatter(console_formatter)
-        fh.setFormatter(file_formatter)
-        logger.addHandler(ch)
-        logger.addHandler(fh)
+        async_logging.setup_logger(logger, log_file)
 
-    def pushover_notify(self, message, priority=2):
+    def pushover_notify(self, message, priority=0):
         message = self.logger.name + ": " + message
         self.pushover_notifier.notify(message, priority)
 
-    def handle_channel_event_ticker_BTC_USDT(self, event: dict):
+    def handle_channel_event_ticker(self, event: dict):
         '''
-        "data": [
-          {
-            "h": 1, // Price of the 24h highest trade
-            "v": 10232.26315789, // The total 24h traded volume
-            "a": 173.60263169, // The price of the latest trade, null if there weren't any trades
-            "l": 0.01, // Price of the 24h lowest trade, null if there weren't any trades
-            "b": 0.01, // The current best bid price, null if there aren't any bids
-            "k": 1.12345680, // The current best ask price, null if there aren't any asks
-            "c": -0.44564773, // 24-hour price change, null if there weren't any trades
-            "t": 1587523078844 // update time
-          }
-        ]
+        Single handler for the ticker channel of all the markets (routed by the precomputed market -> slot table)
+        {
+            "channel": "ticker",
+            "market": "BTC/USDT",
+            "type": "update",
+            "data": {
+                "bid": 29100.5,
+                "ask": 29101.0,
+                "bidSize": 0.0412,
+                "askSize": 1.2,
+                "last": 29100.5,    // null if there weren't any trades
+                "time": 1603922220.4351048
+            }
+        }
+        '''
+        try:
+            data = event["data"]  # json_codec typed ticker data
+            last = data.last
+            self.shared_market_data.update(self.ticker_market_slots[event["market"]], data.bid, data.ask, last if last is not None else math.nan, data.time)
+        except Exception as e:
+            raise Exception("Wrong data structure in ticker channel event. Exception: {}".format(repr(e)))
+
+    def handle_channel_event_orderbook(self, event: dict):
+        '''
+        Keeps the local order book up to date (see order_book.OrderBook) and publishes its top of the book
+        '''
+        book = self.order_books.handle_event(event)
+        if book and book.market not in self.ticker_market_slots:  # The ticker is preferred (it has the last price too)
+            best_bid, best_ask = book.best_bid(), book.best_ask()
+            if best_bid and best_ask:
+                self.shared_market_data.update(book.market, bid=best_bid[0], ask=best_ask[0], timestamp=book.time)
+
+    def log_connection_report(self):
+        self.logger.info("Websocket connection report: {}".format(self.ftx_api_client.connection_report()))
+        for feed, ftx_api_client in enumerate(self.feed_clients, 1):
+            self.logger.info("Feed {} websocket connection report: {}".format(feed, ftx_api_client.connection_report()))
+        if self.feed_arbiter:
+            self.logger.info("Feeds report: {}".format(self.feed_arbiter.report()))
+        if self.recorder:
+            self.logger.info("Market data capture: recorded: {}, dropped: {}".format(self.recorder.recorded, self.recorder.dropped))
+
+    def handle_channel_event_trades(self, event: dict):
+        '''
+        Updates the OHLCV bars of the market
+        {
+            "channel": "trades",
+            "market": "BTC/USDT",
+            "type": "update",
+            "data": [{"id": 1, "price": 29100.5, "size": 0.01, "side": "buy", "liquidation": false, "time": "2021-05-01T12:00:01.123456+00:00"}]
+        }
         '''
         try:
-            self.shared_market_data["price_BTC_sell_to_USDT"] = str(event["data"][0]["b"])
-            self.shared_market_data["price_BTC_buy_for_USDT"] = str(event["data"][0]["k"])
+            self.ohlcv.handle_trades(event["market"], event["data"])
         except Exception as e:
-            raise Exception("Wrong data structure in ticker.BTC_USDT channel event. Exception: {}".format(repr(e)))
+            raise Exception("Wrong data structure in trades channel event. Exception: {}".format(repr(e)))
+
+    def resubscribe_orderbook(self, market: str):
+        self.ftx_api_client.resubscribe_channel("orderbook." + market)
+
+    def create_channels_handling_map(self, feed: int = 0):
+        '''
+        Precomputed channel -> handler lookup table for all the configured markets (of the feed - see market_data_feeds).
+        Also makes sure every market has its slot in the shared market data.
+        '''
+        channels_handling_map = {}
+        handle_channel_event_ticker = self.feed_arbiter.handler(feed, self.handle_channel_event_ticker) if self.feed_arbiter else self.handle_channel_event_ticker
+        for market in self.ticker_markets:
+            self.ticker_market_slots[market] = self.shared_market_data.add_market(market)
+            channels_handling_map["ticker." + market] = handle_channel_event_ticker
+        if feed:
+            return channels_handling_map
+        for market in self.orderbook_markets:
+            self.shared_market_data.add_market(market)
+            channels_handling_map["orderbook." + market] = self.handle_channel_event_orderbook
+        for market in self.bar_markets:
+            channels_handling_map["trades." + market] = self.handle_channel_event_trades
+        return channels_handling_map
 
     async def run(self):
+        channels_handling_map = self.create_channels_handling_map()
+        if self.capture_directory:
+            self.recorder = MarketDataRecorder(self.capture_directory, logger=self.logger)
         self.ftx_api_client = FtxApiClient(
             client_type=FtxApiClient.MARKET,
             debug=self.debug,
             logger=self.logger,
             pushover_notifier=self.pushover_notifier,
-            channels=[
-                # "ticker.BTC_USDT"
-            ],
-            channels_handling_map={
-                # "ticker.BTC_USDT": self.handle_channel_event_ticker_BTC_USDT
-            }
+            websocket_uri=self.websocket_uri,
+            channels=list(channels_handling_map.keys()),
+            channels_handling_map=channels_handling_map,
+            typed_channels=["ticker", "orderbook", "trades"],
+            raw_frames_observer=self.recorder.record if self.recorder else None,
+            standby_connections=self.standby_connections
         )
+        for feed in range(1, self.market_data_feeds):
+            feed_channels_handling_map = self.create_channels_handling_map(feed)
+            self.feed_clients.append(FtxApiClient(
+                client_type=FtxApiClient.MARKET,
+                debug=self.debug,
+                logger=self.logger,
+                pushover_notifier=self.pushover_notifier,
+                websocket_uri=self.websocket_uri,
+                channels=list(feed_channels_handling_map.keys()),
+                channels_handling_map=feed_channels_handling_map,
+                typed_channels=["ticker"],
+                standby_connections=self.standby_connections
+            ))
+        self.periodic_calls.append(TimerScheduler.get().call_periodic(600, self.log_connection_report))
+        if self.fx_rate_providers:
+            # Note! This is not a critical data - we can live without it
+            try:
+                for pair in self.fx_pairs:
+                    self.shared_market_data.add_market(pair)
+                self.fx_rates = FxRateService(self.fx_rate_providers, self.fx_pairs, self.shared_market_data, logger=self.logger)
+                self.periodic_calls.append(TimerScheduler.get().call_periodic(5, self.fx_rates.refresh, first_delay=0))
+            except Exception as e:
+                self.logger.exception("FX rates not available! Exception: {}".format(repr(e)))
         if self.pushover_notifier:
             self.pushover_notify("Started!", 1)
-        while True:
-            # Main response / channel event handling loop
-            await asyncio.sleep(0)  # This line is VERY important: In the case of trying to concurrently run two looping Tasks (here handle_requests() and handle_events_and_responses()), unless the Task has an internal await expression, it will get stuck in the while loop, effectively blocking other tasks from running (much like a normal while loop). However, as soon the Tasks have to (a)wait, they run concurrently without an issue. Check this: https://stackoverflow.com/questions/29269370/how-to-properly-create-and-run-concurrent-tasks-using-pythons-asyncio-module
-            pass
+        # Main response / channel event handling is done by the FtxApiClient tasks - just keep the worker alive
+        await asyncio.Event().wait()
 
     async def cleanup(self):
         self.logger.info("Cleanup before closing worker...")
+        for periodic_call in self.periodic_calls:
+            periodic_call.cancel()
+        if self.fx_rates:
+            await self.fx_rates.close()
+        if self.recorder:
+            self.recorder.close()
 
     # Process execution method
     def run_forever(self):
@@ -93,7 +210,9 @@ class FtxMarketDataWorker(object):
                 pidfile.close(fh=pidfile.fh, cleanup=True)
                 if self.pushover_notifier:
                     self.pushover_notify("Interrupted! Bye bye!")
+                    self.pushover_notifier.flush()
                 self.logger.info("Bye bye!")
+                async_logging.shutdown()
                 try:
                     sys.exit(0)
                 except SystemExit:
@@ -107,5 +226,6 @@ class FtxMarketDataWorker(object):
                 pidfile.close(fh=pidfile.fh, cleanup=True)
                 if self.pushover_notifier:
                     self.pushover_notify("Bye bye!")
+                    self.pushover_notifier.flush()
                 self.logger.info("Bye bye!")
-
+                async_logging.shutdown()
@@ -0,0 +1,172 @@
+'''
+Async FTX REST client (the account state the websocket API doesn't provide: balances, positions, open orders, markets).
+
+    - one persistent (keep-alive) aiohttp connection pool for all the requests
+    - FTX-KEY / FTX-TS / FTX-SIGN authentication: HMAC-SHA256 of "<ts><METHOD></api/path?query><body>" - the keyed HMAC
+      state is precomputed once and copied per request (no key padding / hashing per signature)
+    - FTX-SUBACCOUNT header for subaccounts
+    - concurrent bulk calls (asyncio.gather on the same pool), e.g. get_account_snapshot()
+
+eg. usage (on the worker's loop):
+
+    rest_client = FtxRestClient(api_key, api_secret, subaccount="bot")
+    balances = await rest_client.get_balances()                       # [{"coin": "USDT", "free": 1234.56, ...}, ...]
+    snapshot = await rest_client.get_account_snapshot(["BTC/USDT"])   # {"balances": ..., "positions": ..., "open_orders": ..., "markets": ...}
+    await rest_client.close()
+'''
+
+import hmac
+import time
+import asyncio
+import hashlib
+import logging
+from typing import List
+from urllib.parse import quote, urlencode, urlsplit
+import json_codec
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:
+    aiohttp = None
+
+
+FTX_REST_API_URL = "https://ftx.com/api"
+
+
+class FtxRestClient(object):
+
+    def __init__(self, api_key: str, api_secret: str, subaccount: str = None, base_url: str = FTX_REST_API_URL, timeout: float = 10.0, pool_size: int = 8, logger: logging.Logger = None):
+        if not aiohttp:
+            raise Exception("FtxRestClient requires aiohttp!")
+        self.api_key = api_key
+        self.hmac = hmac.new(api_secret.encode(), digestmod=hashlib.sha256) if api_secret else None  # Keyed state, copied per request
+        self.subaccount = quote(subaccount) if subaccount else None
+        self.base_url = base_url.rstrip("/")
+        self.path_prefix = urlsplit(self.base_url).path  # Signed with the path, e.g. "/api"
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.logger = logger if logger else logging.getLogger("ftx_rest_client")
+        self.session = None
+        self.requests = 0
+        self.errors = 0
+
+    def get_session(self):
+        if not self.session or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool_size, keepalive_timeout=300, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self.session
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    def sign(self, timestamp: str, method: str, path: str, body: str = ""):
+        signature = self.hmac.copy()
+        signature.update((timestamp + method + path + body).encode())
+        return signature.hexdigest()
+
+    def create_headers(self, method: str, path: str, body: str = ""):
+        headers = {"Content-Type": "application/json"} if body else {}
+        if self.hmac:
+            timestamp = str(int(time.time() * 1000))
+            headers["FTX-KEY"] = self.api_key
+            headers["FTX-TS"] = timestamp
+            headers["FTX-SIGN"] = self.sign(timestamp, method, self.path_prefix + path, body)
+            if self.subaccount:
+                headers["FTX-SUBACCOUNT"] = self.subaccount
+        return headers
+
+    async def request(self, method: str, path: str, params: dict = None, body: dict = None):
+        '''
+        Returns the "result" of the response ({"success": true, "result": ...})
+        '''
+        query = urlencode({key: value for key, value in params.items() if value is not None}) if params else ""
+        if query:
+            path += "?" + query
+        data = json_codec.dumps(body) if body is not None else ""
+        headers = self.create_headers(method, path, data)
+        self.requests += 1
+        async with self.get_session().request(method, URL(self.base_url + path, encoded=True), data=data.encode() if data else None, headers=headers) as response:
+            content = await response.read()
+        try:
+            message = json_codec.loads(content)
+        except Exception:
+            message = {"success": False, "error": content[:200]}
+        if response.status != 200 or not message.get("success"):
+            self.errors += 1
+            raise Exception("FTX REST {} {} failed! HTTP status: {}. Error: {}".format(method, path, response.status, message.get("error")))
+        return message.get("result")
+
+    async def get(self, path: str, params: dict = None):
+        return await self.request("GET", path, params=params)
+
+    async def post(self, path: str, body: dict):
+        return await self.request("POST", path, body=body)
+
+    async def delete(self, path: str, body: dict = None):
+        return await self.request("DELETE", path, body=body)
+
+    async def get_account(self):
+        return await self.get("/account")
+
+    async def get_balances(self):
+        return await self.get("/wallet/balances")
+
+    async def get_positions(self):
+        return await self.get("/positions", {"showAvgPrice": "true"})
+
+    async def get_open_orders(self, market: str = None):
+        return await self.get("/orders", {"market": market})
+
+    async def get_markets(self):
+        return await self.get("/markets")
+
+    async def get_market(self, market: str):
+        return await self.get("/markets/" + market)
+
+    async def get_candles(self, market: str, resolution: int, start_time: float = None, end_time: float = None):
+        return await self.get("/markets/{}/candles".format(market), {"resolution": resolution, "start_time": start_time, "end_time": end_time})
+
+    async def place_order(self, market: str, side: str, size: float, price: float = None, type: str = "market", client_id: str = None, reduce_only: bool = False, ioc: bool = False, post_only: bool = False):
+        return await self.post("/orders", {
+            "market": market,
+            "side": side,
+            "price": price,
+            "type": type,
+            "size": size,
+            "reduceOnly": reduce_only,
+            "ioc": ioc,
+            "postOnly": post_only,
+            "clientId": client_id
+        })
+
+    async def cancel_order(self, order_id: int):
+        return await self.delete("/orders/{}".format(order_id))
+
+    async def gather(self, **calls):
+        '''
+        Concurrent calls on the pool: gather(balances=client.get_balances(), ...) -> {"balances": [...], ...}
+        '''
+        results = await asyncio.gather(*calls.values())
+        return dict(zip(calls.keys(), results))
+
+    async def get_account_snapshot(self, markets: List[str] = None):
+        '''
+        Balances, positions, open orders and markets (all of them or the given ones) in one round trip time
+        '''
+        calls = {
+            "balances": self.get_balances(),
+            "positions": self.get_positions(),
+            "open_orders": self.get_open_orders()
+        }
+        if markets:
+            calls.update({"market " + market: self.get_market(market) for market in markets})
+        else:
+            calls["markets"] = self.get_markets()
+        snapshot = await self.gather(**calls)
+        if markets:
+            snapshot["markets"] = [snapshot.pop("market " + market) for market in markets]
+        return snapshot
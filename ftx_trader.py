@@ -8,14 +8,19 @@ import sys
 import getopt
 import traceback
 import ntpath
-import requests
-from pushover_notifier import PushoverNotifier
+import async_logging
+from pushover_notifier import PushoverNotifier, PUSHOVER_API_URL
 from webhook_bot import WebhookBot
 from ftx_user_api_worker import FtxUserApiWorker
+from ftx_user_api_worker_group import FtxUserApiWorkerGroup, shard_accounts
 from ftx_client import FtxClient
+from ftx_rest_client import FTX_REST_API_URL
 from ftx_market_data_worker import FtxMarketDataWorker
+from paper_exchange import create_paper_exchange_server
+from shared_market_data import SharedMarketData
+from signal_transport import SignalChannel
 from multiprocessing import Process, Manager
-from periodic import PeriodicNormal
+from periodic import TimerScheduler
 
 
 pushover_clients = []
@@ -46,17 +51,11 @@ def print_shared_data():
         print("User data collection for user {}: {}".format(ftx_client.ftx_user, shared_user_api_data_collection[ftx_client.ftx_user]))
 
 
-def get_eur_usd_exchange_rate(url):
+def start_periodic_printer(loop):
     '''
-    Note! This is not a critical data - we can live without it
-    {"rates":{"USD":1.2271},"base":"EUR","date":"2020-12-31"}
+    Called on the webhook bot's loop
     '''
-    try:
-        r = requests.get(url, timeout=4)
-        data = r.json()
-        shared_market_data["EUR_USD_exchange_rate"] = str(data["rates"]["USD"])
-    except Exception as e:
-        pass
+    TimerScheduler.get(loop).call_periodic(5, print_shared_data)
 
 
 if __name__ == '__main__':
@@ -78,7 +77,7 @@ if __name__ == '__main__':
         for opt, arg in opts:
             if opt in ("-h", "--help"):
                 print("-r   or   --raspberry                     Use when running on Raspberry Pi!")
-                print("-d   or   --debug                         Ignore api keys definition for FTX. Usefull for debugging with no real transactions.")
+                print("-d   or   --debug                         Paper trading: a local simulated exchange (paper_exchange.py, \"paper_exchange\" config) instead of FTX. API keys are ignored, no real transactions are made.")
                 print("-c   or   --config   <filename>           Use configuration file (in json format)")
                 print("")
                 sys.exit()
@@ -89,7 +88,7 @@ if __name__ == '__main__':
                 print("###################################################################################################")
                 raspberry = True
             elif opt in ("-d",  "--debug"):
-                print("ftx SANDBOX will be used! No real transactions will be made. API keys will be ignored where possible.")
+                print("Paper trading! A local simulated exchange will be used instead of FTX. No real transactions will be made. API keys will be ignored.")
                 debug = True
             elif opt in ("-c", "--config"):
                 if arg:
@@ -117,12 +116,30 @@ if __name__ == '__main__':
 
                 pushover_application_token = configdata["pushover_application_token"]
                 pushover_user_keys = configdata["pushover_user_keys"]
+                pushover_api_url = configdata.get("pushover_api_url", PUSHOVER_API_URL)
+                pushover_send_notifications = configdata.get("pushover_send_notifications", False)
 
                 ftx_users_api_stuff = configdata["ftx_users_api_stuff"]
 
                 exchange_variables = configdata["exchange_variables"]
+                ftx_rest_api_url = configdata.get("ftx_rest_api_url", FTX_REST_API_URL)
+
+                async_logging.configure(**configdata.get("logging", {}))  # Before any logger is set up
+
+                fx_rate_providers = configdata.get("fx_rate_providers") or [configdata["eur_usd_exchange_rate_url"]]
+                fx_pairs = configdata.get("fx_pairs", ["EUR/USD"])
 
-                eur_usd_exchange_rate_url = configdata["eur_usd_exchange_rate_url"]
+                ticker_markets = configdata.get("ticker_markets", ["BTC/USDT"])
+                orderbook_markets = configdata.get("orderbook_markets", [])
+                market_data_capture_directory = configdata.get("market_data_capture_directory")
+                websocket_standby_connections = configdata.get("websocket_standby_connections", 0)
+                market_data_feeds = configdata.get("market_data_feeds", 1)  # Redundant market data connections (first arrival wins)
+                bar_markets = configdata.get("bar_markets", [])  # OHLCV bars from the trades channel
+                bar_timeframes = configdata.get("bar_timeframes", ["1s", "1m", "5m", "1h"])
+                local_strategies = configdata.get("local_strategies", [])  # Indicator strategies on the bars (see signal_engine)
+                webhook_server = configdata.get("webhook_server")  # "aiohttp" (default if installed) or "flask"
+                user_api_processes = configdata.get("user_api_processes")  # Accounts multiplexed on this many processes (None - a process per account)
+                paper_exchange_config = configdata.get("paper_exchange", {})  # The simulated exchange of -d / --debug (see paper_exchange.py)
 
                 if pushover_user_keys.keys() != ftx_users_api_stuff.keys():
                     raise Exception("the user name keys in pushover_user_keys and crypto_com_users_api_stuff dicts must match!")
@@ -132,20 +149,21 @@ if __name__ == '__main__':
                 exit()
 
         for ftx_user, ftx_api_stuff in ftx_users_api_stuff.items():
-            ftx_clients.append(FtxClient(ftx_api_stuff["api_key"], ftx_api_stuff["api_secret"], ftx_user))
+            if debug:
+                ftx_clients.append(FtxClient("paper_" + ftx_user, "paper", ftx_user))  # A paper account per user
+            else:
+                ftx_clients.append(FtxClient(ftx_api_stuff["api_key"], ftx_api_stuff["api_secret"], ftx_user, ftx_api_stuff.get("subaccount")))
 
         # **************************************************************************************************************
         # Shared data definition
         # **************************************************************************************************************
         manager = Manager()
-        shared_market_data = manager.dict({
-            "taker_fee": str(exchange_variables["taker_fee"]),
-            "price_BTC_sell_to_USDT": '0',
-            "fee_BTC_sell_in_USDT": '0',
-            "price_BTC_buy_for_USDT": '0',
-            "fee_BTC_buy_in_BTC": '0',
-            "EUR_USD_exchange_rate": '0'
-        })  # Data shared between processes
+        shared_markets = list(dict.fromkeys(["BTC/USDT", "EUR/USD"] + ticker_markets + orderbook_markets + fx_pairs))
+        shared_market_data = SharedMarketData(
+            markets=shared_markets,
+            max_markets=max(64, len(shared_markets)),
+            taker_fee=exchange_variables["taker_fee"]
+        )  # Market data shared between processes (lock-free shared memory snapshot)
 
         for ftx_client in ftx_clients:
             shared_user_api_data = manager.dict({
@@ -164,34 +182,50 @@ if __name__ == '__main__':
                 "last_transaction_BTC_sell_price_in_USDT": '0'
             })
             shared_user_api_data_collection[ftx_client.ftx_user] = shared_user_api_data
-            buy_sell_requests_queue = manager.Queue()
-            buy_sell_requests_queues_collection[ftx_client.ftx_user] = buy_sell_requests_queue
+            buy_sell_requests_queues_collection[ftx_client.ftx_user] = SignalChannel()  # Webhook -> worker pipe (see signal_transport)
 
         # **************************************************************************************************************
 
-        if debug:
-            periodic_printer = PeriodicNormal(5, print_shared_data)
-        periodic_eur_usd_exchange_rate_getter = PeriodicNormal(5, get_eur_usd_exchange_rate, eur_usd_exchange_rate_url)
+        paper_exchange_process = None
         try:
 
+            websocket_uri = None  # FtxApiClient default (FTX)
+            if debug:
+                print("Starting paper exchange...")
+                paper_markets = list(dict.fromkeys(["BTC/USDT"] + ticker_markets + orderbook_markets + bar_markets))
+                paper_exchange_server = create_paper_exchange_server(paper_exchange_config, paper_markets, exchange_variables["taker_fee"], log_file="./logs/paper_exchange.log")
+                paper_exchange_process = Process(target=paper_exchange_server.run_forever, args=())
+                paper_exchange_process.start()
+                websocket_uri = paper_exchange_server.uri
+                ftx_rest_api_url = paper_exchange_server.rest_url
+
             print("Starting ftx market data worker...")
-            market_data_pushover_notifier = PushoverNotifier("ftx-trader", pushover_application_token, pushover_user_keys.values()) if pushover_user_keys else None
-            ftx_market_data_worker = FtxMarketDataWorker(shared_market_data, debug=debug, pushover_notifier=market_data_pushover_notifier)
+            market_data_pushover_notifier = PushoverNotifier("ftx-trader", pushover_application_token, pushover_user_keys.values(), api_url=pushover_api_url, send_notifications=pushover_send_notifications) if pushover_user_keys else None
+            ftx_market_data_worker = FtxMarketDataWorker(shared_market_data, debug=debug, pushover_notifier=market_data_pushover_notifier, ticker_markets=ticker_markets, orderbook_markets=orderbook_markets, capture_directory=market_data_capture_directory, fx_rate_providers=fx_rate_providers, fx_pairs=fx_pairs, websocket_uri=websocket_uri, standby_connections=websocket_standby_connections, market_data_feeds=market_data_feeds, bar_markets=bar_markets, bar_timeframes=bar_timeframes, strategies=local_strategies, signal_channels=buy_sell_requests_queues_collection)
             ftx_market_data_worker_process = Process(target=ftx_market_data_worker.run_forever, args=())
             ftx_market_data_worker_process.start()
 
             print("Starting ftx user api workers...")
-            ftx_user_api_worker_processes = {}
+            ftx_user_api_workers = {}
             for ftx_client in ftx_clients:
-                user_api_pushover_notifier = PushoverNotifier("ftx-trader", pushover_application_token, [pushover_user_keys[ftx_client.ftx_user]])
-                ftx_user_api_worker = FtxUserApiWorker(ftx_client=ftx_client, shared_user_api_data=shared_user_api_data_collection[ftx_client.ftx_user], shared_market_data=shared_market_data, buy_sell_requests_queue=buy_sell_requests_queues_collection[ftx_client.ftx_user], debug=debug, pushover_notifier=user_api_pushover_notifier)
-                ftx_user_api_worker_process = Process(target=ftx_user_api_worker.run_forever, args=())
-                ftx_user_api_worker_processes[ftx_client.ftx_user] = ftx_user_api_worker_process
-                ftx_user_api_worker_process.start()
+                user_api_pushover_notifier = PushoverNotifier("ftx-trader", pushover_application_token, [pushover_user_keys[ftx_client.ftx_user]], api_url=pushover_api_url, send_notifications=pushover_send_notifications)
+                ftx_user_api_workers[ftx_client.ftx_user] = FtxUserApiWorker(ftx_client=ftx_client, shared_user_api_data=shared_user_api_data_collection[ftx_client.ftx_user], shared_market_data=shared_market_data, buy_sell_requests_channel=buy_sell_requests_queues_collection[ftx_client.ftx_user], debug=debug, pushover_notifier=user_api_pushover_notifier, websocket_uri=websocket_uri, rest_api_url=ftx_rest_api_url, place_orders=debug)
+            ftx_user_api_worker_processes = {}
+            if user_api_processes:
+                for shard_id, shard in enumerate(shard_accounts(list(ftx_user_api_workers.values()), user_api_processes)):
+                    ftx_user_api_worker_group = FtxUserApiWorkerGroup(shard, name=str(shard_id))
+                    ftx_user_api_worker_process = Process(target=ftx_user_api_worker_group.run_forever, args=())
+                    ftx_user_api_worker_processes[shard_id] = ftx_user_api_worker_process
+                    ftx_user_api_worker_process.start()
+            else:
+                for ftx_user, ftx_user_api_worker in ftx_user_api_workers.items():
+                    ftx_user_api_worker_process = Process(target=ftx_user_api_worker.run_forever, args=())
+                    ftx_user_api_worker_processes[ftx_user] = ftx_user_api_worker_process
+                    ftx_user_api_worker_process.start()
 
             print("Starting webhook bot...")
-            webhook_bot = WebhookBot(local_webhook_server_pin, buy_sell_requests_queues_collection)
-            webhook_bot.start_bot()
+            webhook_bot = WebhookBot(local_webhook_server_pin, buy_sell_requests_queues_collection, server=webhook_server)
+            webhook_bot.start_bot(on_loop_started=start_periodic_printer if debug else None)
 
             # Wait for processes to finish their jobs
             for ftx_user_api_worker_process in ftx_user_api_worker_processes.values():
@@ -202,10 +236,9 @@ if __name__ == '__main__':
             print("Exception during workers starting! {}".format(repr(e)))
 
         finally:
-            if debug:
-                print("Workers finished their job - cleaning up periodics...")
-                periodic_printer.stop()
-            periodic_eur_usd_exchange_rate_getter.stop()
+            if paper_exchange_process:
+                paper_exchange_process.terminate()
+            shared_market_data.unlink()
 
     except KeyboardInterrupt:
         print('Interrupted')
@@ -1,21 +1,33 @@
 import os
 import sys
+import math
+import time
 import asyncio
 import logging
-import multiprocessing.queues
-from decimal import *
+import async_logging
+from decimal import Decimal, ROUND_HALF_EVEN
 from event_dispatcher import EventDispatcher
 from ftx_client import FtxClient
 from ftx_lib import FtxApiClient
-from queue import Empty
-from periodic import PeriodicNormal
+from ftx_rest_client import FtxRestClient, FTX_REST_API_URL
+from latency import LatencyTracker, stamp
+from periodic import TimerScheduler
 from pid import PidFile
 from pushover_notifier import PushoverNotifier
+from order_store import OrderStore
+from order_sizing import OrderSize, OrderSizer, Quantizer, rescale
+from fx_rates import DEFAULT_MAX_AGE as FX_RATE_MAX_AGE
+from shared_market_data import SharedMarketData
+from signal_transport import SignalChannel
+
+
+CENTS = Quantizer(2)  # Prices and profits in the messages
+CENTS_PRODUCT = Quantizer(4)  # Product of two CENTS values (e.g. a price in EUR * EUR/USD rate)
 
 
 class FtxUserApiWorker(object):
 
-    def __init__(self, ftx_client: FtxClient, shared_user_api_data: dict, shared_market_data: dict, buy_sell_requests_queue: multiprocessing.queues.Queue, debug: bool = True, log_file: str = None, transactions_log_file: str = None, pushover_notifier: PushoverNotifier = None):
+    def __init__(self, ftx_client: FtxClient, shared_user_api_data: dict, shared_market_data: SharedMarketData, buy_sell_requests_channel: SignalChannel, debug: bool = True, log_file: str = None, transactions_log_file: str = None, pushover_notifier: PushoverNotifier = None, websocket_uri: str = None, rest_api_url: str = FTX_REST_API_URL, place_orders: bool = False, order_timeout: float = 30.0):
         print("Initializing ftx user api worker for user: {}".format(ftx_client.ftx_user))
         self.debug = debug
         self.log_file = log_file if log_file else "./logs/ftx_user_api_worker_{}.log".format(ftx_client.ftx_user)
@@ -27,30 +39,29 @@ class FtxUserApiWorker(object):
         self.ftx_client = ftx_client
         self.shared_market_data = shared_market_data
         self.shared_user_api_data = shared_user_api_data
-        self.buy_sell_requests_queue = buy_sell_requests_queue
+        self.buy_sell_requests_channel = buy_sell_requests_channel
+        self.buy_sell_requests_queue = None  # asyncio.Queue fed by buy_sell_requests_channel (created in run)
         self.ftx_api_client = None
+        self.ftx_rest_client = None  # Account state (balances, markets) - see ftx_rest_client.py
         self.initializing = False
         self.initial_requests_list = []
         self.initialized = False
         self.periodic_calls = []
         self.pushover_notifier = pushover_notifier
-        self.client_orders = {}
+        self.websocket_uri = websocket_uri
+        self.rest_api_url = rest_api_url  # None - no REST account state refresh
+        self.order_store = OrderStore(history_size=1000)  # Orders lifecycle (see order_store.py)
+        self.order_sizers = {}  # instrument -> OrderSizer (see order_sizing.py)
+        self.bid_ask_readers = {}  # market -> SharedMarketData.bid_ask_reader (bound in the worker process, on first use)
+        self.latency_tracker = LatencyTracker()  # Tick-to-trade latency per stage (see latency.py)
+        self.place_orders = place_orders  # Market orders over REST - paper trading only so far (see paper_exchange.py)
+        self.order_timeout = order_timeout  # Seconds to wait for a placed order to be closed
 
     @staticmethod
     def setup_logger(logger, log_file, mode="w"):
-        logger.setLevel(logging.DEBUG)
-        fh = logging.FileHandler(log_file, mode=mode)
-        fh.setLevel(logging.DEBUG)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        ch.setFormatter(console_formatter)
-        fh.setFormatter(file_formatter)
-        logger.addHandler(ch)
-        logger.addHandler(fh)
-
-    def pushover_notify(self, message, priority=2):
+        async_logging.setup_logger(logger, log_file, mode)
+
+    def pushover_notify(self, message, priority=0):
         if self.pushover_notifier:
             message = self.logger.name + ": " + message
             self.pushover_notifier.notify(message, priority)
@@ -80,6 +91,7 @@ class FtxUserApiWorker(object):
                             copied_dict = self.shared_user_api_data["tickers"]
                             copied_dict[ticker][decimal] = str(instrument[decimal])
                             self.shared_user_api_data["tickers"] = copied_dict
+                            self.order_sizers.pop(ticker, None)  # Rebuilt with the new decimals
 
             except Exception as e:
                 raise Exception("Cannot get ticker decimals for ticker: {}. Exception: {}".format(ticker, repr(e)))
@@ -129,17 +141,14 @@ class FtxUserApiWorker(object):
         except Exception as e:
             raise Exception("Wrong data structure in private/get-account-summary response: {}. Exception: {}".format(response, repr(e)))
 
-    def create_market_buy_order(self, instrument_name, amount_to_spend):
+    def create_market_buy_order(self, instrument_name, amount_to_spend, timestamps: dict = None):
         '''
         Creates a new BUY order on the Exchange.
         This call is asynchronous, so the response is simply a confirmation of the request with assigned order_id for the given client_oid.
-        The user.order subscription can be used to check when the order is successfully created.
+        The orders subscription can be used to check when the order is successfully created (or await order_store.wait_fill).
         '''
         client_order_id = self.ftx_client.ftx_user + "_BUY_" + instrument_name + "_market_order_" + str(self.ftx_api_client.current_id())
-        self.client_orders[client_order_id] = {
-            "order_id": "",
-            "status": "pending"
-        }
+        self.order_store.add_pending(client_order_id, instrument_name, "buy", notional=amount_to_spend)
         self.ftx_api_client.send(
             request={
                 "op": "private/create-order",
@@ -148,24 +157,22 @@ class FtxUserApiWorker(object):
                 "type": "MARKET",
                 "notional": amount_to_spend,
                 "client_oid": client_order_id
-            }
+            },
+            timestamps=timestamps
         )
         return client_order_id
 
-    def buy_BTC_for_USDT_market_order(self, amount_to_spend):
-        return self.create_market_buy_order("BTC_USDT", amount_to_spend)
+    def buy_BTC_for_USDT_market_order(self, amount_to_spend, timestamps: dict = None):
+        return self.create_market_buy_order("BTC_USDT", amount_to_spend, timestamps)
 
-    def create_market_sell_order(self, instrument_name, quantity_to_be_sold):
+    def create_market_sell_order(self, instrument_name, quantity_to_be_sold, timestamps: dict = None):
         '''
         Creates a new SELL order on the Exchange.
         This call is asynchronous, so the response is simply a confirmation of the request with assigned order_id for the given client_oid.
-        The user.order subscription can be used to check when the order is successfully created.
+        The orders subscription can be used to check when the order is successfully created (or await order_store.wait_fill).
         '''
         client_order_id = self.ftx_client.ftx_user + "_SELL_" + instrument_name + "_market_order_" + str(self.ftx_api_client.current_id())
-        self.client_orders[client_order_id] = {
-            "order_id": "",
-            "status": "pending"
-        }
+        self.order_store.add_pending(client_order_id, instrument_name, "sell", size=quantity_to_be_sold)
         self.ftx_api_client.send(
             request={
                 "op": "private/create-order",
@@ -174,12 +181,13 @@ class FtxUserApiWorker(object):
                 "type": "MARKET",
                 "quantity": quantity_to_be_sold,
                 "client_oid": client_order_id
-            }
+            },
+            timestamps=timestamps
         )
         return client_order_id
 
-    def sell_BTC_to_USDT_market_order(self, quantity_to_be_sold):
-        return self.create_market_sell_order("BTC_USDT", quantity_to_be_sold)
+    def sell_BTC_to_USDT_market_order(self, quantity_to_be_sold, timestamps: dict = None):
+        return self.create_market_sell_order("BTC_USDT", quantity_to_be_sold, timestamps)
 
     def handle_response_create_order(self, response: dict):
         '''
@@ -191,39 +199,70 @@ class FtxUserApiWorker(object):
         try:
             self.logger.info("Received response for private/create-order method with id: {}. Result: {}".format(response["id"], response["result"]))
             client_order_id = response["result"]["client_oid"]
-            self.client_orders[client_order_id]["order_id"] = response["result"]["order_id"]
+            self.order_store.set_order_id(client_order_id, response["result"]["order_id"])
         except Exception as e:
             raise Exception("Wrong data structure in private/create-order response: {}. Exception: {}".format(response, repr(e)))
 
-    def handle_channel_event_user_order(self, event: dict):  #TODO
+    def handle_channel_event_user_order(self, event: dict):
         '''
-        "data": [
-            {
-                "status": "ACTIVE",
-                "side": "BUY",
-                "price": 1,
-                "quantity": 1,
-                "order_id": "366455245775097673",
-                "client_oid": "my_order_0002",
-                "create_time": 1588758017375,
-                "update_time": 1588758017411,
-                "type": "LIMIT",
-                "instrument_name": "ETH_CRO",
-                "cumulative_quantity": 0,
-                "cumulative_value": 0,
-                "avg_price": 0,
-                "fee_currency": "CRO",
-                "time_in_force":"GOOD_TILL_CANCEL"
-            }
-        ]
+        FTX orders channel:
+        "data": {
+            "id": 24852229,
+            "clientId": "default_user_BUY_BTC/USDT_market_order_2",
+            "market": "BTC/USDT",
+            "type": "market",
+            "side": "buy",
+            "size": 0.01,
+            "price": null,
+            "reduceOnly": false,
+            "ioc": true,
+            "postOnly": false,
+            "status": "closed",
+            "filledSize": 0.01,
+            "remainingSize": 0.0,
+            "avgFillPrice": 25420.5
+        }
         '''
         try:
-            self.logger.info("Received user orders update. Event: {}".format(event["data"]))
-            for order in event["data"]:
-                if order["client_oid"] in self.client_orders:
-                    pass  #TODO
+            order_update = event["data"]
+            order = self.order_store.update(
+                order_update["id"],
+                client_id=order_update.get("clientId"),
+                status=order_update["status"],
+                market=order_update.get("market"),
+                side=order_update.get("side"),
+                size=order_update.get("size"),
+                filled_size=order_update.get("filledSize"),
+                avg_fill_price=order_update.get("avgFillPrice")
+            )
         except Exception as e:
-            raise Exception("Wrong data structure in user.order channel event. Exception: {}".format(repr(e)))
+            raise Exception("Wrong data structure in orders channel event. Exception: {}".format(repr(e)))
+        self.logger.info("Order update: {}".format(order))
+        if order.closed:
+            self.transactions_logger.info("Order closed: {}".format(order))
+
+    def handle_channel_event_user_fill(self, event: dict):
+        '''
+        FTX fills channel:
+        "data": {
+            "fee": 0.16904,
+            "feeRate": 0.000665,
+            "market": "BTC/USDT",
+            "orderId": 24852229,
+            "tradeId": 1234,
+            "price": 25420.5,
+            "side": "buy",
+            "size": 0.01,
+            "time": "2021-01-18T12:40:25.370196+00:00",
+            "type": "order"
+        }
+        '''
+        try:
+            fill = event["data"]
+            order = self.order_store.add_fill(fill["orderId"], fill["size"], fill["price"], fill.get("fee", 0.0))
+        except Exception as e:
+            raise Exception("Wrong data structure in fills channel event. Exception: {}".format(repr(e)))
+        self.logger.info("Fill: {} {} {} @ {} (fee: {}). Order: {}".format(fill.get("market"), fill.get("side"), fill["size"], fill["price"], fill.get("fee"), order))
 
     def handle_channel_event_user_balance(self, event: dict):
         '''
@@ -252,108 +291,244 @@ class FtxUserApiWorker(object):
         except Exception as e:
             raise Exception("Wrong data structure in user.balance channel event. Exception: {}".format(repr(e)))
 
+    async def refresh_account_state(self):
+        '''
+        Balances and the decimals of the used tickers over REST (concurrent calls on the keep-alive pool)
+        '''
+        markets = [ticker.replace("_", "/") for ticker in self.shared_user_api_data["tickers"].keys()]
+        self.handle_account_snapshot(await self.ftx_rest_client.get_account_snapshot(markets))
+
+    def handle_account_snapshot(self, snapshot: dict):
+        '''
+        "balances": [{"coin": "USDT", "free": 1234.56, "total": 1234.56, ...}, ...]
+        "markets": [{"name": "BTC/USDT", "priceIncrement": 1.0, "sizeIncrement": 0.0001, ...}, ...]
+        '''
+        try:
+            for balance in snapshot["balances"]:
+                if balance["coin"] in ("USDT", "BTC", "FTT"):
+                    self.shared_user_api_data["balance_" + balance["coin"]] = str(balance["free"])
+            copied_dict = self.shared_user_api_data["tickers"]  # Re-assigned as a whole (see handle_response_get_instruments)
+            for market in snapshot["markets"]:
+                ticker = market["name"].replace("/", "_")
+                decimals = {
+                    "price_decimals": str(max(0, -Decimal(str(market["priceIncrement"])).normalize().as_tuple().exponent)),
+                    "quantity_decimals": str(max(0, -Decimal(str(market["sizeIncrement"])).normalize().as_tuple().exponent))
+                }
+                if copied_dict.get(ticker) != decimals:
+                    self.logger.info("Updated decimals for ticker: {}: {}".format(ticker, decimals))
+                    copied_dict[ticker] = decimals
+                    self.order_sizers.pop(ticker, None)  # Rebuilt with the new decimals
+            self.shared_user_api_data["tickers"] = copied_dict
+        except Exception as e:
+            raise Exception("Wrong data structure in account snapshot: {}. Exception: {}".format(snapshot, repr(e)))
+        self.logger.debug("Account snapshot: balances: %s, open orders: %s, positions: %s", snapshot["balances"], len(snapshot["open_orders"]), len(snapshot["positions"]))
+
+    def get_bid_ask_reader(self, market: str):
+        '''
+        The bound (views of the market slot) bid/ask reader of the market - the hot path read
+        '''
+        read_bid_ask = self.bid_ask_readers.get(market)
+        if not read_bid_ask:
+            read_bid_ask = self.shared_market_data.bid_ask_reader(market)
+            self.bid_ask_readers[market] = read_bid_ask
+        return read_bid_ask
+
+    def get_eur_usd_exchange_rate(self):
+        '''
+        Published by the market data worker (see fx_rates). '0' (no conversion) if not fetched yet or stale.
+        '''
+        market_EUR_USD = self.shared_market_data.read("EUR/USD")
+        age = time.time() - market_EUR_USD.time
+        if not market_EUR_USD.time or age > FX_RATE_MAX_AGE or math.isnan(market_EUR_USD.last):
+            self.logger.warning("EUR/USD exchange rate not available or stale (age: {:.0f} s)!".format(age))
+            return '0'
+        return str(market_EUR_USD.last)
+
+    def get_order_sizer(self, instrument: str):
+        '''
+        Quantizers of the instrument (built once from its decimals in shared_user_api_data["tickers"])
+        '''
+        order_sizer = self.order_sizers.get(instrument)
+        if not order_sizer:
+            order_sizer = OrderSizer.from_instrument(instrument, self.shared_user_api_data["tickers"][instrument])
+            self.order_sizers[instrument] = order_sizer
+        return order_sizer
+
     def handle_buy_request(self, request: dict):
         # Compare the price from request with current market price from ftx
         self.transactions_logger.info("")
         price_in_request = str(request["price"])
         self.shared_user_api_data["last_transaction_BTC_buy_price_in_fiat"] = price_in_request
-        price_on_ftx = self.shared_market_data["price_BTC_buy_for_USDT"]
+        bid, ask = self.get_bid_ask_reader("BTC/USDT")()
+        price_on_ftx = str(ask)
         self.shared_user_api_data["last_transaction_BTC_buy_price_in_USDT"] = price_on_ftx
         fiat = request["fiat"]
-        eur_usd_exchange_rate = self.shared_market_data["EUR_USD_exchange_rate"]
-        if fiat == "EUR" and eur_usd_exchange_rate != 0:
-            price_in_request_in_usd = Decimal(price_in_request).quantize(Decimal('1e-' + str(2))) * Decimal(eur_usd_exchange_rate).quantize(Decimal('1e-' + str(2)))
-            self.logger.info("[BUY REQUEST] received! Price in request: {} [{}] ({} [USD]). Price on ftx: {} [USDT]".format(Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), fiat, price_in_request_in_usd, Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2)))))
-            message = "[BUY] Price in request: {} [{}] ({} [USD]). Price on ftx: {} [USDT]".format(Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), fiat, price_in_request_in_usd.quantize(Decimal('1e-' + str(2))), Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2))))
+        price_in_request_cents = CENTS.to_fixed(price_in_request, ROUND_HALF_EVEN)
+        price_on_ftx_cents = CENTS.to_fixed(ask, ROUND_HALF_EVEN)
+        eur_usd_exchange_rate = self.get_eur_usd_exchange_rate()
+        if fiat == "EUR" and float(eur_usd_exchange_rate) != 0:
+            price_in_request_in_usd = price_in_request_cents * CENTS.to_fixed(eur_usd_exchange_rate, ROUND_HALF_EVEN)  # 4 decimals
+            self.logger.info("[BUY REQUEST] received! Price in request: %s [%s] (%s [USD]). Price on ftx: %s [USDT]", CENTS.format(price_in_request_cents), fiat, CENTS_PRODUCT.format(price_in_request_in_usd), CENTS.format(price_on_ftx_cents))
+            message = "[BUY] Price in request: {} [{}] ({} [USD]). Price on ftx: {} [USDT]".format(CENTS.format(price_in_request_cents), fiat, CENTS.format(rescale(price_in_request_in_usd, 4, 2, ROUND_HALF_EVEN)), CENTS.format(price_on_ftx_cents))
             self.transactions_logger.info(message)
             self.pushover_notify(message)
         else:
-            self.logger.info("[BUY REQUEST] received! Price in request: {} [{}]. Price on ftx: {} [USDT]".format(Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), fiat, Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2)))))
-            message = "[BUY] Price in request: {} [{}]. Price on ftx: {} [USDT]".format(Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), fiat, Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2))))
+            self.logger.info("[BUY REQUEST] received! Price in request: %s [%s]. Price on ftx: %s [USDT]", CENTS.format(price_in_request_cents), fiat, CENTS.format(price_on_ftx_cents))
+            message = "[BUY] Price in request: {} [{}]. Price on ftx: {} [USDT]".format(CENTS.format(price_in_request_cents), fiat, CENTS.format(price_on_ftx_cents))
             self.transactions_logger.info(message)
             self.pushover_notify(message)
 
         # Get real :)
-        price_BTC_buy_for_USDT = Decimal(self.shared_market_data["price_BTC_buy_for_USDT"]).quantize(
-            Decimal('1e-' + str(self.shared_user_api_data["tickers"]["BTC_USDT"]["price_decimals"])), rounding=ROUND_UP)
-        self.transactions_logger.debug("price_BTC_buy_for_USDT (Decimal): {}".format(price_BTC_buy_for_USDT))
-        balance_USDT = Decimal(self.shared_user_api_data["balance_USDT"]).quantize(Decimal('1e-' + str(2)), rounding=ROUND_DOWN)
-        self.transactions_logger.debug("balance_USDT (Decimal): {}".format(balance_USDT))
-        taker_fee = Decimal(self.shared_market_data["taker_fee"]).quantize(Decimal('1e-' + str(4)), rounding=ROUND_UP)
-        self.transactions_logger.debug("taker_fee (Decimal): {}".format(taker_fee))
-        fee_BTC_buy_in_BTC = ((balance_USDT / price_BTC_buy_for_USDT) * taker_fee).quantize(Decimal('1e-' + str(8)), rounding=ROUND_UP)
-        self.transactions_logger.debug("fee_BTC_buy_in_BTC (Decimal): {}".format(fee_BTC_buy_in_BTC))
-        balance_FTT = Decimal(self.shared_user_api_data["balance_FTT"]).quantize(Decimal('1e-' + str(8)), rounding=ROUND_DOWN)
-        self.transactions_logger.debug("balance_FTT (Decimal): {}".format(balance_FTT))
-
-        message = "Placing a market order on BTC/USDT pair for USDT balance: {}".format(balance_USDT)
+        order_size = self.get_order_sizer("BTC_USDT").buy(ask, self.shared_user_api_data["balance_USDT"], self.shared_market_data.taker_fee)
+        self.transactions_logger.debug("%s (price_BTC_buy_for_USDT, balance_USDT, fee_BTC_buy_in_BTC)", order_size)
+        self.transactions_logger.debug("balance_FTT: %s", self.shared_user_api_data["balance_FTT"])
+
+        message = "Placing a market order on BTC/USDT pair for USDT balance: {}".format(order_size.format("amount"))
         self.logger.info(message)
         #self.pushover_notify(message)
+        if self.place_orders:
+            return self.place_market_order("BTC_USDT", order_size, request.get("timestamps"))
+        return None
 
     def handle_sell_request(self, request: dict):
         # Compare the price from request with current market price from ftx
         self.transactions_logger.info("")
         price_in_request = str(request["price"])
         self.shared_user_api_data["last_transaction_BTC_sell_price_in_fiat"] = price_in_request
-        price_on_ftx = self.shared_market_data["price_BTC_sell_to_USDT"]
+        bid, ask = self.get_bid_ask_reader("BTC/USDT")()
+        price_on_ftx = str(bid)
         self.shared_user_api_data["last_transaction_BTC_sell_price_in_USDT"] = price_on_ftx
         fiat = request["fiat"]
-        profit_in_fiat = (Decimal(self.shared_user_api_data["last_transaction_BTC_sell_price_in_fiat"]).quantize(Decimal('1e-' + str(2))) - Decimal(self.shared_user_api_data["last_transaction_BTC_buy_price_in_fiat"]).quantize(Decimal('1e-' + str(2)))) if self.shared_user_api_data["last_transaction_BTC_buy_price_in_fiat"] else Decimal('0').quantize(Decimal('1e-' + str(2)))
-        profit_in_usdt = (Decimal(self.shared_user_api_data["last_transaction_BTC_sell_price_in_USDT"]).quantize(Decimal('1e-' + str(2))) - Decimal(self.shared_user_api_data["last_transaction_BTC_buy_price_in_USDT"]).quantize(Decimal('1e-' + str(2)))) if self.shared_user_api_data["last_transaction_BTC_buy_price_in_USDT"] else Decimal('0').quantize(Decimal('1e-' + str(2)))
-        eur_usd_exchange_rate = self.shared_market_data["EUR_USD_exchange_rate"]
-        if fiat == "EUR" and eur_usd_exchange_rate != 0:
-            price_in_request_in_usd = Decimal(price_in_request).quantize(Decimal('1e-' + str(2))) * Decimal(eur_usd_exchange_rate).quantize(Decimal('1e-' + str(2)))
-            profit_in_fiat_in_usd = Decimal(profit_in_fiat).quantize(Decimal('1e-' + str(2))) * Decimal(eur_usd_exchange_rate).quantize(Decimal('1e-' + str(2)))
-            self.logger.info("[SELL REQUEST] received! Price in request: {} [{}] ({} [USD]). Price on ftx: {} [USDT]. Profit in fiat: {} [{}] ({} [USD]). Profit on ftx: {} [USDT].".format(Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), fiat, price_in_request_in_usd.quantize(Decimal('1e-' + str(2))), Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2))), profit_in_fiat, fiat, profit_in_fiat_in_usd.quantize(Decimal('1e-' + str(2))), profit_in_usdt))
-            message = "[SELL] Price in request: {} [{}] ({} [USD]). Price on ftx: {} [USDT]. Profit in fiat: {} [{}] ({} [USD]). Profit on ftx: {} [USDT].".format(Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), fiat, price_in_request_in_usd.quantize(Decimal('1e-' + str(2))), Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2))), profit_in_fiat, fiat, profit_in_fiat_in_usd.quantize(Decimal('1e-' + str(2))), profit_in_usdt)
+        price_in_request_cents = CENTS.to_fixed(price_in_request, ROUND_HALF_EVEN)
+        price_on_ftx_cents = CENTS.to_fixed(bid, ROUND_HALF_EVEN)
+        last_buy_price_in_fiat = self.shared_user_api_data["last_transaction_BTC_buy_price_in_fiat"]
+        last_buy_price_in_usdt = self.shared_user_api_data["last_transaction_BTC_buy_price_in_USDT"]
+        profit_in_fiat = price_in_request_cents - CENTS.to_fixed(last_buy_price_in_fiat, ROUND_HALF_EVEN) if last_buy_price_in_fiat else 0
+        profit_in_usdt = price_on_ftx_cents - CENTS.to_fixed(last_buy_price_in_usdt, ROUND_HALF_EVEN) if last_buy_price_in_usdt else 0
+        eur_usd_exchange_rate = self.get_eur_usd_exchange_rate()
+        if fiat == "EUR" and float(eur_usd_exchange_rate) != 0:
+            eur_usd_exchange_rate_cents = CENTS.to_fixed(eur_usd_exchange_rate, ROUND_HALF_EVEN)
+            price_in_request_in_usd = rescale(price_in_request_cents * eur_usd_exchange_rate_cents, 4, 2, ROUND_HALF_EVEN)
+            profit_in_fiat_in_usd = rescale(profit_in_fiat * eur_usd_exchange_rate_cents, 4, 2, ROUND_HALF_EVEN)
+            self.logger.info("[SELL REQUEST] received! Price in request: %s [%s] (%s [USD]). Price on ftx: %s [USDT]. Profit in fiat: %s [%s] (%s [USD]). Profit on ftx: %s [USDT].", CENTS.format(price_in_request_cents), fiat, CENTS.format(price_in_request_in_usd), CENTS.format(price_on_ftx_cents), CENTS.format(profit_in_fiat), fiat, CENTS.format(profit_in_fiat_in_usd), CENTS.format(profit_in_usdt))
+            message = "[SELL] Price in request: {} [{}] ({} [USD]). Price on ftx: {} [USDT]. Profit in fiat: {} [{}] ({} [USD]). Profit on ftx: {} [USDT].".format(CENTS.format(price_in_request_cents), fiat, CENTS.format(price_in_request_in_usd), CENTS.format(price_on_ftx_cents), CENTS.format(profit_in_fiat), fiat, CENTS.format(profit_in_fiat_in_usd), CENTS.format(profit_in_usdt))
             self.transactions_logger.info(message)
             self.pushover_notify(message)
         else:
-            self.logger.info("[SELL REQUEST] received! Price in request: {} [{}]. Price on ftx: {} [USDT]. Profit in fiat: {} [{}]. Profit on ftx: {} [USDT].".format(Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), fiat, Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2))), profit_in_fiat, fiat, profit_in_usdt))
-            message = "[SELL] Price in request: {} [{}]. Price on ftx: {} [USDT]. Profit in fiat: {} [{}]. Profit on ftx: {} [USDT].".format(Decimal(price_in_request).quantize(Decimal('1e-' + str(2))), fiat, Decimal(price_on_ftx).quantize(Decimal('1e-' + str(2))), profit_in_fiat, fiat, profit_in_usdt)
+            self.logger.info("[SELL REQUEST] received! Price in request: %s [%s]. Price on ftx: %s [USDT]. Profit in fiat: %s [%s]. Profit on ftx: %s [USDT].", CENTS.format(price_in_request_cents), fiat, CENTS.format(price_on_ftx_cents), CENTS.format(profit_in_fiat), fiat, CENTS.format(profit_in_usdt))
+            message = "[SELL] Price in request: {} [{}]. Price on ftx: {} [USDT]. Profit in fiat: {} [{}]. Profit on ftx: {} [USDT].".format(CENTS.format(price_in_request_cents), fiat, CENTS.format(price_on_ftx_cents), CENTS.format(profit_in_fiat), fiat, CENTS.format(profit_in_usdt))
             self.transactions_logger.info(message)
             self.pushover_notify(message)
 
         # Get real :)
-        price_BTC_sell_to_USDT = Decimal(self.shared_market_data["price_BTC_sell_to_USDT"]).quantize(
-            Decimal('1e-' + str(self.shared_user_api_data["tickers"]["BTC_USDT"]["price_decimals"])), rounding=ROUND_UP)
-        self.transactions_logger.debug("price_BTC_sell_to_USDT (Decimal): {}".format(price_BTC_sell_to_USDT))
-        balance_BTC = Decimal(self.shared_user_api_data["balance_BTC"]).quantize(Decimal('1e-' + str(8)), rounding=ROUND_DOWN)
-        self.transactions_logger.debug("balance_BTC (Decimal): {}".format(balance_BTC))
-        taker_fee = Decimal(self.shared_market_data["taker_fee"]).quantize(Decimal('1e-' + str(4)), rounding=ROUND_UP)
-        self.transactions_logger.debug("taker_fee (Decimal): {}".format(taker_fee))
-        fee_BTC_sell_in_USDT = ((balance_BTC * price_BTC_sell_to_USDT) * taker_fee).quantize(Decimal('1e-' + str(2)), rounding=ROUND_UP)
-        self.transactions_logger.debug("fee_BTC_sell_in_USDT (Decimal): {}".format(fee_BTC_sell_in_USDT))
-        balance_FTT = Decimal(self.shared_user_api_data["balance_FTT"]).quantize(Decimal('1e-' + str(8)), rounding=ROUND_DOWN)
-        self.transactions_logger.debug("balance_FTT (Decimal): {}".format(balance_FTT))
-
-        message = "Placing a market order on BTC/USDT pair for BTC balance: {}".format(balance_BTC)
+        order_size = self.get_order_sizer("BTC_USDT").sell(bid, self.shared_user_api_data["balance_BTC"], self.shared_market_data.taker_fee)
+        self.transactions_logger.debug("%s (price_BTC_sell_to_USDT, balance_BTC, fee_BTC_sell_in_USDT)", order_size)
+        self.transactions_logger.debug("balance_FTT: %s", self.shared_user_api_data["balance_FTT"])
+
+        message = "Placing a market order on BTC/USDT pair for BTC balance: {}".format(order_size.format("amount"))
         self.logger.info(message)
         #self.pushover_notify(message)
+        if self.place_orders:
+            return self.place_market_order("BTC_USDT", order_size, request.get("timestamps"))
+        return None
 
-    def handle_buy_sell_requests(self):
+    def place_market_order(self, instrument: str, order_size: OrderSize, timestamps: dict = None):
+        '''
+        Sends the market order of the order size over REST (see send_market_order). Returns its client id or None if
+        the size is below the market's size increment.
+        '''
+        quantity_decimals = int(self.shared_user_api_data["tickers"][instrument]["quantity_decimals"])
+        size = self.get_order_sizer(instrument).quantity(order_size, quantity_decimals)
+        if not size:
+            self.logger.info("Nothing to {} on: {} (order size: {})".format(order_size.side, instrument, order_size))
+            return None
+        market = instrument.replace("_", "/")
+        client_order_id = "{}_{}_{}_market_order_{}".format(self.ftx_client.ftx_user, order_size.side.upper(), market, self.ftx_api_client.next_id())
+        size = float(Quantizer(quantity_decimals).format(size))
+        self.order_store.add_pending(client_order_id, market, order_size.side, size=size)
+        asyncio.ensure_future(self.send_market_order(client_order_id, market, order_size.side, size, timestamps))
+        return client_order_id
+
+    async def send_market_order(self, client_order_id: str, market: str, side: str, size: float, timestamps: dict = None):
+        '''
+        Places the order, waits until it's closed (the orders channel) and refreshes the balances
+        '''
+        if timestamps is not None:
+            stamp(timestamps, "order_queued")  # After "handled" - runs once handle_buy_sell_requests has returned
+        try:
+            response = await self.ftx_rest_client.place_order(market, side, size, client_id=client_order_id)
+        except Exception as e:
+            message = "Placing the market order: {} failed: {}".format(client_order_id, repr(e))
+            self.logger.error(message)
+            self.pushover_notify(message)
+            self.order_store.remove(client_order_id)
+            if timestamps is not None:
+                self.latency_tracker.record_trace(timestamps)
+            return
+        self.order_store.set_order_id(client_order_id, response["id"])
+        if timestamps is not None:
+            stamp(timestamps, "order_acknowledged")
+        try:
+            order = await self.order_store.wait_closed(client_order_id, timeout=self.order_timeout)
+        except asyncio.TimeoutError:
+            self.logger.error("Market order: {} not closed in {} s! Removed from the order store: {}".format(client_order_id, self.order_timeout, self.order_store.remove(client_order_id)))
+        else:
+            if timestamps is not None:
+                stamp(timestamps, "order_filled")
+            self.logger.info("Market order closed: {}".format(order))
+        if timestamps is not None:
+            self.latency_tracker.record_trace(timestamps)
+        await self.refresh_account_state()
+
+    def receive_buy_sell_request(self, request: dict):
+        '''
+        Called on the loop as soon as a signal arrives at buy_sell_requests_channel
+        '''
+        if isinstance(request, dict) and "timestamps" in request:
+            stamp(request["timestamps"], "dequeued")
+        self.buy_sell_requests_queue.put_nowait(request)
+
+    def handle_buy_sell_requests(self, request: dict):
         '''
         The incoming request should be a dict with the following keys:
         {
             'price': '25420',
-            'type': 'sell'
+            'type': 'sell',
+            'fiat': 'EUR',
+            'timestamps': {'webhook_received': ..., 'enqueued': ..., 'dequeued': ...}  # Optional (see latency.py)
         }
         '''
-        try:
-            request = self.buy_sell_requests_queue.get_nowait()
-        except (Empty, BrokenPipeError):
-            pass
-        else:
-            if request:
-                if "type" in request and "price" in request and "fiat" in request:
-                    if request["type"] == "buy":
-                        self.handle_buy_request(request)
-                    elif request["type"] == "sell":
-                        self.handle_sell_request(request)
-                    else:
-                        raise Exception("Unknown 'type' key value in buy/sell request! Request: {}".format(request))
+        if request:
+            timestamps = request.get("timestamps")
+            if timestamps is not None:
+                stamp(timestamps, "handling")
+            if "type" in request and "price" in request and "fiat" in request:
+                if request["type"] == "buy":
+                    client_order_id = self.handle_buy_request(request)
+                elif request["type"] == "sell":
+                    client_order_id = self.handle_sell_request(request)
                 else:
-                    raise Exception("The incoming buy/sell request doesn't contain required keys! Request: {}".format(request))
+                    raise Exception("Unknown 'type' key value in buy/sell request! Request: {}".format(request))
+            else:
+                raise Exception("The incoming buy/sell request doesn't contain required keys! Request: {}".format(request))
+            if timestamps is not None:
+                stamp(timestamps, "handled")
+                if not client_order_id and "order_queued" not in timestamps:
+                    # No order has been sent - the trace ends here (otherwise it's recorded once the order is sent / closed)
+                    self.latency_tracker.record_trace(timestamps)
+
+    def expire_pending_orders(self):
+        '''
+        Orders never accepted by the exchange (e.g. no response to the placing) - not to be kept forever
+        '''
+        for order in self.order_store.expire_pending(max_age=self.order_timeout):
+            self.logger.warning("Order not accepted in {} s - removed from the order store: {}".format(self.order_timeout, order))
+
+    def publish_latency_report(self):
+        '''
+        Makes the latency histograms' summaries queryable at runtime (shared_user_api_data["latency"])
+        '''
+        self.shared_user_api_data["latency"] = self.latency_tracker.report()
 
     async def run(self):
 
@@ -382,16 +557,20 @@ class FtxUserApiWorker(object):
             debug=self.debug,
             logger=self.logger,
             pushover_notifier=self.pushover_notifier,
+            websocket_uri=self.websocket_uri,
+            latency_observer=self.latency_tracker.record_trace,
             api_key=self.ftx_client.ftx_api_key,
             api_secret=self.ftx_client.ftx_api_secret,
             channels=[
                 # "user.balance",
-                # "user.order"
-            ],
+                "orders",
+                "fills"
+            ] if self.ftx_client.ftx_api_key else [],  # Private channels - "Not logged in" without an API key
             channels_handling_map={
                 # "user.balance": self.handle_channel_event_user_balance,
-                # "user.order": self.handle_channel_event_user_order
-            },
+                "orders": self.handle_channel_event_user_order,
+                "fills": self.handle_channel_event_user_fill
+            } if self.ftx_client.ftx_api_key else {},
             responses_handling_map={
                 # "public/get-instruments": self.handle_response_get_instruments,
                 # "private/get-account-summary": self.handle_response_get_user_balances,
@@ -405,14 +584,24 @@ class FtxUserApiWorker(object):
             #     "public/get-instruments": self.get_instruments
             # }
         )
+        if self.ftx_client.ftx_api_key and self.rest_api_url:
+            self.ftx_rest_client = FtxRestClient(self.ftx_client.ftx_api_key, self.ftx_client.ftx_api_secret, subaccount=self.ftx_client.ftx_subaccount, base_url=self.rest_api_url, logger=self.logger)
+            self.periodic_calls.append(TimerScheduler.get().call_periodic(60, self.refresh_account_state, first_delay=0))
         self.pushover_notify("Started!", 1)
 
+        self.periodic_calls.append(TimerScheduler.get().call_periodic(5, self.publish_latency_report))
+        self.periodic_calls.append(TimerScheduler.get().call_periodic(60, self.expire_pending_orders))
+
+        self.buy_sell_requests_queue = asyncio.Queue()
+        self.buy_sell_requests_channel.attach(asyncio.get_running_loop(), self.receive_buy_sell_request)
         while True:
-            await asyncio.sleep(0)  # This line is VERY important: In the case of trying to concurrently run two looping Tasks (here handle_requests() and handle_events_and_responses()), unless the Task has an internal await expression, it will get stuck in the while loop, effectively blocking other tasks from running (much like a normal while loop). However, as soon the Tasks have to (a)wait, they run concurrently without an issue. Check this: https://stackoverflow.com/questions/29269370/how-to-properly-create-and-run-concurrent-tasks-using-pythons-asyncio-module
-            # Handle externally injected buy/sell requests
-            if self.ftx_api_client.initialized:
+            # Handle externally injected buy/sell requests (only when the client is initialized)
+            await self.ftx_api_client.initialized_event.wait()
+            request = await self.buy_sell_requests_queue.get()
+            if request:
+                await self.ftx_api_client.initialized_event.wait()
                 try:
-                    self.handle_buy_sell_requests()
+                    self.handle_buy_sell_requests(request)
                 except Exception as e:
                     message = "Exception during handling buy/sell request: {}".format(repr(e))
                     self.logger.exception(message)
@@ -421,6 +610,11 @@ class FtxUserApiWorker(object):
 
     async def cleanup(self):
         self.logger.info("Cleanup before closing worker...")
+        for periodic_call in self.periodic_calls:
+            periodic_call.cancel()
+        self.buy_sell_requests_channel.detach()
+        if self.ftx_rest_client:
+            await self.ftx_rest_client.close()
 
     def run_forever(self):
         # executor = ProcessPoolExecutor(2)  # Alternatively ThreadPoolExecutor
@@ -436,7 +630,10 @@ class FtxUserApiWorker(object):
                 asyncio.get_event_loop().run_until_complete(self.cleanup())
                 pidfile.close(fh=pidfile.fh, cleanup=True)
                 self.pushover_notify("Interrupted! Bye bye!")
+                if self.pushover_notifier:
+                    self.pushover_notifier.flush()
                 self.logger.info("Bye bye!")
+                async_logging.shutdown()
                 try:
                     sys.exit(0)
                 except SystemExit:
@@ -448,5 +645,7 @@ class FtxUserApiWorker(object):
                 asyncio.get_event_loop().run_until_complete(self.cleanup())
                 pidfile.close(fh=pidfile.fh, cleanup=True)
                 self.pushover_notify("Bye bye!")
+                if self.pushover_notifier:
+                    self.pushover_notifier.flush()
                 self.logger.info("Bye bye!")
-
+                async_logging.shutdown()
@@ -0,0 +1,95 @@
+'''
+Many FtxUserApiWorker instances (accounts) on one event loop of one process, instead of a process per account.
+
+Every worker keeps its own websocket (FtxApiClient), signal channel, loggers and pushover notifier - only the
+interpreter, the event loop and its TimerScheduler are shared. A worker failing doesn't stop the other ones.
+ftx_trader.py shards the accounts across "user_api_processes" processes (see shard_accounts).
+
+eg. usage:
+
+    group = FtxUserApiWorkerGroup([FtxUserApiWorker(...), FtxUserApiWorker(...)], name="0")
+    Process(target=group.run_forever).start()
+'''
+
+import os
+import sys
+import asyncio
+import logging
+from typing import List
+import async_logging
+from pid import PidFile
+from ftx_user_api_worker import FtxUserApiWorker
+
+
+def shard_accounts(accounts: list, processes: int):
+    '''
+    Round robin, e.g. 5 accounts into 2 processes -> [[a0, a2, a4], [a1, a3]]
+    '''
+    return [shard for shard in (accounts[i::processes] for i in range(processes)) if shard]
+
+
+class FtxUserApiWorkerGroup(object):
+
+    def __init__(self, workers: List[FtxUserApiWorker], name: str, log_file: str = None):
+        print("Initializing ftx user api worker group: {} ({} accounts)".format(name, len(workers)))
+        self.workers = workers
+        self.name = name
+        self.log_file = log_file if log_file else "./logs/ftx_user_api_worker_group_{}.log".format(name)
+        self.logger = logging.getLogger("ftx_user_api_worker_group_{}".format(name))
+        FtxUserApiWorkerGroup.setup_logger(self.logger, self.log_file)
+        self.worker_tasks = []
+
+    @staticmethod
+    def setup_logger(logger, log_file):
+        async_logging.setup_logger(logger, log_file)
+
+    async def run_worker(self, worker: FtxUserApiWorker):
+        '''
+        As FtxUserApiWorker.run_forever, but only this worker ends on an exception
+        '''
+        try:
+            await worker.run()
+        except asyncio.CancelledError:
+            worker.logger.info("Interrupted")
+            worker.pushover_notify("Interrupted! Bye bye!")
+            raise
+        except Exception as e:
+            worker.pushover_notify(repr(e))
+            worker.logger.exception(repr(e))
+            worker.pushover_notify("Bye bye!")
+        finally:
+            await worker.cleanup()
+            worker.logger.info("Bye bye!")
+            self.logger.info("Worker: {} finished ({} running)".format(worker.logger.name, sum(1 for task in self.worker_tasks if not task.done()) - 1))
+
+    async def run(self):
+        self.logger.info("Running workers: {}".format([worker.logger.name for worker in self.workers]))
+        self.worker_tasks = [asyncio.ensure_future(self.run_worker(worker)) for worker in self.workers]
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+
+    async def stop(self):
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+
+    def run_forever(self):
+        with PidFile(pidname="ftx_user_api_worker_group_{}".format(self.name), piddir="./logs") as pidfile:
+            loop = asyncio.get_event_loop()
+            try:
+                loop.run_until_complete(self.run())
+            except KeyboardInterrupt:
+                self.logger.info("Interrupted")
+                loop.run_until_complete(self.stop())
+            except Exception as e:
+                self.logger.exception(repr(e))
+            finally:
+                pidfile.close(fh=pidfile.fh, cleanup=True)
+                for worker in self.workers:
+                    if worker.pushover_notifier:
+                        worker.pushover_notifier.flush()
+                self.logger.info("Bye bye!")
+                async_logging.shutdown()
+        try:
+            sys.exit(0)
+        except SystemExit:
+            os._exit(0)
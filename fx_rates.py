@@ -0,0 +1,171 @@
+'''
+Async FX rates service (e.g. EUR/USD for the alerts in EUR).
+
+    - one persistent (keep-alive) aiohttp connection pool for all the requests
+    - revalidation with ETag / Last-Modified (If-None-Match / If-Modified-Since -> 304 Not Modified)
+    - TTL cache: no request at all while the cached rates are fresh
+    - several currency pairs (one request per base currency)
+    - providers fallback: the providers are tried in the configured order until one of them gives the rates
+    - every rate has its staleness metadata (FxRate.age / FxRate.stale) and is published into SharedMarketData as a
+      market named by the pair (bid = ask = last = rate, time = when the rate was fetched / revalidated), so workers
+      read it (and its age) lock-free: shared_market_data.read("EUR/USD").last / shared_market_data.age("EUR/USD")
+
+Providers are URL templates of the APIs returning {"rates": {"<quote currency>": <rate>, ...}, ...}, e.g.
+    https://api.exchangeratesapi.io/latest?base={base}&symbols={symbols}
+    https://api.frankfurter.app/latest?from={base}&to={symbols}
+
+eg. usage (on the worker's loop):
+
+    fx_rates = FxRateService(["https://api.frankfurter.app/latest?from={base}&to={symbols}"], ["EUR/USD"], shared_market_data)
+    TimerScheduler.get().call_periodic(5, fx_rates.refresh)
+    ...
+    fx_rates.get("EUR/USD")     # FxRate(pair='EUR/USD', rate=1.2271, provider=..., fetched_time=..., ...)
+    await fx_rates.close()
+'''
+
+import time
+import logging
+from collections import namedtuple
+from typing import List
+import json_codec
+from shared_market_data import SharedMarketData
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+DEFAULT_MAX_AGE = 6 * 3600.0  # Seconds after which a rate not refreshed (e.g. all providers failing) is stale
+
+
+class FxRate(namedtuple("FxRate", ["pair", "rate", "provider", "fetched_time", "max_age"])):
+    '''
+    fetched_time - when the rate was fetched or revalidated (unix time)
+    '''
+
+    __slots__ = ()
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_time
+
+    @property
+    def stale(self):
+        return self.age > self.max_age
+
+
+class CachedRates(object):
+    '''
+    Cached response of a provider for a base currency
+    '''
+
+    __slots__ = ("rates", "etag", "last_modified", "fetched_time", "expires")
+
+    def __init__(self):
+        self.rates = {}
+        self.etag = None
+        self.last_modified = None
+        self.fetched_time = 0.0
+        self.expires = 0.0  # monotonic time
+
+
+class FxRateService(object):
+
+    def __init__(self, providers: List[str], pairs: List[str], shared_market_data: SharedMarketData = None, ttl: float = 60.0, max_age: float = DEFAULT_MAX_AGE, timeout: float = 4.0, logger: logging.Logger = None):
+        if not aiohttp:
+            raise Exception("FxRateService requires aiohttp!")
+        self.providers = providers
+        self.pairs = pairs
+        self.shared_market_data = shared_market_data
+        self.ttl = ttl  # Seconds the fetched rates are used without asking the provider again
+        self.max_age = max_age  # Seconds after which a rate not refreshed (e.g. all providers failing) is stale
+        self.timeout = timeout
+        self.logger = logger if logger else logging.getLogger("fx_rates")
+        self.quotes_by_base = {}  # base currency -> [quote currencies]
+        for pair in pairs:
+            base, quote = pair.split("/")
+            self.quotes_by_base.setdefault(base, []).append(quote)
+        self.cache = {}  # (provider, base) -> CachedRates
+        self.rates = {}  # pair -> FxRate
+        self.session = None
+        self.last_errors = {}  # base -> last error message (every new error is logged once)
+        self.requests = 0
+        self.not_modified = 0
+
+    def get(self, pair: str):
+        return self.rates.get(pair)
+
+    def get_session(self):
+        if not self.session or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=2, keepalive_timeout=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self.session
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def refresh(self):
+        '''
+        Refreshes all the pairs (to be called periodically)
+        '''
+        for base, quotes in self.quotes_by_base.items():
+            errors = []
+            for provider in self.providers:
+                try:
+                    cached = await self.fetch(provider, base, quotes)
+                    for quote in quotes:
+                        self.publish(FxRate(base + "/" + quote, float(cached.rates[quote]), provider, cached.fetched_time, self.max_age))
+                except Exception as e:
+                    errors.append("{}: {}".format(provider, repr(e)))
+                    continue
+                break
+            else:
+                message = "Cannot get FX rates for: {} from any provider! Errors: {}".format(base, errors)
+                if self.last_errors.get(base) != message:
+                    self.logger.error(message)
+                    self.last_errors[base] = message
+                continue
+            if base in self.last_errors:
+                self.logger.info("FX rates for: {} are available again".format(base))
+                del self.last_errors[base]
+
+    async def fetch(self, provider: str, base: str, quotes: List[str]):
+        cached = self.cache.get((provider, base))
+        if cached and time.monotonic() < cached.expires and all(quote in cached.rates for quote in quotes):
+            return cached  # Fresh enough
+        headers = {}
+        if cached:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        url = provider.format(base=base, symbols=",".join(quotes))
+        self.requests += 1
+        async with self.get_session().get(url, headers=headers) as response:
+            if response.status == 304 and cached:
+                self.not_modified += 1
+            elif response.status == 200:
+                data = json_codec.loads(await response.read())
+                rates = data["rates"]
+                missing_quotes = [quote for quote in quotes if quote not in rates]
+                if missing_quotes:
+                    raise Exception("Rates missing for: {}".format(missing_quotes))
+                cached = CachedRates()
+                cached.rates = rates
+                cached.etag = response.headers.get("ETag")
+                cached.last_modified = response.headers.get("Last-Modified")
+                self.cache[(provider, base)] = cached
+            else:
+                raise Exception("HTTP status: {}".format(response.status))
+        cached.fetched_time = time.time()
+        cached.expires = time.monotonic() + self.ttl
+        return cached
+
+    def publish(self, fx_rate: FxRate):
+        self.rates[fx_rate.pair] = fx_rate
+        if self.shared_market_data:
+            self.shared_market_data.update(fx_rate.pair, bid=fx_rate.rate, ask=fx_rate.rate, last=fx_rate.rate, timestamp=fx_rate.fetched_time)
@@ -0,0 +1,358 @@
+'''
+Streaming technical indicators over OHLCV bars (see ohlcv.py): EMA, SMA, RSI, ATR, Bollinger bands and VWAP.
+
+Every indicator has two ways of computing the same values:
+    - update(bar): O(1) per new (closed) bar - bar is a row [time, open, high, low, close, volume, trades]
+    - warm_up(bars): the whole history at once, vectorized with NumPy (bars - a 2D array of the rows, e.g.
+      OhlcvBars.view()) - returns the values for every bar and leaves the indicator's state as if all the bars had been
+      passed to update(), so the streaming updates carry on from there
+
+The values are NaN until the indicator is ready (e.g. SMA before "period" bars).
+
+EMA, RSI and ATR use the first value as the seed of the recursion (RSI and ATR use Wilder's smoothing: alpha = 1 /
+period). The vectorized recursion (ema()) is computed in blocks, so the powers of (1 - alpha) stay in the float range.
+
+eg. usage:
+
+    rsi = RSI(14)
+    history = rsi.warm_up(bars.view()[:-1])     # All the closed bars
+    value = rsi.update(closed_bar)              # Then on every closed bar
+'''
+
+import math
+from collections import deque
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+TIME, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)  # ohlcv.FIELDS columns
+
+
+def ema(values, alpha: float):
+    '''
+    y[0] = x[0], y[i] = y[i-1] + alpha * (x[i] - y[i-1]) - vectorized: within a block y[i] = w^(i+1) * (carry + alpha *
+    cumsum(x[k] / w^(k+1))[i]), w = 1 - alpha
+    '''
+    values = np.asarray(values, dtype=float)
+    out = np.empty(len(values))
+    if not len(values):
+        return out
+    w = 1.0 - alpha
+    if w <= 0.0:
+        out[:] = values
+        return out
+    out[0] = values[0]
+    block = max(1, int(30.0 / -math.log(w)))  # w^-block <= e^30
+    powers = w ** np.arange(1, min(block, len(values)) + 1)
+    carry = values[0]
+    for start in range(1, len(values), block):
+        x = values[start:start + block]
+        p = powers[:len(x)]
+        out[start:start + len(x)] = p * (carry + alpha * np.cumsum(x / p))
+        carry = out[start + len(x) - 1]
+    return out
+
+
+def rolling_mean(values, period: int):
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        sums = np.cumsum(values)
+        out[period - 1] = sums[period - 1]
+        out[period:] = sums[period:] - sums[:-period]
+        out[period - 1:] /= period
+    return out
+
+
+class Indicator(object):
+
+    name = None
+
+    def __init__(self):
+        if not np:
+            raise Exception("Indicators require numpy!")
+        self.value = math.nan
+
+    def update(self, bar):
+        raise NotImplementedError
+
+    def warm_up(self, bars):
+        raise NotImplementedError
+
+
+class EMA(Indicator):
+
+    name = "ema"
+
+    def __init__(self, period: int, field: int = CLOSE):
+        super().__init__()
+        self.period = period
+        self.field = field
+        self.alpha = 2.0 / (period + 1)
+        self.average = None
+        self.count = 0
+
+    def update(self, bar):
+        x = bar[self.field]
+        if self.average is None:
+            self.average = x
+        else:
+            self.average += self.alpha * (x - self.average)
+        self.count += 1
+        self.value = self.average if self.count >= self.period else math.nan
+        return self.value
+
+    def warm_up(self, bars):
+        values = ema(bars[:, self.field], self.alpha)
+        self.count = len(values)
+        if self.count:
+            self.average = values[-1]
+        values[:self.period - 1] = np.nan
+        self.value = values[-1] if self.count else math.nan
+        return values
+
+
+class SMA(Indicator):
+
+    name = "sma"
+
+    def __init__(self, period: int, field: int = CLOSE):
+        super().__init__()
+        self.period = period
+        self.field = field
+        self.window = deque(maxlen=period)
+        self.sum = 0.0
+        self.updates = 0
+
+    def update(self, bar):
+        x = bar[self.field]
+        window = self.window
+        if len(window) == self.period:
+            self.sum -= window[0]
+        window.append(x)
+        self.updates += 1
+        if self.updates % self.period:
+            self.sum += x
+        else:
+            self.sum = math.fsum(window)  # No drift of the running sum
+        self.value = self.sum / self.period if len(window) == self.period else math.nan
+        return self.value
+
+    def warm_up(self, bars):
+        x = bars[:, self.field]
+        self.window.clear()
+        self.window.extend(x[-self.period:].tolist())
+        self.sum = math.fsum(self.window)
+        self.updates = len(x)
+        values = rolling_mean(x, self.period)
+        self.value = values[-1] if len(values) else math.nan
+        return values
+
+
+class RSI(Indicator):
+
+    name = "rsi"
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.period = period
+        self.alpha = 1.0 / period
+        self.previous_close = None
+        self.average_gain = None
+        self.average_loss = None
+        self.count = 0
+
+    @staticmethod
+    def rsi(average_gain, average_loss):
+        if average_loss == 0.0:
+            return 50.0 if average_gain == 0.0 else 100.0
+        return 100.0 - 100.0 / (1.0 + average_gain / average_loss)
+
+    def update(self, bar):
+        close = bar[CLOSE]
+        if self.previous_close is not None:
+            change = close - self.previous_close
+            gain, loss = (change, 0.0) if change > 0 else (0.0, -change)
+            if self.average_gain is None:
+                self.average_gain, self.average_loss = gain, loss
+            else:
+                self.average_gain += self.alpha * (gain - self.average_gain)
+                self.average_loss += self.alpha * (loss - self.average_loss)
+            self.count += 1
+        self.previous_close = close
+        self.value = self.rsi(self.average_gain, self.average_loss) if self.count >= self.period else math.nan
+        return self.value
+
+    def warm_up(self, bars):
+        close = bars[:, CLOSE]
+        values = np.full(len(close), np.nan)
+        if len(close):
+            self.previous_close = close[-1]
+        if len(close) < 2:
+            return values
+        changes = np.diff(close)
+        average_gains = ema(np.maximum(changes, 0.0), self.alpha)
+        average_losses = ema(np.maximum(-changes, 0.0), self.alpha)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100.0 - 100.0 / (1.0 + average_gains / average_losses)
+        rsi = np.where(average_losses == 0.0, np.where(average_gains == 0.0, 50.0, 100.0), rsi)
+        values[1:] = rsi
+        values[:self.period] = np.nan
+        self.average_gain, self.average_loss = average_gains[-1], average_losses[-1]
+        self.count = len(changes)
+        self.value = values[-1]
+        return values
+
+
+class ATR(Indicator):
+
+    name = "atr"
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.period = period
+        self.alpha = 1.0 / period
+        self.previous_close = None
+        self.average = None
+        self.count = 0
+
+    def update(self, bar):
+        high, low = bar[HIGH], bar[LOW]
+        if self.previous_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.previous_close = bar[CLOSE]
+        if self.average is None:
+            self.average = true_range
+        else:
+            self.average += self.alpha * (true_range - self.average)
+        self.count += 1
+        self.value = self.average if self.count >= self.period else math.nan
+        return self.value
+
+    def warm_up(self, bars):
+        high, low, close = bars[:, HIGH], bars[:, LOW], bars[:, CLOSE]
+        if not len(close):
+            return np.full(0, np.nan)
+        true_range = high - low
+        true_range[1:] = np.maximum(true_range[1:], np.maximum(np.abs(high[1:] - close[:-1]), np.abs(low[1:] - close[:-1])))
+        values = ema(true_range, self.alpha)
+        self.previous_close = close[-1]
+        self.average = values[-1]
+        self.count = len(values)
+        values[:self.period - 1] = np.nan
+        self.value = values[-1]
+        return values
+
+
+class Bollinger(Indicator):
+    '''
+    (middle, upper, lower) = SMA -/+ deviations * standard deviation (population) of the last "period" closes
+    '''
+
+    name = "bollinger"
+
+    def __init__(self, period: int = 20, deviations: float = 2.0):
+        super().__init__()
+        self.period = period
+        self.deviations = deviations
+        self.window = deque(maxlen=period)
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of the squared differences from the mean (Welford, sliding)
+        self.updates = 0
+        self.value = (math.nan, math.nan, math.nan)
+
+    def update(self, bar):
+        x = bar[CLOSE]
+        window = self.window
+        self.updates += 1
+        if len(window) < self.period:
+            window.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(window)
+            self.m2 += delta * (x - self.mean)
+        else:
+            old = window[0]
+            window.append(x)
+            mean = self.mean + (x - old) / self.period
+            self.m2 += (x - old) * (x - mean + old - self.mean)
+            self.mean = mean
+        if not self.updates % self.period:  # No drift of the running moments
+            self.mean = math.fsum(window) / len(window)
+            self.m2 = math.fsum((value - self.mean) ** 2 for value in window)
+        if len(window) < self.period:
+            self.value = (math.nan, math.nan, math.nan)
+        else:
+            width = self.deviations * math.sqrt(max(self.m2, 0.0) / self.period)
+            self.value = (self.mean, self.mean + width, self.mean - width)
+        return self.value
+
+    def warm_up(self, bars):
+        close = bars[:, CLOSE]
+        values = np.full((len(close), 3), np.nan)
+        if len(close) >= self.period:
+            windows = sliding_window_view(close, self.period)
+            mean = windows.mean(axis=1)
+            width = self.deviations * windows.std(axis=1)
+            values[self.period - 1:] = np.column_stack((mean, mean + width, mean - width))
+        self.window.clear()
+        self.window.extend(close[-self.period:].tolist())
+        self.mean = math.fsum(self.window) / len(self.window) if self.window else 0.0
+        self.m2 = math.fsum((value - self.mean) ** 2 for value in self.window)
+        self.updates = len(close)
+        self.value = tuple(values[-1]) if len(close) else (math.nan, math.nan, math.nan)
+        return values
+
+
+class VWAP(Indicator):
+    '''
+    Volume weighted average of the typical price (high + low + close) / 3, restarted every session (UTC days by default)
+    '''
+
+    name = "vwap"
+
+    def __init__(self, session: int = 86400):
+        super().__init__()
+        self.session = session
+        self.session_id = None
+        self.price_volume = 0.0
+        self.volume = 0.0
+
+    def update(self, bar):
+        session_id = bar[TIME] // self.session
+        if session_id != self.session_id:
+            self.session_id = session_id
+            self.price_volume = self.volume = 0.0
+        typical_price = (bar[HIGH] + bar[LOW] + bar[CLOSE]) / 3.0
+        self.price_volume += typical_price * bar[VOLUME]
+        self.volume += bar[VOLUME]
+        self.value = self.price_volume / self.volume if self.volume else typical_price
+        return self.value
+
+    def warm_up(self, bars):
+        if not len(bars):
+            return np.full(0, np.nan)
+        typical_price = (bars[:, HIGH] + bars[:, LOW] + bars[:, CLOSE]) / 3.0
+        volume = bars[:, VOLUME]
+        price_volume = np.cumsum(typical_price * volume)
+        cumulative_volume = np.cumsum(volume)
+        session_ids = bars[:, TIME] // self.session
+        starts = np.flatnonzero(np.r_[True, session_ids[1:] != session_ids[:-1]])
+        session_starts = np.repeat(starts, np.diff(np.r_[starts, len(bars)]))  # Per bar: the index of its session's first bar
+        before = session_starts - 1
+        price_volume -= np.where(before >= 0, price_volume[before], 0.0)
+        cumulative_volume -= np.where(before >= 0, cumulative_volume[before], 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.where(cumulative_volume > 0, price_volume / cumulative_volume, typical_price)
+        self.session_id = session_ids[-1]
+        self.price_volume = price_volume[-1]
+        self.volume = cumulative_volume[-1]
+        self.value = values[-1]
+        return values
+
+
+INDICATORS = {indicator.name: indicator for indicator in (EMA, SMA, RSI, ATR, Bollinger, VWAP)}
@@ -0,0 +1,166 @@
+'''
+Pluggable JSON codec for the websocket frames.
+Uses msgspec or orjson when installed and falls back to the stdlib json module otherwise.
+The backend can be forced with the FTX_TRADER_JSON_BACKEND environment variable ("msgspec", "orjson" or "json").
+
+Channel messages of the known channels can be decoded with typed "data" (see FrameDecoder), so handlers use
+attribute access (data.bid) instead of repeated dict lookups. With msgspec the data is decoded straight into Structs,
+with the other backends it's converted into namedtuples with the same fields.
+'''
+
+import os
+import json
+from collections import namedtuple
+from typing import List, Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+BACKENDS = [name for name, module in (("msgspec", msgspec), ("orjson", orjson)) if module] + ["json"]
+
+TICKER_FIELDS = ("bid", "ask", "bidSize", "askSize", "last", "time")
+ORDERBOOK_FIELDS = ("time", "checksum", "bids", "asks", "action")
+TRADE_FIELDS = ("id", "price", "size", "side", "liquidation", "time")
+
+# Fallback typed data (the msgspec backend uses the Structs below)
+TickerData = namedtuple("TickerData", TICKER_FIELDS)
+OrderbookData = namedtuple("OrderbookData", ORDERBOOK_FIELDS)
+TradeData = namedtuple("TradeData", TRADE_FIELDS)
+
+if msgspec:
+    class TickerStruct(msgspec.Struct):
+        bid: Optional[float] = None
+        ask: Optional[float] = None
+        bidSize: Optional[float] = None
+        askSize: Optional[float] = None
+        last: Optional[float] = None
+        time: float = 0.0
+
+    class OrderbookStruct(msgspec.Struct):
+        time: float = 0.0
+        checksum: int = 0
+        bids: List[List[float]] = []
+        asks: List[List[float]] = []
+        action: str = ""
+
+    class TradeStruct(msgspec.Struct):
+        id: Optional[int] = None
+        price: float = 0.0
+        size: float = 0.0
+        side: str = ""
+        liquidation: bool = False
+        time: str = ""
+
+    class ChannelEnvelope(msgspec.Struct):
+        channel: Optional[str] = None
+        market: Optional[str] = None
+        type: Optional[str] = None
+        data: msgspec.Raw = None
+
+
+def default_backend():
+    backend = os.environ.get("FTX_TRADER_JSON_BACKEND")
+    if backend:
+        if backend not in BACKENDS:
+            raise Exception("JSON backend: {} is not available! Available backends: {}".format(backend, BACKENDS))
+        return backend
+    return BACKENDS[0]
+
+
+def get_loads(backend: str):
+    if backend == "msgspec":
+        return msgspec.json.Decoder().decode
+    elif backend == "orjson":
+        return orjson.loads
+    return json.loads
+
+
+def get_dumps(backend: str):
+    '''
+    Note! Always returns str - websockets sends bytes as binary frames
+    '''
+    if backend == "msgspec":
+        encode = msgspec.json.Encoder().encode
+        return lambda obj: encode(obj).decode()
+    elif backend == "orjson":
+        return lambda obj: orjson.dumps(obj).decode()
+    return json.dumps
+
+
+BACKEND = default_backend()
+loads = get_loads(BACKEND)
+dumps = get_dumps(BACKEND)
+
+
+def to_ticker(data: dict):
+    return TickerData(*map(data.get, TICKER_FIELDS))
+
+
+def to_orderbook(data: dict):
+    return OrderbookData(*map(data.get, ORDERBOOK_FIELDS))
+
+
+def to_trades(data: list):
+    return [TradeData(*map(trade.get, TRADE_FIELDS)) for trade in data]
+
+
+class FrameDecoder(object):
+    '''
+    Decodes the received websocket frames into dicts. For the channels passed in typed_channels (e.g. ["ticker",
+    "orderbook", "trades"]) the channel messages' "data" is decoded into typed data (TickerData / OrderbookData /
+    list of TradeData or their msgspec Struct equivalents - the same attributes).
+    '''
+
+    TYPED_DATA = {
+        "ticker": ("TickerStruct", to_ticker),
+        "orderbook": ("OrderbookStruct", to_orderbook),
+        "trades": ("TradeStruct", to_trades),
+    }
+
+    def __init__(self, typed_channels: List[str] = None, backend: str = None):
+        self.backend = backend if backend else BACKEND
+        self.loads = get_loads(self.backend)
+        self.typed_channels = set(typed_channels) if typed_channels else set()
+        for channel in self.typed_channels:
+            if channel not in self.TYPED_DATA:
+                raise Exception("No typed data defined for channel: {}".format(channel))
+        if self.backend == "msgspec" and self.typed_channels:
+            self.envelope_decoder = msgspec.json.Decoder(ChannelEnvelope)
+            self.data_decoders = {}
+            for channel in self.typed_channels:
+                struct = globals()[self.TYPED_DATA[channel][0]]
+                self.data_decoders[channel] = msgspec.json.Decoder(List[struct] if channel == "trades" else struct).decode
+            self.decode = self.decode_msgspec_typed
+        elif self.typed_channels:
+            self.converters = {channel: self.TYPED_DATA[channel][1] for channel in self.typed_channels}
+            self.decode = self.decode_typed
+        else:
+            self.decode = self.loads
+
+    def decode_typed(self, frame):
+        message = self.loads(frame)
+        converter = self.converters.get(message.get("channel"))
+        if converter and message.get("type") in ("partial", "update"):
+            message["data"] = converter(message["data"])
+        return message
+
+    def decode_msgspec_typed(self, frame):
+        envelope = self.envelope_decoder.decode(frame)
+        data_decoder = self.data_decoders.get(envelope.channel)
+        if data_decoder and envelope.type in ("partial", "update"):
+            return {
+                "channel": envelope.channel,
+                "market": envelope.market,
+                "type": envelope.type,
+                "data": data_decoder(envelope.data)
+            }
+        # Not a typed channel message (pong, subscribed, error, responses...)
+        return self.loads(frame)
@@ -0,0 +1,214 @@
+'''
+Capture of the raw websocket frames (with their receive timestamps) into segmented, compressed, append-only files, and
+memory-mapped replay of them (e.g. for reproducing incidents, backtests or feeding the benchmarks' stand-in server).
+
+Segment file (<directory>/market_data_<first receive time in ns>.ftxcap) is a sequence of independent blocks:
+    block header:   magic, first receive time, last receive time, records count, raw length, compressed length
+    block payload:  zlib compressed records, each: receive time (float64), frame length (uint32), utf-8 frame
+A block is written at once, so after a crash only the last (truncated) block of the last segment can be lost.
+
+eg. usage:
+
+    recorder = MarketDataRecorder("./captures")
+    recorder.record(frame, time.time())      # Non-blocking - the writing is done by a background thread (the frame is
+                                             # dropped and counted if max_pending frames are already waiting)
+    recorder.close()
+
+    reader = MarketDataCaptureReader("./captures")
+    for receive_time, frame in reader.replay(start=1603922220.0, end=1603925820.0):
+        ...
+
+Or from the command line (one frame per line, e.g. for benchmarks/ftx_stand_in_server.py --frames):
+    python market_data_recorder.py <directory> [--start <unix time>] [--end <unix time>] > frames.txt
+'''
+
+import os
+import sys
+import mmap
+import glob
+import zlib
+import time
+import struct
+import logging
+import argparse
+import threading
+from bisect import bisect_left
+from queue import Queue, Empty, Full
+
+
+BLOCK_HEADER = struct.Struct("<4sddIII")
+BLOCK_MAGIC = b"FTXB"
+RECORD_HEADER = struct.Struct("<dI")
+SEGMENT_EXTENSION = ".ftxcap"
+
+
+class MarketDataRecorder(object):
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, block_size: int = 256 * 1024, flush_interval: float = 1.0, compression_level: int = 6, logger: logging.Logger = None,
+                 max_pending: int = 100000):
+        self.directory = directory
+        self.segment_size = segment_size  # Bytes (compressed) per segment file
+        self.block_size = block_size  # Bytes (uncompressed) per compressed block
+        self.flush_interval = flush_interval  # Max seconds the records wait in memory before being written
+        self.compression_level = compression_level
+        self.logger = logger if logger else logging.getLogger("market_data_recorder")
+        self.records_queue = Queue(maxsize=max_pending)  # Frames waiting for the writer (e.g. the disk stalls)
+        self.segment = None
+        self.segment_written = 0
+        self.recorded = 0
+        self.dropped = 0  # Frames not recorded: the queue was full or their block couldn't be written
+        os.makedirs(directory, exist_ok=True)
+        self.writer = threading.Thread(target=self.write_forever, name="market_data_recorder", daemon=True)
+        self.writer.start()
+
+    def record(self, frame, receive_time: float):
+        '''
+        Called from the receiving loop - only hands the frame over to the writer thread (never waits for it)
+        '''
+        try:
+            self.records_queue.put_nowait((receive_time, frame))
+        except Full:
+            if not self.dropped:
+                self.logger.error("Market data capture queue is full ({} frames) - dropping frames!".format(self.records_queue.maxsize))
+            self.dropped += 1
+
+    def close(self):
+        '''
+        Writes all the pending records and closes the current segment
+        '''
+        if self.writer.is_alive():
+            self.records_queue.put(None)
+            self.writer.join()
+
+    def write_forever(self):
+        records = []
+        raw_size = 0
+        block_started = None
+        closing = False
+        while not closing:
+            timeout = self.flush_interval - (time.monotonic() - block_started) if records else None
+            try:
+                item = self.records_queue.get(timeout=max(0.0, timeout) if timeout is not None else None)
+            except Empty:
+                item = False  # Flush interval elapsed
+            if item is None:
+                closing = True
+            elif item:
+                receive_time, frame = item
+                encoded_frame = frame.encode() if isinstance(frame, str) else frame
+                if not records:
+                    block_started = time.monotonic()
+                records.append((receive_time, encoded_frame))
+                raw_size += RECORD_HEADER.size + len(encoded_frame)
+                if raw_size < self.block_size:
+                    continue
+            if records:
+                try:
+                    self.write_block(records)
+                    self.recorded += len(records)
+                except Exception as e:
+                    self.dropped += len(records)
+                    self.logger.exception("Cannot write market data capture block ({} records dropped): {}".format(len(records), repr(e)))
+                records = []
+                raw_size = 0
+        if self.segment:
+            self.segment.close()
+            self.segment = None
+
+    def write_block(self, records: list):
+        payload = b"".join(RECORD_HEADER.pack(receive_time, len(frame)) + frame for receive_time, frame in records)
+        compressed_payload = zlib.compress(payload, self.compression_level)
+        if not self.segment or self.segment_written >= self.segment_size:
+            if self.segment:
+                self.segment.close()
+            path = os.path.join(self.directory, "market_data_{:020d}{}".format(int(records[0][0] * 1e9), SEGMENT_EXTENSION))
+            self.segment = open(path, "ab")
+            self.segment_written = self.segment.tell()
+            self.logger.info("Writing market data capture segment: {}".format(path))
+        block = BLOCK_HEADER.pack(BLOCK_MAGIC, records[0][0], records[-1][0], len(records), len(payload), len(compressed_payload)) + compressed_payload
+        self.segment.write(block)
+        self.segment.flush()
+        self.segment_written += len(block)
+
+
+class CaptureSegment(object):
+    '''
+    Memory-mapped segment file with the index of its blocks
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.blocks = []  # [(first receive time, last receive time, payload offset, compressed length)]
+        self.last_times = []
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        offset = 0
+        while offset + BLOCK_HEADER.size <= size:
+            magic, first_time, last_time, count, raw_length, compressed_length = BLOCK_HEADER.unpack_from(self.map, offset)
+            payload_offset = offset + BLOCK_HEADER.size
+            if magic != BLOCK_MAGIC or payload_offset + compressed_length > size:
+                break  # Truncated (e.g. being written or after a crash)
+            self.blocks.append((first_time, last_time, payload_offset, compressed_length))
+            self.last_times.append(last_time)
+            offset = payload_offset + compressed_length
+
+    def replay(self, start: float = None, end: float = None):
+        first_block = bisect_left(self.last_times, start) if start is not None else 0
+        for first_time, last_time, payload_offset, compressed_length in self.blocks[first_block:]:
+            if end is not None and first_time >= end:
+                return
+            payload = zlib.decompress(self.map[payload_offset:payload_offset + compressed_length])
+            offset = 0
+            payload_size = len(payload)
+            while offset < payload_size:
+                receive_time, length = RECORD_HEADER.unpack_from(payload, offset)
+                offset += RECORD_HEADER.size
+                if (start is None or receive_time >= start) and (end is None or receive_time < end):
+                    yield receive_time, payload[offset:offset + length].decode()
+                elif end is not None and receive_time >= end:
+                    return
+                offset += length
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+
+
+class MarketDataCaptureReader(object):
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, "*" + SEGMENT_EXTENSION)))
+
+    @staticmethod
+    def segment_start(path: str):
+        return int(os.path.basename(path)[len("market_data_"):-len(SEGMENT_EXTENSION)]) / 1e9
+
+    def replay(self, start: float = None, end: float = None):
+        '''
+        Yields (receive time, frame) of all the records with start <= receive time < end, in the recorded order
+        '''
+        paths = self.segment_paths()
+        for i, path in enumerate(paths):
+            if end is not None and self.segment_start(path) >= end:
+                return
+            if start is not None and i + 1 < len(paths) and self.segment_start(paths[i + 1]) <= start:
+                continue  # The whole segment is before start
+            segment = CaptureSegment(path)
+            try:
+                yield from segment.replay(start, end)
+            finally:
+                segment.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exports the captured frames (one per line) to stdout")
+    parser.add_argument("directory", type=str)
+    parser.add_argument("--start", type=float, default=None)
+    parser.add_argument("--end", type=float, default=None)
+    args = parser.parse_args()
+    for _, frame in MarketDataCaptureReader(args.directory).replay(args.start, args.end):
+        sys.stdout.write(frame + "\n")
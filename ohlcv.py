@@ -0,0 +1,205 @@
+'''
+Incremental OHLCV bars (candles) built from the FTX trades channel, for several timeframes per market.
+
+    - every timeframe's bars live in a preallocated NumPy ring buffer (capacity bars) - the memory is bounded and fixed
+      per market and timeframe, nothing is allocated per trade
+    - the ring buffer is mirrored (every row is written at i and at i + capacity, in one assignment), so the last n
+      bars are always one contiguous slice: readers get zero-copy, read only views (view() / column()) in time order
+    - a trades message is first reduced per bucket of the smallest timeframe (all the others are its multiples) and the
+      reduced bar is merged into every timeframe - one row write per message and timeframe, not per trade
+    - the trade times ("2021-05-01T12:00:01.123456+00:00") are parsed with a per second cache of the datetime part
+
+Bars without trades are not created (no flat bars for the gaps). Trades older than the current bar are dropped (and
+counted in late_trades). The bar closed listeners (add_bar_closed_listener) are called with (bars, closed bar) as soon as
+the first trade of the next bar arrives.
+
+eg. usage (in the market data worker):
+
+    aggregator = OhlcvAggregator(["BTC/USDT"], timeframes=["1s", "1m", "5m", "1h"])
+    aggregator.handle_trades("BTC/USDT", event["data"])     # trades channel event
+    bars = aggregator.bars("BTC/USDT", "1m").view(100)      # last 100 bars, columns: time open high low close volume trades
+    closes = aggregator.bars("BTC/USDT", "1m").column("close", 100)
+
+Note! The views are live: the last row is the current (still open) bar and the rows move on with the ring buffer -
+copy them if they are kept across new trades.
+'''
+
+from datetime import datetime, timezone
+from typing import List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+TIMEFRAMES = {"1s": 1, "1m": 60, "5m": 300, "15m": 900, "1h": 3600, "4h": 14400, "1d": 86400}
+FIELDS = ("time", "open", "high", "low", "close", "volume", "trades")  # time - the bar's start (epoch seconds)
+
+
+class OhlcvBars(object):
+    '''
+    Mirrored ring buffer of the bars of one market and timeframe
+    '''
+
+    def __init__(self, market: str, timeframe: str, capacity: int = 1000):
+        if not np:
+            raise Exception("OhlcvBars requires numpy!")
+        self.market = market
+        self.timeframe = timeframe
+        self.seconds = TIMEFRAMES[timeframe]
+        self.capacity = capacity
+        self.data = np.full((2 * capacity, len(FIELDS)), np.nan)
+        self.mirrored = self.data.reshape(2, capacity, len(FIELDS))  # mirrored[:, i] - both copies of the slot i
+        self.readonly = self.data.view()
+        self.readonly.flags.writeable = False
+        self.head = -1  # Slot of the current bar
+        self.count = 0
+        self.start = None  # The current bar's start
+        self.current = None  # The current bar: [time, open, high, low, close, volume, trades]
+        self.late_trades = 0
+        self.bar_closed_listeners = []  # callback(bars, closed bar)
+
+    def __len__(self):
+        return self.count
+
+    def update(self, start: float, open: float, high: float, low: float, close: float, volume: float, trades: int):
+        '''
+        Merges a partial bar (start - of the smallest timeframe bucket) into the current bar or starts a new one
+        '''
+        start -= start % self.seconds
+        current = self.current
+        if start == self.start:
+            if high > current[2]:
+                current[2] = high
+            if low < current[3]:
+                current[3] = low
+            current[4] = close
+            current[5] += volume
+            current[6] += trades
+        elif self.start is None or start > self.start:
+            closed = current
+            self.start = start
+            self.current = current = [start, open, high, low, close, volume, trades]
+            self.head = (self.head + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+            self.mirrored[:, self.head] = current
+            if closed:
+                for listener in self.bar_closed_listeners:
+                    listener(self, closed)
+            return
+        else:
+            self.late_trades += trades
+            return
+        self.mirrored[:, self.head] = current
+
+    def closed_view(self, n: int = None):
+        '''
+        As view() without the current bar
+        '''
+        n = self.count - 1 if n is None else min(n, self.count - 1)
+        end = self.head + self.capacity
+        return self.readonly[end - max(n, 0):end]
+
+    def view(self, n: int = None):
+        '''
+        Read only view of the last n bars (all of them by default), oldest first - the last one is the current bar
+        '''
+        n = self.count if n is None else min(n, self.count)
+        end = self.head + self.capacity + 1
+        return self.readonly[end - n:end]
+
+    def column(self, field: str, n: int = None):
+        return self.view(n)[:, FIELDS.index(field)]
+
+    def last(self):
+        return dict(zip(FIELDS, self.current)) if self.current else None
+
+
+class OhlcvAggregator(object):
+
+    def __init__(self, markets: List[str], timeframes: List[str] = None, capacity: int = 1000):
+        self.timeframes = timeframes if timeframes else ["1s", "1m", "5m", "1h"]
+        for timeframe in self.timeframes:
+            if timeframe not in TIMEFRAMES:
+                raise Exception("Unknown timeframe: {}. Supported: {}".format(timeframe, list(TIMEFRAMES.keys())))
+        self.capacity = capacity
+        self.bucket_seconds = min(TIMEFRAMES[timeframe] for timeframe in self.timeframes)
+        for timeframe in self.timeframes:
+            if TIMEFRAMES[timeframe] % self.bucket_seconds:
+                raise Exception("Timeframe: {} is not a multiple of the smallest timeframe".format(timeframe))
+        self.market_bars = {}  # market -> [OhlcvBars per timeframe]
+        self.bar_closed_listeners = []
+        for market in markets:
+            self.add_market(market)
+        self.time_prefix = None  # Trade time parsing cache: "YYYY-MM-DDTHH:MM:SS" -> epoch seconds
+        self.time_base = 0.0
+
+    def add_market(self, market: str):
+        if market not in self.market_bars:
+            self.market_bars[market] = [OhlcvBars(market, timeframe, self.capacity) for timeframe in self.timeframes]
+            for bars in self.market_bars[market]:
+                bars.bar_closed_listeners.extend(self.bar_closed_listeners)
+
+    def add_bar_closed_listener(self, listener):
+        '''
+        listener(bars, closed bar) for every market and timeframe
+        '''
+        self.bar_closed_listeners.append(listener)
+        for market_bars in self.market_bars.values():
+            for bars in market_bars:
+                bars.bar_closed_listeners.append(listener)
+
+    def bars(self, market: str, timeframe: str):
+        return self.market_bars[market][self.timeframes.index(timeframe)]
+
+    def nbytes(self):
+        return sum(bars.data.nbytes for market_bars in self.market_bars.values() for bars in market_bars)
+
+    def parse_time(self, value):
+        '''
+        FTX trade time (ISO 8601, UTC) -> epoch seconds
+        '''
+        if not isinstance(value, str):
+            return float(value)
+        if not value.endswith("+00:00"):
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        prefix = value[:19]
+        if prefix != self.time_prefix:
+            self.time_base = datetime.fromisoformat(prefix).replace(tzinfo=timezone.utc).timestamp()
+            self.time_prefix = prefix
+        fraction = value[19:-6]
+        return self.time_base + float(fraction) if fraction else self.time_base
+
+    def handle_trades(self, market: str, trades: list):
+        '''
+        Trades of a trades channel event (TradeData / TradeStruct / dicts), in the exchange's order
+        '''
+        market_bars = self.market_bars[market]
+        bucket_seconds = self.bucket_seconds
+        parse_time = self.parse_time
+        bucket = None
+        for trade in trades:
+            if isinstance(trade, dict):
+                price, size, trade_time = trade["price"], trade["size"], trade["time"]
+            else:
+                price, size, trade_time = trade.price, trade.size, trade.time
+            trade_time = parse_time(trade_time)
+            trade_bucket = trade_time - trade_time % bucket_seconds
+            if trade_bucket == bucket:
+                if price > high:
+                    high = price
+                elif price < low:
+                    low = price
+                close = price
+                volume += size
+                count += 1
+                continue
+            if bucket is not None:
+                for bars in market_bars:
+                    bars.update(bucket, open, high, low, close, volume, count)
+            bucket, open, high, low, close, volume, count = trade_bucket, price, price, price, price, size, 1
+        if bucket is not None:
+            for bars in market_bars:
+                bars.update(bucket, open, high, low, close, volume, count)
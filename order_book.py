@@ -0,0 +1,242 @@
+import zlib
+import logging
+from array import array
+from bisect import bisect_left
+from itertools import zip_longest
+from typing import Callable
+
+
+class OrderBookSide(object):
+    '''
+    Price levels of one side of the book kept in compact sorted arrays - the best level is always at index 0.
+    Bids are stored with negated prices, so both sides are sorted ascending.
+    Locating a level is O(log n) (bisect). Inserting / removing a level shifts the arrays (memmove) - negligible for
+    the level counts FTX sends (100 per side in the partial).
+    '''
+
+    def __init__(self, descending: bool):
+        self.sign = -1.0 if descending else 1.0
+        self.keys = array('d')  # sign * price
+        self.sizes = array('d')
+        self.checksum_fragments = []  # "price:size" strings in FTX checksum format, kept in sync with the levels
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        del self.keys[:]
+        del self.sizes[:]
+        del self.checksum_fragments[:]
+
+    def apply(self, price: float, size: float):
+        '''
+        Sets the size of the price level. Size 0 removes the level.
+        '''
+        key = self.sign * price
+        keys = self.keys
+        i = bisect_left(keys, key)
+        exists = i < len(keys) and keys[i] == key
+        if size == 0:
+            if exists:
+                del keys[i]
+                del self.sizes[i]
+                del self.checksum_fragments[i]
+        elif exists:
+            self.sizes[i] = size
+            self.checksum_fragments[i] = "{}:{}".format(float(price), float(size))
+        else:
+            keys.insert(i, key)
+            self.sizes.insert(i, size)
+            self.checksum_fragments.insert(i, "{}:{}".format(float(price), float(size)))
+
+    def price(self, level: int):
+        return self.sign * self.keys[level]
+
+    def best(self):
+        '''
+        (price, size) of the best level or None if the side is empty
+        '''
+        if self.keys:
+            return self.sign * self.keys[0], self.sizes[0]
+        return None
+
+    def levels(self, n: int):
+        return [(self.sign * key, size) for key, size in zip(self.keys[:n], self.sizes[:n])]
+
+    def depth(self, n: int):
+        '''
+        Total size of the n best levels
+        '''
+        return sum(self.sizes[:n])
+
+    def cost(self, quantity: float):
+        '''
+        (filled quantity, notional) of a market order of the given quantity walking this side of the book
+        '''
+        filled = notional = 0.0
+        for key, size in zip(self.keys, self.sizes):
+            size = min(size, quantity - filled)
+            filled += size
+            notional += size * self.sign * key
+            if filled >= quantity:
+                break
+        return filled, notional
+
+    def fills(self, quantity: float):
+        '''
+        [(price, size)] per level of a market order of the given quantity walking this side of the book
+        '''
+        fills = []
+        filled = 0.0
+        for key, size in zip(self.keys, self.sizes):
+            size = min(size, quantity - filled)
+            fills.append((self.sign * key, size))
+            filled += size
+            if filled >= quantity:
+                break
+        return fills
+
+    def quantity_for_notional(self, notional: float):
+        '''
+        (quantity, spent notional) of a market order spending the given notional walking this side of the book
+        '''
+        quantity = spent = 0.0
+        for key, size in zip(self.keys, self.sizes):
+            price = self.sign * key
+            size = min(size, (notional - spent) / price)
+            quantity += size
+            spent += size * price
+            if spent >= notional:
+                break
+        return quantity, spent
+
+
+class OrderBook(object):
+    '''
+    Local copy of the FTX order book of a single market, fed by the `orderbook` channel messages:
+        {
+            "channel": "orderbook",
+            "market": "BTC/USDT",
+            "type": "partial",   // or "update"
+            "data": {
+                "time": 1603922220.4351048,
+                "checksum": 1851349441,
+                "bids": [[13567.5, 0.3], ...],   // [price, size], size 0 means the level has been removed
+                "asks": [[13568.0, 1.2], ...],
+                "action": "partial"
+            }
+        }
+    The data is expected as json_codec typed orderbook data (data.bids, data.asks...).
+    '''
+
+    CHECKSUM_LEVELS = 100
+
+    def __init__(self, market: str):
+        self.market = market
+        self.bids = OrderBookSide(descending=True)
+        self.asks = OrderBookSide(descending=False)
+        self.time = 0.0
+        self.valid = False  # False until the partial arrives (and after a checksum failure)
+
+    def __repr__(self):
+        return "OrderBook({}, bid: {}, ask: {})".format(self.market, self.bids.best(), self.asks.best())
+
+    def apply_partial(self, data):
+        self.bids.clear()
+        self.asks.clear()
+        self.apply_update(data)
+
+    def apply_update(self, data):
+        bids_apply = self.bids.apply
+        for price, size in data.bids:
+            bids_apply(price, size)
+        asks_apply = self.asks.apply
+        for price, size in data.asks:
+            asks_apply(price, size)
+        self.time = data.time
+
+    def checksum(self):
+        '''
+        CRC32 of "bid_price:bid_size:ask_price:ask_size:..." over the 100 best levels (as defined by FTX)
+        '''
+        fragments = []
+        for bid, ask in zip_longest(self.bids.checksum_fragments[:self.CHECKSUM_LEVELS], self.asks.checksum_fragments[:self.CHECKSUM_LEVELS]):
+            if bid:
+                fragments.append(bid)
+            if ask:
+                fragments.append(ask)
+        return zlib.crc32(":".join(fragments).encode())
+
+    def best_bid(self):
+        return self.bids.best()
+
+    def best_ask(self):
+        return self.asks.best()
+
+    def spread(self):
+        if self.bids and self.asks:
+            return self.asks.price(0) - self.bids.price(0)
+        return None
+
+    def depth(self, n: int):
+        '''
+        (bids size, asks size) summed over the n best levels
+        '''
+        return self.bids.depth(n), self.asks.depth(n)
+
+    def average_fill_price(self, side: str, quantity: float):
+        '''
+        Average price of a market order ('buy' walks the asks, 'sell' walks the bids). None if the book is too thin.
+        '''
+        filled, notional = (self.asks if side == "buy" else self.bids).cost(quantity)
+        if not filled or filled < quantity:
+            return None
+        return notional / filled
+
+
+class OrderBooks(object):
+    '''
+    Order books of all the subscribed markets. Every update is verified against the FTX checksum - on mismatch the book
+    is invalidated and the resubscribe callback is called with the market (FTX sends a fresh partial after subscribing).
+    '''
+
+    def __init__(self, resubscribe: Callable = None, logger: logging.Logger = None):
+        self.books = {}
+        self.resubscribe = resubscribe
+        self.logger = logger if logger else logging.getLogger("order_book")
+
+    def __getitem__(self, market: str):
+        return self.books[market]
+
+    def __contains__(self, market: str):
+        return market in self.books
+
+    def get(self, market: str):
+        book = self.books.get(market)
+        return book if book and book.valid else None
+
+    def handle_event(self, event: dict):
+        '''
+        Returns the updated OrderBook or None if the book is not (yet) valid
+        '''
+        market = event["market"]
+        data = event["data"]
+        book = self.books.get(market)
+        if book is None:
+            book = self.books[market] = OrderBook(market)
+        if event["type"] == "partial":
+            book.apply_partial(data)
+        elif book.valid:
+            book.apply_update(data)
+        else:
+            # Waiting for the partial (after subscribing or after a checksum failure)
+            return None
+
+        if book.checksum() != data.checksum:
+            book.valid = False
+            self.logger.error("Order book checksum mismatch for market: {}. Resubscribing...".format(market))
+            if self.resubscribe:
+                self.resubscribe(market)
+            return None
+        book.valid = True
+        return book
@@ -0,0 +1,217 @@
+'''
+Fixed-point order sizing (replaces the Decimal('1e-' + str(n)) quantize chains of the buy / sell handlers).
+
+Values are integers in units of 10^-decimals (e.g. a USDT balance of 1234.56 with 2 decimals is 123456). The
+quantizers are precomputed per instrument (tick = price_decimals) and convert prices / balances / fees given as float,
+str, int or Decimal with the same result as Decimal(str(value)).quantize(Decimal('1e-' + str(decimals)), rounding):
+    - str: digits are cut at the decimal point (no float involved), exponent notation goes through Decimal
+    - float: round(value * scale) is exact iff it converts back to the same float (the shortest repr of the float has
+      at most `decimals` decimals and below fast_limit it's the only such number) - otherwise parsed from repr(value)
+Supported roundings: ROUND_UP, ROUND_DOWN, ROUND_HALF_EVEN (the Decimal default, used for the log messages).
+
+The fees are computed exactly in integers (a single rounding of the exact value), the former Decimal chains rounded
+the intermediate quotient to the 28 digits of the Decimal context first (see benchmarks/bench_order_sizing.py for the
+equivalence check against them).
+
+eg. usage:
+
+    sizer = OrderSizer.from_instrument("BTC_USDT", {"price_decimals": "2", "quantity_decimals": "6"})
+    order_size = sizer.buy(price=43123.456, quote_balance="1234.5678", taker_fee=0.000665)
+    order_size.amount                    # 123456 (fixed point, 2 decimals of the quote currency)
+    order_size.format("amount")          # "1234.56"
+    order_size.decimal("fee")            # Decimal('0.00002004')
+'''
+
+from decimal import Decimal, ROUND_UP, ROUND_DOWN, ROUND_HALF_EVEN
+
+
+BASE_DECIMALS = 8  # e.g. BTC balances
+QUOTE_DECIMALS = 2  # e.g. USDT balances and fees
+FEE_RATE_DECIMALS = 4  # taker fee rate
+
+
+def divide(numerator: int, denominator: int, rounding: str = ROUND_DOWN):
+    '''
+    Integer division rounded as Decimal (ROUND_UP - away from zero, ROUND_DOWN - towards zero)
+    '''
+    if not denominator:
+        raise Exception("Division by zero!")
+    negative = (numerator < 0) != (denominator < 0)
+    quotient, remainder = divmod(abs(numerator), abs(denominator))
+    if remainder:
+        if rounding == ROUND_UP:
+            quotient += 1
+        elif rounding == ROUND_HALF_EVEN:
+            if 2 * remainder > abs(denominator) or (2 * remainder == abs(denominator) and quotient % 2):
+                quotient += 1
+        elif rounding != ROUND_DOWN:
+            raise Exception("Unsupported rounding: {}".format(rounding))
+    return -quotient if negative else quotient
+
+
+def rescale(value: int, from_decimals: int, to_decimals: int, rounding: str = ROUND_DOWN):
+    if to_decimals >= from_decimals:
+        return value * 10 ** (to_decimals - from_decimals)
+    return divide(value, 10 ** (from_decimals - to_decimals), rounding)
+
+
+class Quantizer(object):
+
+    __slots__ = ("decimals", "scale", "fast_limit", "quantum")
+
+    def __init__(self, decimals: int):
+        self.decimals = decimals
+        self.scale = 10 ** decimals
+        self.fast_limit = 2 ** 52 / self.scale  # Below it the float spacing is finer than 10^-decimals
+        self.quantum = Decimal(1).scaleb(-decimals)
+
+    def to_fixed(self, value, rounding: str = ROUND_DOWN):
+        if isinstance(value, float):
+            return self.float_to_fixed(value, rounding)
+        if isinstance(value, str):
+            return self.str_to_fixed(value, rounding)
+        if isinstance(value, int):
+            return value * self.scale
+        return self.decimal_to_fixed(Decimal(value), rounding)
+
+    def float_to_fixed(self, value: float, rounding: str):
+        fixed = round(value * self.scale)
+        if -self.fast_limit < value < self.fast_limit and fixed / self.scale == value:
+            return fixed
+        return self.str_to_fixed(repr(value), rounding)
+
+    def str_to_fixed(self, value: str, rounding: str):
+        integer_part, _, fraction = value.partition(".")
+        if len(fraction) <= self.decimals and (integer_part + fraction).isdecimal():
+            return int(integer_part + fraction.ljust(self.decimals, "0"))  # Nothing to round (e.g. "43123.45" with 2 decimals)
+        digits = value.strip()
+        negative = digits.startswith("-")
+        if digits[:1] in ("+", "-"):
+            digits = digits[1:]
+        integer_part, _, fraction = digits.partition(".")
+        if not (integer_part + fraction).isdecimal():
+            return self.decimal_to_fixed(Decimal(value), rounding)  # Exponent notation, NaN, ...
+        rest = fraction[self.decimals:]
+        fixed = int((integer_part or "0") + fraction[:self.decimals].ljust(self.decimals, "0"))
+        if rest and rest.strip("0"):
+            if rounding == ROUND_UP:
+                fixed += 1
+            elif rounding == ROUND_HALF_EVEN:
+                if rest[0] > "5" or (rest[0] == "5" and (rest[1:].strip("0") or fixed % 2)):
+                    fixed += 1
+            elif rounding != ROUND_DOWN:
+                return self.decimal_to_fixed(Decimal(value), rounding)
+        return -fixed if negative else fixed
+
+    def decimal_to_fixed(self, value: Decimal, rounding: str):
+        return int(value.quantize(self.quantum, rounding=rounding).scaleb(self.decimals))
+
+    def to_decimal(self, fixed: int):
+        return Decimal(fixed).scaleb(-self.decimals)
+
+    def format(self, fixed: int):
+        if not self.decimals:
+            return str(fixed)
+        digits = str(abs(fixed)).rjust(self.decimals + 1, "0")
+        return ("-" if fixed < 0 else "") + digits[:-self.decimals] + "." + digits[-self.decimals:]
+
+
+class OrderSize(object):
+    '''
+    Result of OrderSizer.buy / sell (fixed point integers):
+        price       limit of the market price (ROUND_UP to the tick)
+        amount      buy: notional to spend in the quote currency / sell: quantity in the base currency (ROUND_DOWN)
+        fee         buy: in the base currency / sell: in the quote currency (ROUND_UP)
+        taker_fee   fee rate (ROUND_UP)
+    '''
+
+    __slots__ = ("side", "price", "amount", "fee", "taker_fee", "quantizers")
+
+    def __init__(self, side: str, price: int, amount: int, fee: int, taker_fee: int, quantizers: dict):
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.fee = fee
+        self.taker_fee = taker_fee
+        self.quantizers = quantizers  # field name -> Quantizer
+
+    def decimal(self, name: str):
+        return self.quantizers[name].to_decimal(getattr(self, name))
+
+    def format(self, name: str):
+        return self.quantizers[name].format(getattr(self, name))
+
+    def __repr__(self):
+        return "OrderSize(side={}, price={}, amount={}, fee={}, taker_fee={})".format(
+            self.side, self.format("price"), self.format("amount"), self.format("fee"), self.format("taker_fee"))
+
+
+class OrderSizer(object):
+    '''
+    Precomputed quantizers of an instrument
+    '''
+
+    def __init__(self, instrument: str, price_decimals: int, base_decimals: int = BASE_DECIMALS, quote_decimals: int = QUOTE_DECIMALS, fee_rate_decimals: int = FEE_RATE_DECIMALS):
+        self.instrument = instrument
+        self.price_quantizer = Quantizer(price_decimals)
+        self.base_quantizer = Quantizer(base_decimals)
+        self.quote_quantizer = Quantizer(quote_decimals)
+        self.fee_rate_quantizer = Quantizer(fee_rate_decimals)
+        self.buy_quantizers = {"price": self.price_quantizer, "amount": self.quote_quantizer, "fee": self.base_quantizer, "taker_fee": self.fee_rate_quantizer}
+        self.sell_quantizers = {"price": self.price_quantizer, "amount": self.base_quantizer, "fee": self.quote_quantizer, "taker_fee": self.fee_rate_quantizer}
+        # buy fee [base] = notional [quote] * fee rate / price: 10^-(quote + fee rate - price) -> 10^-base
+        buy_fee_exponent = base_decimals + price_decimals - quote_decimals - fee_rate_decimals
+        self.buy_fee_numerator = 10 ** max(buy_fee_exponent, 0)
+        self.buy_fee_denominator = 10 ** max(-buy_fee_exponent, 0)
+        # sell fee [quote] = quantity [base] * price * fee rate: 10^-(base + price + fee rate) -> 10^-quote
+        self.sell_fee_denominator = 10 ** (base_decimals + price_decimals + fee_rate_decimals - quote_decimals)
+        self.taker_fee_cache = (None, 0)  # (taker fee as given, fixed point)
+        self.base_decimals = base_decimals
+        self.quote_decimals = quote_decimals
+
+    @classmethod
+    def from_instrument(cls, instrument: str, metadata: dict, **kwargs):
+        '''
+        metadata - e.g. shared_user_api_data["tickers"]["BTC_USDT"]: {"price_decimals": "2", "quantity_decimals": "6"}
+        '''
+        return cls(instrument, int(metadata["price_decimals"]), **kwargs)
+
+    def get_taker_fee(self, taker_fee):
+        cached_taker_fee, fixed = self.taker_fee_cache
+        if taker_fee != cached_taker_fee or type(taker_fee) is not type(cached_taker_fee):
+            fixed = self.fee_rate_quantizer.to_fixed(taker_fee, ROUND_UP)
+            self.taker_fee_cache = (taker_fee, fixed)
+        return fixed
+
+    def buy(self, price, quote_balance, taker_fee):
+        '''
+        Spends the whole quote balance at the (ask) price
+        '''
+        price = self.price_quantizer.to_fixed(price, ROUND_UP)
+        if not price:
+            raise Exception("Cannot size a buy of: {} for price: 0".format(self.instrument))
+        notional = self.quote_quantizer.to_fixed(quote_balance, ROUND_DOWN)
+        taker_fee = self.get_taker_fee(taker_fee)
+        fee = divide(notional * taker_fee * self.buy_fee_numerator, price * self.buy_fee_denominator, ROUND_UP)
+        return OrderSize("buy", price, notional, fee, taker_fee, self.buy_quantizers)
+
+    def sell(self, price, base_balance, taker_fee):
+        '''
+        Sells the whole base balance at the (bid) price
+        '''
+        price = self.price_quantizer.to_fixed(price, ROUND_UP)
+        quantity = self.base_quantizer.to_fixed(base_balance, ROUND_DOWN)
+        taker_fee = self.get_taker_fee(taker_fee)
+        fee = divide(quantity * price * taker_fee, self.sell_fee_denominator, ROUND_UP)
+        return OrderSize("sell", price, quantity, fee, taker_fee, self.sell_quantizers)
+
+    def quantity(self, order_size: OrderSize, quantity_decimals: int):
+        '''
+        Size of the market order in the base currency with the market's quantity_decimals (ROUND_DOWN): buy - the
+        notional at the price, sell - the amount
+        '''
+        if order_size.side == "sell":
+            return rescale(order_size.amount, self.base_decimals, quantity_decimals, ROUND_DOWN)
+        # notional [quote] / price: 10^-(quote - price) -> 10^-quantity
+        exponent = quantity_decimals + self.price_quantizer.decimals - self.quote_decimals
+        return divide(order_size.amount * 10 ** max(exponent, 0), order_size.price * 10 ** max(-exponent, 0), ROUND_DOWN)
@@ -0,0 +1,264 @@
+'''
+Order lifecycle store of a user api worker.
+
+Every order goes through the states:  pending -> new -> partially_filled -> closed
+    pending             sent (known by the client id only)
+    new                 accepted by the exchange (has the exchange order id)
+    partially_filled    filled_size > 0
+    closed              filled, cancelled or rejected (see Order.fully_filled)
+An update can skip states (e.g. a market order goes straight from pending to closed), but never goes back.
+
+Orders are indexed by the client id and by the exchange order id (O(1) lookup). Closed orders stay findable in a bounded
+history (the oldest ones are evicted), so memory and lookup cost stay flat regardless of the uptime. Orders which are never
+going to be closed are evicted as well: remove() (the placing failed or timed out) and expire_pending() (never accepted).
+Fills arriving before the order id is known (the fills channel can be faster than the placing response) are kept
+(bounded) and applied once it is.
+
+Fill notifications are awaitable:
+
+    order = store.add_pending("default_user_BUY_BTC/USDT_1", "BTC/USDT", "buy", size=0.01)
+    ...
+    await store.wait_fill(order.client_id)      # Next fill (filled_size increase) of the order
+    await store.wait_closed(order.client_id)    # The order has been closed
+'''
+
+import time
+import asyncio
+from collections import OrderedDict
+
+
+PENDING = "pending"
+NEW = "new"
+PARTIALLY_FILLED = "partially_filled"
+CLOSED = "closed"
+
+STATES_ORDER = {PENDING: 0, NEW: 1, PARTIALLY_FILLED: 2, CLOSED: 3}
+
+
+class Order(object):
+
+    __slots__ = ("client_id", "order_id", "market", "side", "size", "notional", "state", "filled_size", "fills_size", "fills_value",
+                 "avg_fill_price", "fee", "created_time", "update_time", "fill_waiters", "close_waiters")
+
+    def __init__(self, client_id: str, market: str = None, side: str = None, size: float = None, notional: float = None):
+        self.client_id = client_id
+        self.order_id = None
+        self.market = market
+        self.side = side
+        self.size = size
+        self.notional = notional
+        self.state = PENDING
+        self.filled_size = 0.0
+        self.fills_size = 0.0  # Sum of the fills sizes (the orders channel filledSize can be late or early)
+        self.fills_value = 0.0
+        self.avg_fill_price = None
+        self.fee = 0.0
+        self.created_time = time.time()
+        self.update_time = self.created_time
+        self.fill_waiters = []
+        self.close_waiters = []
+
+    @property
+    def closed(self):
+        return self.state == CLOSED
+
+    @property
+    def fully_filled(self):
+        return self.state == CLOSED and self.size is not None and self.filled_size >= self.size
+
+    def __repr__(self):
+        return "Order(client_id={}, order_id={}, market={}, side={}, size={}, state={}, filled_size={}, avg_fill_price={}, fee={})".format(
+            self.client_id, self.order_id, self.market, self.side, self.size, self.state, self.filled_size, self.avg_fill_price, self.fee)
+
+
+class OrderStore(object):
+
+    def __init__(self, history_size: int = 1000):
+        self.history_size = history_size
+        self.orders_by_client_id = {}
+        self.orders_by_order_id = {}
+        self.history = OrderedDict()  # Closed orders (client id or order id -> order), the oldest first
+        self.early_fills = OrderedDict()  # order id -> [(size, price, fee)] of the fills of not yet known orders, the oldest first
+
+    def get(self, client_id: str):
+        return self.orders_by_client_id.get(client_id)
+
+    def get_by_order_id(self, order_id):
+        return self.orders_by_order_id.get(order_id)
+
+    def add_pending(self, client_id: str, market: str = None, side: str = None, size: float = None, notional: float = None):
+        if client_id in self.orders_by_client_id:
+            raise Exception("Order with client id: {} already exists!".format(client_id))
+        order = Order(client_id, market, side, size, notional)
+        self.orders_by_client_id[client_id] = order
+        return order
+
+    def set_order_id(self, client_id: str, order_id):
+        '''
+        The exchange accepted the order (e.g. the response for the order placing)
+        '''
+        order = self.orders_by_client_id.get(client_id)
+        if not order:
+            raise Exception("Unknown order with client id: {}".format(client_id))
+        self.index_order_id(order, order_id)
+        self.set_state(order, NEW)
+        return order
+
+    def index_order_id(self, order: Order, order_id):
+        if order_id is not None and order.order_id is None:
+            order.order_id = order_id
+            self.orders_by_order_id[order_id] = order
+            for size, price, fee in self.early_fills.pop(order_id, ()):
+                self.apply_fill(order, size, price, fee)
+
+    def remove(self, client_id: str):
+        '''
+        Evicts the order which is not going to be closed (its placing failed or timed out) - its waiters get an exception
+        '''
+        order = self.orders_by_client_id.pop(client_id, None)
+        if not order:
+            return None
+        if order.order_id is not None and self.orders_by_order_id.get(order.order_id) is order:
+            del self.orders_by_order_id[order.order_id]
+        for waiter in order.fill_waiters + order.close_waiters:
+            if not waiter.done():
+                waiter.set_exception(Exception("Order with client id: {} has been removed!".format(client_id)))
+        order.fill_waiters.clear()
+        order.close_waiters.clear()
+        return order
+
+    def expire_pending(self, max_age: float):
+        '''
+        Evicts the orders still pending (never accepted by the exchange) for more than max_age seconds. Returns them.
+        '''
+        expired_time = time.time() - max_age
+        expired = [order for order in self.orders_by_client_id.values() if order.state == PENDING and order.created_time < expired_time]
+        for order in expired:
+            self.remove(order.client_id)
+        return expired
+
+    def find(self, client_id: str = None, order_id=None):
+        order = self.orders_by_order_id.get(order_id) if order_id is not None else None
+        if not order and client_id is not None:
+            order = self.orders_by_client_id.get(client_id)
+        return order
+
+    def update(self, order_id, client_id: str = None, status: str = None, market: str = None, side: str = None, size: float = None,
+               filled_size: float = None, avg_fill_price: float = None):
+        '''
+        Order update from the exchange (e.g. the FTX orders channel: status "new" / "open" / "closed")
+        Orders not placed by this store (e.g. manually) are tracked as well.
+        '''
+        order = self.find(client_id, order_id)
+        if not order:
+            order = Order(client_id, market, side, size)
+            if client_id is not None:
+                self.orders_by_client_id[client_id] = order
+        self.index_order_id(order, order_id)
+        if order.closed:
+            return order  # Late update of an already closed order
+        order.market = order.market or market
+        order.side = order.side or side
+        if size is not None:
+            order.size = size
+        if avg_fill_price is not None:
+            order.avg_fill_price = avg_fill_price
+        if filled_size is not None:
+            self.set_filled_size(order, filled_size)
+        if status == "closed":
+            self.set_state(order, CLOSED)
+        else:
+            self.set_state(order, NEW)
+        return order
+
+    def add_fill(self, order_id, size: float, price: float, fee: float = 0.0):
+        '''
+        Fill from the exchange (e.g. the FTX fills channel). Fills of not yet known orders are kept until the order id is
+        known (set_order_id / update) - at most history_size orders, the oldest are dropped (e.g. manual orders' fills).
+        '''
+        order = self.orders_by_order_id.get(order_id)
+        if not order:
+            self.early_fills.setdefault(order_id, []).append((size, price, fee))
+            while len(self.early_fills) > self.history_size:
+                self.early_fills.popitem(last=False)
+            return None
+        return self.apply_fill(order, size, price, fee)
+
+    def apply_fill(self, order: Order, size: float, price: float, fee: float):
+        order.fee += fee
+        order.fills_size += size
+        order.fills_value += price * size
+        if order.fills_size >= order.filled_size:
+            order.avg_fill_price = order.fills_value / order.fills_size
+        self.set_filled_size(order, order.fills_size)
+        return order
+
+    def set_filled_size(self, order: Order, filled_size: float):
+        if filled_size > order.filled_size:
+            order.filled_size = filled_size
+            order.update_time = time.time()
+            if not order.closed:
+                self.set_state(order, PARTIALLY_FILLED)
+            self.notify(order.fill_waiters, order)
+
+    def set_state(self, order: Order, state: str):
+        if STATES_ORDER[state] <= STATES_ORDER[order.state]:
+            return
+        order.state = state
+        order.update_time = time.time()
+        if state == CLOSED:
+            self.notify(order.fill_waiters, order)
+            self.notify(order.close_waiters, order)
+            self.archive(order)
+
+    def archive(self, order: Order):
+        '''
+        Moves the closed order into the bounded history (evicting the oldest closed orders from the indexes)
+        '''
+        self.history[order.client_id if order.client_id is not None else ("order_id", order.order_id)] = order
+        while len(self.history) > self.history_size:
+            _, evicted_order = self.history.popitem(last=False)
+            if evicted_order.client_id is not None and self.orders_by_client_id.get(evicted_order.client_id) is evicted_order:
+                del self.orders_by_client_id[evicted_order.client_id]
+            if evicted_order.order_id is not None and self.orders_by_order_id.get(evicted_order.order_id) is evicted_order:
+                del self.orders_by_order_id[evicted_order.order_id]
+
+    @staticmethod
+    def notify(waiters: list, order: Order):
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(order)
+        waiters.clear()
+
+    async def wait(self, order: Order, waiters: list, timeout: float = None):
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+    def get_order(self, client_id: str = None, order_id=None):
+        order = self.find(client_id, order_id)
+        if not order:
+            raise Exception("Unknown order (client id: {}, order id: {})".format(client_id, order_id))
+        return order
+
+    async def wait_fill(self, client_id: str = None, order_id=None, timeout: float = None):
+        '''
+        Waits for the next fill of the order (or its closing). Returns the order.
+        '''
+        order = self.get_order(client_id, order_id)
+        if order.closed:
+            return order
+        return await self.wait(order, order.fill_waiters, timeout)
+
+    async def wait_closed(self, client_id: str = None, order_id=None, timeout: float = None):
+        '''
+        Waits until the order is closed. Returns the order.
+        '''
+        order = self.get_order(client_id, order_id)
+        if order.closed:
+            return order
+        return await self.wait(order, order.close_waiters, timeout)
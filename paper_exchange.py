@@ -0,0 +1,751 @@
+'''
+Paper trading: a local simulated FTX exchange speaking the websocket (wss://ftx.com/ws/) and REST (https://ftx.com/api)
+protocols of FtxApiClient and FtxRestClient. ftx_trader.py -d/--debug runs the whole stack against it ("paper_exchange"
+config) - no risk, no exchange connection, e.g. for soak testing the throughput and the tick-to-trade latency.
+
+    - market data: the ticker / orderbook / trades channel frames of a source are relayed to the subscribed connections
+      as they are (a fresh orderbook partial on subscribing), the exchange's order books are kept from the same frames:
+        synthetic   random walk order books of the markets (SyntheticMarketData)
+        replay      a market data capture (market_data_recorder) at its recorded pace (speed times faster), looped
+        live        the real FTX market data (an FtxApiClient market connection) - only the orders are simulated
+    - market orders (POST /orders) are matched against the current order book of their market (a fill per level walked,
+      the ticker's bid / ask if there is no order book) right after the order is accepted or fill_latency seconds later.
+      The paper fills don't change the book.
+    - the orders / fills channel updates (as FTX sends them) go to the account's logged in connections
+    - every API key is a paper account (created on its first use with initial_balances, the signatures aren't verified).
+      The buy fee is paid in the base currency, the sell fee in the quote currency (as order_sizing.OrderSizer expects).
+
+Only market orders are supported (the other types are rejected). The balances are checked when the order is placed (a buy
+at the best price) and again when it's matched. A market order larger than the book (or a buy walking past what the
+quote balance pays for) fills what it can, the rest is cancelled.
+
+REST endpoints (under /api): GET /account, /wallet/balances, /positions, /orders, /markets, /markets/{market},
+POST /orders, DELETE /orders/{order_id}.
+
+eg. usage:
+
+    exchange = PaperExchange(["BTC/USDT"], taker_fee=0.000665, initial_balances={"USDT": 10000.0})
+    server = await PaperExchangeServer(exchange, SyntheticMarketData(["BTC/USDT"]), port=8765, rest_port=8766).start()
+    # FtxApiClient(..., websocket_uri=server.uri) / FtxRestClient(..., base_url=server.rest_url)
+
+Or standalone:
+    python paper_exchange.py [--port 8765] [--rest-port 8766] [--source synthetic] [--markets BTC/USDT ETH/USDT]
+                             [--rate 10] [--capture-directory <dir>] [--speed 1.0] [--fill-latency 0.0]
+'''
+
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import websockets
+import async_logging
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List
+import json_codec
+from ftx_lib import FtxApiClient
+from market_data_recorder import MarketDataCaptureReader
+from order_book import OrderBook, OrderBooks
+from periodic import TimerScheduler
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+
+DEFAULT_INCREMENTS = {"BTC/USDT": (1.0, 0.0001), "ETH/USDT": (0.1, 0.001), "FTT/USDT": (0.001, 0.1)}  # (priceIncrement, sizeIncrement)
+DEFAULT_PRICES = {"BTC/USDT": 30000.0, "ETH/USDT": 2000.0, "FTT/USDT": 25.0}
+PUBLIC_CHANNELS = ("ticker", "orderbook", "trades")
+PRIVATE_CHANNELS = ("orders", "fills")
+
+
+def iso_time(timestamp: float = None):
+    return datetime.fromtimestamp(timestamp if timestamp is not None else time.time(), timezone.utc).isoformat()
+
+
+def to_decimal(value):
+    return Decimal(repr(float(value)))
+
+
+class PaperAccount(object):
+
+    def __init__(self, key: str, balances: dict, history_size: int = 1000):
+        self.key = key
+        self.balances = {coin: to_decimal(amount) for coin, amount in balances.items()}
+        self.orders = OrderedDict()  # order id -> order (FTX format), the oldest first
+        self.history_size = history_size
+
+    def balance(self, coin: str):
+        return self.balances.get(coin, Decimal(0))
+
+    def add(self, coin: str, amount: Decimal):
+        self.balances[coin] = self.balance(coin) + amount
+
+    def add_order(self, order: dict):
+        self.orders[order["id"]] = order
+        while len(self.orders) > self.history_size:
+            self.orders.popitem(last=False)
+
+    def balances_list(self):
+        return [{"coin": coin, "free": float(amount), "total": float(amount), "availableWithoutBorrow": float(amount), "spotBorrow": 0.0, "usdValue": None}
+                for coin, amount in self.balances.items()]
+
+
+class PaperExchange(object):
+
+    def __init__(self, markets: List[str], taker_fee: float = 0.000665, initial_balances: dict = None, increments: dict = None, fill_latency: float = 0.0, logger: logging.Logger = None):
+        self.logger = logger if logger else logging.getLogger("paper_exchange")
+        self.taker_fee = to_decimal(taker_fee)
+        self.initial_balances = initial_balances if initial_balances is not None else {"USDT": 10000.0}
+        self.fill_latency = fill_latency  # Seconds between accepting a market order and its matching
+        self.markets = {}  # market -> FTX market info
+        increments = increments if increments else {}
+        for market in markets:
+            self.add_market(market, *increments.get(market, DEFAULT_INCREMENTS.get(market, (0.01, 0.0001))))
+        self.order_books = OrderBooks(logger=self.logger)
+        self.tickers = {}  # market -> the last ticker channel data
+        self.accounts = {}  # API key -> PaperAccount
+        self.next_order_id = 1
+        self.next_fill_id = 1
+        self.listeners = []  # callback(account key, channel, data) - the orders / fills channel updates
+        self.stats = {"orders": 0, "rejected": 0, "fills": 0}
+
+    def add_market(self, market: str, price_increment: float, size_increment: float):
+        base, _, quote = market.partition("/")
+        self.markets[market] = {"name": market, "enabled": True, "type": "spot", "baseCurrency": base, "quoteCurrency": quote,
+                                "priceIncrement": price_increment, "sizeIncrement": size_increment, "minProvideSize": size_increment}
+
+    def account(self, key: str):
+        account = self.accounts.get(key)
+        if not account:
+            account = self.accounts[key] = PaperAccount(key, self.initial_balances)
+            self.logger.info("New paper account: {} with balances: {}".format(key, self.initial_balances))
+        return account
+
+    def handle_message(self, message: dict):
+        '''
+        Market data channel message of the source (json_codec typed data)
+        '''
+        channel = message["channel"]
+        if channel == "orderbook":
+            self.order_books.handle_event(message)
+        elif channel == "ticker":
+            self.tickers[message["market"]] = message["data"]
+
+    def quote(self, market: str):
+        '''
+        (bid, ask, last) - from the order book if there is a valid one
+        '''
+        ticker = self.tickers.get(market)
+        last = ticker.last if ticker else None
+        book = self.order_books.get(market)
+        if book and book.bids and book.asks:
+            return book.bids.price(0), book.asks.price(0), last
+        if ticker:
+            return ticker.bid, ticker.ask, last
+        return None, None, last
+
+    def market_info(self, market: str):
+        bid, ask, last = self.quote(market)
+        return dict(self.markets[market], bid=bid, ask=ask, last=last, price=last)
+
+    def fills(self, market: str, side: str, size: float):
+        '''
+        [(price, size)] of a market order walking the book
+        '''
+        book = self.order_books.get(market)
+        if book:
+            book_side = book.asks if side == "buy" else book.bids
+            if book_side:
+                return book_side.fills(size)
+        bid, ask, _ = self.quote(market)
+        price = ask if side == "buy" else bid
+        return [(price, size)] if price else []
+
+    def check_balance(self, account: PaperAccount, market: str, side: str, size: float):
+        '''
+        Returns the fills of the order, raises if there is no market data or not enough balance for it (a buy is
+        estimated at the best price - see match)
+        '''
+        fills = self.fills(market, side, size)
+        if not fills:
+            raise Exception("No market data for market: {}".format(market))
+        info = self.markets[market]
+        if side == "buy":
+            needed, coin = to_decimal(fills[0][0]) * to_decimal(size), info["quoteCurrency"]
+        else:
+            needed, coin = to_decimal(size), info["baseCurrency"]
+        if needed > account.balance(coin):
+            raise Exception("Not enough balances")
+        return fills
+
+    def place_order(self, key: str, body: dict):
+        '''
+        POST /orders body -> the accepted order (matched on the loop right after or fill_latency seconds later)
+        '''
+        market = body.get("market")
+        if market not in self.markets:
+            raise Exception("No such market: {}".format(market))
+        side = body.get("side")
+        if side not in ("buy", "sell"):
+            raise Exception("Invalid side: {}".format(side))
+        if body.get("type", "market") != "market":
+            raise Exception("Only market orders are supported by the paper exchange")
+        size = float(body.get("size") or 0)
+        if size <= 0:
+            raise Exception("Invalid size: {}".format(body.get("size")))
+        account = self.account(key)
+        try:
+            self.check_balance(account, market, side, size)
+        except Exception:
+            self.stats["rejected"] += 1
+            raise
+        order = {"id": self.next_order_id, "clientId": body.get("clientId"), "market": market, "type": "market", "side": side, "price": None,
+                 "size": size, "status": "new", "filledSize": 0.0, "remainingSize": size, "avgFillPrice": None, "reduceOnly": bool(body.get("reduceOnly")),
+                 "ioc": True, "postOnly": False, "createdAt": iso_time()}
+        self.next_order_id += 1
+        self.stats["orders"] += 1
+        account.add_order(order)
+        self.publish(key, "orders", dict(order))
+        loop = asyncio.get_running_loop()
+        if self.fill_latency:
+            loop.call_later(self.fill_latency, self.match, account, order)
+        else:
+            loop.call_soon(self.match, account, order)
+        return dict(order)
+
+    def match(self, account: PaperAccount, order: dict):
+        if order["status"] == "closed":
+            return  # Cancelled meanwhile
+        market, side = order["market"], order["side"]
+        try:
+            fills = self.check_balance(account, market, side, order["size"])
+        except Exception as e:
+            self.logger.warning("Order: {} of account: {} cancelled: {}".format(order["id"], account.key, e))
+            self.stats["rejected"] += 1
+            self.close(account, order)
+            return
+        info = self.markets[market]
+        base, quote = info["baseCurrency"], info["quoteCurrency"]
+        size_increment = to_decimal(info["sizeIncrement"])
+        filled = value = Decimal(0)
+        fill_time = iso_time()
+        for price, size in fills:
+            fill_size = to_decimal(size)
+            notional = to_decimal(price) * fill_size
+            if side == "buy" and notional > account.balance(quote):
+                # Walked past what the quote balance pays for - the rest of the order is cancelled
+                fill_size = account.balance(quote) / to_decimal(price) // size_increment * size_increment
+                if fill_size <= 0:
+                    break
+                size, notional = float(fill_size), to_decimal(price) * fill_size
+            if side == "buy":
+                fee, fee_currency = fill_size * self.taker_fee, base
+                account.add(quote, -notional)
+                account.add(base, fill_size - fee)
+            else:
+                fee, fee_currency = notional * self.taker_fee, quote
+                account.add(base, -fill_size)
+                account.add(quote, notional - fee)
+            filled += fill_size
+            value += notional
+            self.stats["fills"] += 1
+            self.publish(account.key, "fills", {
+                "id": self.next_fill_id, "tradeId": self.next_fill_id, "orderId": order["id"], "market": market, "future": None, "baseCurrency": base,
+                "quoteCurrency": quote, "type": "order", "side": side, "price": price, "size": size, "fee": float(fee), "feeRate": float(self.taker_fee),
+                "feeCurrency": fee_currency, "liquidity": "taker", "time": fill_time})
+            self.next_fill_id += 1
+        order["filledSize"] = float(filled)
+        order["avgFillPrice"] = float(value / filled) if filled else None
+        self.close(account, order)
+        if filled < to_decimal(order["size"]):
+            self.logger.info("Order: {} of account: {} filled: {} of: {}, the rest cancelled".format(order["id"], account.key, filled, order["size"]))
+
+    def close(self, account: PaperAccount, order: dict):
+        order["status"] = "closed"
+        order["remainingSize"] = max(0.0, order["size"] - order["filledSize"])
+        self.publish(account.key, "orders", dict(order))
+
+    def cancel_order(self, key: str, order_id: int):
+        order = self.account(key).orders.get(order_id)
+        if not order:
+            raise Exception("Order not found")
+        if order["status"] != "closed":
+            self.close(self.account(key), order)
+        return "Order queued for cancellation"
+
+    def open_orders(self, key: str, market: str = None):
+        return [dict(order) for order in self.account(key).orders.values() if order["status"] != "closed" and (not market or order["market"] == market)]
+
+    def publish(self, key: str, channel: str, data: dict):
+        for listener in self.listeners:
+            listener(key, channel, data)
+
+
+class PaperConnection(object):
+
+    __slots__ = ("websocket", "key", "subscriptions", "outbox", "sender")
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.key = None  # API key of the logged in account
+        self.subscriptions = set()  # (channel, market) - market None for the private channels
+        self.outbox = deque()  # Private channel frames, sent in order
+        self.sender = None
+
+
+class PaperExchangeServer(object):
+
+    def __init__(self, exchange: PaperExchange, source=None, host: str = "127.0.0.1", port: int = 8765, rest_port: int = 8766, log_file: str = None, logger: logging.Logger = None):
+        if not web:
+            raise Exception("PaperExchangeServer requires aiohttp!")
+        self.exchange = exchange
+        self.source = source  # SyntheticMarketData / CaptureReplay / LiveMarketData
+        self.host = host
+        self.port = port  # 0 - any free port
+        self.rest_port = rest_port
+        self.logger = logger if logger else logging.getLogger("paper_exchange")
+        if log_file:
+            async_logging.setup_logger(self.logger, log_file)
+        self.decoder = json_codec.FrameDecoder(["ticker", "orderbook"])
+        self.connections = set()
+        self.relayed = 0
+        self.websocket_server = None
+        self.runner = None
+        self.source_task = None
+        self.periodic_calls = []
+        exchange.listeners.append(self.handle_account_update)
+
+    @property
+    def uri(self):
+        return "ws://{}:{}/ws/".format(self.host, self.port)
+
+    @property
+    def rest_url(self):
+        return "http://{}:{}/api".format(self.host, self.rest_port)
+
+    async def publish_frame(self, frame: str):
+        '''
+        Market data frame of the source: into the exchange's order books and (as it is) to the subscribed connections
+        '''
+        message = self.decoder.decode(frame)
+        if message.get("type") not in ("partial", "update") or message.get("channel") not in PUBLIC_CHANNELS:
+            return  # e.g. pong / subscribed of the live source
+        self.exchange.handle_message(message)
+        subscription = (message["channel"], message.get("market"))
+        for connection in list(self.connections):
+            if subscription in connection.subscriptions:
+                try:
+                    await connection.websocket.send(frame)
+                except websockets.ConnectionClosed:
+                    pass
+        self.relayed += 1
+
+    def handle_account_update(self, key: str, channel: str, data: dict):
+        frame = None
+        for connection in self.connections:
+            if connection.key == key and (channel, None) in connection.subscriptions:
+                if frame is None:
+                    frame = json_codec.dumps({"channel": channel, "type": "update", "data": data})
+                connection.outbox.append(frame)
+                if not connection.sender:
+                    connection.sender = asyncio.ensure_future(self.send_outbox(connection))
+
+    async def send_outbox(self, connection: PaperConnection):
+        try:
+            while connection.outbox:
+                await connection.websocket.send(connection.outbox.popleft())
+        except websockets.ConnectionClosed:
+            connection.outbox.clear()
+        finally:
+            connection.sender = None
+
+    @staticmethod
+    async def respond(connection: PaperConnection, request: dict, message: dict):
+        if "id" in request:
+            message["id"] = request["id"]  # See FtxApiClient.request
+        await connection.websocket.send(json_codec.dumps(message))
+
+    async def handle_request(self, connection: PaperConnection, request: dict):
+        op = request.get("op")
+        if op == "ping":
+            await self.respond(connection, request, {"type": "pong"})
+        elif op == "login":
+            key = request.get("args", {}).get("key")
+            if not key:
+                await self.respond(connection, request, {"type": "error", "code": 400, "msg": "Invalid login credentials"})
+                return
+            connection.key = key
+            self.exchange.account(key)
+        elif op in ("subscribe", "unsubscribe"):
+            channel = request.get("channel")
+            market = request.get("market")
+            if channel in PRIVATE_CHANNELS:
+                if not connection.key:
+                    await self.respond(connection, request, {"type": "error", "code": 400, "msg": "Not logged in"})
+                    return
+                market = None
+            elif channel not in PUBLIC_CHANNELS:
+                await self.respond(connection, request, {"type": "error", "code": 400, "msg": "Invalid channel: {}".format(channel)})
+                return
+            elif market not in self.exchange.markets:
+                await self.respond(connection, request, {"type": "error", "code": 400, "msg": "Invalid market: {}".format(market)})
+                return
+            subscription = (channel, market)
+            if op == "unsubscribe":
+                connection.subscriptions.discard(subscription)
+                await self.respond(connection, request, {"type": "unsubscribed", "channel": channel, "market": market})
+                return
+            if subscription in connection.subscriptions:
+                await self.respond(connection, request, {"type": "error", "code": 400, "msg": "Already subscribed"})
+                return
+            connection.subscriptions.add(subscription)
+            await self.respond(connection, request, {"type": "subscribed", "channel": channel, "market": market})
+            if channel == "orderbook":
+                book = self.exchange.order_books.get(market)
+                if book:  # Otherwise the next partial of the source comes through
+                    await connection.websocket.send(json_codec.dumps(self.orderbook_partial(book)))
+        else:
+            await self.respond(connection, request, {"type": "error", "code": 400, "msg": "Invalid op: {}".format(op)})
+
+    @staticmethod
+    def orderbook_partial(book: OrderBook):
+        return {"channel": "orderbook", "market": book.market, "type": "partial", "data": {
+            "time": book.time, "checksum": book.checksum(), "bids": book.bids.levels(OrderBook.CHECKSUM_LEVELS),
+            "asks": book.asks.levels(OrderBook.CHECKSUM_LEVELS), "action": "partial"}}
+
+    async def handle_connection(self, websocket, path=None):
+        connection = PaperConnection(websocket)
+        self.connections.add(connection)
+        try:
+            async for message in websocket:
+                try:
+                    request = json_codec.loads(message)
+                except ValueError:
+                    await connection.websocket.send(json_codec.dumps({"type": "error", "code": 400, "msg": "Invalid JSON"}))
+                    continue
+                await self.handle_request(connection, request)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if connection.sender:
+                connection.sender.cancel()
+            self.connections.discard(connection)
+
+    @staticmethod
+    def rest_response(result):
+        return web.json_response({"success": True, "result": result}, dumps=json_codec.dumps)
+
+    @staticmethod
+    def rest_error(message: str, status: int = 400):
+        return web.json_response({"success": False, "error": message}, status=status, dumps=json_codec.dumps)
+
+    @staticmethod
+    def account_key(request):
+        key = request.headers.get("FTX-KEY")
+        if not key:
+            raise web.HTTPUnauthorized(text='{"success": false, "error": "Not logged in"}', content_type="application/json")
+        return key
+
+    async def handle_rest_account(self, request):
+        key = self.account_key(request)
+        return self.rest_response({"username": key, "leverage": 1.0, "makerFee": float(self.exchange.taker_fee), "takerFee": float(self.exchange.taker_fee), "positions": [],
+                                   "collateral": float(self.exchange.account(key).balance("USDT")), "freeCollateral": float(self.exchange.account(key).balance("USDT"))})
+
+    async def handle_rest_balances(self, request):
+        return self.rest_response(self.exchange.account(self.account_key(request)).balances_list())
+
+    async def handle_rest_positions(self, request):
+        self.account_key(request)
+        return self.rest_response([])
+
+    async def handle_rest_open_orders(self, request):
+        return self.rest_response(self.exchange.open_orders(self.account_key(request), request.query.get("market")))
+
+    async def handle_rest_markets(self, request):
+        return self.rest_response([self.exchange.market_info(market) for market in self.exchange.markets])
+
+    async def handle_rest_market(self, request):
+        market = request.match_info["market"].upper()
+        if market not in self.exchange.markets:
+            return self.rest_error("No such market: {}".format(market), status=404)
+        return self.rest_response(self.exchange.market_info(market))
+
+    async def handle_rest_place_order(self, request):
+        key = self.account_key(request)
+        try:
+            return self.rest_response(self.exchange.place_order(key, json_codec.loads(await request.text())))
+        except Exception as e:
+            return self.rest_error(str(e))
+
+    async def handle_rest_cancel_order(self, request):
+        key = self.account_key(request)
+        try:
+            return self.rest_response(self.exchange.cancel_order(key, int(request.match_info["order_id"])))
+        except Exception as e:
+            return self.rest_error(str(e), status=404)
+
+    async def run_source(self):
+        try:
+            await self.source.run(self)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.exception("Market data source failed: {}".format(repr(e)))
+
+    async def start(self):
+        self.websocket_server = await websockets.serve(self.handle_connection, self.host, self.port)
+        self.port = self.websocket_server.sockets[0].getsockname()[1]
+        app = web.Application()
+        app.router.add_get("/api/account", self.handle_rest_account)
+        app.router.add_get("/api/wallet/balances", self.handle_rest_balances)
+        app.router.add_get("/api/positions", self.handle_rest_positions)
+        app.router.add_get("/api/orders", self.handle_rest_open_orders)
+        app.router.add_post("/api/orders", self.handle_rest_place_order)
+        app.router.add_delete("/api/orders/{order_id}", self.handle_rest_cancel_order)
+        app.router.add_get("/api/markets", self.handle_rest_markets)
+        app.router.add_get("/api/markets/{market:.+}", self.handle_rest_market)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.rest_port)
+        await site.start()
+        self.rest_port = site._server.sockets[0].getsockname()[1]
+        if self.source:
+            self.source_task = asyncio.ensure_future(self.run_source())
+        self.logger.info("Paper exchange listening at: {} (REST: {}), markets: {}".format(self.uri, self.rest_url, list(self.exchange.markets)))
+        return self
+
+    async def stop(self):
+        for periodic_call in self.periodic_calls:
+            periodic_call.cancel()
+        if self.source_task:
+            self.source_task.cancel()
+        if self.websocket_server:
+            self.websocket_server.close()
+            await self.websocket_server.wait_closed()
+        if self.runner:
+            await self.runner.cleanup()
+
+    def report(self):
+        return dict(self.exchange.stats, connections=len(self.connections), accounts=len(self.exchange.accounts), relayed=self.relayed)
+
+    def log_report(self):
+        self.logger.info("Paper exchange: {}".format(self.report()))
+
+    async def run(self):
+        await self.start()
+        self.periodic_calls.append(TimerScheduler.get().call_periodic(60, self.log_report))
+        await asyncio.Event().wait()
+
+    def run_forever(self):
+        loop = asyncio.get_event_loop()
+        try:
+            loop.run_until_complete(self.run())
+        except KeyboardInterrupt:
+            self.logger.info("Interrupted")
+        except Exception as e:
+            self.logger.exception(repr(e))
+        finally:
+            loop.run_until_complete(self.stop())
+            self.logger.info("Bye bye!")
+            async_logging.shutdown()
+
+
+class SyntheticMarketData(object):
+    '''
+    Random walk order books (depth levels a side around the mid, a tick apart): every market gets an orderbook update
+    (the changed levels, with the checksum), a ticker and (half of the time) a trade rate times a second
+    '''
+
+    def __init__(self, markets: List[str], rate: float = 10.0, prices: dict = None, depth: int = 50, volatility: float = 0.0002, seed: int = None):
+        self.markets = markets
+        self.rate = rate
+        self.prices = dict(DEFAULT_PRICES, **(prices if prices else {}))
+        self.depth = depth
+        self.volatility = volatility  # Relative standard deviation of the mid per update
+        self.random = random.Random(seed)
+        self.books = {}  # market -> OrderBook (the generated one)
+        self.mids = {}
+        self.ticks = {}
+        self.trade_id = 0
+
+    def levels(self, market: str):
+        '''
+        {price: size} of the bids and the asks around the current mid
+        '''
+        tick = self.ticks[market]
+        decimals = max(0, -int(math.floor(math.log10(tick))))
+        best_bid = math.floor(self.mids[market] / tick) * tick
+        bids = [round(best_bid - i * tick, decimals) for i in range(self.depth)]
+        asks = [round(best_bid + (i + 1) * tick, decimals) for i in range(self.depth)]
+        return bids, asks
+
+    def size(self):
+        return round(self.random.uniform(0.001, 2.0), 4)
+
+    def partial(self, market: str, tick: float):
+        self.ticks[market] = tick
+        self.mids.setdefault(market, self.prices.get(market, 100.0))
+        book = self.books[market] = OrderBook(market)
+        bids, asks = self.levels(market)
+        for price in bids:
+            book.bids.apply(price, self.size())
+        for price in asks:
+            book.asks.apply(price, self.size())
+        book.time = time.time()
+        return {"channel": "orderbook", "market": market, "type": "partial", "data": {
+            "time": book.time, "checksum": book.checksum(), "bids": book.bids.levels(self.depth), "asks": book.asks.levels(self.depth), "action": "partial"}}
+
+    def step(self, market: str):
+        '''
+        The next orderbook update, ticker and trade messages of the market
+        '''
+        book = self.books[market]
+        self.mids[market] *= math.exp(self.random.gauss(0.0, self.volatility))
+        bids, asks = self.levels(market)
+        changes = {"bids": [], "asks": []}
+        for name, book_side, prices in (("bids", book.bids, bids), ("asks", book.asks, asks)):
+            wanted = set(prices)
+            for price, _ in book_side.levels(len(book_side)):
+                if price not in wanted:
+                    changes[name].append([price, 0.0])
+            current = dict(book_side.levels(len(book_side)))
+            for price in prices:
+                if price not in current or self.random.random() < 0.05:
+                    changes[name].append([price, self.size()])
+            for price, size in changes[name]:
+                book_side.apply(price, size)
+        now = time.time()
+        book.time = now
+        messages = [{"channel": "orderbook", "market": market, "type": "update", "data": dict(changes, time=now, checksum=book.checksum(), action="update")}]
+        (bid, bid_size), (ask, ask_size) = book.bids.best(), book.asks.best()
+        messages.append({"channel": "ticker", "market": market, "type": "update", "data": {"bid": bid, "ask": ask, "bidSize": bid_size, "askSize": ask_size, "last": bid, "time": now}})
+        if self.random.random() < 0.5:
+            self.trade_id += 1
+            side = self.random.choice(("buy", "sell"))
+            messages.append({"channel": "trades", "market": market, "type": "update", "data": [{
+                "id": self.trade_id, "price": ask if side == "buy" else bid, "size": round(self.random.uniform(0.0001, 0.5), 4), "side": side,
+                "liquidation": False, "time": iso_time(now)}]})
+        return messages
+
+    async def run(self, server: PaperExchangeServer):
+        for market in self.markets:
+            await server.publish_frame(json_codec.dumps(self.partial(market, server.exchange.markets[market]["priceIncrement"])))
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            for market in self.markets:
+                for message in self.step(market):
+                    await server.publish_frame(json_codec.dumps(message))
+            next_tick = max(next_tick + 1.0 / self.rate, loop.time() - 1.0)  # No catching up after a stall longer than 1 s
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+
+class CaptureReplay(object):
+    '''
+    The frames of a market data capture (see market_data_recorder) at the recorded pace, speed times faster (0 - as fast
+    as possible), looped
+    '''
+
+    def __init__(self, directory: str, speed: float = 1.0, start: float = None, end: float = None, loop: bool = True):
+        self.directory = directory
+        self.speed = speed
+        self.start = start
+        self.end = end
+        self.loop = loop
+
+    async def run(self, server: PaperExchangeServer):
+        loop = asyncio.get_running_loop()
+        while True:
+            first_time = started = None
+            for receive_time, frame in MarketDataCaptureReader(self.directory).replay(self.start, self.end):
+                if first_time is None:
+                    first_time, started = receive_time, loop.time()
+                if self.speed:
+                    delay = started + (receive_time - first_time) / self.speed - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)
+                await server.publish_frame(frame)
+            if not self.loop or first_time is None:
+                server.logger.info("Replay of the capture: {} finished".format(self.directory))
+                return
+
+
+class LiveMarketData(object):
+    '''
+    The real FTX market data (only the orders are simulated)
+    '''
+
+    def __init__(self, markets: List[str], channels: List[str] = None, websocket_uri: str = None, logger: logging.Logger = None):
+        self.markets = markets
+        self.channels = channels if channels else list(PUBLIC_CHANNELS)
+        self.websocket_uri = websocket_uri
+        self.logger = logger
+        self.client = None
+
+    async def run(self, server: PaperExchangeServer):
+        frames = asyncio.Queue()
+        channels = ["{}.{}".format(channel, market) for channel in self.channels for market in self.markets]
+        self.client = FtxApiClient(
+            client_type=FtxApiClient.MARKET,
+            logger=self.logger if self.logger else server.logger,
+            channels=channels,
+            channels_handling_map={channel: self.ignore for channel in channels},
+            websocket_uri=self.websocket_uri,
+            raw_frames_observer=lambda frame, receive_time: frames.put_nowait(frame)
+        )
+        server.exchange.order_books.resubscribe = lambda market: self.client.resubscribe_channel("orderbook." + market)
+        while True:
+            await server.publish_frame(await frames.get())
+
+    @staticmethod
+    def ignore(event: dict):
+        pass
+
+
+def create_paper_exchange_server(config: dict, markets: List[str], taker_fee: float, log_file: str = None):
+    '''
+    config - the "paper_exchange" section of the ftx_trader config, e.g. {"port": 8765, "rest_port": 8766, "source":
+    "synthetic", "rate": 10, "initial_balances": {"USDT": 10000}} (see the arguments of __main__)
+    '''
+    source_type = config.get("source", "synthetic")
+    if source_type == "synthetic":
+        source = SyntheticMarketData(markets, rate=config.get("rate", 10.0), prices=config.get("prices"))
+    elif source_type == "replay":
+        source = CaptureReplay(config["capture_directory"], speed=config.get("speed", 1.0))
+    elif source_type == "live":
+        source = LiveMarketData(markets, websocket_uri=config.get("live_websocket_uri"))
+    else:
+        raise Exception("Unknown paper exchange market data source: {}. Supported: synthetic, replay, live".format(source_type))
+    exchange = PaperExchange(markets, taker_fee=config.get("taker_fee", taker_fee), initial_balances=config.get("initial_balances"),
+                             increments=config.get("increments"), fill_latency=config.get("fill_latency", 0.0))
+    return PaperExchangeServer(exchange, source, host=config.get("host", "127.0.0.1"), port=config.get("port", 8765), rest_port=config.get("rest_port", 8766),
+                               log_file=log_file, logger=exchange.logger)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Paper trading exchange simulator (FTX websocket and REST API)")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rest-port", type=int, default=8766)
+    parser.add_argument("--markets", nargs="+", default=["BTC/USDT"])
+    parser.add_argument("--source", choices=["synthetic", "replay", "live"], default="synthetic")
+    parser.add_argument("--rate", type=float, default=10.0, help="Synthetic updates/s per market")
+    parser.add_argument("--capture-directory", type=str, default=None)
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed (0 - as fast as possible)")
+    parser.add_argument("--taker-fee", type=float, default=0.000665)
+    parser.add_argument("--fill-latency", type=float, default=0.0)
+    parser.add_argument("--usdt", type=float, default=10000.0, help="Initial USDT balance of every paper account")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = create_paper_exchange_server({"host": args.host, "port": args.port, "rest_port": args.rest_port, "source": args.source, "rate": args.rate,
+                                           "capture_directory": args.capture_directory, "speed": args.speed, "fill_latency": args.fill_latency,
+                                           "initial_balances": {"USDT": args.usdt}}, args.markets, args.taker_fee)
+    server.run_forever()
@@ -1,7 +1,15 @@
+import math
+import time
+import heapq
+import random
 import asyncio
 import inspect
+import logging
+import weakref
+import itertools
 from contextlib import suppress
 from threading import Timer
+from latency import LatencyHistogram
 
 
 class PeriodicAsync:
@@ -103,4 +111,166 @@ class PeriodicNormal(object):
     def _run(self):
         self.is_started = False
         self.start()
-        self.func(*self.args, **self.kwargs)
\ No newline at end of file
+        self.func(*self.args, **self.kwargs)
+
+class PeriodicTimer(object):
+    '''
+    Timer scheduled by TimerScheduler (see TimerScheduler.call_periodic). Cancel it with cancel().
+    '''
+
+    __slots__ = ("scheduler", "interval", "func", "args", "jitter", "missed_ticks", "name", "deadline", "fire_time",
+                 "cancelled", "running", "ticks", "skipped")
+
+    def __init__(self, scheduler, interval: float, func, args: tuple, jitter: float, missed_ticks: str, name: str, deadline: float):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.func = func
+        self.args = args
+        self.jitter = jitter
+        self.missed_ticks = missed_ticks
+        self.name = name
+        self.deadline = deadline  # Nominal time of the next tick (without the jitter)
+        self.fire_time = deadline
+        self.cancelled = False
+        self.running = None  # Task of the still running (async) call
+        self.ticks = 0
+        self.skipped = 0
+
+    def cancel(self):
+        self.cancelled = True
+        if self.running and not self.running.done():
+            self.running.cancel()
+
+
+class TimerScheduler(object):
+    '''
+    Event loop native scheduler of periodic calls - a single timer heap per loop, no threads at all (unlike PeriodicNormal
+    creating a thread per tick). The callbacks (normal functions or coroutine functions) run in the loop.
+        - drift correction: the ticks are at start + n * interval, regardless of how late the previous ones were
+        - jitter: every tick is delayed by random(0, jitter) seconds (e.g. to spread the requests of many clients)
+        - missed ticks policy (when the loop was blocked longer than the interval or an async call is still running):
+            SKIP        skip the missed ticks and keep the phase (the default)
+            CATCH_UP    run all the missed ticks at once
+            DELAY       run one tick now and restart the phase from now
+
+    eg. usage:
+
+        scheduler = TimerScheduler.get()    # The scheduler of the running loop
+        timer = scheduler.call_periodic(15, client.ping, jitter=0.5)
+        ...
+        timer.cancel()
+    '''
+
+    SKIP = "skip"
+    CATCH_UP = "catch_up"
+    DELAY = "delay"
+
+    _schedulers = weakref.WeakKeyDictionary()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.loop = loop if loop else asyncio.get_event_loop()
+        self.heap = []  # [(fire time, sequence, timer)]
+        self.sequence = itertools.count()
+        self.handle = None  # loop.call_at handle of the earliest timer
+        self.handle_time = None
+        self.timers = 0
+        self.ticks = 0
+        self.lateness = LatencyHistogram()  # ns between the scheduled and the real tick time
+        self.overhead = LatencyHistogram()  # ns spent in the scheduler itself per tick (without the callbacks)
+
+    @classmethod
+    def get(cls, loop: asyncio.AbstractEventLoop = None):
+        '''
+        The one scheduler per loop
+        '''
+        loop = loop if loop else asyncio.get_running_loop()
+        scheduler = cls._schedulers.get(loop)
+        if scheduler is None:
+            scheduler = cls._schedulers[loop] = cls(loop)
+        return scheduler
+
+    def call_periodic(self, interval: float, func, *args, jitter: float = 0.0, missed_ticks: str = SKIP, first_delay: float = None, name: str = None):
+        if interval <= 0:
+            raise Exception("Interval must be positive! Interval: {}".format(interval))
+        if missed_ticks not in (self.SKIP, self.CATCH_UP, self.DELAY):
+            raise Exception("Unknown missed ticks policy: {}".format(missed_ticks))
+        deadline = self.loop.time() + (interval if first_delay is None else first_delay)
+        timer = PeriodicTimer(self, interval, func, args, jitter, missed_ticks, name if name else getattr(func, "__name__", repr(func)), deadline)
+        self.timers += 1
+        self.push(timer)
+        return timer
+
+    def push(self, timer: PeriodicTimer):
+        timer.fire_time = timer.deadline + (random.uniform(0, timer.jitter) if timer.jitter else 0.0)
+        heapq.heappush(self.heap, (timer.fire_time, next(self.sequence), timer))
+        if self.handle_time is None or timer.fire_time < self.handle_time:
+            self.arm()
+
+    def arm(self):
+        if self.handle:
+            self.handle.cancel()
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+            self.timers -= 1
+        if self.heap:
+            self.handle_time = self.heap[0][0]
+            self.handle = self.loop.call_at(self.handle_time, self.run_due)
+        else:
+            self.handle = self.handle_time = None
+
+    def run_due(self):
+        self.handle = self.handle_time = None
+        now = self.loop.time()
+        while self.heap and self.heap[0][0] <= now:
+            start = time.perf_counter_ns()
+            fire_time, _, timer = heapq.heappop(self.heap)
+            if timer.cancelled:
+                self.timers -= 1
+                continue
+            self.ticks += 1
+            self.lateness.record(int((now - fire_time) * 1e9))
+            self.reschedule(timer, now)
+            self.overhead.record(time.perf_counter_ns() - start)
+            self.call(timer)
+        self.arm()
+
+    def reschedule(self, timer: PeriodicTimer, now: float):
+        timer.deadline += timer.interval  # Drift correction - the phase is kept
+        if timer.deadline <= now:
+            if timer.missed_ticks == self.SKIP:
+                missed = math.ceil((now - timer.deadline) / timer.interval)
+                timer.skipped += missed
+                timer.deadline += missed * timer.interval
+                if timer.deadline <= now:
+                    timer.deadline += timer.interval
+                    timer.skipped += 1
+            elif timer.missed_ticks == self.DELAY:
+                timer.deadline = now + timer.interval
+            # CATCH_UP - the missed tick is due right away
+        heapq.heappush(self.heap, (timer.deadline + (random.uniform(0, timer.jitter) if timer.jitter else 0.0), next(self.sequence), timer))
+
+    def call(self, timer: PeriodicTimer):
+        if timer.running and not timer.running.done():
+            timer.skipped += 1  # The previous (async) call is still running - never overlap
+            return
+        timer.ticks += 1
+        try:
+            result = timer.func(*timer.args)
+            if inspect.isawaitable(result):
+                timer.running = asyncio.ensure_future(result, loop=self.loop)
+                timer.running.add_done_callback(self.log_exception)
+        except Exception as e:
+            logging.getLogger("periodic").exception("Exception during periodic call: {}. {}".format(timer.name, repr(e)))
+
+    @staticmethod
+    def log_exception(task):
+        if not task.cancelled() and task.exception():
+            logging.getLogger("periodic").error("Exception during periodic call: {}".format(repr(task.exception())))
+
+    def stats(self):
+        return {
+            "timers": self.timers,
+            "ticks": self.ticks,
+            "lateness_us": self.lateness.summary(),
+            "overhead_us": self.overhead.summary()
+        }
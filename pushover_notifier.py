@@ -1,49 +1,289 @@
+'''
+Pushover notifications - never blocking the caller (e.g. a websocket handler or a buy/sell request handling).
+
+notify() only appends the message into an in-memory queue and wakes up the background sender thread, which:
+    - coalesces bursts: messages coming within batch_delay (or while the user key is rate limited) are sent as one
+      digest message (priority of the most important message)
+    - deduplicates: an identical message already pending is counted (" (x3)"), an identical message already sent within
+      dedup_window is dropped
+    - rate limits every user key (min_interval between the requests, exponential backoff when the provider fails)
+    - keeps one persistent (keep-alive) HTTPS connection to the provider
+
+The sender thread is started lazily by the first notify() of the process (the notifier is created in the main process
+and used in the forked workers). flush() waits (bounded) until everything queued is sent, e.g. before the exit.
+
+Nothing is sent unless send_notifications is set (the "pushover_send_notifications" config key, off by default) - the
+notifications used to be never sent at all. The default priority is 0 (normal), priority 2 (emergency: retried every
+30 minutes until acknowledged, for an hour) only when explicitly requested.
+
+api_url can point to a local stand-in (see benchmarks/http_stand_in_server.py).
+'''
+
+import os
+import time
+import json
 import logging
-from time import localtime, strftime
-from pushover import Client
+import async_logging
+import threading
+from collections import deque, OrderedDict
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlsplit, urlencode
 from typing import List
 
 
+PUSHOVER_API_URL = "https://api.pushover.net/1/messages.json"
+MAX_MESSAGE_LENGTH = 1024  # Pushover limit (characters)
+MAX_TITLE_LENGTH = 250  # Pushover limit (characters)
+MAX_BACKOFF = 300.0  # Seconds
+
+
+class PendingMessage(object):
+
+    __slots__ = ("message", "priority", "time", "count")
+
+    def __init__(self, message: str, priority: int, time: float):
+        self.message = message
+        self.priority = priority
+        self.time = time  # Unix time of the first occurrence
+        self.count = 1
+
+
+class UserKeyState(object):
+    '''
+    Sending state of a single pushover user key
+    '''
+
+    __slots__ = ("user_key", "batch", "batch_time", "next_send_time", "backoff", "sent")
+
+    def __init__(self, user_key: str):
+        self.user_key = user_key
+        self.batch = OrderedDict()  # message -> PendingMessage
+        self.batch_time = 0.0  # Monotonic time the first message of the batch came
+        self.next_send_time = 0.0  # Monotonic time the next request is allowed (rate limit / backoff)
+        self.backoff = 0.0
+        self.sent = {}  # message -> monotonic time it was sent (deduplication)
+
+
 class PushoverNotifier(object):
 
-    def __init__(self, application_title, pushover_application_token: str, pushover_user_keys: List[str], logger: logging.Logger = None):
+    def __init__(self, application_title, pushover_application_token: str, pushover_user_keys: List[str], logger: logging.Logger = None, api_url: str = PUSHOVER_API_URL,
+                 min_interval: float = 5.0, batch_delay: float = 1.0, dedup_window: float = 60.0, max_pending: int = 1000, max_batch: int = 100, timeout: float = 10.0,
+                 send_notifications: bool = False):
         self.application_title = application_title
+        self.send_notifications = send_notifications  # Off - notify() does nothing
         self.pushover_application_token = pushover_application_token
-        self.pushover_user_keys = pushover_user_keys
-        self.pushover_clients = self.create_clients()
+        self.pushover_user_keys = list(pushover_user_keys) if pushover_user_keys else []
+        self.api_url = api_url
+        self.min_interval = min_interval  # Seconds between two requests for the same user key
+        self.batch_delay = batch_delay  # Seconds a message waits for the others of the same burst
+        self.dedup_window = dedup_window  # Seconds an identical message isn't sent again
+        self.max_pending = max_pending  # Messages queued for the sender (the oldest are dropped when full)
+        self.max_batch = max_batch  # Distinct messages in a digest (the oldest are dropped when full)
+        self.timeout = timeout
         if logger:
             self.logger = logger
         else:
             self.logger = logging.getLogger("pushover_notifier")
             PushoverNotifier.setup_logger(self.logger, "./logs/pushover_notifier.log")
+        self.stats = {"queued": 0, "dropped": 0, "deduplicated": 0, "coalesced": 0, "requests": 0, "failed_requests": 0}
+        self.sender_lock = threading.Lock()
+        self.init_sender_state()
+
+    def init_sender_state(self):
+        self.sender_pid = None
+        self.sender_thread = None
+        self.pending = deque(maxlen=self.max_pending)  # (unix time, message, priority)
+        self.wakeup = threading.Event()
+        self.idle = threading.Event()
+        self.flushing = False
+        self.user_key_states = [UserKeyState(user_key) for user_key in self.pushover_user_keys]
+        self.connection = None
+
+    def __getstate__(self):
+        # Threads, locks and the connection are per process
+        state = self.__dict__.copy()
+        for name in ("sender_lock", "sender_thread", "pending", "wakeup", "idle", "user_key_states", "connection"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.sender_lock = threading.Lock()
+        self.init_sender_state()
 
     @staticmethod
     def setup_logger(logger, log_file):
-        logger.setLevel(logging.DEBUG)
-        fh = logging.FileHandler(log_file, mode="w")
-        fh.setLevel(logging.DEBUG)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        ch.setFormatter(console_formatter)
-        fh.setFormatter(file_formatter)
-        logger.addHandler(ch)
-        logger.addHandler(fh)
-
-    def create_clients(self):
-        pushover_clients = []
-        if self.pushover_application_token and self.pushover_user_keys:
-            for pushover_user_key in self.pushover_user_keys:
-                pushover_client = Client(pushover_user_key, api_token=self.pushover_application_token)
-                pushover_clients.append(pushover_client)
-        return pushover_clients
-
-    def notify(self, message, priority=2):
-        # try:
-        #     msg = strftime("%Y-%m-%d %H:%M:%S", localtime()) + " " + str(message)
-        #     for pushover_client in self.pushover_clients:
-        #         pushover_client.send_message(msg, title=self.application_title, priority=priority, retry=1800, expire=3600)
-        # except Exception as e:
-        #     self.logger.error("PUSHOVER NOTIFICATIONS NOT WORKING - probably connection issues. {}".format(str(e)))
-        pass
\ No newline at end of file
+        async_logging.setup_logger(logger, log_file)
+
+    @property
+    def enabled(self):
+        return bool(self.send_notifications and self.pushover_application_token and self.pushover_user_keys)
+
+    def notify(self, message, priority=0):
+        '''
+        Queues the message (never blocks on the provider)
+        '''
+        if not self.enabled:
+            return
+        if self.sender_pid != os.getpid():
+            self.start_sender()
+        if len(self.pending) == self.max_pending:
+            self.stats["dropped"] += 1
+        self.idle.clear()
+        self.pending.append((time.time(), str(message), priority))
+        self.stats["queued"] += 1
+        self.wakeup.set()
+
+    def start_sender(self):
+        with self.sender_lock:
+            if self.sender_pid == os.getpid():
+                return
+            if self.sender_pid is not None:
+                self.init_sender_state()  # Forked - the sender thread of the parent process doesn't exist here
+            self.sender_thread = threading.Thread(target=self.run_sender, name="pushover_notifier", daemon=True)
+            self.sender_thread.start()
+            self.sender_pid = os.getpid()
+
+    def flush(self, timeout: float = 5.0):
+        '''
+        Sends everything queued right away (ignoring batch_delay and min_interval). Waits up to timeout seconds.
+        Returns True if everything was sent.
+        '''
+        if self.sender_pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        self.flushing = True
+        self.wakeup.set()
+        try:
+            while self.idle.wait(max(0.0, deadline - time.monotonic())):
+                if not self.pending:
+                    return True
+                self.idle.clear()
+                self.wakeup.set()
+            return False
+        finally:
+            self.flushing = False
+
+    def run_sender(self):
+        while True:
+            self.wakeup.wait(self.get_wait_timeout())
+            self.wakeup.clear()
+            try:
+                self.collect_pending()
+                self.send_due_batches()
+            except Exception as e:
+                self.logger.exception("Pushover sender exception: {}".format(repr(e)))
+            if not self.pending and not any(state.batch for state in self.user_key_states):
+                self.idle.set()
+
+    def get_wait_timeout(self):
+        due_times = [self.get_due_time(state) for state in self.user_key_states if state.batch]
+        if not due_times:
+            return None
+        return max(0.0, min(due_times) - time.monotonic())
+
+    def get_due_time(self, state: UserKeyState):
+        if self.flushing and not state.backoff:
+            return 0.0
+        return max(state.batch_time + self.batch_delay, state.next_send_time)
+
+    def collect_pending(self):
+        now = time.monotonic()
+        while self.pending:
+            message_time, message, priority = self.pending.popleft()
+            for state in self.user_key_states:
+                pending_message = state.batch.get(message)
+                if pending_message:
+                    pending_message.count += 1
+                    pending_message.priority = max(pending_message.priority, priority)
+                    self.stats["coalesced"] += 1
+                elif now - state.sent.get(message, -self.dedup_window) < self.dedup_window:
+                    self.stats["deduplicated"] += 1
+                else:
+                    if not state.batch:
+                        state.batch_time = now
+                    elif len(state.batch) >= self.max_batch:
+                        state.batch.popitem(last=False)
+                        self.stats["dropped"] += 1
+                    state.batch[message] = PendingMessage(message, priority, message_time)
+
+    def send_due_batches(self):
+        for state in self.user_key_states:
+            if state.batch and time.monotonic() >= self.get_due_time(state):
+                self.send_batch(state)
+
+    def send_batch(self, state: UserKeyState):
+        messages = list(state.batch.values())
+        fields = self.create_fields(state.user_key, messages)
+        now = time.monotonic()
+        try:
+            status = self.post(fields)
+        except Exception as e:
+            self.stats["failed_requests"] += 1
+            state.backoff = min(state.backoff * 2 if state.backoff else self.min_interval, MAX_BACKOFF)
+            state.next_send_time = now + state.backoff
+            self.logger.error("PUSHOVER NOTIFICATIONS NOT WORKING - probably connection issues. {} (retry in: {} s)".format(repr(e), state.backoff))
+            return
+        if 400 <= status < 500 and status != 429:
+            self.logger.error("Pushover rejected {} message(s) (HTTP status: {}) - dropped".format(len(messages), status))
+        state.batch.clear()
+        state.backoff = 0.0
+        state.next_send_time = now + self.min_interval
+        for message in messages:
+            state.sent[message.message] = now
+        if len(state.sent) > self.max_batch:
+            for message, sent_time in list(state.sent.items()):
+                if now - sent_time >= self.dedup_window:
+                    del state.sent[message]
+
+    def create_fields(self, user_key: str, messages: List[PendingMessage]):
+        def format_message(pending_message: PendingMessage):
+            text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(pending_message.time)) + " " + pending_message.message
+            return text + " (x{})".format(pending_message.count) if pending_message.count > 1 else text
+
+        if len(messages) == 1:
+            title = self.application_title
+            text = format_message(messages[0])
+        else:
+            title = "{} ({} messages)".format(self.application_title, sum(message.count for message in messages))
+            text = "\n".join(format_message(message) for message in messages)
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 3] + "..."
+        priority = max(message.priority for message in messages)
+        fields = {
+            "token": self.pushover_application_token,
+            "user": user_key,
+            "title": title[:MAX_TITLE_LENGTH],
+            "message": text,
+            "priority": priority,
+            "timestamp": int(messages[0].time)
+        }
+        if priority == 2:
+            # Emergency priority requires retry and expire
+            fields["retry"] = 1800
+            fields["expire"] = 3600
+        return fields
+
+    def post(self, fields: dict):
+        '''
+        Sends the request over the persistent connection. Raises for the connection / server errors (to be retried),
+        returns the HTTP status otherwise.
+        '''
+        url = urlsplit(self.api_url)
+        if not self.connection:
+            connection_class = HTTPSConnection if url.scheme == "https" else HTTPConnection
+            self.connection = connection_class(url.hostname, url.port, timeout=self.timeout)
+        self.stats["requests"] += 1
+        try:
+            self.connection.request("POST", url.path, body=urlencode(fields), headers={"Content-Type": "application/x-www-form-urlencoded"})
+            response = self.connection.getresponse()
+            body = response.read()
+        except Exception:
+            self.connection.close()
+            self.connection = None
+            raise
+        if response.status == 429 or response.status >= 500:
+            raise Exception("HTTP status: {}".format(response.status))
+        if response.status == 200 and json.loads(body).get("status") != 1:
+            raise Exception("Unexpected response: {}".format(body[:200]))
+        return response.status
@@ -0,0 +1,253 @@
+import math
+import time
+import struct
+from collections import namedtuple
+from multiprocessing import shared_memory
+from typing import List, Union
+
+
+MarketSnapshot = namedtuple("MarketSnapshot", ["bid", "ask", "last", "time"])
+
+# Bound once - the readers are on the hot path
+unpack_slot = struct.Struct("<Qdddd").unpack_from
+unpack_seq = struct.Struct("<Q").unpack_from
+
+
+class SharedMarketData(object):
+    '''
+    Fixed layout market data snapshot living in shared memory (multiprocessing.shared_memory).
+    Replaces the Manager().dict proxy - reading a price is a local memory access instead of a pickled IPC round trip.
+
+    Single writer (the market data worker), many lock-free readers (the user api workers) - seqlock protocol:
+        - the writer makes the market's sequence number odd, writes the values and makes the sequence number even again
+        - the reader copies the whole slot, re-reads the sequence number and retries if it's odd or has changed in the meantime
+
+    Layout:
+        header:         magic, max markets, markets count, taker fee
+        names table:    max_markets * NAME_SIZE bytes (utf-8, zero padded)
+        market slots:   max_markets * SLOT_SIZE bytes (seq, bid, ask, last, update time), one cache line each (aligned)
+
+    eg. usage:
+
+        shared_market_data = SharedMarketData(["BTC/USDT"], taker_fee=0.000665)  # In the main process
+        shared_market_data.update("BTC/USDT", bid=29100.5, ask=29101.0)         # In the market data worker
+        shared_market_data.best_ask("BTC/USDT")                                 # In the user api workers
+        read_bid_ask = shared_market_data.bid_ask_reader("BTC/USDT")            # The hot path: bound once...
+        bid, ask = read_bid_ask()                                               # ...read on every tick
+        shared_market_data.unlink()                                             # In the main process, on exit
+
+    The object is picklable - unpickling it (e.g. with the spawn start method) attaches to the same shared memory block.
+    Note! Prices are floats. Convert them with Decimal(str(price)) (not Decimal(price)) to get the received value exactly.
+    '''
+
+    MAGIC = 0x46545853  # "FTXS"
+    HEADER = struct.Struct("<IIId")
+    NAME_SIZE = 32
+    SLOT = struct.Struct("<Qdddd")
+    SEQ = struct.Struct("<Q")
+    SLOT_SIZE = 64
+
+    def __init__(self, markets: List[str] = None, max_markets: int = 64, taker_fee: float = 0.0, name: str = None, create: bool = True):
+        self.max_markets = max_markets
+        self.market_slots = {}
+        self.offsets = {}  # Both market names and slots -> offset of the market slot
+        self.views = []  # memoryviews of the readers (see bid_ask_reader) - released on close
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=self.size(max_markets))
+            self.buf = self.shm.buf
+            self.HEADER.pack_into(self.buf, 0, self.MAGIC, max_markets, 0, taker_fee)
+            for market in markets or []:
+                self.add_market(market)
+        else:
+            self.attach(name)
+
+    @classmethod
+    def slots_offset(cls, max_markets):
+        '''
+        The market slots start at a SLOT_SIZE (cache line) boundary
+        '''
+        return -(-(cls.HEADER.size + max_markets * cls.NAME_SIZE) // cls.SLOT_SIZE) * cls.SLOT_SIZE
+
+    @classmethod
+    def size(cls, max_markets):
+        return cls.slots_offset(max_markets) + max_markets * cls.SLOT_SIZE
+
+    def attach(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf
+        magic, self.max_markets, _, _ = self.HEADER.unpack_from(self.buf, 0)
+        if magic != self.MAGIC:
+            raise Exception("Shared memory block: {} doesn't contain market data!".format(name))
+        self.refresh_markets()
+
+    def __getstate__(self):
+        return {"name": self.shm.name}
+
+    def __setstate__(self, state):
+        self.market_slots = {}
+        self.offsets = {}
+        self.views = []
+        self.attach(state["name"])
+        try:
+            # Only the creator owns the block - don't let the resource tracker of this process unlink it on exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+
+    def __repr__(self):
+        return "SharedMarketData(taker_fee={}, {})".format(self.taker_fee, {market: tuple(self.read(slot)) for market, slot in self.market_slots.items()})
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def markets(self):
+        self.refresh_markets()
+        return list(self.market_slots.keys())
+
+    @property
+    def taker_fee(self):
+        return self.HEADER.unpack_from(self.buf, 0)[3]
+
+    @taker_fee.setter
+    def taker_fee(self, value: float):
+        magic, max_markets, markets_count, _ = self.HEADER.unpack_from(self.buf, 0)
+        self.HEADER.pack_into(self.buf, 0, magic, max_markets, markets_count, value)
+
+    def markets_count(self):
+        return self.HEADER.unpack_from(self.buf, 0)[2]
+
+    def refresh_markets(self):
+        '''
+        Picks up the markets added by other processes
+        '''
+        for slot in range(len(self.market_slots), self.markets_count()):
+            offset = self.HEADER.size + slot * self.NAME_SIZE
+            market = bytes(self.buf[offset:offset + self.NAME_SIZE]).rstrip(b"\0").decode()
+            self.register_market(market, slot)
+
+    def register_market(self, market: str, slot: int):
+        self.market_slots[market] = slot
+        self.offsets[market] = self.offsets[slot] = self.slot_offset(slot)
+
+    def add_market(self, market: str):
+        '''
+        Adds a new market (if not added yet) and returns its slot. To be called by the writer only.
+        '''
+        self.refresh_markets()
+        if market in self.market_slots:
+            return self.market_slots[market]
+        encoded_market = market.encode()
+        if len(encoded_market) > self.NAME_SIZE:
+            raise Exception("Market name: {} is too long (max {} bytes)!".format(market, self.NAME_SIZE))
+        magic, max_markets, markets_count, taker_fee = self.HEADER.unpack_from(self.buf, 0)
+        if markets_count >= max_markets:
+            raise Exception("Cannot add market: {}. All {} market slots are already used!".format(market, max_markets))
+        offset = self.HEADER.size + markets_count * self.NAME_SIZE
+        self.buf[offset:offset + self.NAME_SIZE] = encoded_market.ljust(self.NAME_SIZE, b"\0")
+        self.SLOT.pack_into(self.buf, self.slot_offset(markets_count), 0, 0.0, 0.0, 0.0, 0.0)
+        # Publish the market only when its name and slot are already in place
+        self.HEADER.pack_into(self.buf, 0, magic, max_markets, markets_count + 1, taker_fee)
+        self.register_market(market, markets_count)
+        return markets_count
+
+    def market_slot(self, market: str):
+        if market not in self.market_slots:
+            self.refresh_markets()
+            if market not in self.market_slots:
+                raise KeyError("Unknown market: {}".format(market))
+        return self.market_slots[market]
+
+    def market_offset(self, market: Union[str, int]):
+        offset = self.offsets.get(market)
+        if offset is None:
+            self.refresh_markets()
+            offset = self.offsets.get(market)
+            if offset is None:
+                raise KeyError("Unknown market: {}".format(market))
+        return offset
+
+    def slot_offset(self, slot: int):
+        return self.slots_offset(self.max_markets) + slot * self.SLOT_SIZE
+
+    def update(self, market: Union[str, int], bid: float, ask: float, last: float = math.nan, timestamp: float = None):
+        '''
+        To be called by the (single) writer only. Accepts the market name or its slot.
+        '''
+        offset = self.offsets.get(market) or self.market_offset(market)
+        seq = self.SEQ.unpack_from(self.buf, offset)[0]
+        self.SEQ.pack_into(self.buf, offset, seq + 1)  # Odd - write in progress
+        self.SLOT.pack_into(self.buf, offset, seq + 1, bid, ask, last, timestamp if timestamp is not None else time.time())
+        self.SEQ.pack_into(self.buf, offset, seq + 2)
+
+    def read(self, market: Union[str, int]):
+        '''
+        Lock-free consistent read of the market's snapshot. Accepts the market name or its slot.
+        '''
+        offset = self.offsets.get(market) or self.market_offset(market)
+        buf = self.buf
+        while True:
+            seq, bid, ask, last, timestamp = unpack_slot(buf, offset)
+            if not seq & 1 and seq == unpack_seq(buf, offset)[0]:
+                return MarketSnapshot(bid, ask, last, timestamp)
+
+    def read_bid_ask(self, market: Union[str, int]):
+        '''
+        The cheapest consistent read: (bid, ask) tuple
+        '''
+        offset = self.offsets.get(market) or self.market_offset(market)
+        buf = self.buf
+        while True:
+            seq, bid, ask, _, _ = unpack_slot(buf, offset)
+            if not seq & 1 and seq == unpack_seq(buf, offset)[0]:
+                return bid, ask
+
+    def bid_ask_reader(self, market: Union[str, int]):
+        '''
+        Returns a function doing the read_bid_ask of the market through views of its slot bound once (no struct unpacking,
+        no offset lookup) - the hot path readers should keep it
+        '''
+        offset = self.market_offset(market)
+        view = self.buf[offset:offset + self.SLOT.size]
+        seqs = view.cast('Q')
+        values = view.cast('d')  # [seq, bid, ask, last, time] - index 0 only via seqs
+        self.views.extend((view, seqs, values))
+
+        def read_bid_ask():
+            while True:
+                seq = seqs[0]
+                bid = values[1]
+                ask = values[2]
+                if not seq & 1 and seq == seqs[0]:
+                    return bid, ask
+
+        return read_bid_ask
+
+    def best_bid(self, market: Union[str, int]):
+        return self.read_bid_ask(market)[0]
+
+    def best_ask(self, market: Union[str, int]):
+        return self.read_bid_ask(market)[1]
+
+    def age(self, market: Union[str, int]):
+        '''
+        Seconds since the last update of the market (inf if never updated)
+        '''
+        timestamp = self.read(market).time
+        return time.time() - timestamp if timestamp else math.inf
+
+    def close(self):
+        for view in reversed(self.views):  # The casts before the views they were made of
+            view.release()
+        self.views = []
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        '''
+        To be called once by the creator, when no process uses the snapshot anymore
+        '''
+        self.close()
+        self.shm.unlink()
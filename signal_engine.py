@@ -0,0 +1,207 @@
+'''
+Local buy/sell signals generated from the OHLCV bars (see ohlcv.py) by indicator strategies (see indicators.py), next to
+the TradingView alerts coming through WebhookBot.
+
+The signals are the same request dicts the webhook delivers ({"type": "buy", "price": "29100.5", "fiat": "USD"} plus
+"source": the strategy name) and they go through the same SignalChannels into FtxUserApiWorker.handle_buy_sell_requests
+- one execution path for both.
+
+A strategy maps its indicators' values to a state on every closed bar of its market and timeframe: 1 (buy zone), -1
+(sell zone), 0 (neutral) or NaN (not ready). Entering the buy / sell zone is a signal. The states can be computed bar by
+bar (O(1) indicator updates) or for the whole history at once (vectorized, see Strategy.warm_up) - with the same result.
+
+eg. usage (in the market data worker):
+
+    strategies = [create_strategy({"type": "ema_cross", "market": "BTC/USDT", "timeframe": "1m", "fast": 9, "slow": 21})]
+    engine = SignalEngine(ohlcv_aggregator, strategies, signal_channels=buy_sell_requests_queues_collection)
+    engine.warm_up()  # On the bars already there
+
+Note! FtxUserApiWorker trades BTC/USDT whatever the signal's market is - the strategies should run on BTC/USDT bars.
+'''
+
+import math
+import logging
+from typing import List
+from indicators import EMA, RSI, Bollinger, CLOSE
+from latency import stamp
+from ohlcv import OhlcvAggregator, OhlcvBars
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Strategy(object):
+
+    type = None
+
+    def __init__(self, market: str, timeframe: str, name: str = None):
+        self.market = market
+        self.timeframe = timeframe
+        self.name = name if name else "{}:{}:{}".format(self.type, market, timeframe)
+        self.indicators = []
+        self.previous_state = math.nan
+
+    def state(self, bar):
+        '''
+        1 / -1 / 0 / NaN from the indicators' current values
+        '''
+        raise NotImplementedError
+
+    def states(self, bars):
+        '''
+        Vectorized state() of every bar (warms the indicators up)
+        '''
+        raise NotImplementedError
+
+    def update(self, bar):
+        '''
+        Closed bar -> "buy" / "sell" / None
+        '''
+        for indicator in self.indicators:
+            indicator.update(bar)
+        state = self.state(bar)
+        previous_state, self.previous_state = self.previous_state, state
+        if state != previous_state and state and not math.isnan(previous_state) and not math.isnan(state):
+            return "buy" if state > 0 else "sell"
+        return None
+
+    def warm_up(self, bars):
+        '''
+        All the closed bars at once - returns the signals of the history: [(bar index, "buy" / "sell")]
+        '''
+        states = self.states(bars)
+        if not len(states):
+            return []
+        signals = np.flatnonzero(~np.isnan(states[1:]) & ~np.isnan(states[:-1]) & (states[1:] != states[:-1]) & (states[1:] != 0)) + 1
+        self.previous_state = float(states[-1])
+        return [(int(index), "buy" if states[index] > 0 else "sell") for index in signals]
+
+
+class EmaCrossStrategy(Strategy):
+    '''
+    Buy when the fast EMA crosses above the slow one, sell when it crosses below
+    '''
+
+    type = "ema_cross"
+
+    def __init__(self, market: str, timeframe: str, fast: int = 9, slow: int = 21, name: str = None):
+        super().__init__(market, timeframe, name)
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.indicators = [self.fast, self.slow]
+
+    def state(self, bar):
+        if math.isnan(self.fast.value) or math.isnan(self.slow.value):
+            return math.nan
+        return 1.0 if self.fast.value > self.slow.value else -1.0
+
+    def states(self, bars):
+        fast, slow = self.fast.warm_up(bars), self.slow.warm_up(bars)
+        return np.where(np.isnan(fast) | np.isnan(slow), np.nan, np.where(fast > slow, 1.0, -1.0))
+
+
+class RsiStrategy(Strategy):
+    '''
+    Buy when the RSI drops below oversold, sell when it rises above overbought
+    '''
+
+    type = "rsi"
+
+    def __init__(self, market: str, timeframe: str, period: int = 14, oversold: float = 30.0, overbought: float = 70.0, name: str = None):
+        super().__init__(market, timeframe, name)
+        self.rsi = RSI(period)
+        self.oversold = oversold
+        self.overbought = overbought
+        self.indicators = [self.rsi]
+
+    def state(self, bar):
+        rsi = self.rsi.value
+        if math.isnan(rsi):
+            return math.nan
+        return 1.0 if rsi < self.oversold else -1.0 if rsi > self.overbought else 0.0
+
+    def states(self, bars):
+        rsi = self.rsi.warm_up(bars)
+        return np.where(np.isnan(rsi), np.nan, np.where(rsi < self.oversold, 1.0, np.where(rsi > self.overbought, -1.0, 0.0)))
+
+
+class BollingerStrategy(Strategy):
+    '''
+    Buy when the close drops below the lower band, sell when it rises above the upper band
+    '''
+
+    type = "bollinger"
+
+    def __init__(self, market: str, timeframe: str, period: int = 20, deviations: float = 2.0, name: str = None):
+        super().__init__(market, timeframe, name)
+        self.bands = Bollinger(period, deviations)
+        self.indicators = [self.bands]
+
+    def state(self, bar):
+        _, upper, lower = self.bands.value
+        if math.isnan(upper):
+            return math.nan
+        close = bar[CLOSE]
+        return 1.0 if close < lower else -1.0 if close > upper else 0.0
+
+    def states(self, bars):
+        bands = self.bands.warm_up(bars)
+        close = bars[:, CLOSE]
+        return np.where(np.isnan(bands[:, 1]), np.nan, np.where(close < bands[:, 2], 1.0, np.where(close > bands[:, 1], -1.0, 0.0)))
+
+
+STRATEGIES = {strategy.type: strategy for strategy in (EmaCrossStrategy, RsiStrategy, BollingerStrategy)}
+
+
+def create_strategy(config: dict):
+    '''
+    {"type": "ema_cross", "market": "BTC/USDT", "timeframe": "1m", ...the strategy's parameters}
+    '''
+    parameters = dict(config)
+    strategy_type = parameters.pop("type")
+    if strategy_type not in STRATEGIES:
+        raise Exception("Unknown strategy type: {}. Supported: {}".format(strategy_type, list(STRATEGIES.keys())))
+    return STRATEGIES[strategy_type](**parameters)
+
+
+class SignalEngine(object):
+
+    def __init__(self, aggregator: OhlcvAggregator, strategies: List[Strategy], signal_channels: dict = None, fiat: str = "USD", logger: logging.Logger = None):
+        self.aggregator = aggregator
+        self.strategies = {}  # (market, timeframe) -> [Strategy]
+        for strategy in strategies:
+            aggregator.bars(strategy.market, strategy.timeframe)  # Raises if the bars aren't aggregated
+            self.strategies.setdefault((strategy.market, strategy.timeframe), []).append(strategy)
+        self.signal_channels = signal_channels if signal_channels is not None else {}  # user -> SignalChannel
+        self.fiat = fiat
+        self.logger = logger if logger else logging.getLogger("signal_engine")
+        self.signals = 0
+        aggregator.add_bar_closed_listener(self.handle_bar_closed)
+
+    def warm_up(self):
+        for (market, timeframe), strategies in self.strategies.items():
+            bars = self.aggregator.bars(market, timeframe).closed_view()
+            for strategy in strategies:
+                strategy.warm_up(bars)
+
+    def handle_bar_closed(self, bars: OhlcvBars, bar: list):
+        strategies = self.strategies.get((bars.market, bars.timeframe))
+        if strategies:
+            for strategy in strategies:
+                side = strategy.update(bar)
+                if side:
+                    self.emit(strategy, side, bar)
+
+    def emit(self, strategy: Strategy, side: str, bar: list):
+        request = {"type": side, "price": repr(bar[CLOSE]), "fiat": self.fiat, "source": strategy.name}
+        self.signals += 1
+        self.logger.info("[LOCAL SIGNAL] {}".format(request))
+        for user, signal_channel in self.signal_channels.items():
+            timestamps = {}
+            stamp(timestamps, "enqueued")
+            try:
+                signal_channel.put(dict(request, timestamps=timestamps))
+            except Exception as e:
+                self.logger.error("Cannot deliver the local signal to user: {}! Exception: {}".format(user, repr(e)))
@@ -0,0 +1,77 @@
+'''
+Low-latency transport of the buy/sell signals from the webhook bot to the user api workers (instead of Manager queues,
+where every signal goes through the manager server process and the workers have to poll).
+
+Every worker gets its own one-way pipe. The webhook writes a signal with a single non-blocking write (JSON, far below
+PIPE_BUF, so it's atomic and never partially written). The worker's loop watches the pipe (loop.add_reader) and so it's
+woken up as soon as a signal arrives.
+
+eg. usage:
+
+    channel = SignalChannel()                           # Before forking the processes
+
+    channel.put({"type": "buy", "price": "25420", "fiat": "EUR"})     # Webhook process (never blocks)
+
+    channel.attach(asyncio.get_running_loop(), handle_signal)        # Worker process - handle_signal(signal) is
+                                                                      # called on the loop for every received signal
+'''
+
+import os
+import select
+import asyncio
+import multiprocessing
+from typing import Callable
+import json_codec
+
+
+class SignalChannelFull(Exception):
+    '''
+    The worker doesn't read its signals (the pipe buffer is full)
+    '''
+
+
+class SignalChannel(object):
+
+    MAX_SIGNAL_SIZE = select.PIPE_BUF - 4  # Connection.send_bytes adds 4 bytes header - bigger writes are not atomic
+
+    def __init__(self):
+        self.receiver, self.sender = multiprocessing.Pipe(duplex=False)
+        os.set_blocking(self.sender.fileno(), False)
+        self.loop = None
+
+    def put(self, signal: dict):
+        '''
+        Never blocks. Safe to be called from many threads (every signal is a single atomic write).
+        '''
+        frame = json_codec.dumps(signal).encode()
+        if len(frame) > self.MAX_SIGNAL_SIZE:
+            raise Exception("Signal too big ({} bytes, max: {})! Signal: {}".format(len(frame), self.MAX_SIGNAL_SIZE, signal))
+        try:
+            self.sender.send_bytes(frame)
+        except BlockingIOError:
+            raise SignalChannelFull("Signal channel is full - the worker doesn't read its signals! Signal not delivered: {}".format(signal))
+
+    def get(self, timeout: float = None):
+        '''
+        Blocking - returns None on timeout
+        '''
+        if not self.receiver.poll(timeout):
+            return None
+        return json_codec.loads(self.receiver.recv_bytes())
+
+    def attach(self, loop: asyncio.AbstractEventLoop, callback: Callable):
+        '''
+        Calls callback(signal) on the loop for every received signal
+        '''
+        self.loop = loop
+        loop.add_reader(self.receiver.fileno(), self.read_signals, callback)
+
+    def detach(self):
+        if self.loop:
+            self.loop.remove_reader(self.receiver.fileno())
+            self.loop = None
+
+    def read_signals(self, callback: Callable):
+        # Everything already in the pipe (there are only whole signals - see put)
+        while self.receiver.poll():
+            callback(json_codec.loads(self.receiver.recv_bytes()))
@@ -1,30 +1,79 @@
 '''
-Using http://flask-classful.teracy.org/
+Using http://flask-classful.teracy.org/ (Flask development server mode)
+and https://docs.aiohttp.org/ (asyncio server mode - the default one when aiohttp is installed)
 '''
 
-import ast
+import hmac
 import hashlib
-import pprint
+import asyncio
+import threading
+from typing import Callable
 from flask import Flask, current_app
 from flask_classful import FlaskView, route
 from flask import Flask, request, abort
+import json_codec
+from latency import stamp
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+
+ALERT_TYPES = ("buy", "sell")
+MAX_ALERT_SIZE = 16 * 1024  # Bytes - TradingView alerts are tiny
+ALERT_FORMAT_HINT = '{"type": "{{strategy.order.action}}", "price": "{{strategy.order.price}}", "fiat": "EUR", "token": "99fb2f48c6af4761f904fc85f95eb56190e5d40b1f44ec3a9c1fa121"}'
+
+
+class AlertError(Exception):
+    '''
+    Malformed alert (HTTP 400)
+    '''
+
+
+def parse_alert(body, token: str):
+    '''
+    Strict parsing of the TradingView alert (a JSON object):
+        {"type": "buy" | "sell", "price": "25420", "fiat": "EUR", "token": "<token>"}
+    Returns the alert without the token, or None if the token is wrong (compared in constant time).
+    '''
+    try:
+        data = json_codec.loads(body)
+    except Exception as e:
+        raise AlertError("Cannot decode received data! Exception: {}".format(repr(e)))
+    if not isinstance(data, dict):
+        raise AlertError("The alert must be a JSON object! Received: {}".format(type(data).__name__))
+    received_token = data.pop("token", None)
+    if not isinstance(received_token, str) or not hmac.compare_digest(received_token.encode(), token.encode()):
+        return None
+    if data.get("type") not in ALERT_TYPES or "price" not in data or "fiat" not in data:
+        raise AlertError("The alert must contain 'type' (one of: {}), 'price' and 'fiat' keys! Received: {}".format(ALERT_TYPES, data))
+    return data
 
 
 class WebhookBot(object):
 
-    def __init__(self, webhook_pin: str, buy_sell_requests_queues_collection: dict):
+    FLASK = "flask"
+    AIOHTTP = "aiohttp"
+
+    def __init__(self, webhook_pin: str, buy_sell_requests_queues_collection: dict, server: str = None):
         print("Initializing webhook bot...")
 
         self.webhook_pin = webhook_pin
+        self.token = self.get_token()
         self.buy_sell_requests_queues_collection = buy_sell_requests_queues_collection
+        self.server = server if server else (self.AIOHTTP if web else self.FLASK)
+        if self.server == self.AIOHTTP and not web:
+            print("aiohttp is not installed! Using the Flask server instead!")
+            self.server = self.FLASK
         print("***********************************************************************************************************************************************")
         print("TradingView Alert string to be used (just copy and paste it):")
         print(
-            '{"type": "{{strategy.order.action}}", "price": "{{strategy.order.price}}", "fiat": "EUR", "token": "' + self.get_token() + '"}')
+            '{"type": "{{strategy.order.action}}", "price": "{{strategy.order.price}}", "fiat": "EUR", "token": "' + self.token + '"}')
         print("***********************************************************************************************************************************************")
 
-        # Create Flask object called app.
-        self.app = self.create_app()
+        # Create Flask (or aiohttp) object called app.
+        self.app = self.create_aiohttp_app() if self.server == self.AIOHTTP else self.create_app()
 
     # Generate unique token from webhook_pin. This adds a marginal amount of security.
     def get_token(self):
@@ -38,15 +87,98 @@ class WebhookBot(object):
         # init variables (accessible in views)
         app.config['SECRET_KEY'] = self.get_token()
         app.config['SHARED_QUEUES'] = self.buy_sell_requests_queues_collection
+        app.config['WEBHOOK_BOT'] = self
+        return app
+
+    def create_aiohttp_app(self):
+        app = web.Application(client_max_size=MAX_ALERT_SIZE)
+        app.router.add_get('/', self.index)
+        app.router.add_post('/webhook', self.webhook)
         return app
 
-    def start_bot(self):
-        WebhookView.register(self.app)
+    def dispatch_alert(self, data: dict, timestamps: dict):
+        '''
+        Adds the alert to each client's signal channel (never blocks - see signal_transport)
+        '''
+        for user, buy_sell_requests_channel in self.buy_sell_requests_queues_collection.items():
+            # Every worker gets its own copy of the latency trace (see latency.py)
+            request_timestamps = dict(timestamps)
+            stamp(request_timestamps, "enqueued")
+            try:
+                buy_sell_requests_channel.put(dict(data, timestamps=request_timestamps))
+            except Exception as e:
+                print("Cannot deliver the alert to user: {}! Exception: {}".format(user, repr(e)))
+        print("[Alert Received] {}".format(data))
+
+    async def index(self, http_request):
+        return web.Response(text='Webhook bot is online')
+
+    async def webhook(self, http_request):
+        timestamps = {}
+        stamp(timestamps, "webhook_received")
+        try:
+            data = parse_alert(await http_request.read(), self.token)
+        except AlertError as e:
+            print(str(e))
+            print("Note! The alert should be sent as the following string (replace token with the correct one!):")
+            print(ALERT_FORMAT_HINT)
+            raise web.HTTPBadRequest()
+        if data is None:
+            print("Wrong token received!")
+            raise web.HTTPForbidden()
+        self.dispatch_alert(data, timestamps)
+        return web.Response()
+
+    async def serve(self, host: str = '0.0.0.0', port: int = 80):
+        '''
+        Starts the aiohttp server on the running loop. Returns the runner (await runner.cleanup() to stop it).
+        '''
+        runner = web.AppRunner(self.app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port, backlog=1024).start()
+        except Exception:
+            await runner.cleanup()
+            raise
+        return runner
+
+    def start_aiohttp_bot(self, on_loop_started: Callable = None):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = None
         try:
-            self.app.run(host='0.0.0.0', port=80)
-        except PermissionError:
-            print("Exception! You need root access to run the bot at port 80! Running at default port 5000 instead!")
-            self.app.run(host='0.0.0.0', port=5000)
+            try:
+                runner = loop.run_until_complete(self.serve(port=80))
+            except PermissionError:
+                print("Exception! You need root access to run the bot at port 80! Running at default port 5000 instead!")
+                runner = loop.run_until_complete(self.serve(port=5000))
+            if on_loop_started:
+                on_loop_started(loop)
+            loop.run_forever()
+        finally:
+            if runner:
+                loop.run_until_complete(runner.cleanup())
+            loop.close()
+
+    def start_bot(self, on_loop_started: Callable = None):
+        '''
+        on_loop_started(loop) is called with the bot's event loop, e.g. to schedule periodic calls on it (see
+        periodic.TimerScheduler). In the Flask mode the loop runs in a (single) background thread.
+        '''
+        try:
+            if self.server == self.AIOHTTP:
+                self.start_aiohttp_bot(on_loop_started)
+            else:
+                if on_loop_started:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="webhook_bot_loop", daemon=True).start()
+                    loop.call_soon_threadsafe(on_loop_started, loop)
+                WebhookView.register(self.app)
+                try:
+                    self.app.run(host='0.0.0.0', port=80)
+                except PermissionError:
+                    print("Exception! You need root access to run the bot at port 80! Running at default port 5000 instead!")
+                    self.app.run(host='0.0.0.0', port=5000)
         except Exception as e:
             e.args = ("Exception during WebhookBot running! " + str(e),)
             raise
@@ -63,23 +195,19 @@ class WebhookView(FlaskView):
     @route('/webhook', methods=['POST'])
     def webhook(self):
         if request.method == 'POST':
-            # Parse the string data from tradingview into a python dict
+            timestamps = {}
+            stamp(timestamps, "webhook_received")
+            # Parse the JSON data from tradingview into a python dict and check that the token is correct
             try:
-                data = ast.literal_eval(request.get_data(as_text=True))
-            except Exception as e:
-                print("Cannot decode received data! Exception: {}".format(repr(e)))
+                data = parse_alert(request.get_data(), current_app.config['SECRET_KEY'])
+            except AlertError as e:
+                print(str(e))
                 print("Note! The alert should be sent as the following string (replace token with the correct one!):")
-                print('{"type": "{{strategy.order.action}}", "price": "{{strategy.order.price}}", "token": "99fb2f48c6af4761f904fc85f95eb56190e5d40b1f44ec3a9c1fa121"}')
-                abort(403)
-            # Check that the key is correct
-            if current_app.config['SECRET_KEY'] == data['token']:
-                print("[Alert Received]")
-                print("POST Received:")
-                pprint.pprint(data)
-                # Add the request to each client's queue
-                buy_sell_requests_queues_collection = current_app.config['SHARED_QUEUES']
-                for buy_sell_requests_queue in buy_sell_requests_queues_collection.values():
-                    buy_sell_requests_queue.put(data)
+                print(ALERT_FORMAT_HINT)
+                abort(400)
+            if data is not None:
+                # Add the request to each client's signal channel
+                current_app.config['WEBHOOK_BOT'].dispatch_alert(data, timestamps)
                 return '', 200
             else:
                 print("Wrong token received!")